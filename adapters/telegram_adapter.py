@@ -207,8 +207,8 @@ async def handle_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     tenant_id = _resolve_tenant_id(update)
     if update.message and update.message.text and update.message.text.strip().lower().startswith("/start") and " t_" in update.message.text.strip().lower():
         set_telegram_tenant_for_user(str(update.effective_user.id), tenant_id)
-    from core.agent_runner import run_agent
-    response = run_agent(
+    from core.agent_runner import run_agent_async
+    response = await run_agent_async(
         tenant_id=tenant_id,
         channel="telegram",
         incoming_message=user_text,
@@ -34,6 +34,23 @@ def get_agent_response(
     )
 
 
+async def get_agent_response_async(
+    tenant_id: str,
+    lead_id: str,
+    text: str,
+    is_audio: bool = False,
+    agent_id: str | None = None,
+) -> dict[str, Any]:
+    """Como get_agent_response, para os webhooks assíncronos (não bloqueia o event loop)."""
+    from core.agent_runner import run_agent_async
+    return await run_agent_async(
+        tenant_id=tenant_id,
+        channel="whatsapp",
+        incoming_message=text or "",
+        metadata={"lead_id": lead_id, "is_audio": is_audio, "agent_id": agent_id},
+    )
+
+
 def resolve_tenant_id_from_whatsapp(payload: dict[str, Any]) -> str:
     """Extrai tenant_id do payload (ex.: número associado a um tenant). Por ora retorna default."""
     return (__import__("os").environ.get("WHATSAPP_TENANT_ID", "default") or "default").strip()
@@ -3,6 +3,7 @@ Core engine: executa o agente SPIN para um tenant/canal sem conhecer dashboard n
 Chama execution (facade, db, RAG, LLM) e retorna resposta estruturada.
 """
 
+import os
 import sys
 from pathlib import Path
 
@@ -11,7 +12,9 @@ ROOT = Path(__file__).resolve().parent.parent
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from typing import Any
+from typing import Any, Awaitable, Callable, Optional
+
+from execution.async_runtime import run_db, run_sync
 
 
 def run_agent(
@@ -19,6 +22,18 @@ def run_agent(
     channel: str,
     incoming_message: str,
     metadata: dict[str, Any],
+    on_partial: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> dict[str, Any]:
+    """Versão síncrona de run_agent_async (mesmos parâmetros e retorno)."""
+    return run_sync(run_agent_async(tenant_id, channel, incoming_message, metadata, on_partial=on_partial))
+
+
+async def run_agent_async(
+    tenant_id: str,
+    channel: str,
+    incoming_message: str,
+    metadata: dict[str, Any],
+    on_partial: Optional[Callable[[str], Awaitable[None]]] = None,
 ) -> dict[str, Any]:
     """
     Executa uma rodada do agente para o tenant/canal.
@@ -26,7 +41,9 @@ def run_agent(
     - channel: "telegram" | "whatsapp" (informativo).
     - incoming_message: texto da mensagem do lead.
     - metadata: {"lead_id": str, "is_audio": bool, "agent_id": str opcional}.
+    - on_partial: opcional; recebe o texto parcial da resposta em stream (Telegram, SSE).
     Retorna: {"resposta_texto", "enviar_audio", "proximo_estado", "enviar_imagens", "modelos"}.
+    Para uso em handlers assíncronos (webhooks, bot): não bloqueia o event loop.
     """
     lead_id = str(metadata.get("lead_id", ""))
     is_audio = bool(metadata.get("is_audio", False))
@@ -44,18 +61,19 @@ def run_agent(
 
     # Modo legado: tenant_id default ou ausente
     if not tenant_id or str(tenant_id).strip().lower() == "default":
-        from execution.agent_facade import run_agent_facade
-        return run_agent_facade(
+        from execution.agent_facade import run_agent_facade_async
+        return await run_agent_facade_async(
             lead_id=lead_id,
             user_text=incoming_message.strip(),
             is_audio=is_audio,
             tenant_id=None,
             agent_id=None,
+            on_partial=on_partial,
         )
 
     # Multi-tenant: resolver agente e config do tenant
     from execution import tenant_config
-    tenant = tenant_config.get_tenant(tenant_id)
+    tenant = await run_db(tenant_config.get_tenant, tenant_id)
     if not tenant:
         return {
             "resposta_texto": "Empresa não encontrada. Entre em contato com o suporte.",
@@ -65,10 +83,10 @@ def run_agent(
             "modelos": [],
         }
     if not agent_id:
-        agent = tenant_config.get_active_agent_for_tenant(tenant_id)
+        agent = await run_db(tenant_config.get_active_agent_for_tenant, tenant_id)
         agent_id = str(agent["id"]) if agent else None
     else:
-        agent = tenant_config.get_agent_by_id(agent_id)
+        agent = await run_db(tenant_config.get_agent_by_id, agent_id)
     if not agent_id or not agent:
         # Tenant existe mas não tem agente ativo — exige criar/ativar agente em Meus Agentes
         return {
@@ -85,12 +103,13 @@ def run_agent(
         if isinstance(settings, dict) and settings.get("drive_folder_id"):
             drive_folder_id_override = settings["drive_folder_id"]
 
-    from execution.agent_facade import run_agent_facade
-    return run_agent_facade(
+    from execution.agent_facade import run_agent_facade_async
+    return await run_agent_facade_async(
         lead_id=lead_id,
         user_text=incoming_message.strip(),
         is_audio=is_audio,
         tenant_id=tenant_id,
         agent_id=str(agent["id"]),
         drive_folder_id_override=drive_folder_id_override,
+        on_partial=on_partial,
     )
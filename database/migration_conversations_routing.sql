@@ -0,0 +1,9 @@
+-- Migration: roteamento fixo por conversa (execution/routing_state.py)
+-- O handoff do supervisor fica na conversa do agente de entrada (agente do canal): as mensagens
+-- seguintes do lead vão para o agente roteado, mesmo depois de reiniciar a API.
+
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS routed_agent_id UUID REFERENCES agents(id) ON DELETE SET NULL;
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS routing_confidence REAL;
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS routed_at TIMESTAMPTZ;
+
+COMMENT ON COLUMN conversations.routed_agent_id IS 'Agente que atende o lead após o último handoff do supervisor (NULL = o próprio agente).';
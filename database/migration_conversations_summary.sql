@@ -0,0 +1,7 @@
+-- Migration: resumo contínuo da conversa (execution/conversation_summary.py)
+-- summary: resumo acumulado, atualizado em segundo plano a cada N turnos por um modelo barato.
+-- summary_turns: turnos gravados que ainda não entraram no resumo (vão no prompt por extenso).
+-- A tabela legado sessions (bot sem tenant) recebe as mesmas colunas em db_sessions.init_db.
+
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS summary TEXT;
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS summary_turns INT NOT NULL DEFAULT 0;
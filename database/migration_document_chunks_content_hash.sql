@@ -0,0 +1,15 @@
+-- Migration: hash de conteúdo por chunk para reaproveitar embeddings (deduplicação)
+-- Re-uploads do mesmo catálogo/tabela de preços copiam o vetor de chunks idênticos do tenant
+-- em vez de chamar a API de embeddings de novo.
+
+ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS content_hash TEXT;
+ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS embedding_model TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_document_chunks_tenant_hash ON document_chunks (tenant_id, content_hash);
+
+-- Relatório por documento: total de chunks e quantos embeddings foram reaproveitados
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS chunks_count INT DEFAULT 0;
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS embeddings_reused INT DEFAULT 0;
+
+COMMENT ON COLUMN document_chunks.content_hash IS 'sha256 do texto normalizado + modelo de embedding (ver execution/document_ingest.chunk_content_hash).';
+COMMENT ON COLUMN documents.embeddings_reused IS 'Chunks cujo embedding foi copiado de um chunk idêntico do tenant (chamadas à API evitadas).';
@@ -0,0 +1,6 @@
+-- Migration: metadata por chunk (ex.: aba e intervalo de linhas de planilhas)
+-- Planilhas são ingeridas em streaming; cada chunk guarda {"sheet": ..., "row_start": n, "row_end": m}.
+
+ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS metadata JSONB;
+
+COMMENT ON COLUMN document_chunks.metadata IS 'Origem do chunk no documento (aba/linhas da planilha, página, URL).';
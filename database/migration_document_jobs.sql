@@ -0,0 +1,40 @@
+-- Migration: fila durável de processamento de documentos (run_document_worker.py)
+-- O platform_backend enfileira aqui quando DOCUMENT_JOBS_ENABLED=1; o worker consome com
+-- SELECT ... FOR UPDATE SKIP LOCKED, retry com backoff e justiça entre tenants.
+
+CREATE TABLE IF NOT EXISTS document_jobs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    tenant_id UUID NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    document_id UUID REFERENCES documents(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'running', 'completed', 'failed')),
+    attempts INT NOT NULL DEFAULT 0,
+    max_attempts INT NOT NULL DEFAULT 3,
+    run_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    locked_at TIMESTAMPTZ,
+    locked_by TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    progress_message TEXT,
+    last_error TEXT,
+    result JSONB,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS idx_document_jobs_pending ON document_jobs (run_at) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_document_jobs_running ON document_jobs (tenant_id) WHERE status = 'running';
+CREATE INDEX IF NOT EXISTS idx_document_jobs_document ON document_jobs (document_id, created_at DESC);
+
+-- Todos os documentos do job (um lote de imagens é um job só): status, retry e requeue valem para cada um
+ALTER TABLE document_jobs ADD COLUMN IF NOT EXISTS document_ids UUID[] NOT NULL DEFAULT '{}';
+UPDATE document_jobs SET document_ids = ARRAY[document_id] WHERE document_id IS NOT NULL AND document_ids = '{}';
+CREATE INDEX IF NOT EXISTS idx_document_jobs_document_ids ON document_jobs USING GIN (document_ids);
+
+-- Arquivos enviados, guardados com o job (large objects, gravados e lidos em blocos): o worker roda em
+-- outro serviço e não enxerga o disco da API. Dispensável com DOCUMENT_JOB_SHARED_UPLOADS=1.
+CREATE TABLE IF NOT EXISTS document_job_files (
+    job_id UUID NOT NULL REFERENCES document_jobs(id) ON DELETE CASCADE,
+    file_path TEXT NOT NULL,
+    content_oid OID NOT NULL,
+    PRIMARY KEY (job_id, file_path)
+);
@@ -0,0 +1,21 @@
+-- Migration: páginas de documentos criados por crawl de URL (POST /api/documents/url com crawl=true)
+-- Guarda ETag/Last-Modified/hash por página para o refresh (POST /api/documents/{id}/refresh)
+-- baixar e re-ingerir só as páginas que mudaram.
+
+CREATE TABLE IF NOT EXISTS document_pages (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    tenant_id UUID NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    document_id UUID NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    url TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    content_hash TEXT,
+    http_status INT,
+    last_error TEXT,
+    fetched_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    UNIQUE (document_id, url)
+);
+
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS crawl_options JSONB;
+
+COMMENT ON COLUMN documents.crawl_options IS 'URL inicial, max_pages, max_depth e use_sitemap do crawl (reutilizados no refresh).';
@@ -0,0 +1,6 @@
+-- Migration: hash do arquivo enviado (deduplicação de uploads idênticos)
+-- O upload calcula o SHA-256 enquanto grava em disco; se o tenant já tem um documento com o
+-- mesmo hash, o documento existente é devolvido sem salvar nem reprocessar o arquivo.
+
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS file_sha256 TEXT;
+CREATE INDEX IF NOT EXISTS idx_documents_tenant_sha256 ON documents (tenant_id, file_sha256);
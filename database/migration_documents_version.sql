@@ -0,0 +1,7 @@
+-- Migration: versão do documento para substituição incremental (POST /api/documents/{id}/replace)
+-- A troca de versão acontece na mesma transação que insere/remove os chunks alterados,
+-- então a busca nunca vê um documento pela metade.
+
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS version INT DEFAULT 1;
+
+COMMENT ON COLUMN documents.version IS 'Incrementada a cada substituição do arquivo (ver execution/document_ingest.replace_chunks).';
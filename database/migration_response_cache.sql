@@ -0,0 +1,22 @@
+-- Migration: cache semântico de respostas do agente (execution/response_cache.py)
+-- Opt-in por agente em agents.settings.response_cache. Chave: tenant + agente + estado + hash do
+-- contexto (RAG recuperado e persona) e embedding da mensagem (pgvector, 1536 dims).
+-- Requer a extensão vector (schema_pgvector.sql).
+
+CREATE TABLE IF NOT EXISTS response_cache (
+    id BIGSERIAL PRIMARY KEY,
+    tenant_id UUID NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    agent_id UUID NOT NULL REFERENCES agents(id) ON DELETE CASCADE,
+    state TEXT NOT NULL,
+    context_hash TEXT NOT NULL,
+    query TEXT NOT NULL,
+    embedding vector(1536) NOT NULL,
+    response JSONB NOT NULL,
+    hits INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    last_hit_at TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS idx_response_cache_key ON response_cache (tenant_id, agent_id, state, context_hash);
+
+COMMENT ON COLUMN response_cache.response IS 'Resposta estruturada (resposta_texto, proximo_estado...) com o nome do lead como {nome}.';
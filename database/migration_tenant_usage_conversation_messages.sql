@@ -0,0 +1,7 @@
+-- Migration: total de mensagens do mês reconciliado pelo contador de cota (execution/plan_limit_checker.py)
+-- O limite do plano é checado num contador (Redis ou memória); a reconciliação periódica recalcula pelo
+-- tenant_conversation_log e grava o total aqui.
+
+ALTER TABLE tenant_usage ADD COLUMN IF NOT EXISTS conversation_messages INTEGER NOT NULL DEFAULT 0;
+
+COMMENT ON COLUMN tenant_usage.conversation_messages IS 'Mensagens (cliente + agente) do mês em tenant_conversation_log, na última reconciliação do contador de cota.';
@@ -0,0 +1,17 @@
+-- Migration: cache de descrições de imagens (OpenAI Vision) da base de conhecimento
+-- Chave: tenant + SHA-256 da imagem + modelo. Re-upload ou a mesma imagem em outro agente
+-- reaproveita a descrição em vez de chamar o modelo de novo.
+
+CREATE TABLE IF NOT EXISTS vision_cache (
+    tenant_id UUID NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    image_hash TEXT NOT NULL,
+    model TEXT NOT NULL,
+    description TEXT NOT NULL,
+    elapsed_ms INT NOT NULL DEFAULT 0,
+    hits INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    last_hit_at TIMESTAMPTZ,
+    PRIMARY KEY (tenant_id, image_hash, model)
+);
+
+COMMENT ON COLUMN vision_cache.elapsed_ms IS 'Duração da chamada original ao Vision (usada para estimar o tempo economizado a cada hit).';
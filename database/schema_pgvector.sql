@@ -11,11 +11,15 @@ CREATE TABLE IF NOT EXISTS document_chunks (
     chunk_index INT NOT NULL,
     content TEXT NOT NULL,
     embedding vector(1536),
+    content_hash TEXT,
+    embedding_model TEXT,
+    metadata JSONB,
     created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
 );
 
 CREATE INDEX IF NOT EXISTS idx_document_chunks_tenant ON document_chunks (tenant_id);
 CREATE INDEX IF NOT EXISTS idx_document_chunks_document ON document_chunks (document_id);
+CREATE INDEX IF NOT EXISTS idx_document_chunks_tenant_hash ON document_chunks (tenant_id, content_hash);
 
 -- Índice HNSW para busca por similaridade (cosine). Cria após ter dados.
 -- CREATE INDEX IF NOT EXISTS idx_document_chunks_embedding ON document_chunks
@@ -4,27 +4,40 @@ Usado pelo core/agent_runner e pelo handler legado (com tenant_id/agent_id opcio
 Não envia mensagens; apenas retorna o dict (resposta_texto, enviar_audio, proximo_estado, enviar_imagens, modelos).
 """
 
+import logging
 import os
-from typing import Any, Optional
+from typing import Any, Awaitable, Callable, Optional
 
 from .db_sessions import (
     append_log,
     get_or_create_session,
     get_recent_log,
+    get_summary,
     init_db,
     update_classification,
     update_state,
 )
+from .async_runtime import run_db, run_sync
+from .conversation_summary import after_turn, recent_log_limit, unsummarized
 from .state_machine import apply_transition
+from .turn_graph import TurnStep, run_turn_graph, step_timeout
+from .usage_scope import UsageScope, usage_scope
 from . import plan_limit_checker
 
+logger = logging.getLogger(__name__)
 
-def _drive_search(user_text: str, state: str) -> str:
-    """Import lazy para não quebrar na Vercel quando google.* não está no bundle."""
+
+def _drive_search(user_text: str, state: str, report: Optional[dict] = None, folder_id: Optional[str] = None) -> str:
+    """
+    Import lazy para não quebrar na Vercel quando google.* não está no bundle. Falha vai para report["error"].
+    folder_id: pasta do tenant (sem ele, DRIVE_FOLDER_ID).
+    """
     try:
         from .drive_rag import search as drive_search
-        return drive_search(user_text, state=state)
+        return drive_search(user_text, state=state, folder_id=folder_id)
     except Exception as e:
+        if report is not None:
+            report["error"] = str(e)
         return (
             "CONTEXTO: A base de conhecimento não está disponível no momento. "
             "Não invente preços ou links; diga que vai verificar. "
@@ -32,7 +45,7 @@ def _drive_search(user_text: str, state: str) -> str:
         )
 
 
-def run_agent_facade(
+async def run_agent_facade_async(
     lead_id: str,
     user_text: str,
     is_audio: bool = False,
@@ -43,129 +56,268 @@ def run_agent_facade(
     agent_name_override: Optional[str] = None,
     agent_niche_override: Optional[str] = None,
     agent_prompt_custom_override: Optional[str] = None,
+    on_partial: Optional[Callable[[str], Awaitable[None]]] = None,
 ) -> dict[str, Any]:
     """
     Executa uma rodada do agente: sessão, RAG, LLM, transição de estado, log.
     Retorna dict com resposta_texto, enviar_audio, proximo_estado, enviar_imagens, modelos.
     Quando tenant_id e agent_id são informados, usa tabelas multi-tenant (conversations, tenant_conversation_log).
+    A chamada ao modelo é aguardada sem ocupar thread; banco, RAG e supervisor rodam no pool de
+    async_runtime.run_db. Com on_partial, a resposta vem em stream e on_partial(texto parcial)
+    é chamado à medida que resposta_texto chega (ver llm_orchestrator.run_stream_async).
+    Tokens de todas as chamadas do turno (LLM, supervisor, embeddings) são somados num
+    usage_scope e gravados em tenant_usage ao final; sem saldo de tokens o turno não chama o LLM.
     """
-    init_db()
-    session = get_or_create_session(lead_id, tenant_id=tenant_id, agent_id=agent_id)
-    current_state = session["current_state"]
+    with usage_scope("turn", tenant_id, agent_id=agent_id, lead_id=lead_id) as usage:
+        return await _run_turn(
+            usage,
+            lead_id,
+            user_text,
+            is_audio=is_audio,
+            tenant_id=tenant_id,
+            agent_id=agent_id,
+            drive_folder_id_override=drive_folder_id_override,
+            embedding_namespace_override=embedding_namespace_override,
+            agent_name_override=agent_name_override,
+            agent_niche_override=agent_niche_override,
+            agent_prompt_custom_override=agent_prompt_custom_override,
+            on_partial=on_partial,
+        )
 
+
+async def _run_turn(
+    usage: UsageScope,
+    lead_id: str,
+    user_text: str,
+    is_audio: bool = False,
+    tenant_id: Optional[str] = None,
+    agent_id: Optional[str] = None,
+    drive_folder_id_override: Optional[str] = None,
+    embedding_namespace_override: Optional[str] = None,
+    agent_name_override: Optional[str] = None,
+    agent_niche_override: Optional[str] = None,
+    agent_prompt_custom_override: Optional[str] = None,
+    on_partial: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> dict[str, Any]:
     # DRIVE_RAG_DISABLED=1 desativa o RAG do Google Drive (usa só base de conhecimento por documentos)
     drive_disabled = os.environ.get("DRIVE_RAG_DISABLED", "").strip() in ("1", "true", "yes")
+    use_drive = not drive_disabled and bool(drive_folder_id_override or os.environ.get("DRIVE_FOLDER_ID", "").strip())
+    # Prefer overrides (ex.: API já carregou o agente com PLATFORM_DATABASE_URL); senão tenta get_agent_by_id (DATABASE_URL)
+    original_agent_id = agent_id
+    needs_agent_info = agent_name_override is None and agent_niche_override is None and agent_prompt_custom_override is None
 
-    if not drive_disabled and drive_folder_id_override:
-        rag_context = _rag_for_folder(drive_folder_id_override, user_text, current_state)
-    elif not drive_disabled and os.environ.get("DRIVE_FOLDER_ID", "").strip():
-        rag_context = _drive_search(user_text, current_state)
-    elif tenant_id:
-        # Base de conhecimento por documentos enviados no dashboard (pgvector)
-        try:
+    # Sessão, histórico e resumo são do agente que vai responder (r["routing"]): depois de um handoff,
+    # leituras e gravações do turno ficam na mesma conversa (a do agente roteado).
+    async def session_step(r: dict) -> dict:
+        await run_db(init_db)
+        return await run_db(get_or_create_session, lead_id, tenant_id=tenant_id, agent_id=r["routing"])
+
+    # rag_report["error"]: a busca falhou e o contexto é só um aviso (o turno não usa o cache de respostas)
+    rag_report: dict = {}
+
+    async def rag_step(r: dict) -> str:
+        if use_drive:
+            state = r["session"]["current_state"]
+            if drive_folder_id_override:
+                return await run_db(_rag_for_folder, drive_folder_id_override, user_text, state, rag_report)
+            return await run_db(_drive_search, user_text, state, rag_report)
+        if tenant_id:
+            # Base de conhecimento por documentos enviados no dashboard (pgvector)
             from .knowledge_rag import search_document_chunks
-            rag_context = search_document_chunks(
-                tenant_id, user_text, limit=6,
-                embedding_namespace=embedding_namespace_override,
+            rag_context = await run_db(
+                search_document_chunks, tenant_id, user_text, limit=6,
+                embedding_namespace=embedding_namespace_override, report=rag_report,
             )
-        except Exception as e:
-            rag_context = (
-                "CONTEXTO: Base de conhecimento indisponível. Não invente dados. "
-                f"(Erro: {e})"
-            )
-        if not rag_context or not rag_context.strip():
-            rag_context = (
-                "CONTEXTO: Nenhum documento na base de conhecimento. "
-                "Envie arquivos em Base de conhecimento no dashboard (PDF ou TXT). "
-                "Não invente preços ou especificações."
-            )
-    else:
-        rag_context = (
+            if not rag_context or not rag_context.strip():
+                rag_context = (
+                    "CONTEXTO: Nenhum documento na base de conhecimento. "
+                    "Envie arquivos em Base de conhecimento no dashboard (PDF ou TXT). "
+                    "Não invente preços ou especificações."
+                )
+            return rag_context
+        return (
             "CONTEXTO: A base de conhecimento (Google Drive) não está configurada. "
             "Não invente preços, links, modelos ou especificações. "
             "Para dúvidas sobre produtos ou pagamento, diga que vai verificar. "
             "Foque nas perguntas SPIN e no relacionamento consultivo."
         )
 
-    recent_log = get_recent_log(lead_id, limit=12, tenant_id=tenant_id, agent_id=agent_id)
-    # Chat de teste do dashboard: enviar só mensagens do usuário no histórico (não as do assistente) para não reaproveitar respostas antigas de outro nicho (ex.: filtro)
-    if lead_id == "dashboard-test" and recent_log:
-        recent_log = [m for m in recent_log if m.get("role") == "user"]
+    def rag_fallback(e: Exception) -> str:
+        rag_report["error"] = str(e)
+        if use_drive:
+            return (
+                "CONTEXTO: A base de conhecimento não está disponível no momento. "
+                "Não invente preços ou links; diga que vai verificar. "
+                f"(Erro: {e})"
+            )
+        return f"CONTEXTO: Base de conhecimento indisponível. Não invente dados. (Erro: {e})"
 
-    # Prefer overrides (ex.: API já carregou o agente com PLATFORM_DATABASE_URL); senão tenta get_agent_by_id (DATABASE_URL)
-    original_agent_id = agent_id
+    async def recent_log_step(r: dict) -> list[dict]:
+        recent_log = await run_db(get_recent_log, lead_id, limit=recent_log_limit(), tenant_id=tenant_id, agent_id=r["routing"])
+        # Chat de teste do dashboard: enviar só mensagens do usuário no histórico (não as do assistente) para não reaproveitar respostas antigas de outro nicho (ex.: filtro)
+        if lead_id == "dashboard-test" and recent_log:
+            recent_log = [m for m in recent_log if m.get("role") == "user"]
+        return recent_log
+
+    async def summary_step(r: dict) -> dict:
+        return await run_db(get_summary, lead_id, tenant_id=tenant_id, agent_id=r["routing"])
 
     # --- AIOS SUPERVISOR ROUTING ---
-    if tenant_id:
+    # A decisão (só leitura, sob timeout) fica em route["decision"] apenas se a etapa terminou a
+    # tempo: no timeout a corrotina é cancelada antes da atribuição e nada da decisão é gravado.
+    route: dict = {}
+
+    async def routing_step(r: dict) -> Optional[str]:
+        """agent_id que deve responder (o atual, se não houve handoff)."""
+        if not tenant_id:
+            return agent_id
+        from .routing_state import decide_route
+        routing_decision = await run_db(decide_route, tenant_id, agent_id, lead_id, user_text)
+        route["decision"] = routing_decision
+        return routing_decision.get("target_agent_id") or agent_id
+
+    async def route_commit_step(r: dict) -> None:
+        """Grava a decisão usada pelo turno (estado do roteamento e, no handoff, a memória compartilhada)."""
+        decision = route.get("decision")
+        if not decision:
+            return
+        from .routing_state import record_route
+        await run_db(record_route, tenant_id, agent_id, lead_id, decision)
+        target = decision.get("target_agent_id")
+        if not decision.get("handoff") or not target or target == agent_id:
+            return
+        # Handoff occurred! Save context in shared memory
         try:
-            from .supervisor import route_conversation
-            routing_decision = route_conversation(tenant_id, user_text, recent_log, current_agent_id=agent_id)
-            if routing_decision.get("target_agent_id") and routing_decision.get("target_agent_id") != agent_id:
-                # Handoff occurred! Save context in shared memory
-                agent_id = routing_decision["target_agent_id"]
-                try:
-                    from .agent_memory import save_shared_memory
-                    summary = f"Supervisor routed the conversation to you because: {routing_decision.get('reason')}. Please assist the user."
-                    save_shared_memory(tenant_id, lead_id, original_agent_id, agent_id, summary)
-                except Exception as mem_err:
-                    print(f"Failed to write shared memory: {mem_err}")
-        except Exception as e:
-            print(f"Supervisor wrapper error: {e}")
+            from .agent_memory import save_shared_memory
+            summary = f"Supervisor routed the conversation to you because: {decision.get('reason')}. Please assist the user."
+            await run_db(save_shared_memory, tenant_id, lead_id, original_agent_id, target, summary)
+        except Exception as mem_err:
+            print(f"Failed to write shared memory: {mem_err}")
 
+    async def agent_step(r: dict) -> Optional[dict]:
+        routed = r["routing"]
+        if not (needs_agent_info and routed):
+            return None
+        from .tenant_config import get_agent_by_id
+        return await run_db(get_agent_by_id, routed)
+
+    async def plan_step(r: dict) -> bool:
+        return not tenant_id or await run_db(plan_limit_checker.check_message_limit, tenant_id)
+
+    async def tokens_step(r: dict) -> bool:
+        if not tenant_id:
+            return True
+        from .usage_tracker import check_token_budget
+        return await run_db(check_token_budget, tenant_id)
+
+    # Etapas independentes em paralelo: roteamento, RAG (pgvector) e limites do plano (mensagens, tokens).
+    # Sessão, histórico e resumo esperam o roteamento (são do agente que responde); a busca do agente
+    # também. O resumo lê a conversa criada pela sessão; o RAG do Drive depende do estado.
+    # Etapas com timeout só leem ou são idempotentes (sessão/uso: "get or create"): no timeout a thread
+    # do run_db continua. A gravação do roteamento fica em route_commit, sem timeout.
+    steps, report = await run_turn_graph([
+        TurnStep("routing", routing_step, timeout=step_timeout("routing", 12.0), fallback=agent_id),
+        TurnStep("route_commit", route_commit_step, deps=("routing",), fallback=None),
+        TurnStep("session", session_step, deps=("routing",), timeout=step_timeout("session", 10.0)),
+        TurnStep("rag", rag_step, deps=("session",) if use_drive else (),
+                 timeout=step_timeout("rag", 12.0), fallback=rag_fallback),
+        TurnStep("recent_log", recent_log_step, deps=("routing",), timeout=step_timeout("recent_log", 5.0), fallback=[]),
+        TurnStep("summary", summary_step, deps=("session",), timeout=step_timeout("summary", 5.0), fallback={"summary": "", "summary_turns": 0}),
+        TurnStep("agent", agent_step, deps=("routing",), timeout=step_timeout("agent", 5.0), fallback=None),
+        TurnStep("plan", plan_step, timeout=step_timeout("plan", 5.0), fallback=True),
+        TurnStep("tokens", tokens_step, timeout=step_timeout("tokens", 5.0), fallback=True),
+    ])
+    logger.info("turn_steps", extra={"tenant_id": tenant_id, "lead_id": lead_id, **report})
+
+    current_state = steps["session"]["current_state"]
+    rag_context = steps["rag"]
+    recent_log = steps["recent_log"]
+    agent_id = usage.agent_id = steps["routing"]
     agent_name = agent_name_override
     agent_niche = agent_niche_override
     agent_prompt_custom = agent_prompt_custom_override
-    
-    if agent_name is None and agent_niche is None and agent_prompt_custom is None and agent_id:
-        try:
-            from .tenant_config import get_agent_by_id
-            agent_info = get_agent_by_id(agent_id)
-            if agent_info:
-                agent_name = agent_info.get("name")
-                agent_niche = agent_info.get("niche")
-                agent_prompt_custom = agent_info.get("prompt_custom")
-        except Exception:
-            pass
+    if steps["agent"]:
+        agent_name = steps["agent"].get("name")
+        agent_niche = steps["agent"].get("niche")
+        agent_prompt_custom = steps["agent"].get("prompt_custom")
 
     # --- PLAN LIMIT CHECK ---
-    if tenant_id and not plan_limit_checker.check_message_limit(tenant_id):
+    if not steps["plan"]:
         return {
             "resposta_texto": "Limite de mensagens do seu plano atingido. Por favor, faça upgrade para continuar usando o serviço.",
             "proximo_estado": current_state
         }
+    if not steps["tokens"]:
+        return {
+            "resposta_texto": "Limite de tokens do seu plano atingido. Por favor, faça upgrade para continuar usando o serviço.",
+            "proximo_estado": current_state
+        }
 
-    from .llm_orchestrator import run as llm_run
-    out = llm_run(
-        user_id=lead_id,
-        user_message=user_text,
-        current_state=current_state,
-        rag_context=rag_context,
-        recent_log=recent_log,
-        input_was_audio=is_audio,
-        agent_name=agent_name,
-        agent_niche=agent_niche,
-        agent_prompt_custom=agent_prompt_custom,
-        tenant_id=tenant_id,
-        agent_id=agent_id,
-    )
+    # --- CACHE SEMÂNTICO DE RESPOSTAS (opt-in por agente; só no começo da conversa) ---
+    lead_name = (steps["session"].get("spin_answers") or {}).get("nome")
+    cache_hash, out = None, None
+    if tenant_id and agent_id and not steps["summary"]["summary"]:
+        from . import response_cache
+        try:
+            cache_hash, out = await run_db(
+                response_cache.cached_reply, tenant_id, agent_id, current_state, user_text, rag_context,
+                (agent_name, agent_niche, agent_prompt_custom), lead_name,
+                recent_log=recent_log, rag_error=bool(rag_report.get("error")),
+            )
+        except Exception as e:
+            logger.warning("response_cache_unavailable", extra={"tenant_id": tenant_id, "error": str(e)})
+        if out:
+            out["enviar_audio"] = is_audio and out.get("enviar_audio", True)
+            if on_partial is not None:
+                await on_partial(out["resposta_texto"])
+
+    if not out:
+        from .llm_orchestrator import run_async as llm_run_async, run_stream_async as llm_run_stream_async
+        llm_kwargs = dict(
+            user_id=lead_id,
+            user_message=user_text,
+            current_state=current_state,
+            rag_context=rag_context,
+            recent_log=unsummarized(recent_log, steps["summary"]),
+            summary=steps["summary"]["summary"],
+            input_was_audio=is_audio,
+            agent_name=agent_name,
+            agent_niche=agent_niche,
+            agent_prompt_custom=agent_prompt_custom,
+            tenant_id=tenant_id,
+            agent_id=agent_id,
+        )
+        if on_partial is not None:
+            out = await llm_run_stream_async(on_partial=on_partial, **llm_kwargs)
+        else:
+            out = await llm_run_async(**llm_kwargs)
+        if cache_hash and not out.get("fallback"):
+            try:
+                await run_db(response_cache.store, tenant_id, agent_id, current_state, cache_hash, user_text, out, lead_name)
+            except Exception as e:
+                logger.warning("response_cache_store_failed", extra={"tenant_id": tenant_id, "error": str(e)})
 
     resposta_texto = (out.get("resposta_texto") or "").strip()
     proximo_estado = out.get("proximo_estado") or current_state
     new_state = apply_transition(current_state, proximo_estado)
     if new_state != current_state:
-        update_state(lead_id, new_state, tenant_id=tenant_id, agent_id=agent_id)
+        await run_db(update_state, lead_id, new_state, tenant_id=tenant_id, agent_id=agent_id)
 
-    append_log(lead_id, "user", user_text, "audio" if is_audio else "text", tenant_id=tenant_id, agent_id=agent_id)
-    append_log(lead_id, "assistant", resposta_texto, "text", tenant_id=tenant_id, agent_id=agent_id)
+    await run_db(append_log, lead_id, "user", user_text, "audio" if is_audio else "text", tenant_id=tenant_id, agent_id=agent_id)
+    await run_db(append_log, lead_id, "assistant", resposta_texto, "text", tenant_id=tenant_id, agent_id=agent_id)
+    try:
+        await after_turn(lead_id, tenant_id=tenant_id, agent_id=agent_id)
+    except Exception as e:
+        logger.warning("conversation_summary_schedule_failed", extra={"tenant_id": tenant_id, "lead_id": lead_id, "error": str(e)})
 
     if new_state == "fechamento":
-        update_classification(lead_id, "quente", tenant_id=tenant_id, agent_id=agent_id)
+        await run_db(update_classification, lead_id, "quente", tenant_id=tenant_id, agent_id=agent_id)
 
     # Track usage if tenant is valid
     if tenant_id:
         try:
             from .usage_tracker import track_message_sync
-            track_message_sync(tenant_id, tokens_used=0) # Token estimation could be added here
+            await run_db(track_message_sync, tenant_id, tokens_used=usage.total_tokens, metadata=usage.metadata())
         except Exception as e:
             print(f"Error tracking message: {e}")
 
@@ -178,14 +330,38 @@ def run_agent_facade(
     }
 
 
-def _rag_for_folder(folder_id: str, query: str, state: str) -> str:
-    """Busca RAG para um folder_id específico (tenant). Por ora delega para drive_search com env override temporário."""
-    old = os.environ.get("DRIVE_FOLDER_ID")
-    try:
-        os.environ["DRIVE_FOLDER_ID"] = folder_id
-        return _drive_search(query, state)
-    finally:
-        if old is not None:
-            os.environ["DRIVE_FOLDER_ID"] = old
-        elif "DRIVE_FOLDER_ID" in os.environ:
-            del os.environ["DRIVE_FOLDER_ID"]
+def run_agent_facade(
+    lead_id: str,
+    user_text: str,
+    is_audio: bool = False,
+    tenant_id: Optional[str] = None,
+    agent_id: Optional[str] = None,
+    drive_folder_id_override: Optional[str] = None,
+    embedding_namespace_override: Optional[str] = None,
+    agent_name_override: Optional[str] = None,
+    agent_niche_override: Optional[str] = None,
+    agent_prompt_custom_override: Optional[str] = None,
+    on_partial: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> dict[str, Any]:
+    """Versão síncrona de run_agent_facade_async (executa no loop de fundo de async_runtime)."""
+    return run_sync(run_agent_facade_async(
+        lead_id,
+        user_text,
+        is_audio=is_audio,
+        tenant_id=tenant_id,
+        agent_id=agent_id,
+        drive_folder_id_override=drive_folder_id_override,
+        embedding_namespace_override=embedding_namespace_override,
+        agent_name_override=agent_name_override,
+        agent_niche_override=agent_niche_override,
+        agent_prompt_custom_override=agent_prompt_custom_override,
+        on_partial=on_partial,
+    ))
+
+
+def _rag_for_folder(folder_id: str, query: str, state: str, report: Optional[dict] = None) -> str:
+    """
+    Busca RAG para um folder_id específico (tenant). A pasta vai como argumento, sem mexer no
+    ambiente do processo: turnos de tenants diferentes rodam ao mesmo tempo no pool do run_db.
+    """
+    return _drive_search(query, state, report, folder_id=folder_id)
@@ -0,0 +1,82 @@
+"""
+Suporte ao pipeline assíncrono do agente.
+- run_db: executa chamadas síncronas de banco (psycopg2) num pool de threads próprio, limitado por
+  ASYNC_DB_WORKERS (padrão 32), sem disputar o executor padrão do event loop.
+- run_sync: executa uma corrotina a partir de código síncrono num event loop de fundo compartilhado
+  pelo processo (uma thread), para que a API síncrona seja só um invólucro da assíncrona e os
+  clientes HTTP/Redis assíncronos sejam reaproveitados entre chamadas.
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+_lock = threading.Lock()
+_pid: Optional[int] = None
+_db_executor: Optional[ThreadPoolExecutor] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_thread: Optional[threading.Thread] = None
+
+
+def _db_workers() -> int:
+    try:
+        return max(1, int(os.environ.get("ASYNC_DB_WORKERS", "").strip() or 32))
+    except ValueError:
+        return 32
+
+
+def _reset_after_fork() -> None:
+    """Threads não sobrevivem ao fork: o processo filho cria executor e loop próprios. Chamar com _lock."""
+    global _pid, _db_executor, _loop, _loop_thread
+    if _pid != os.getpid():
+        _pid = os.getpid()
+        _db_executor = None
+        _loop = None
+        _loop_thread = None
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _db_executor
+    with _lock:
+        _reset_after_fork()
+        if _db_executor is None:
+            _db_executor = ThreadPoolExecutor(max_workers=_db_workers(), thread_name_prefix="agent-db")
+        return _db_executor
+
+
+async def run_db(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    await de uma função síncrona de banco (db_sessions, tenant_config, plan_limit_checker...).
+    Leva junto o contexto (contextvars), ex.: o usage_scope do turno.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_executor(), functools.partial(ctx.run, fn, *args, **kwargs))
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop, _loop_thread
+    with _lock:
+        _reset_after_fork()
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            _loop_thread = threading.Thread(target=_loop.run_forever, name="agent-async-loop", daemon=True)
+            _loop_thread.start()
+        return _loop
+
+
+def run_sync(coro: Awaitable[T]) -> T:
+    """
+    Executa a corrotina no loop de fundo e bloqueia a thread atual até o resultado.
+    Não pode ser chamado de dentro do próprio loop de fundo (use await).
+    """
+    loop = _background_loop()
+    if threading.current_thread() is _loop_thread:
+        raise RuntimeError("run_sync chamado dentro do loop assíncrono do agente; use await")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
@@ -0,0 +1,120 @@
+"""
+Benchmark: chunker estrutural (execution/chunker.py) vs o corte antigo a cada 600 caracteres com
+80 de sobreposição. Para os documentos de tests/fixtures/chunking mede: número de chunks, tokens
+totais (custo de embedding), tokens recuperados por pergunta (custo no prompt) e hit-rate de
+recuperação: a pergunta acerta se algum dos top-k chunks contém a resposta inteira.
+A recuperação usa BM25 léxico (sem banco nem chaves de API), o suficiente para comparar onde os
+cortes caem.
+Uso: na raiz do projeto:
+  python execution/benchmark_chunker.py [--top-k 3] [--target-tokens 200] [--dir tests/fixtures/chunking]
+"""
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import unicodedata
+from collections import Counter
+
+# raiz do projeto
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+FIXTURES = os.path.join(ROOT, "tests", "fixtures", "chunking")
+
+
+def legacy_chunks(text: str, size: int = 600, overlap: int = 80) -> list[str]:
+    """Splitter anterior (cópia de document_ingest._chunk_text antes do chunker)."""
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    chunks = []
+    start = 0
+    while start < len(text):
+        chunk = text[start:start + size]
+        if chunk.strip():
+            chunks.append(chunk.strip())
+        start += size - overlap
+    return chunks
+
+
+def _terms(text: str) -> list[str]:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [w for w in re.findall(r"[a-z0-9]+", text) if len(w) > 2]
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _bm25_rank(query: str, chunks: list[str], k1: float = 1.5, b: float = 0.75) -> list[int]:
+    docs = [Counter(_terms(c)) for c in chunks]
+    avg_len = sum(sum(d.values()) for d in docs) / max(1, len(docs))
+    df = Counter(t for d in docs for t in d)
+    scores = []
+    for i, d in enumerate(docs):
+        length = sum(d.values())
+        score = 0.0
+        for t in set(_terms(query)):
+            if t not in d:
+                continue
+            idf = math.log(1 + (len(docs) - df[t] + 0.5) / (df[t] + 0.5))
+            score += idf * d[t] * (k1 + 1) / (d[t] + k1 * (1 - b + b * length / avg_len))
+        scores.append((score, -i))
+    return [-i for _, i in sorted(scores, reverse=True)]
+
+
+def evaluate(name: str, chunks_by_doc: dict[str, list[str]], questions: list[dict], top_k: int) -> dict:
+    from execution.chunker import count_tokens
+
+    pool = [(doc, c) for doc, chunks in chunks_by_doc.items() for c in chunks]
+    texts = [c for _, c in pool]
+    hits = 0
+    retrieved_tokens = 0
+    for q in questions:
+        top = _bm25_rank(q["question"], texts)[:top_k]
+        answer = _normalize(q["answer"])
+        if any(answer in _normalize(texts[i]) for i in top):
+            hits += 1
+        retrieved_tokens += sum(count_tokens(texts[i]) for i in top)
+    return {
+        "splitter": name,
+        "chunks": len(texts),
+        "total_tokens": sum(count_tokens(t) for t in texts),
+        "prompt_tokens_per_question": round(retrieved_tokens / max(1, len(questions)), 1),
+        "hit_rate": round(hits / max(1, len(questions)), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default=FIXTURES, help="pasta com os documentos e questions.json")
+    parser.add_argument("--top-k", type=int, default=3, help="chunks recuperados por pergunta")
+    parser.add_argument("--target-tokens", type=int, default=None, help="alvo do chunker (padrão CHUNK_TARGET_TOKENS)")
+    args = parser.parse_args()
+
+    from execution.chunker import chunk_texts
+
+    with open(os.path.join(args.dir, "questions.json"), encoding="utf-8") as f:
+        questions = json.load(f)
+    texts = {}
+    for doc in sorted({q["doc"] for q in questions}):
+        with open(os.path.join(args.dir, doc), encoding="utf-8") as f:
+            texts[doc] = f.read()
+
+    results = [
+        evaluate("legacy_600c", {d: legacy_chunks(t) for d, t in texts.items()}, questions, args.top_k),
+        evaluate("structural", {d: chunk_texts(t, target_tokens=args.target_tokens) for d, t in texts.items()}, questions, args.top_k),
+    ]
+    print(f"{len(texts)} documentos, {len(questions)} perguntas, top-{args.top_k}")
+    for r in results:
+        print(
+            f"  {r['splitter']:<12} chunks={r['chunks']:<4} tokens={r['total_tokens']:<6} "
+            f"prompt/pergunta={r['prompt_tokens_per_question']:<7} hit_rate={r['hit_rate']:.3f}"
+        )
+    print(json.dumps(results, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
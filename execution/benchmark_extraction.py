@@ -0,0 +1,174 @@
+"""
+Benchmark: latência de turnos de conversa (p50/p95) enquanto documentos são extraídos em paralelo,
+comparando extração no próprio processo (EXTRACTION_MAX_PROCESSES=0) com o pool de processos.
+Cada turno é o turno real (core.agent_runner.run_agent -> agent_facade: grafo de etapas, prompt,
+model_router, parse da resposta, transição de estado) com o I/O trocado por stubs em memória:
+banco, RAG e cliente do LLM (LLM_LATENCY_MS de espera, padrão 20). O que se mede é quanto o GIL
+ocupado pela extração atrasa esses turnos. Não precisa de banco nem de chaves de API.
+Uso: na raiz do projeto:
+  python execution/benchmark_extraction.py [--ingests 4] [--turns 200] [--file caminho.pdf]
+Sem --file, gera um HTML sintético grande em diretório temporário.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+# raiz do projeto
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def _synthetic_html(path: str, paragraphs: int = 60000) -> None:
+    row = "<tr><td>Quarto {i}</td><td>R$ {p},00</td><td>Café da manhã incluso</td></tr>"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("<html><body><table>")
+        for i in range(paragraphs):
+            f.write(row.format(i=i, p=150 + i % 90))
+        f.write("</table></body></html>")
+
+
+TENANT = "00000000-0000-0000-0000-000000000001"
+AGENT = "00000000-0000-0000-0000-000000000002"
+RAG_CONTEXT = "\n".join(f"Quarto {i}: R$ {150 + i},00 a diária, café da manhã incluso." for i in range(30))
+
+
+class _FakeCompletions:
+    """chat.completions do cliente do LLM: espera LLM_LATENCY_MS e devolve uma resposta JSON."""
+
+    async def create(self, model, messages, **kwargs):
+        await asyncio.sleep(float(os.environ.get("LLM_LATENCY_MS", "20")) / 1000)
+        reply = {"resposta_texto": "A diária do quarto standard é R$ 150,00 com café.", "enviar_audio": False,
+                 "proximo_estado": "problema", "enviar_imagens": False, "modelos": []}
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps(reply, ensure_ascii=False)))],
+            usage=SimpleNamespace(prompt_tokens=1800, completion_tokens=60, total_tokens=1860, prompt_tokens_details=None),
+        )
+
+
+def _stub_turn_io() -> None:
+    """Troca banco, RAG, roteamento e cliente do LLM por stubs em memória; o resto do turno é o real."""
+    from execution import agent_facade, agent_memory, knowledge_rag, llm_orchestrator, response_cache
+    from execution import routing_state, tenant_config, usage_tracker
+
+    sessions: dict = {}
+    logs: dict = {}
+    agent = {"id": AGENT, "name": "Pousada Sol", "niche": "hotelaria", "prompt_custom": "Seja cordial.",
+             "settings": {}, "active": True}
+    client = SimpleNamespace(chat=SimpleNamespace(completions=_FakeCompletions()))
+
+    def append_log(lead_id, role, content, content_type="text", tenant_id=None, agent_id=None):
+        logs.setdefault(lead_id, []).append({"role": role, "content": content})
+
+    def update_state(lead_id, state, tenant_id=None, agent_id=None):
+        sessions[lead_id]["current_state"] = state
+
+    async def no_after_turn(*a, **k):
+        return None
+
+    noop = lambda *a, **k: None
+    for name, value in {
+        "init_db": noop,
+        "get_or_create_session": lambda lead_id, **k: sessions.setdefault(lead_id, {"current_state": "descoberta", "spin_answers": {}}),
+        "get_recent_log": lambda lead_id, limit=12, **k: logs.get(lead_id, [])[-limit:],
+        "get_summary": lambda *a, **k: {"summary": "", "summary_turns": 0},
+        "update_state": update_state, "append_log": append_log, "update_classification": noop,
+        "after_turn": no_after_turn,
+    }.items():
+        setattr(agent_facade, name, value)
+    agent_facade.plan_limit_checker.check_message_limit = lambda tenant_id: True
+    usage_tracker.check_token_budget = lambda tenant_id: True
+    usage_tracker.track_message_sync = lambda *a, **k: True
+    tenant_config.get_tenant = lambda tenant_id: {"id": tenant_id, "settings": {}}
+    tenant_config.get_agent_by_id = lambda agent_id: agent
+    tenant_config.get_agent_settings = lambda tenant_id, agent_id: {}
+    routing_state.decide_route = lambda tenant_id, agent_id, lead_id, message: {
+        "target_agent_id": agent_id, "reason": "Sticky routing", "handoff": False, "state": None,
+    }
+    routing_state.record_route = noop
+    agent_memory.get_shared_memory = lambda *a, **k: []
+    knowledge_rag.search_document_chunks = lambda *a, **k: RAG_CONTEXT
+    response_cache.cached_reply = lambda *a, **k: (None, None)
+    llm_orchestrator._get_async_client = lambda: client
+    os.environ["DRIVE_RAG_DISABLED"] = "1"
+
+
+_turns = 0
+
+
+def _chat_turn() -> None:
+    """Um turno de conversa pelo caminho real (run_agent), com um lead novo a cada 5 turnos."""
+    global _turns
+    from core.agent_runner import run_agent
+    _turns += 1
+    run_agent(TENANT, "telegram", "Qual o preço da diária para o fim de semana?",
+              {"lead_id": f"lead-{_turns // 5}", "agent_id": AGENT})
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def run(mode: str, file_path: str, ingests: int, turns: int) -> dict:
+    from execution.extraction_pool import extract_text
+
+    os.environ["EXTRACTION_MAX_PROCESSES"] = "0" if mode == "inline" else str(max(1, min(ingests, os.cpu_count() or 2)))
+    done = threading.Event()
+
+    def ingest_loop():
+        while not done.is_set():
+            extract_text(file_path)
+
+    workers = [threading.Thread(target=ingest_loop, daemon=True) for _ in range(ingests)]
+    for w in workers:
+        w.start()
+    time.sleep(0.5)
+    latencies = []
+    for _ in range(turns):
+        t0 = time.perf_counter()
+        _chat_turn()
+        latencies.append((time.perf_counter() - t0) * 1000)
+    done.set()
+    for w in workers:
+        w.join()
+    return {
+        "mode": mode,
+        "p50_ms": round(statistics.median(latencies), 1),
+        "p95_ms": round(_percentile(latencies, 95), 1),
+        "max_ms": round(max(latencies), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ingests", type=int, default=4, help="extrações simultâneas")
+    parser.add_argument("--turns", type=int, default=200, help="turnos de conversa medidos por modo")
+    parser.add_argument("--file", help="arquivo a extrair (padrão: HTML sintético)")
+    args = parser.parse_args()
+
+    _stub_turn_io()
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = args.file
+        if not file_path:
+            file_path = os.path.join(tmp, "benchmark.html")
+            _synthetic_html(file_path)
+        baseline = [(time.perf_counter(), _chat_turn(), time.perf_counter()) for _ in range(20)]
+        idle_p50 = statistics.median((b - a) * 1000 for a, _, b in baseline)
+        print(f"Arquivo: {file_path} ({os.path.getsize(file_path) / (1024 * 1024):.1f} MB), ingestões paralelas: {args.ingests}")
+        print(f"Turno sem carga: p50 {idle_p50:.1f} ms")
+        for mode in ("inline", "pool"):
+            r = run(mode, file_path, args.ingests, args.turns)
+            print(f"{r['mode']:>6}: p50 {r['p50_ms']} ms | p95 {r['p95_ms']} ms | max {r['max_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Divisão de documentos em chunks para a base de conhecimento.
+Em vez de fatiar a cada 600 caracteres, respeita a estrutura do texto: seções (títulos), parágrafos,
+frases e linhas de tabela, agrupando-os até um tamanho alvo em tokens. Assim um chunk não corta
+uma frase ou uma linha de preço no meio, e há menos chunks (menos embeddings e menos tokens no prompt).
+
+- Título da seção é repetido no início de cada chunk da seção.
+- Tabelas (linhas com " | " ou tab) ficam em chunks próprios, com o cabeçalho repetido.
+- Páginas separadas por form feed (\\f, como o extrator de PDF produz) e blocos "Planilha: X"
+  viram metadata: {"page": n} (e "page_end" se o chunk atravessar páginas) / {"sheet": X}.
+- Sobreposição: a última frase de um chunk cortado por tamanho é repetida no próximo, se couber
+  em CHUNK_OVERLAP_TOKENS.
+
+Tokens contados por tokens.estimate_tokens (tiktoken quando instalado; senão ~4 caracteres por token).
+
+Variáveis de ambiente: CHUNK_TARGET_TOKENS (padrão 200), CHUNK_OVERLAP_TOKENS (padrão 30).
+"""
+
+import os
+import re
+from typing import List, Optional, Tuple
+
+from .tokens import estimate_tokens
+
+DEFAULT_TARGET_TOKENS = 200
+DEFAULT_OVERLAP_TOKENS = 30
+PAGE_BREAK = "\f"
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+(?=[\"'(\[]?[A-ZÀ-Ý0-9])")
+_TERMINAL_PUNCTUATION = tuple(".!?:;,…")
+_SHEET_PREFIX = "Planilha: "
+
+
+def _env_int(key: str, default: int) -> int:
+    try:
+        return max(0, int(os.environ.get(key, "").strip() or default))
+    except ValueError:
+        return default
+
+
+def count_tokens(text: str) -> int:
+    return estimate_tokens(text)
+
+
+def _is_table_line(line: str) -> bool:
+    return " | " in line or "\t" in line
+
+
+def _is_heading(block: List[str]) -> bool:
+    """Bloco de uma linha curta sem pontuação final (ex.: "Check-in e check-out", "# Preços")."""
+    if len(block) != 1:
+        return False
+    line = block[0].strip()
+    if line.startswith("#"):
+        return True
+    return 0 < len(line) <= 80 and len(line.split()) <= 12 and not line.endswith(_TERMINAL_PUNCTUATION) and not _is_table_line(line)
+
+
+def _split_sentences(paragraph: str) -> List[str]:
+    """Frases do parágrafo, sem cortar em abreviações e numerações ("Art. 2.", "Sr.", "1.")."""
+    sentences: List[str] = []
+    for piece in (p.strip() for p in _SENTENCE_END.split(paragraph)):
+        if not piece:
+            continue
+        if sentences:
+            last_word = sentences[-1].rsplit(None, 1)[-1].rstrip(".")
+            if len(last_word) <= 3 or last_word.isdigit():
+                sentences[-1] += " " + piece
+                continue
+        sentences.append(piece)
+    return sentences
+
+
+def _split_long(text: str, max_tokens: int) -> List[str]:
+    """Último recurso para um trecho sem frases menores que o alvo: corta entre palavras."""
+    parts: List[str] = []
+    current: List[str] = []
+    for word in text.split():
+        if current and count_tokens(" ".join(current + [word])) > max_tokens:
+            parts.append(" ".join(current))
+            current = []
+        current.append(word)
+    if current:
+        parts.append(" ".join(current))
+    return parts
+
+
+class _Packer:
+    """
+    Acumula unidades (títulos, frases, linhas de tabela) até o alvo de tokens e emite os chunks.
+    Seções curtas seguidas dividem o mesmo chunk; quando uma seção ou tabela continua num chunk
+    novo, o título/cabeçalho dela é repetido no início.
+    """
+
+    def __init__(self, target: int, overlap: int, with_pages: bool):
+        self.target = target
+        self.overlap = overlap
+        self.with_pages = with_pages
+        self.chunks: List[dict] = []
+        self.heading = ""
+        self.table_header = ""
+        self.sheet: Optional[str] = None
+        self.units: List[Tuple[str, str, bool]] = []  # (separador, texto, é título)
+        self.tokens = 0
+        self.page_start = self.page_end = 0
+
+    def section(self, heading: str, page: int) -> None:
+        """Início de seção: o título entra como linha própria e vira o prefixo das continuações."""
+        self.end_table()
+        self.heading = heading
+        if self.units and self.tokens + count_tokens(heading) >= self.target:
+            self.flush()
+        self._append("\n", heading, True, page)
+
+    def table(self, header: str, page: int) -> None:
+        """Tabela em chunk próprio (só o título da seção pode vir antes), com o cabeçalho repetido."""
+        if any(not is_title for _, _, is_title in self.units):
+            titles = []
+            while self.units[-1][2]:
+                titles.insert(0, self.units.pop())
+            self.flush()
+            for _, title, _ in titles:
+                self._append("\n", title, True, page)
+        self.table_header = header
+        self._append("\n", header, True, page)
+
+    def end_table(self) -> None:
+        if self.table_header:
+            self.flush()
+            self.table_header = ""
+
+    def add(self, unit: str, page: int, sep: str = " ") -> None:
+        unit_tokens = count_tokens(unit)
+        if self.units and self.tokens + unit_tokens > self.target:
+            # Títulos no fim do chunk passam para o próximo (como prefixo)
+            while self.units and self.units[-1][2]:
+                self.units.pop()
+            carry = self.units[-1][1] if self.units and sep == " " and not self.table_header else None
+            self.flush()
+            if carry and count_tokens(carry) <= self.overlap:
+                self._append(" ", carry, False, self.page_end or page)
+        self._append(sep, unit, False, page)
+
+    def _append(self, sep: str, unit: str, is_title: bool, page: int) -> None:
+        if not self.units:
+            self.page_start = page
+            self.tokens = 0
+            prefix = "\n".join(p for p in (self.heading, self.table_header) if p)
+            if prefix and not is_title:
+                self.units.append(("", prefix, True))
+                self.tokens += count_tokens(prefix) + 1
+        if not self.units:
+            sep = ""
+        elif self.units[-1][2]:
+            sep = "\n"  # título/cabeçalho sempre em linha própria
+        self.units.append((sep, unit, is_title))
+        self.tokens += count_tokens(unit) + 1
+        self.page_end = page
+
+    def flush(self, keep_titles: bool = False) -> None:
+        """Emite o chunk atual. Só títulos (sem texto) são descartados, salvo keep_titles."""
+        if self.units and (keep_titles or any(not is_title for _, _, is_title in self.units)):
+            metadata: dict = {}
+            if self.sheet:
+                metadata["sheet"] = self.sheet
+            if self.with_pages:
+                metadata["page"] = self.page_start
+                if self.page_end != self.page_start:
+                    metadata["page_end"] = self.page_end
+            content = "".join(sep + text for sep, text, _ in self.units).strip()
+            self.chunks.append({"content": content, "metadata": metadata})
+        self.units, self.tokens = [], 0
+
+
+def chunk_document(
+    text: str,
+    target_tokens: Optional[int] = None,
+    overlap_tokens: Optional[int] = None,
+) -> List[dict]:
+    """
+    Divide o texto extraído em chunks estruturais de ~target_tokens.
+    Retorna [{"content": texto, "metadata": {...}}] (metadata vazia quando não há página/aba).
+    """
+    if not text or not text.strip():
+        return []
+    target = max(20, target_tokens or _env_int("CHUNK_TARGET_TOKENS", DEFAULT_TARGET_TOKENS))
+    overlap = _env_int("CHUNK_OVERLAP_TOKENS", DEFAULT_OVERLAP_TOKENS) if overlap_tokens is None else overlap_tokens
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    pages = text.split(PAGE_BREAK)
+    packer = _Packer(target, overlap, with_pages=len(pages) > 1)
+
+    for page_number, page in enumerate(pages, start=1):
+        for raw_block in re.split(r"\n\s*\n", page):
+            block = [line.strip() for line in raw_block.split("\n") if line.strip()]
+            if not block:
+                continue
+            if block[0].startswith(_SHEET_PREFIX):
+                packer.end_table()
+                packer.flush(keep_titles=True)
+                packer.sheet = block[0][len(_SHEET_PREFIX):].strip() or None
+                packer.heading = ""
+                block = block[1:]
+                if not block:
+                    continue
+            if _is_heading(block):
+                packer.section(block[0].lstrip("#").strip(), page_number)
+                continue
+
+            table_lines = sum(1 for line in block if _is_table_line(line))
+            if len(block) > 1 and table_lines * 2 >= len(block):
+                packer.table(block[0], page_number)
+                for row in block[1:]:
+                    packer.add(row, page_number, sep="\n")
+                packer.end_table()
+                continue
+
+            # Parágrafo: linhas (e, se preciso, frases) com quebra de linha só no início do bloco
+            sep = "\n"
+            for line in block:
+                pieces = [line]
+                if count_tokens(line) > target // 2:
+                    # Linha longa: frases; frase maior que 3/4 do alvo (sobra para o título) é cortada entre palavras
+                    max_sentence = target * 3 // 4
+                    pieces = []
+                    for sentence in _split_sentences(line):
+                        pieces.extend([sentence] if count_tokens(sentence) <= max_sentence else _split_long(sentence, max_sentence))
+                for piece in pieces:
+                    packer.add(piece, page_number, sep=sep)
+                    sep = " "
+    packer.flush(keep_titles=True)
+    return packer.chunks
+
+
+def chunk_texts(text: str, target_tokens: Optional[int] = None) -> List[str]:
+    """Só o texto dos chunks (para quem não grava metadata)."""
+    return [c["content"] for c in chunk_document(text, target_tokens=target_tokens)]
@@ -0,0 +1,164 @@
+"""
+Resumo contínuo da conversa (limita o tamanho do prompt em conversas longas).
+A cada CONVERSATION_SUMMARY_EVERY_TURNS turnos (padrão 6; 0 desativa) um modelo barato
+(CONVERSATION_SUMMARY_MODEL) incorpora ao resumo os turnos que saíram da janela recente, em
+segundo plano, depois da resposta. O resumo fica na própria conversa (conversations/sessions,
+colunas summary e summary_turns, ao lado de spin_answers).
+
+No prompt entram o resumo + os turnos ainda não resumidos (os últimos CONVERSATION_SUMMARY_KEEP_TURNS
+mais os que chegaram desde o último resumo), do mais recente para o mais antigo até
+CONVERSATION_HISTORY_TOKENS tokens.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from .async_runtime import run_db
+from .db_sessions import get_recent_log, get_summary, increment_summary_turns, save_summary
+from .llm_usage import record_llm_usage
+from .tokens import CHARS_PER_TOKEN, estimate_tokens
+from .usage_scope import usage_scope
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SUMMARY_MODEL = "openai/gpt-4o-mini"
+
+SUMMARY_SYSTEM_PROMPT = (
+    "Você mantém o resumo de uma conversa de vendas (SPIN) entre um cliente e um atendente. "
+    "Atualize o resumo anterior com as novas mensagens. Preserve: nome e dados do cliente, situação, "
+    "problemas, implicações e necessidades relatadas, produtos e preços discutidos, objeções, "
+    "compromissos e próximos passos. Descarte saudações e repetições. "
+    "Responda só com o resumo, em português, em até 150 palavras."
+)
+
+# Resumos em andamento (tenant, agente, lead): um por conversa; referência evita coleta da task
+_in_flight: set[tuple] = set()
+_tasks: set[asyncio.Task] = set()
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, "").strip() or default)
+    except ValueError:
+        return default
+
+
+def summary_every_turns() -> int:
+    return max(0, _env_int("CONVERSATION_SUMMARY_EVERY_TURNS", 6))
+
+
+def keep_turns() -> int:
+    return max(1, _env_int("CONVERSATION_SUMMARY_KEEP_TURNS", 3))
+
+
+def history_budget_tokens() -> int:
+    return max(50, _env_int("CONVERSATION_HISTORY_TOKENS", 1200))
+
+
+def recent_log_limit() -> int:
+    """Mensagens a buscar por turno: janela recente + turnos que acumulam até o próximo resumo."""
+    return 2 * (keep_turns() + summary_every_turns())
+
+
+def unsummarized(recent_log: list[dict], summary: dict) -> list[dict]:
+    """Mensagens do histórico que ainda não estão no resumo (todas, se não há resumo)."""
+    if not summary.get("summary"):
+        return recent_log
+    return recent_log[-2 * (keep_turns() + summary.get("summary_turns", 0)):]
+
+
+def _line(m: dict) -> str:
+    role = "Cliente" if m["role"] == "user" else "Você"
+    return f"{role}: {(m.get('content') or '').strip()}"
+
+
+def fit_history(recent_log: list[dict], budget_tokens: int) -> list[str]:
+    """Linhas do histórico, da mais recente para trás, até o orçamento de tokens (ordem cronológica)."""
+    lines: list[str] = []
+    used = 0
+    for m in reversed(recent_log):
+        if not (m.get("content") or "").strip():
+            continue
+        line = _line(m)
+        tokens = estimate_tokens(line)
+        if used + tokens > budget_tokens:
+            if not lines:  # a última mensagem sempre entra, cortada
+                lines.append(line[: budget_tokens * CHARS_PER_TOKEN])
+            break
+        lines.append(line)
+        used += tokens
+    return list(reversed(lines))
+
+
+async def after_turn(lead_id: str, tenant_id: Optional[str] = None, agent_id: Optional[str] = None) -> None:
+    """Conta o turno gravado e, ao completar o intervalo, agenda a atualização do resumo em segundo plano."""
+    every = summary_every_turns()
+    if not every:
+        return
+    pending = await run_db(increment_summary_turns, lead_id, tenant_id=tenant_id, agent_id=agent_id)
+    key = (tenant_id, agent_id, str(lead_id))
+    if pending < every or key in _in_flight:
+        return
+    _in_flight.add(key)
+    task = asyncio.get_running_loop().create_task(refresh_summary(lead_id, tenant_id, agent_id))
+    _tasks.add(task)
+    task.add_done_callback(lambda t: (_tasks.discard(t), _in_flight.discard(key)))
+
+
+async def _summarize(previous: str, messages: list[dict], tenant_id: Optional[str], agent_id: Optional[str]) -> str:
+    from .llm_orchestrator import _get_async_client
+
+    model = os.environ.get("CONVERSATION_SUMMARY_MODEL", "").strip() or DEFAULT_SUMMARY_MODEL
+    content = "Resumo anterior:\n" + (previous or "(nenhum)") + "\n\nNovas mensagens:\n" + "\n".join(_line(m) for m in messages)
+    started = time.monotonic()
+    response = await _get_async_client().chat.completions.create(
+        model=model,
+        messages=[{"role": "system", "content": SUMMARY_SYSTEM_PROMPT}, {"role": "user", "content": content}],
+        temperature=0.2,
+        max_tokens=400,
+    )
+    record_llm_usage(
+        response, model, (time.monotonic() - started) * 1000,
+        purpose="summary", tenant_id=tenant_id, agent_id=agent_id,
+    )
+    return (response.choices[0].message.content or "").strip()
+
+
+async def refresh_summary(lead_id: str, tenant_id: Optional[str] = None, agent_id: Optional[str] = None) -> Optional[str]:
+    """
+    Incorpora ao resumo os turnos pendentes que já saíram da janela recente. Falhas só são logadas:
+    os turnos continuam pendentes e entram no próximo resumo. Retorna o novo resumo (ou None).
+    """
+    with usage_scope("summary", tenant_id, agent_id=agent_id, lead_id=lead_id) as usage:
+        try:
+            current = await run_db(get_summary, lead_id, tenant_id=tenant_id, agent_id=agent_id)
+            pending = current["summary_turns"]
+            keep = keep_turns()
+            if pending <= 0:
+                return None
+            log = await run_db(get_recent_log, lead_id, limit=2 * (pending + keep), tenant_id=tenant_id, agent_id=agent_id)
+            fold = log[: -2 * keep]
+            if not fold:
+                return None
+            summary = await _summarize(current["summary"], fold, tenant_id, agent_id)
+            if not summary:
+                return None
+            await run_db(save_summary, lead_id, summary, pending, tenant_id=tenant_id, agent_id=agent_id)
+            logger.info("conversation_summary", extra={
+                "tenant_id": tenant_id, "lead_id": lead_id, "folded_turns": pending,
+                "summary_tokens": estimate_tokens(summary),
+            })
+            return summary
+        except Exception as e:
+            logger.warning("conversation_summary_failed", extra={"tenant_id": tenant_id, "lead_id": lead_id, "error": str(e)})
+            return None
+        finally:
+            if tenant_id and usage.by_purpose():
+                try:
+                    from .usage_tracker import track_tokens_sync
+                    await run_db(track_tokens_sync, tenant_id, usage.total_tokens, "summary", usage.metadata())
+                except Exception as e:
+                    logger.warning("conversation_summary_usage_failed", extra={"tenant_id": tenant_id, "error": str(e)})
@@ -90,6 +90,36 @@ def get_connection() -> sqlite3.Connection:
     return conn
 
 
+# Colunas adicionadas depois do schema inicial (ver database/migration_*.sql). ALTER TABLE pega lock
+# exclusivo na tabela mesmo com IF NOT EXISTS e init_db roda a cada turno: só uma vez por processo.
+_PG_ADDED_COLUMNS = [
+    "ALTER TABLE sessions ADD COLUMN IF NOT EXISTS summary TEXT",
+    "ALTER TABLE sessions ADD COLUMN IF NOT EXISTS summary_turns INT NOT NULL DEFAULT 0",
+    "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS summary TEXT",
+    "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS summary_turns INT NOT NULL DEFAULT 0",
+    # A FK também trava agents: mais um motivo para não repetir por turno
+    "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS routed_agent_id UUID REFERENCES agents(id) ON DELETE SET NULL",
+    "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS routing_confidence REAL",
+    "ALTER TABLE conversations ADD COLUMN IF NOT EXISTS routed_at TIMESTAMPTZ",
+]
+_pg_columns_checked = False
+
+
+def _ensure_pg_columns(conn) -> None:
+    """Aplica _PG_ADDED_COLUMNS na primeira chamada do processo (cada ALTER isolado: falha não derruba os demais)."""
+    global _pg_columns_checked
+    if _pg_columns_checked:
+        return
+    with conn.cursor() as cur:
+        for stmt in _PG_ADDED_COLUMNS:
+            try:
+                cur.execute(stmt)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+    _pg_columns_checked = True
+
+
 def init_db() -> None:
     """Cria as tabelas se não existirem (legado + multi-tenant). Postgres: cria automaticamente. Supabase REST: rode supabase_schema.sql no SQL Editor."""
     if _use_postgres():
@@ -186,6 +216,7 @@ def init_db() -> None:
                         except Exception:
                             pass
             conn.commit()
+            _ensure_pg_columns(conn)
         finally:
             conn.close()
         return
@@ -213,6 +244,11 @@ def init_db() -> None:
             );
             CREATE INDEX IF NOT EXISTS idx_log_user_ts ON conversation_log(user_id, timestamp);
         """)
+        for column in ("summary TEXT", "summary_turns INTEGER NOT NULL DEFAULT 0"):
+            try:
+                conn.execute(f"ALTER TABLE sessions ADD COLUMN {column}")
+            except sqlite3.OperationalError:
+                pass  # coluna já existe
         conn.commit()
     finally:
         conn.close()
@@ -252,7 +288,8 @@ def get_or_create_session(
             with conn.cursor() as cur:
                 cur.execute(
                     """INSERT INTO conversations (tenant_id, agent_id, lead_id, state, lead_classification, spin_answers, created_at, updated_at)
-                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
+                       VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                       ON CONFLICT (tenant_id, agent_id, lead_id) DO NOTHING""",
                     (tenant_id, agent_id, user_id, "descoberta", "frio", json.dumps({}), now, now),
                 )
             conn.commit()
@@ -435,7 +472,7 @@ def reset_session(
         try:
             with conn.cursor() as cur:
                 cur.execute(
-                    "UPDATE conversations SET state = %s, lead_classification = %s, spin_answers = %s, updated_at = %s WHERE tenant_id = %s AND agent_id = %s AND lead_id = %s",
+                    "UPDATE conversations SET state = %s, lead_classification = %s, spin_answers = %s, summary = NULL, summary_turns = 0, routed_agent_id = NULL, routing_confidence = NULL, routed_at = NULL, updated_at = %s WHERE tenant_id = %s AND agent_id = %s AND lead_id = %s",
                     ("descoberta", "frio", empty_spin, now, tenant_id, agent_id, user_id),
                 )
                 cur.execute(
@@ -445,13 +482,18 @@ def reset_session(
             conn.commit()
         finally:
             conn.close()
+        try:
+            from .routing_state import clear as clear_routing
+            clear_routing(tenant_id, agent_id, user_id)
+        except Exception as e:
+            print(f"Error clearing routing state: {e}")
         return
     if _use_postgres():
         conn = _get_pg_connection()
         try:
             with conn.cursor() as cur:
                 cur.execute(
-                    "UPDATE sessions SET current_state = %s, lead_classification = %s, spin_answers = %s, updated_at = %s WHERE user_id = %s",
+                    "UPDATE sessions SET current_state = %s, lead_classification = %s, spin_answers = %s, summary = NULL, summary_turns = 0, updated_at = %s WHERE user_id = %s",
                     ("descoberta", "frio", empty_spin, now, user_id),
                 )
                 cur.execute("DELETE FROM conversation_log WHERE user_id = %s", (user_id,))
@@ -472,7 +514,7 @@ def reset_session(
     conn = get_connection()
     try:
         conn.execute(
-            "UPDATE sessions SET current_state = ?, lead_classification = ?, spin_answers = ?, updated_at = ? WHERE user_id = ?",
+            "UPDATE sessions SET current_state = ?, lead_classification = ?, spin_answers = ?, summary = NULL, summary_turns = 0, updated_at = ? WHERE user_id = ?",
             ("descoberta", "frio", empty_spin, now, user_id),
         )
         conn.execute("DELETE FROM conversation_log WHERE user_id = ?", (user_id,))
@@ -636,6 +678,11 @@ def append_log(
             conn.commit()
         finally:
             conn.close()
+        try:
+            from .plan_limit_checker import record_messages
+            record_messages(tenant_id)
+        except Exception as e:
+            print(f"Error counting message quota: {e}")
         return
     if _use_postgres():
         conn = _get_pg_connection()
@@ -763,6 +810,172 @@ def get_recent_log(
         conn.close()
 
 
+def _pg_summary_target(user_id: str, tenant_id: Optional[str], agent_id: Optional[str]) -> tuple[str, str, tuple]:
+    """Tabela e filtro da conversa no Postgres (conversations com tenant+agent; senão sessions)."""
+    if _use_tenant_tables(tenant_id) and agent_id:
+        return "conversations", "tenant_id = %s AND agent_id = %s AND lead_id = %s", (tenant_id, agent_id, user_id)
+    return "sessions", "user_id = %s", (user_id,)
+
+
+def get_summary(
+    user_id: str,
+    tenant_id: Optional[str] = None,
+    agent_id: Optional[str] = None,
+) -> dict:
+    """
+    Resumo acumulado da conversa e quantos turnos ainda não entraram nele.
+    Retorna {"summary": str, "summary_turns": int}. Supabase REST: sem resumo (colunas só no Postgres/SQLite).
+    """
+    user_id = str(user_id)
+    empty = {"summary": "", "summary_turns": 0}
+    if _use_postgres():
+        table, where, params = _pg_summary_target(user_id, tenant_id, agent_id)
+        conn = _get_pg_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT summary, summary_turns FROM {table} WHERE {where}", params)
+                row = cur.fetchone()
+        finally:
+            conn.close()
+    elif _use_supabase():
+        return empty
+    else:
+        conn = get_connection()
+        try:
+            row = conn.execute("SELECT summary, summary_turns FROM sessions WHERE user_id = ?", (user_id,)).fetchone()
+        finally:
+            conn.close()
+    if not row:
+        return empty
+    return {"summary": row["summary"] or "", "summary_turns": int(row["summary_turns"] or 0)}
+
+
+def increment_summary_turns(
+    user_id: str,
+    tenant_id: Optional[str] = None,
+    agent_id: Optional[str] = None,
+) -> int:
+    """Conta mais um turno (mensagem do cliente + resposta) fora do resumo. Retorna o total pendente."""
+    user_id = str(user_id)
+    if _use_postgres():
+        table, where, params = _pg_summary_target(user_id, tenant_id, agent_id)
+        conn = _get_pg_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"UPDATE {table} SET summary_turns = COALESCE(summary_turns, 0) + 1 WHERE {where} RETURNING summary_turns",
+                    params,
+                )
+                row = cur.fetchone()
+            conn.commit()
+        finally:
+            conn.close()
+        return int(row["summary_turns"]) if row else 0
+    if _use_supabase():
+        return 0
+    conn = get_connection()
+    try:
+        conn.execute("UPDATE sessions SET summary_turns = COALESCE(summary_turns, 0) + 1 WHERE user_id = ?", (user_id,))
+        row = conn.execute("SELECT summary_turns FROM sessions WHERE user_id = ?", (user_id,)).fetchone()
+        conn.commit()
+        return int(row["summary_turns"]) if row else 0
+    finally:
+        conn.close()
+
+
+def save_summary(
+    user_id: str,
+    summary: str,
+    folded_turns: int,
+    tenant_id: Optional[str] = None,
+    agent_id: Optional[str] = None,
+) -> None:
+    """Grava o novo resumo e desconta os turnos incorporados (turnos que chegaram durante o resumo continuam pendentes)."""
+    user_id = str(user_id)
+    if _use_postgres():
+        table, where, params = _pg_summary_target(user_id, tenant_id, agent_id)
+        conn = _get_pg_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(
+                    f"UPDATE {table} SET summary = %s, summary_turns = GREATEST(COALESCE(summary_turns, 0) - %s, 0) WHERE {where}",
+                    (summary, folded_turns, *params),
+                )
+            conn.commit()
+        finally:
+            conn.close()
+        return
+    if _use_supabase():
+        return
+    conn = get_connection()
+    try:
+        conn.execute(
+            "UPDATE sessions SET summary = ?, summary_turns = MAX(COALESCE(summary_turns, 0) - ?, 0) WHERE user_id = ?",
+            (summary, folded_turns, user_id),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def get_routing(
+    user_id: str,
+    tenant_id: Optional[str] = None,
+    agent_id: Optional[str] = None,
+) -> Optional[dict]:
+    """
+    Último handoff gravado na conversa do agente de entrada (canal): {"agent_id", "confidence", "routed_at"}
+    (routed_at em epoch) ou None. Só nas tabelas multi-tenant do Postgres.
+    """
+    if not (_use_tenant_tables(tenant_id) and agent_id and _use_postgres()):
+        return None
+    conn = _get_pg_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """SELECT routed_agent_id, routing_confidence, routed_at FROM conversations
+                   WHERE tenant_id = %s AND agent_id = %s AND lead_id = %s""",
+                (tenant_id, agent_id, str(user_id)),
+            )
+            row = cur.fetchone()
+    finally:
+        conn.close()
+    if not row or not row["routed_agent_id"]:
+        return None
+    return {
+        "agent_id": str(row["routed_agent_id"]),
+        "confidence": float(row["routing_confidence"] or 0.0),
+        "routed_at": row["routed_at"].timestamp() if row["routed_at"] else 0.0,
+    }
+
+
+def save_routing(
+    user_id: str,
+    routed_agent_id: str,
+    confidence: float,
+    tenant_id: Optional[str] = None,
+    agent_id: Optional[str] = None,
+) -> None:
+    """Grava o handoff na conversa do agente de entrada (cria a linha se o turno ainda não criou)."""
+    if not (_use_tenant_tables(tenant_id) and agent_id and _use_postgres()):
+        return
+    conn = _get_pg_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """INSERT INTO conversations (tenant_id, agent_id, lead_id, routed_agent_id, routing_confidence, routed_at)
+                   VALUES (%s, %s, %s, %s, %s, NOW())
+                   ON CONFLICT (tenant_id, agent_id, lead_id) DO UPDATE SET
+                     routed_agent_id = EXCLUDED.routed_agent_id,
+                     routing_confidence = EXCLUDED.routing_confidence,
+                     routed_at = EXCLUDED.routed_at""",
+                (tenant_id, agent_id, str(user_id), routed_agent_id, confidence),
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+
 def classify_lead_heuristic(
     user_id: str,
     state: str,
@@ -1,17 +1,25 @@
 """
 Ingestão da base de conhecimento: extrai texto do arquivo, divide em chunks, gera embeddings e grava em document_chunks.
 Chamado após o upload de documento no platform_backend (ou por script).
-Suporta: .txt, .pdf, .xlsx, .xls, .png, .jpg, .jpeg. Requer OPENAI_API_KEY e tabela document_chunks (pgvector).
+Suporta: .txt, .pdf, .xlsx, .xls, .png, .jpg, .jpeg, .webp. Requer OPENAI_API_KEY e tabela document_chunks (pgvector).
 """
 
-import base64
+import hashlib
+import json
 import os
+import unicodedata
+from itertools import islice
 from pathlib import Path
-from typing import List
+from typing import Callable, Iterable, Iterator, List, Optional, Union
 
-# Chunk size e overlap para não estourar contexto e manter continuidade
-CHUNK_SIZE = 600
-CHUNK_OVERLAP = 80
+# Chunks processados por vez em store_chunks (lookup de hash + embeddings + insert)
+STORE_WINDOW = 500
+
+# Tentativas de replace_chunks quando o documento muda entre o diff e o lock da troca
+REPLACE_MAX_ATTEMPTS = 3
+
+# Um chunk é o texto ou {"content": texto, "metadata": {...}} (ex.: aba e linhas da planilha)
+Chunk = Union[str, dict]
 
 
 def _extract_text_excel_xlsx(path: Path) -> str:
@@ -47,43 +55,14 @@ def _extract_text_excel_xls(path: Path) -> str:
     return "\n\n".join(parts).strip()
 
 
-def _extract_text_image(file_path: str) -> str:
-    """Extrai texto de imagem (.png, .jpg, .jpeg) via OpenAI Vision (descrição para RAG)."""
-    api_key = os.environ.get("OPENAI_API_KEY", "").strip()
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY é necessário para processar imagens.")
-    path = Path(file_path)
-    data = path.read_bytes()
-    b64 = base64.standard_b64encode(data).decode("ascii")
-    suf = path.suffix.lower()
-    mime = "image/png" if suf == ".png" else "image/jpeg"
-    from openai import OpenAI
-    client = OpenAI(api_key=api_key)
-    resp = client.chat.completions.create(
-        model=os.environ.get("OPENAI_VISION_MODEL", "gpt-4o-mini"),
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": "Descreva o conteúdo desta imagem ou documento de forma textual e detalhada, incluindo texto visível, números, tabelas e informações relevantes, para uso em busca semântica em uma base de conhecimento. Responda apenas com o texto da descrição, sem introduções.",
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": f"data:{mime};base64,{b64}"},
-                    },
-                ],
-            }
-        ],
-        max_tokens=1024,
-    )
-    text = (resp.choices[0].message.content or "").strip()
-    return text
+def _extract_text_image(file_path: str, tenant_id: Optional[str] = None) -> str:
+    """Extrai texto de imagem (.png, .jpg, .jpeg, .webp) via OpenAI Vision (ver vision_extract: cache por hash)."""
+    from .vision_extract import describe_image
+    return describe_image(file_path, tenant_id=tenant_id)
 
 
-def _extract_text(file_path: str) -> str:
-    """Extrai texto de .txt, .pdf, .xlsx, .xls, .png, .jpg ou .jpeg."""
+def _extract_text(file_path: str, tenant_id: Optional[str] = None) -> str:
+    """Extrai texto de .txt, .pdf, .xlsx, .xls, .png, .jpg, .jpeg ou .webp."""
     path = Path(file_path)
     if not path.exists():
         raise FileNotFoundError(f"Arquivo não encontrado: {file_path}")
@@ -94,12 +73,9 @@ def _extract_text(file_path: str) -> str:
         try:
             from pypdf import PdfReader
             reader = PdfReader(str(path))
-            parts = []
-            for p in reader.pages:
-                t = p.extract_text()
-                if t:
-                    parts.append(t)
-            return "\n\n".join(parts).strip()
+            # Páginas separadas por form feed: o chunker registra a página de cada trecho
+            parts = [p.extract_text() or "" for p in reader.pages]
+            return "\n\f\n".join(parts).strip(" \n")
         except ImportError:
             raise RuntimeError("Para PDF instale: pip install pypdf") from None
     if suf == ".xlsx":
@@ -112,29 +88,17 @@ def _extract_text(file_path: str) -> str:
             return _extract_text_excel_xls(path)
         except ImportError:
             raise RuntimeError("Para Excel .xls instale: pip install xlrd") from None
-    if suf in (".png", ".jpg", ".jpeg"):
-        return _extract_text_image(file_path)
+    if suf in (".png", ".jpg", ".jpeg", ".webp"):
+        return _extract_text_image(file_path, tenant_id=tenant_id)
     raise ValueError(
-        f"Formato não suportado: {suf}. Use .txt, .pdf, .xlsx, .xls, .png, .jpg ou .jpeg."
+        f"Formato não suportado: {suf}. Use .txt, .pdf, .xlsx, .xls, .png, .jpg, .jpeg ou .webp."
     )
 
 
-def _chunk_text(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
-    """Divide texto em blocos com overlap."""
-    if not text or not text.strip():
-        return []
-    text = text.replace("\r\n", "\n").replace("\r", "\n")
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = start + size
-        chunk = text[start:end]
-        if not chunk.strip():
-            start = end - overlap
-            continue
-        chunks.append(chunk.strip())
-        start = end - overlap
-    return chunks
+def _chunk_text(text: str) -> List[str]:
+    """Divide texto em chunks estruturais (ver chunker.chunk_document)."""
+    from .chunker import chunk_texts
+    return chunk_texts(text)
 
 
 def _get_connection():
@@ -151,37 +115,416 @@ def _get_connection():
     return psycopg2.connect(url, cursor_factory=RealDictCursor)
 
 
-def ingest_document(file_path: str, tenant_id: str, document_id: str) -> int:
+_chunk_schema_checked = False
+
+
+def _ensure_chunk_hash_columns() -> None:
     """
-    Processa um documento: extrai texto, chunk, gera embeddings, insere em document_chunks.
-    document_id = UUID do registro em documents (tabela).
-    Retorna o número de chunks inseridos.
+    Garante content_hash/embedding_model/metadata em document_chunks e o relatório em documents (uma vez
+    por processo). Usa conexão própria: commit ou rollback do DDL não mexem na transação de quem chama.
+    """
+    global _chunk_schema_checked
+    if _chunk_schema_checked:
+        return
+    conn = _get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS content_hash TEXT")
+            cur.execute("ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS embedding_model TEXT")
+            cur.execute("ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS metadata JSONB")
+            cur.execute(
+                "CREATE INDEX IF NOT EXISTS idx_document_chunks_tenant_hash ON document_chunks (tenant_id, content_hash)"
+            )
+            cur.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS chunks_count INT DEFAULT 0")
+            cur.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS embeddings_reused INT DEFAULT 0")
+            cur.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS version INT DEFAULT 1")
+        conn.commit()
+        _chunk_schema_checked = True
+    except Exception as e:
+        conn.rollback()
+        print(f"[ingest] não foi possível garantir colunas de hash: {e}")
+    finally:
+        conn.close()
+
+
+def chunk_content_hash(text: str, model: str) -> str:
+    """Hash do texto normalizado (NFC, espaços colapsados) + modelo de embedding."""
+    normalized = " ".join(unicodedata.normalize("NFC", text or "").split())
+    return hashlib.sha256(f"{model}\n{normalized}".encode("utf-8")).hexdigest()
+
+
+def _existing_embeddings(cur, tenant_id: str, model: str, hashes: List[str]) -> dict[str, str]:
+    """Embeddings já gravados no tenant para esses hashes: {content_hash: vetor em texto pgvector}."""
+    if not hashes:
+        return {}
+    cur.execute(
+        """
+        SELECT DISTINCT ON (content_hash) content_hash, embedding::text AS embedding
+        FROM document_chunks
+        WHERE tenant_id = %s AND embedding_model = %s AND content_hash = ANY(%s)
+          AND embedding IS NOT NULL
+        """,
+        (tenant_id, model, hashes),
+    )
+    return {r["content_hash"]: r["embedding"] for r in cur.fetchall()}
+
+
+def _embed_missing(tenant_id: str, chunks: List[str], hashes: List[str], vectors: dict[str, str]) -> tuple[int, dict]:
+    """
+    Gera embeddings só para hashes ausentes em `vectors` (um por hash, mesmo se repetido no documento)
+    e os adiciona a `vectors`. Retorna (quantidade gerada, stats do embedding_service).
     """
     from .knowledge_rag import _embed
 
-    text = _extract_text(file_path)
-    chunks = _chunk_text(text)
-    if not chunks:
-        return 0
+    to_embed: dict[str, str] = {}
+    for h, content in zip(hashes, chunks):
+        if h not in vectors and h not in to_embed:
+            to_embed[h] = content
+    if not to_embed:
+        return 0, {}
+    stats: dict = {}
+    new_vectors = _embed(list(to_embed.values()), tenant_id=tenant_id, stats=stats)
+    for h, emb in zip(to_embed.keys(), new_vectors):
+        vectors[h] = "[" + ",".join(str(x) for x in emb) + "]"
+    return len(to_embed), stats
+
+
+def _chunk_parts(chunk: Chunk) -> tuple[str, Optional[dict]]:
+    """(texto, metadata) de um chunk em texto puro ou dict."""
+    if isinstance(chunk, dict):
+        return chunk.get("content") or "", chunk.get("metadata")
+    return chunk, None
+
+
+def _windows(chunks: Iterable[Chunk], size: int) -> Iterator[List[Chunk]]:
+    it = iter(chunks)
+    while True:
+        window = list(islice(it, size))
+        if not window:
+            return
+        yield window
+
+
+def _merge_embedding_stats(total: dict, stats: dict) -> None:
+    """Soma as estatísticas de embed_texts de várias janelas."""
+    if not stats:
+        return
+    for key in ("chunks", "batches", "tokens", "retries", "elapsed_seconds", "throttled_seconds"):
+        total[key] = round(total.get(key, 0) + stats.get(key, 0), 3)
+    elapsed = total.get("elapsed_seconds") or 0
+    total["chunks_per_second"] = round(total["chunks"] / elapsed, 2) if elapsed > 0 else float(total["chunks"])
+
+
+def _insert_chunk(cur, tenant_id: str, document_id: str, index: int, content: str, metadata: Optional[dict], vector: str, content_hash: str, model: str) -> None:
+    cur.execute(
+        """
+        INSERT INTO document_chunks (tenant_id, document_id, chunk_index, content, embedding, content_hash, embedding_model, metadata)
+        VALUES (%s, %s, %s, %s, %s::vector, %s, %s, %s)
+        """,
+        (tenant_id, document_id, index, content, vector, content_hash, model, json.dumps(metadata) if metadata else None),
+    )
 
-    embeddings = _embed(chunks)
 
+def store_chunks(
+    tenant_id: str,
+    document_id: str,
+    chunks: Iterable[Chunk],
+    conn=None,
+    replace_existing: bool = False,
+    on_progress: Optional[Callable[[int], None]] = None,
+) -> dict:
+    """
+    Grava os chunks do documento em document_chunks, reaproveitando embeddings de chunks idênticos
+    (mesmo hash de texto normalizado + modelo) já existentes no tenant; só chama a API para os novos.
+    chunks pode ser um gerador (ex.: planilha em streaming): é consumido em janelas de STORE_WINDOW,
+    então só uma janela fica em memória. Tudo é gravado numa única transação.
+    replace_existing: apaga os chunks atuais do documento na mesma transação (reprocessamento/retry idempotente).
+    on_progress(n): chamado após cada janela com o total de chunks gravados até ali.
+    Retorna relatório: chunks, embedded, reused, embedding_stats.
+    """
+    from .embedding_service import embedding_model
+
+    report = {"chunks": 0, "embedded": 0, "reused": 0, "embedding_stats": {}}
+    if isinstance(chunks, (list, tuple)) and not chunks and not replace_existing:
+        return report
+    model = embedding_model()
+
+    _ensure_chunk_hash_columns()
+    own_conn = conn is None
+    if own_conn:
+        conn = _get_connection()
+    try:
+        old_ids: list = []
+        if replace_existing:
+            # Apagados só no fim: chunks antigos continuam disponíveis para reaproveitar embeddings
+            with conn.cursor() as cur:
+                cur.execute("SELECT id FROM document_chunks WHERE document_id = %s", (document_id,))
+                old_ids = [str(r["id"]) for r in cur.fetchall()]
+
+        for window in _windows(chunks, STORE_WINDOW):
+            parts = [_chunk_parts(c) for c in window]
+            contents = [content for content, _ in parts]
+            hashes = [chunk_content_hash(c, model) for c in contents]
+            with conn.cursor() as cur:
+                vectors = _existing_embeddings(cur, tenant_id, model, list(set(hashes)))
+            embedded, stats = _embed_missing(tenant_id, contents, hashes, vectors)
+            _merge_embedding_stats(report["embedding_stats"], stats)
+            with conn.cursor() as cur:
+                for offset, ((content, metadata), h) in enumerate(zip(parts, hashes)):
+                    _insert_chunk(cur, tenant_id, document_id, report["chunks"] + offset, content, metadata, vectors[h], h, model)
+            report["chunks"] += len(window)
+            report["embedded"] += embedded
+            if on_progress:
+                on_progress(report["chunks"])
+
+        report["reused"] = report["chunks"] - report["embedded"]
+        with conn.cursor() as cur:
+            if old_ids:
+                cur.execute("DELETE FROM document_chunks WHERE id = ANY(%s::uuid[])", (old_ids,))
+            cur.execute(
+                "UPDATE documents SET chunks_count = %s, embeddings_reused = %s WHERE id = %s",
+                (report["chunks"], report["reused"], document_id),
+            )
+        if own_conn:
+            conn.commit()
+    except Exception:
+        if own_conn:
+            conn.rollback()
+        raise
+    finally:
+        if own_conn:
+            conn.close()
+
+    stats = report["embedding_stats"]
+    print(
+        f"[ingest] documento {document_id}: {report['chunks']} chunks, {report['embedded']} embeddings gerados, "
+        f"{report['reused']} reaproveitados"
+        + (f" ({stats['chunks_per_second']} chunks/s, {stats['retries']} retries)" if stats else "")
+    )
+    return report
+
+
+def _chunk_snapshot(tenant_id: str, document_id: str) -> tuple[int, list]:
+    """
+    Versão do documento e chunks atuais (id, content_hash; content só dos sem hash), sem lock e numa
+    transação curta.
+    """
     conn = _get_connection()
     try:
         with conn.cursor() as cur:
-            for i, (content, emb) in enumerate(zip(chunks, embeddings)):
-                vec_str = "[" + ",".join(str(x) for x in emb) + "]"
-                cur.execute(
-                    """
-                    INSERT INTO document_chunks (tenant_id, document_id, chunk_index, content, embedding)
-                    VALUES (%s, %s, %s, %s, %s::vector)
-                    """,
-                    (tenant_id, document_id, i, content, vec_str),
-                )
+            cur.execute("SELECT version FROM documents WHERE id = %s AND tenant_id = %s", (document_id, tenant_id))
+            row = cur.fetchone()
+            if not row:
+                raise ValueError(f"Documento {document_id} não encontrado")
+            cur.execute(
+                """SELECT id, content_hash, CASE WHEN content_hash IS NULL THEN content END AS content
+                   FROM document_chunks WHERE document_id = %s ORDER BY chunk_index""",
+                (document_id,),
+            )
+            existing = cur.fetchall()
+        conn.commit()
+    finally:
+        conn.close()
+    return row.get("version") or 1, existing
+
+
+def _available_chunks(existing: list, model: str) -> tuple[list, dict[str, list]]:
+    """
+    (backfill, available) dos chunks atuais: backfill são (hash, modelo, id) dos chunks sem hash;
+    available mapeia hash -> ids ainda não casados com um chunk novo.
+    """
+    # Chunks antigos sem hash (ingeridos antes da migração) recebem o hash do modelo atual
+    backfill = []
+    available: dict[str, list] = {}
+    for r in existing:
+        h = r["content_hash"]
+        if not h:
+            h = chunk_content_hash(r["content"], model)
+            backfill.append((h, model, r["id"]))
+        available.setdefault(h, []).append(r["id"])
+    return backfill, available
+
+
+def _diff_chunks(existing: list, hashes: List[str], model: str) -> tuple[list, list, list, list]:
+    """
+    Diff por hash entre os chunks atuais e os novos: (backfill, kept, added, removed).
+    backfill: (hash, modelo, id) dos chunks antigos sem hash; kept: (id, novo índice);
+    added: índices dos chunks novos; removed: ids a apagar.
+    """
+    backfill, available = _available_chunks(existing, model)
+    kept: list[tuple[str, int]] = []
+    added: list[int] = []
+    for i, h in enumerate(hashes):
+        ids = available.get(h)
+        if ids:
+            kept.append((ids.pop(0), i))
+        else:
+            added.append(i)
+    removed = [cid for ids in available.values() for cid in ids]
+    return backfill, kept, added, removed
+
+
+def _embed_added(tenant_id: str, model: str, contents: List[str], hashes: List[str], vectors: dict[str, str], stats: dict) -> int:
+    """
+    Completa `vectors` para os chunks novos (reaproveitando os do tenant, sem transação aberta).
+    Retorna quantos embeddings foram gerados.
+    """
+    missing = list(set(hashes) - vectors.keys())
+    if not missing:
+        return 0
+    conn = _get_connection()
+    try:
+        with conn.cursor() as cur:
+            vectors.update(_existing_embeddings(cur, tenant_id, model, missing))
         conn.commit()
-        return len(chunks)
     finally:
         conn.close()
+    count, window_stats = _embed_missing(tenant_id, contents, hashes, vectors)
+    _merge_embedding_stats(stats, window_stats)
+    return count
+
+
+def replace_chunks(tenant_id: str, document_id: str, chunks: Iterable[Chunk], document_updates: Optional[dict] = None) -> dict:
+    """
+    Substitui o conteúdo de um documento de forma incremental e atômica.
+    Compara os novos chunks com os existentes pelo hash: chunks iguais são mantidos (só muda chunk_index),
+    removidos são apagados e só os novos/alterados geram embedding (reaproveitando hashes do tenant).
+    chunks pode ser um gerador (ex.: planilha em streaming): é consumido em janelas de STORE_WINDOW,
+    com diff e embeddings por janela; do que já existe só ficam em memória hash e metadata, o texto
+    fica só para os chunks novos.
+    Diff e embeddings rodam fora de transação (a API de embeddings pode levar minutos). Só a troca
+    trava o documento (FOR UPDATE): confere se versão e chunks ainda são os do diff e aplica
+    delete/insert/update + documents.version + 1 num único commit, então a busca vê a versão antiga
+    inteira ou a nova inteira. Se o documento mudou nesse meio tempo, o diff é refeito (até
+    REPLACE_MAX_ATTEMPTS vezes) reaproveitando os embeddings já gerados; se o novo diff precisar
+    inserir um chunk cujo texto não foi guardado, a substituição falha e deve ser repetida.
+    document_updates: colunas extras de documents a atualizar na troca (ex.: file_path, file_size_mb).
+    Retorna relatório: chunks, kept, added, removed, embedded, reused, version.
+    """
+    from .embedding_service import embedding_model
+
+    model = embedding_model()
+    _ensure_chunk_hash_columns()
+    seen_version, existing = _chunk_snapshot(tenant_id, document_id)
+    backfill, available = _available_chunks(existing, model)
+    hashes: list[str] = []
+    metadata: list[Optional[dict]] = []
+    contents: dict[int, str] = {}  # só dos chunks novos
+    kept: list[tuple[str, int]] = []
+    added: list[int] = []
+    vectors: dict[str, str] = {}
+    embedded = 0
+    stats: dict = {}
+
+    for window in _windows(chunks, STORE_WINDOW):
+        window_added: list[int] = []
+        for content, meta in map(_chunk_parts, window):
+            i = len(hashes)
+            h = chunk_content_hash(content, model)
+            hashes.append(h)
+            metadata.append(meta)
+            ids = available.get(h)
+            if ids:
+                kept.append((ids.pop(0), i))
+            else:
+                contents[i] = content
+                window_added.append(i)
+        added.extend(window_added)
+        embedded += _embed_added(tenant_id, model, [contents[i] for i in window_added], [hashes[i] for i in window_added], vectors, stats)
+    removed = [cid for ids in available.values() for cid in ids]
+
+    for attempt in range(REPLACE_MAX_ATTEMPTS):
+        if attempt:
+            seen_version, existing = _chunk_snapshot(tenant_id, document_id)
+            backfill, kept, added, removed = _diff_chunks(existing, hashes, model)
+            if any(i not in contents for i in added):
+                # Um chunk mantido sumiu do banco e o texto dele não ficou em memória
+                raise RuntimeError(f"Documento {document_id} alterado durante a substituição; tente de novo")
+            embedded += _embed_added(tenant_id, model, [contents[i] for i in added], [hashes[i] for i in added], vectors, stats)
+
+        conn = _get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT version FROM documents WHERE id = %s AND tenant_id = %s FOR UPDATE", (document_id, tenant_id))
+                row = cur.fetchone()
+                if not row:
+                    raise ValueError(f"Documento {document_id} não encontrado")
+                cur.execute("SELECT id, content_hash FROM document_chunks WHERE document_id = %s ORDER BY chunk_index", (document_id,))
+                current = [(str(r["id"]), r["content_hash"]) for r in cur.fetchall()]
+            if (row.get("version") or 1) != seen_version or current != [(str(r["id"]), r["content_hash"]) for r in existing]:
+                # Outra gravação entre o diff e o lock: refaz o diff sobre o estado novo
+                conn.rollback()
+                continue
+            version = seen_version + 1
+
+            # Troca atômica: as alterações + versão do documento saem no mesmo commit do lock
+            with conn.cursor() as cur:
+                if backfill:
+                    cur.executemany(
+                        "UPDATE document_chunks SET content_hash = %s, embedding_model = %s WHERE id = %s",
+                        backfill,
+                    )
+                if removed:
+                    cur.execute("DELETE FROM document_chunks WHERE id = ANY(%s::uuid[])", ([str(c) for c in removed],))
+                if kept:
+                    # Posição e metadata (ex.: linhas da planilha) podem mudar mesmo com o texto igual
+                    cur.executemany(
+                        "UPDATE document_chunks SET chunk_index = %s, metadata = %s WHERE id = %s",
+                        [(i, json.dumps(metadata[i]) if metadata[i] else None, cid) for cid, i in kept],
+                    )
+                for i in added:
+                    _insert_chunk(cur, tenant_id, document_id, i, contents[i], metadata[i], vectors[hashes[i]], hashes[i], model)
+                updates = {
+                    **(document_updates or {}),
+                    "version": version,
+                    "chunks_count": len(hashes),
+                    "embeddings_reused": len(hashes) - embedded,
+                    "status": "completed",
+                }
+                assignments = ", ".join(f"{col} = %s" for col in updates)
+                cur.execute(
+                    f"UPDATE documents SET {assignments} WHERE id = %s AND tenant_id = %s",
+                    (*updates.values(), document_id, tenant_id),
+                )
+            conn.commit()
+            break
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    else:
+        raise RuntimeError(f"Documento {document_id} alterado durante a substituição; tente de novo")
+
+    report = {
+        "chunks": len(hashes),
+        "kept": len(kept),
+        "added": len(added),
+        "removed": len(removed),
+        "embedded": embedded,
+        "reused": len(hashes) - embedded,
+        "version": version,
+        "embedding_stats": stats,
+    }
+    print(
+        f"[ingest] documento {document_id} v{version}: {report['kept']} mantidos, {report['added']} novos "
+        f"({report['embedded']} embeddings gerados), {report['removed']} removidos"
+    )
+    return report
+
+
+def ingest_document(file_path: str, tenant_id: str, document_id: str) -> int:
+    """
+    Processa um documento: extrai texto, chunk, gera embeddings, insere em document_chunks.
+    document_id = UUID do registro em documents (tabela).
+    Retorna o número de chunks inseridos.
+    """
+    from .chunker import chunk_document
+    text = _extract_text(file_path, tenant_id=tenant_id)
+    chunks = chunk_document(text)
+    if not chunks:
+        return 0
+    return store_chunks(tenant_id, document_id, chunks)["chunks"]
 
 
 def delete_chunks_for_document(document_id: str) -> None:
@@ -5,12 +5,11 @@ Extende execution/document_ingest.py para suportar mais formatos.
 import os
 import uuid
 from pathlib import Path
-from typing import List, Optional
+from typing import Optional
 import requests
 from bs4 import BeautifulSoup
 
-CHUNK_SIZE = 600
-CHUNK_OVERLAP = 80
+from .document_ingest import _chunk_text  # noqa: F401  (um só splitter: o de document_ingest)
 
 
 def _extract_text_from_file(file_path: str) -> str:
@@ -53,50 +52,15 @@ def _extract_text_from_pdf(path: Path) -> str:
         raise RuntimeError("Para PDF instale: pip install pypdf")
     
     reader = PdfReader(str(path))
-    parts = []
-    for page in reader.pages:
-        text = page.extract_text()
-        if text:
-            parts.append(text)
-    return "\n\n".join(parts).strip()
+    # Páginas separadas por form feed: o chunker registra a página de cada trecho
+    parts = [page.extract_text() or "" for page in reader.pages]
+    return "\n\f\n".join(parts).strip(" \n")
 
 
 def _extract_text_from_excel(path: Path) -> str:
-    """Extrai texto de Excel (.xlsx com openpyxl, .xls com xlrd)."""
-    suf = path.suffix.lower()
-    if suf == ".xls":
-        return _extract_text_from_xls(path)
-    try:
-        import openpyxl
-    except ImportError:
-        raise RuntimeError("Para Excel .xlsx instale: pip install openpyxl")
-    parts = []
-    wb = openpyxl.load_workbook(path, data_only=True)
-    for sheet_name in wb.sheetnames:
-        sheet = wb[sheet_name]
-        parts.append(f"\n--- Sheet: {sheet_name} ---\n")
-        for row in sheet.iter_rows(values_only=True):
-            row_text = " | ".join(str(cell) if cell is not None else "" for cell in row)
-            if row_text.strip():
-                parts.append(row_text)
-    return "\n".join(parts).strip()
-
-
-def _extract_text_from_xls(path: Path) -> str:
-    """Extrai texto de Excel antigo (.xls)."""
-    try:
-        import xlrd
-    except ImportError:
-        raise RuntimeError("Para Excel .xls instale: pip install xlrd")
-    wb = xlrd.open_workbook(str(path))
-    parts = []
-    for sheet in wb.sheets():
-        parts.append(f"\n--- Sheet: {sheet.name} ---\n")
-        for row_idx in range(sheet.nrows):
-            row_text = " | ".join(str(sheet.cell_value(row_idx, col_idx)).strip() for col_idx in range(sheet.ncols))
-            if row_text.strip():
-                parts.append(row_text)
-    return "\n".join(parts).strip()
+    """Extrai texto de Excel (.xlsx/.xls), lendo linha a linha (ver spreadsheet_ingest)."""
+    from .spreadsheet_ingest import extract_text
+    return extract_text(str(path))
 
 
 def _extract_text_from_docx(path: Path) -> str:
@@ -124,18 +88,9 @@ def _extract_text_from_docx(path: Path) -> str:
 
 
 def _extract_text_from_csv(path: Path) -> str:
-    """Extrai texto de CSV."""
-    import csv
-    
-    parts = []
-    with open(path, 'r', encoding='utf-8', errors='replace') as f:
-        reader = csv.reader(f)
-        for row in reader:
-            row_text = " | ".join(cell for cell in row)
-            if row_text.strip():
-                parts.append(row_text)
-    
-    return "\n".join(parts).strip()
+    """Extrai texto de CSV (delimitador detectado; cabeçalho repetido por bloco)."""
+    from .spreadsheet_ingest import extract_text
+    return extract_text(str(path))
 
 
 def _extract_text_from_markdown(path: Path) -> str:
@@ -217,29 +172,6 @@ def _extract_text_from_html_string(html: str) -> str:
     return '\n'.join(lines)
 
 
-def _chunk_text(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
-    """Divide texto em blocos com overlap."""
-    if not text or not text.strip():
-        return []
-    
-    text = text.replace('\r\n', '\n').replace('\r', '\n')
-    chunks = []
-    start = 0
-    
-    while start < len(text):
-        end = start + size
-        chunk = text[start:end]
-        
-        if not chunk.strip():
-            start = end - overlap
-            continue
-            
-        chunks.append(chunk.strip())
-        start = end - overlap
-    
-    return chunks
-
-
 def get_file_size_mb(file_path: str) -> float:
     """Retorna tamanho do arquivo em MB."""
     return os.path.getsize(file_path) / (1024 * 1024)
@@ -0,0 +1,286 @@
+"""
+Pipeline de processamento de documentos da base de conhecimento (extração → chunks → embeddings).
+Executado pelo worker da fila (run_document_worker.py) ou, sem fila, por BackgroundTasks no platform_backend.
+As funções levantam exceção em caso de erro para que a fila possa refazer o job; quem chama decide
+quando marcar o documento como 'failed'.
+"""
+
+import hashlib
+import os
+from typing import Callable, Optional
+
+from .document_ingest import _get_connection, replace_chunks, store_chunks
+
+# progress(fração 0..1, mensagem)
+ProgressCallback = Callable[[float, str], None]
+
+
+def _noop_progress(fraction: float, message: str) -> None:
+    pass
+
+
+def file_sha256(file_path: str, block_size: int = 1024 * 1024) -> str:
+    """SHA-256 do arquivo, lido em blocos."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def set_document_status(doc_id: str, status: str) -> None:
+    """Atualiza documents.status (pending, processing, completed, failed)."""
+    conn = _get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("UPDATE documents SET status = %s WHERE id = %s", (status, doc_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _document_text(file_path: str, tenant_id: str, report: dict) -> str:
+    """Texto do arquivo: imagens via Vision (com cache; relatório em report["vision"]), o resto via extraction_pool."""
+    from .extraction_pool import extract_text
+    from .vision_extract import describe_image, is_image
+
+    if is_image(file_path):
+        report["vision"] = {}
+        return describe_image(file_path, tenant_id=tenant_id, report=report["vision"])
+    return extract_text(file_path)
+
+
+def process_document(
+    doc_id: str,
+    file_path: str,
+    tenant_id: str,
+    file_name: str,
+    file_type: str,
+    progress: Optional[ProgressCallback] = None,
+) -> dict:
+    """Processa um documento recém-enviado. Idempotente: reprocessar substitui os chunks anteriores."""
+    from .chunker import chunk_document
+    from .extraction_pool import iter_spreadsheet_chunks
+    from .spreadsheet_ingest import is_spreadsheet
+
+    progress = progress or _noop_progress
+    conn = _get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE documents SET status = 'processing', file_name = %s, file_type = %s, file_size_mb = %s WHERE id = %s",
+                (file_name, file_type, os.path.getsize(file_path) / (1024 * 1024), doc_id),
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+    if is_spreadsheet(file_path):
+        # Planilha em streaming: linhas -> chunks com cabeçalho -> embeddings, em janelas
+        progress(0.1, "lendo planilha")
+        report = store_chunks(
+            tenant_id,
+            doc_id,
+            iter_spreadsheet_chunks(file_path),
+            replace_existing=True,
+            on_progress=lambda n: progress(0.5, f"{n} trechos gravados"),
+        )
+    else:
+        progress(0.1, "extraindo texto")
+        extraction: dict = {}
+        text = _document_text(file_path, tenant_id, extraction)
+        progress(0.3, "dividindo em trechos")
+        chunks = chunk_document(text)
+        progress(0.4, f"gerando embeddings ({len(chunks)} trechos)")
+        report = {**store_chunks(tenant_id, doc_id, chunks, replace_existing=True), **extraction}
+    set_document_status(doc_id, "completed")
+    progress(1.0, "concluído")
+    return report
+
+
+def replace_document(
+    doc_id: str,
+    file_path: str,
+    tenant_id: str,
+    file_name: str,
+    file_type: str,
+    progress: Optional[ProgressCallback] = None,
+) -> dict:
+    """
+    Substitui o arquivo de um documento (diff por hash + troca atômica de versão).
+    Em caso de erro a versão anterior continua intacta; o arquivo antigo só é apagado após a troca.
+    """
+    from .chunker import chunk_document
+    from .extraction_pool import iter_spreadsheet_chunks
+    from .spreadsheet_ingest import is_spreadsheet
+
+    progress = progress or _noop_progress
+    conn = _get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT file_path FROM documents WHERE id = %s AND tenant_id = %s", (doc_id, tenant_id))
+            row = cur.fetchone()
+    finally:
+        conn.close()
+    old_path = row["file_path"] if row else None
+
+    progress(0.1, "extraindo texto")
+    extraction: dict = {}
+    if is_spreadsheet(file_path):
+        # Planilha em streaming: replace_chunks faz diff e embeddings por janela
+        chunks = iter_spreadsheet_chunks(file_path)
+    else:
+        chunks = chunk_document(_document_text(file_path, tenant_id, extraction))
+    progress(0.3, "comparando trechos")
+    report = replace_chunks(
+        tenant_id,
+        doc_id,
+        chunks,
+        document_updates={
+            "file_path": file_path,
+            "file_name": file_name,
+            "file_type": file_type,
+            "file_size_mb": os.path.getsize(file_path) / (1024 * 1024),
+            "file_sha256": file_sha256(file_path),
+        },
+    )
+    if old_path and old_path != file_path and os.path.isfile(old_path):
+        try:
+            os.remove(old_path)
+        except OSError:
+            pass
+    progress(1.0, "concluído")
+    return {**report, **extraction}
+
+
+def process_images(
+    doc_id: str,
+    tenant_id: str,
+    documents: list,
+    progress: Optional[ProgressCallback] = None,
+) -> dict:
+    """
+    Lote de imagens enviadas juntas (documents = [{doc_id, file_path, file_name, file_type}]):
+    as descrições saem de uma só chamada a vision_extract.describe_images (cache + paralelo sob
+    orçamento) e cada imagem vira seu próprio documento. doc_id é o primeiro documento do lote; o
+    job fica ligado a todos (document_jobs.document_ids).
+    """
+    from .chunker import chunk_document
+    from .vision_extract import describe_images
+
+    progress = progress or _noop_progress
+    conn = _get_connection()
+    try:
+        with conn.cursor() as cur:
+            for d in documents:
+                cur.execute(
+                    "UPDATE documents SET status = 'processing', file_size_mb = %s WHERE id = %s",
+                    (os.path.getsize(d["file_path"]) / (1024 * 1024), d["doc_id"]),
+                )
+        conn.commit()
+    finally:
+        conn.close()
+
+    progress(0.1, f"descrevendo {len(documents)} imagens")
+    vision: dict = {}
+    descriptions = describe_images([d["file_path"] for d in documents], tenant_id=tenant_id, report=vision)
+    chunks_total = 0
+    for n, (d, text) in enumerate(zip(documents, descriptions), start=1):
+        chunks_total += store_chunks(tenant_id, d["doc_id"], chunk_document(text), replace_existing=True)["chunks"]
+        set_document_status(d["doc_id"], "completed")
+        progress(0.1 + 0.9 * n / len(documents), f"{n}/{len(documents)} imagens gravadas")
+    return {"documents": len(documents), "chunks": chunks_total, "vision": vision}
+
+
+def discard_replacement(file_path: str) -> None:
+    """Remove o arquivo de uma substituição que falhou definitivamente."""
+    if file_path and os.path.isfile(file_path):
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+
+
+def crawl_document(doc_id: str, tenant_id: str, progress: Optional[ProgressCallback] = None, **options) -> dict:
+    """Crawl/refresh de um site (ver url_ingest.crawl_document)."""
+    from .url_ingest import crawl_document as run_crawl
+    return run_crawl(doc_id, tenant_id, progress=progress, **options)
+
+
+# Handlers por tipo de job. Chamados como handler(doc_id, tenant_id=..., progress=..., **payload)
+JOB_HANDLERS: dict[str, Callable[..., dict]] = {
+    "process": process_document,
+    "replace": replace_document,
+    "crawl": crawl_document,
+    "images": process_images,
+}
+
+
+def run_handler(kind: str, doc_id: str, tenant_id: str, payload: dict, progress: Optional[ProgressCallback] = None) -> dict:
+    """Executa o handler do tipo de job com o payload enfileirado."""
+    handler = JOB_HANDLERS.get(kind)
+    if handler is None:
+        raise ValueError(f"Tipo de job desconhecido: {kind}")
+    return handler(doc_id, tenant_id=tenant_id, progress=progress, **payload)
+
+
+def handle_final_failure(kind: str, doc_id: Optional[str], payload: dict) -> None:
+    """
+    Falha definitiva (sem mais tentativas): substituição descarta o arquivo novo e refresh de site
+    mantém a versão anterior; nos demais casos o documento fica 'failed'.
+    """
+    if kind == "replace":
+        discard_replacement(payload.get("file_path"))
+    elif kind == "crawl" and payload.get("refresh"):
+        return
+    elif kind == "images":
+        for d in payload.get("documents") or []:
+            try:
+                set_document_status(d["doc_id"], "failed")
+            except Exception:
+                pass
+    elif doc_id:
+        try:
+            set_document_status(doc_id, "failed")
+        except Exception:
+            pass
+
+
+def run_job(job: dict) -> bool:
+    """
+    Executa um job reservado da fila (ver job_queue.claim_job) e registra o resultado.
+    Em falha definitiva aplica handle_final_failure. Retorna True se o job concluiu.
+    """
+    import logging
+
+    from . import job_queue
+
+    logger = logging.getLogger(__name__)
+    payload = job["payload"]
+
+    def progress(fraction: float, message: str) -> None:
+        try:
+            job_queue.update_progress(job["id"], fraction, message)
+        except Exception:
+            pass
+
+    from .usage_tracker import tracked_usage
+
+    try:
+        # Tokens de embeddings/Vision do job vão para tenant_usage (event_type document_job)
+        with tracked_usage("document_job", job["tenant_id"]):
+            job_queue.restore_job_files(job["id"])
+            result = run_handler(job["kind"], job["document_id"], job["tenant_id"], payload, progress=progress)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        will_retry = job_queue.fail_job(job["id"], job["attempts"], job["max_attempts"], error)
+        logger.warning(
+            "document_job_failed",
+            extra={"job_id": job["id"], "kind": job["kind"], "attempt": job["attempts"], "retry": will_retry, "error": error},
+        )
+        if not will_retry:
+            handle_final_failure(job["kind"], job["document_id"], payload)
+        return False
+    job_queue.complete_job(job["id"], result)
+    logger.info("document_job_completed", extra={"job_id": job["id"], "kind": job["kind"], "tenant_id": job["tenant_id"]})
+    return True
@@ -141,10 +141,10 @@ def _download_file_content(service, file_id: str, mime_type: str) -> str:
 def load_folder_content(folder_id: str | None = None, use_cache: bool = True) -> str:
     """
     Carrega todo o texto da pasta (concatenação dos arquivos).
-    Opcionalmente usa cache em .tmp/drive_cache.txt para evitar chamadas repetidas.
+    Opcionalmente usa cache em .tmp/drive_cache_{folder_id}.txt (um por pasta) para evitar chamadas repetidas.
     """
     folder_id = folder_id or get_folder_id()
-    cache_path = _project_root() / ".tmp" / "drive_cache.txt"
+    cache_path = _project_root() / ".tmp" / f"drive_cache_{re.sub(r'[^A-Za-z0-9_-]', '_', folder_id)}.txt"
     if use_cache and cache_path.exists():
         return cache_path.read_text(encoding="utf-8", errors="replace")
 
@@ -299,14 +299,15 @@ def get_filter_images_from_drive(
         return []
 
 
-def search(query: str, state: str | None = None) -> str:
+def search(query: str, state: str | None = None, folder_id: str | None = None) -> str:
     """
     API principal para o orquestrador: busca no Drive e retorna contexto para o LLM.
     state pode ser usado para enriquecer a query (ex.: em fechamento incluir "link pagamento").
+    folder_id: pasta do tenant; sem ele, DRIVE_FOLDER_ID.
     """
     if state == "fechamento":
         query = f"{query} link pagamento compra"
-    content = load_folder_content()
+    content = load_folder_content(folder_id)
     return search_chunks(query, full_content=content)
 
 
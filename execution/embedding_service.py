@@ -0,0 +1,287 @@
+"""
+Serviço de embeddings para ingestão e busca.
+Divide as entradas em lotes por número de tokens, executa N lotes em paralelo respeitando
+um orçamento de requisições/tokens por minuto (global e por tenant), refaz chamadas que
+falham com 429/5xx com backoff exponencial + jitter e mede a vazão (chunks/s).
+
+Variáveis de ambiente (todas opcionais; 0 = sem limite nos orçamentos):
+  OPENAI_EMBEDDING_MODEL         modelo (padrão text-embedding-3-small)
+  EMBEDDING_BATCH_MAX_TOKENS     tokens por requisição (padrão 20000)
+  EMBEDDING_CONCURRENCY          lotes simultâneos (padrão 4)
+  EMBEDDING_RPM / EMBEDDING_TPM  orçamento global por minuto (padrão 3000 / 1000000)
+  EMBEDDING_TENANT_RPM / EMBEDDING_TENANT_TPM  orçamento por tenant (padrão 1000 / 350000)
+  EMBEDDING_MAX_RETRIES          tentativas extras em 429/5xx (padrão 5)
+  EMBEDDING_RETRY_BASE_SECONDS   base do backoff (padrão 1.0)
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from .tokens import estimate_tokens
+from .usage_scope import add_usage
+
+logger = logging.getLogger(__name__)
+
+# Limite da API OpenAI de entradas por requisição de embeddings
+MAX_INPUTS_PER_REQUEST = 2048
+DEFAULT_MODEL = "text-embedding-3-small"
+
+RETRYABLE_STATUS = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+
+def _env_int(key: str, default: int) -> int:
+    raw = os.environ.get(key, "").strip()
+    if not raw:
+        return default
+    try:
+        return max(0, int(raw))
+    except ValueError:
+        return default
+
+
+def _env_float(key: str, default: float) -> float:
+    raw = os.environ.get(key, "").strip()
+    if not raw:
+        return default
+    try:
+        return max(0.0, float(raw))
+    except ValueError:
+        return default
+
+
+def embedding_model() -> str:
+    """Modelo de embeddings configurado (OPENAI_EMBEDDING_MODEL)."""
+    return os.environ.get("OPENAI_EMBEDDING_MODEL", "").strip() or DEFAULT_MODEL
+
+
+# --- Orçamento por minuto (janela deslizante de 60s) ---
+
+class _MinuteBudget:
+    """Janela deslizante de 60s com limite de requisições e de tokens (0 = sem limite)."""
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.events: deque = deque()  # (timestamp, tokens)
+        self.tokens_in_window = 0
+
+    def _prune(self, now: float) -> None:
+        while self.events and now - self.events[0][0] >= 60.0:
+            _, t = self.events.popleft()
+            self.tokens_in_window -= t
+
+    def wait_time(self, tokens: int, now: float) -> float:
+        """Segundos até caber uma requisição com `tokens`; 0 se já cabe."""
+        self._prune(now)
+        fits_requests = not self.rpm or len(self.events) < self.rpm
+        # Um lote maior que o TPM inteiro só passa com a janela vazia
+        fits_tokens = (
+            not self.tpm
+            or self.tokens_in_window + tokens <= self.tpm
+            or not self.events
+        )
+        if fits_requests and fits_tokens:
+            return 0.0
+        return max(0.05, 60.0 - (now - self.events[0][0]))
+
+    def consume(self, tokens: int, now: float) -> None:
+        self.events.append((now, tokens))
+        self.tokens_in_window += tokens
+
+
+_budget_lock = threading.Lock()
+_global_budget: Optional[_MinuteBudget] = None
+_tenant_budgets: dict[str, _MinuteBudget] = {}
+
+
+def _budgets_for(tenant_id: Optional[str]) -> list[_MinuteBudget]:
+    """Orçamentos aplicáveis (global + tenant). Chamar com _budget_lock adquirido."""
+    global _global_budget
+    rpm = _env_int("EMBEDDING_RPM", 3000)
+    tpm = _env_int("EMBEDDING_TPM", 1_000_000)
+    if _global_budget is None:
+        _global_budget = _MinuteBudget(rpm, tpm)
+    _global_budget.rpm, _global_budget.tpm = rpm, tpm
+    budgets = [_global_budget]
+    if tenant_id:
+        t_rpm = _env_int("EMBEDDING_TENANT_RPM", 1000)
+        t_tpm = _env_int("EMBEDDING_TENANT_TPM", 350_000)
+        budget = _tenant_budgets.get(tenant_id)
+        if budget is None:
+            budget = _tenant_budgets[tenant_id] = _MinuteBudget(t_rpm, t_tpm)
+        budget.rpm, budget.tpm = t_rpm, t_tpm
+        budgets.append(budget)
+    return budgets
+
+
+def _acquire(tenant_id: Optional[str], tokens: int) -> float:
+    """Bloqueia até o lote caber em todos os orçamentos; retorna segundos esperados."""
+    waited = 0.0
+    while True:
+        with _budget_lock:
+            now = time.monotonic()
+            budgets = _budgets_for(tenant_id)
+            wait = max(b.wait_time(tokens, now) for b in budgets)
+            if wait <= 0:
+                for b in budgets:
+                    b.consume(tokens, now)
+                return waited
+        time.sleep(wait)
+        waited += wait
+
+
+# --- Lotes ---
+
+def split_batches(texts: List[str], max_tokens: int, max_inputs: int = MAX_INPUTS_PER_REQUEST) -> List[List[int]]:
+    """
+    Agrupa índices de `texts` em lotes com no máximo `max_tokens` tokens e `max_inputs` entradas.
+    Um texto maior que max_tokens vai sozinho no seu lote. Mantém a ordem original.
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+        n = estimate_tokens(text)
+        if current and (current_tokens + n > max_tokens or len(current) >= max_inputs):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += n
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _status_of(exc: Exception) -> Optional[int]:
+    """Status HTTP de um erro do SDK OpenAI (None para erro de conexão/timeout)."""
+    return getattr(exc, "status_code", None)
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    raw = headers.get("retry-after") if hasattr(headers, "get") else None
+    try:
+        return float(raw) if raw else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_retryable(exc: Exception) -> bool:
+    try:
+        import openai
+        if isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError)):
+            return True
+    except ImportError:
+        pass
+    status = _status_of(exc)
+    return status is not None and status in RETRYABLE_STATUS
+
+
+def _get_client():
+    api_key = os.environ.get("OPENAI_API_KEY", "").strip()
+    if not api_key:
+        raise ValueError(
+            "OPENAI_API_KEY não configurado. Defina no .env para usar a base de conhecimento."
+        )
+    from .http_clients import openai_client
+    # Retries feitos aqui (com orçamento e jitter), não no SDK
+    return openai_client(api_key, max_retries=0)
+
+
+def _embed_batch(client, model: str, inputs: List[str], tokens: int, tenant_id: Optional[str], max_retries: int, stats: dict, stats_lock: threading.Lock) -> List[List[float]]:
+    base = _env_float("EMBEDDING_RETRY_BASE_SECONDS", 1.0)
+    attempt = 0
+    while True:
+        waited = _acquire(tenant_id, tokens)
+        try:
+            out = client.embeddings.create(input=inputs, model=model)
+            data = sorted(out.data, key=lambda e: e.index)
+            with stats_lock:
+                stats["throttled_seconds"] += waited
+                usage = getattr(out, "usage", None)
+                stats["tokens"] += getattr(usage, "total_tokens", None) or tokens
+            return [e.embedding for e in data]
+        except Exception as e:
+            if attempt >= max_retries or not _is_retryable(e):
+                raise
+            delay = _retry_after(e)
+            if delay is None:
+                # Backoff exponencial com "full jitter"
+                delay = random.uniform(0, base * (2 ** attempt))
+            attempt += 1
+            with stats_lock:
+                stats["retries"] += 1
+                stats["throttled_seconds"] += waited
+            logger.warning(
+                "embedding_retry",
+                extra={"status": _status_of(e), "attempt": attempt, "delay": round(delay, 2), "tenant_id": tenant_id},
+            )
+            time.sleep(delay)
+
+
+def embed_texts(
+    texts: List[str],
+    tenant_id: Optional[str] = None,
+    model: Optional[str] = None,
+    stats: Optional[dict] = None,
+    max_retries: Optional[int] = None,
+) -> List[List[float]]:
+    """
+    Gera embeddings para `texts` (mesma ordem), em lotes paralelos com orçamento e retry.
+    tenant_id: aplica também o orçamento por tenant.
+    max_retries: sobrescreve EMBEDDING_MAX_RETRIES (ex.: 1 na busca, para não travar a conversa).
+    stats: se informado, é preenchido com chunks, batches, tokens, retries, elapsed_seconds,
+    throttled_seconds e chunks_per_second.
+    """
+    if stats is None:
+        stats = {}
+    stats.update({"chunks": len(texts), "batches": 0, "tokens": 0, "retries": 0,
+                  "elapsed_seconds": 0.0, "throttled_seconds": 0.0, "chunks_per_second": 0.0})
+    if not texts:
+        return []
+    model = model or embedding_model()
+    client = _get_client()
+    batches = split_batches(texts, max(1, _env_int("EMBEDDING_BATCH_MAX_TOKENS", 20_000)))
+    stats["batches"] = len(batches)
+    if max_retries is None:
+        max_retries = _env_int("EMBEDDING_MAX_RETRIES", 5)
+    stats_lock = threading.Lock()
+    started = time.monotonic()
+
+    def run(batch: List[int]) -> List[List[float]]:
+        inputs = [texts[i] for i in batch]
+        tokens = sum(estimate_tokens(t) for t in inputs)
+        return _embed_batch(client, model, inputs, tokens, tenant_id, max_retries, stats, stats_lock)
+
+    concurrency = max(1, min(_env_int("EMBEDDING_CONCURRENCY", 4), len(batches)))
+    results: List[Optional[List[float]]] = [None] * len(texts)
+    if concurrency == 1:
+        outputs = [run(b) for b in batches]
+    else:
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="embed")
+        try:
+            outputs = list(executor.map(run, batches))
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    for batch, vectors in zip(batches, outputs):
+        for i, vec in zip(batch, vectors):
+            results[i] = vec
+
+    elapsed = time.monotonic() - started
+    stats["elapsed_seconds"] = round(elapsed, 3)
+    stats["throttled_seconds"] = round(stats["throttled_seconds"], 3)
+    stats["chunks_per_second"] = round(len(texts) / elapsed, 2) if elapsed > 0 else float(len(texts))
+    add_usage("embedding", model, prompt_tokens=stats["tokens"], total_tokens=stats["tokens"])
+    if len(texts) > 1:
+        logger.info(
+            "embedding_throughput",
+            extra={"tenant_id": tenant_id, **stats},
+        )
+    return results  # type: ignore[return-value]
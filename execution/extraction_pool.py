@@ -0,0 +1,261 @@
+"""
+Extração de texto em processos separados para formatos pesados em CPU (PDF, Excel, Word, HTML).
+pypdf/openpyxl/BeautifulSoup são Python puro e seguram o GIL por segundos em arquivos grandes;
+rodando num processo filho, a extração não atrasa as conversas atendidas pelo mesmo processo.
+
+Cada arquivo roda num processo novo (contexto "spawn", seguro com threads) com limites próprios:
+tempo de parede, tempo de CPU e memória. Um semáforo limita quantas extrações rodam ao mesmo tempo.
+Planilhas (iter_spreadsheet_chunks): o filho grava os chunks num arquivo temporário (JSON por linha) e
+o slot é liberado assim que ele termina; o consumidor lê o arquivo linha a linha, sem segurar o slot
+enquanto gera embeddings.
+
+Variáveis de ambiente:
+  EXTRACTION_MAX_PROCESSES   extrações simultâneas em processo (padrão 2; 0 = extrair no próprio processo)
+  EXTRACTION_TIMEOUT_SECONDS tempo máximo por arquivo (padrão 300)
+  EXTRACTION_CPU_SECONDS     limite de CPU do processo filho (padrão 240; 0 = sem limite)
+  EXTRACTION_MEMORY_MB       limite de memória do processo filho (padrão 1024; 0 = sem limite)
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+# Formatos cuja extração é CPU pesada; os demais (.txt, .csv, .md) continuam inline
+HEAVY_EXTENSIONS = frozenset({".pdf", ".xlsx", ".xls", ".docx", ".html"})
+
+# Erros do filho que são re-levantados com o mesmo tipo no processo pai
+_PASSTHROUGH_ERRORS = {
+    "FileNotFoundError": FileNotFoundError,
+    "ValueError": ValueError,
+    "RuntimeError": RuntimeError,
+}
+
+
+class ExtractionLimitError(RuntimeError):
+    """Extração excedeu tempo, CPU ou memória do processo filho."""
+
+
+def _env_int(key: str, default: int) -> int:
+    try:
+        return max(0, int(os.environ.get(key, "").strip() or default))
+    except ValueError:
+        return default
+
+
+_slots_lock = threading.Lock()
+_slots: threading.BoundedSemaphore | None = None
+_slots_size = 0
+
+
+def _get_slots(size: int) -> threading.BoundedSemaphore:
+    global _slots, _slots_size
+    with _slots_lock:
+        if _slots is None or _slots_size != size:
+            _slots = threading.BoundedSemaphore(size)
+            _slots_size = size
+        return _slots
+
+
+def _apply_limits(cpu_seconds: int, memory_mb: int) -> None:
+    """Aplica RLIMIT_CPU / RLIMIT_AS no processo atual (somente Unix)."""
+    try:
+        import resource
+    except ImportError:
+        return
+    if cpu_seconds:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 5))
+    if memory_mb:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _child_extract(file_path: str, conn, cpu_seconds: int, memory_mb: int) -> None:
+    """Ponto de entrada do processo filho: extrai e envia ("ok", texto) ou ("error", tipo, mensagem)."""
+    try:
+        _apply_limits(cpu_seconds, memory_mb)
+        from execution.document_ingest_extended import _extract_text_from_file
+        conn.send(("ok", _extract_text_from_file(file_path)))
+    except MemoryError:
+        conn.send(("limit", "MemoryError", f"memória acima de {memory_mb} MB"))
+    except BaseException as e:
+        conn.send(("error", type(e).__name__, str(e)))
+    finally:
+        conn.close()
+
+
+def _child_spool_chunks(file_path: str, conn, cpu_seconds: int, memory_mb: int, spool_path: str) -> None:
+    """Processo filho de planilhas: grava os chunks em spool_path (um JSON por linha) e envia ("done", n)."""
+    try:
+        _apply_limits(cpu_seconds, memory_mb)
+        from execution.spreadsheet_ingest import iter_row_chunks
+        count = 0
+        with open(spool_path, "w", encoding="utf-8") as f:
+            for chunk in iter_row_chunks(file_path):
+                f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+                count += 1
+        conn.send(("done", count))
+    except MemoryError:
+        conn.send(("limit", "MemoryError", f"memória acima de {memory_mb} MB"))
+    except BaseException as e:
+        conn.send(("error", type(e).__name__, str(e)))
+    finally:
+        conn.close()
+
+
+def _spawn(target, file_path: str, cpu_seconds: int, memory_mb: int, *extra):
+    """
+    Inicia o processo filho (target(file_path, conexão, cpu, memória, *extra)). Retorna (processo, conexão)
+    ou None se o ambiente não permite processos.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    try:
+        parent_conn, child_conn = ctx.Pipe(duplex=False)
+        proc = ctx.Process(
+            target=target,
+            args=(file_path, child_conn, cpu_seconds, memory_mb, *extra),
+            name="doc-extract",
+            daemon=True,
+        )
+        proc.start()
+    except OSError as e:
+        logger.warning("extraction_process_unavailable", extra={"error": str(e)})
+        return None
+    child_conn.close()
+    return proc, parent_conn
+
+
+def _receive(proc, conn, timeout: int, file_path: str):
+    """Próxima mensagem do filho; ExtractionLimitError se estourar o tempo ou o filho morrer."""
+    if not conn.poll(timeout or None):
+        raise ExtractionLimitError(f"Extração excedeu {timeout}s: {Path(file_path).name}")
+    try:
+        return conn.recv()
+    except EOFError:
+        # Filho morreu sem responder (SIGXCPU/SIGKILL por limite de CPU, OOM)
+        proc.join(5)
+        raise ExtractionLimitError(
+            f"Processo de extração encerrado (código {proc.exitcode}) — limite de CPU/memória? {Path(file_path).name}"
+        ) from None
+
+
+def _stop(proc, conn) -> None:
+    conn.close()
+    if proc.is_alive():
+        proc.terminate()
+    proc.join(5)
+
+
+def _raise_child_error(message: tuple) -> None:
+    if message[0] == "limit":
+        raise ExtractionLimitError(f"Extração excedeu o limite: {message[2]}")
+    error_type = _PASSTHROUGH_ERRORS.get(message[1])
+    if error_type is not None:
+        raise error_type(message[2])
+    raise RuntimeError(f"{message[1]}: {message[2]}")
+
+
+def _limits() -> tuple[int, int, int]:
+    return (
+        _env_int("EXTRACTION_TIMEOUT_SECONDS", 300),
+        _env_int("EXTRACTION_CPU_SECONDS", 240),
+        _env_int("EXTRACTION_MEMORY_MB", 1024),
+    )
+
+
+def extract_text(file_path: str) -> str:
+    """
+    Extrai o texto do arquivo (mesmo contrato de document_ingest_extended._extract_text_from_file).
+    Formatos pesados rodam num processo filho com limites; os leves, no próprio processo.
+    """
+    from .document_ingest_extended import _extract_text_from_file
+
+    max_processes = _env_int("EXTRACTION_MAX_PROCESSES", 2)
+    if not max_processes or Path(file_path).suffix.lower() not in HEAVY_EXTENSIONS:
+        return _extract_text_from_file(file_path)
+    if not Path(file_path).exists():
+        raise FileNotFoundError(f"Arquivo não encontrado: {file_path}")
+
+    timeout, cpu_seconds, memory_mb = _limits()
+    slots = _get_slots(max_processes)
+    queued = time.monotonic()
+    with slots:
+        started = time.monotonic()
+        spawned = _spawn(_child_extract, file_path, cpu_seconds, memory_mb)
+        if spawned is None:
+            # Ambiente sem suporte a processos (ex.: serverless): extrai inline
+            return _extract_text_from_file(file_path)
+        proc, conn = spawned
+        try:
+            message = _receive(proc, conn, timeout, file_path)
+        finally:
+            _stop(proc, conn)
+    if message[0] != "ok":
+        _raise_child_error(message)
+    text = message[1]
+    logger.info(
+        "extraction_done",
+        extra={
+            "file": Path(file_path).name,
+            "queued_seconds": round(started - queued, 3),
+            "elapsed_seconds": round(time.monotonic() - started, 3),
+            "chars": len(text),
+        },
+    )
+    return text
+
+
+def _read_spool(spool_path: str) -> Iterator[dict]:
+    with open(spool_path, "r", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def iter_spreadsheet_chunks(file_path: str) -> Iterator[dict]:
+    """
+    Chunks de planilha (ver spreadsheet_ingest.iter_row_chunks) extraídos num processo filho, que os
+    grava num arquivo temporário (um JSON por linha). O slot de extração fica com o filho só até ele
+    terminar; depois os chunks são entregues lendo o arquivo linha a linha, então a memória continua
+    constante e o tempo que o consumidor leva (embeddings, gravação) não segura o slot nem conta no
+    tempo limite. CSV (fora de HEAVY_EXTENSIONS) é lido no próprio processo, como em extract_text.
+    """
+    from .spreadsheet_ingest import iter_row_chunks
+
+    max_processes = _env_int("EXTRACTION_MAX_PROCESSES", 2)
+    if not max_processes or Path(file_path).suffix.lower() not in HEAVY_EXTENSIONS:
+        yield from iter_row_chunks(file_path)
+        return
+    if not Path(file_path).exists():
+        raise FileNotFoundError(f"Arquivo não encontrado: {file_path}")
+
+    timeout, cpu_seconds, memory_mb = _limits()
+    fd, spool_path = tempfile.mkstemp(prefix="sheet-", suffix=".jsonl")
+    os.close(fd)
+    try:
+        with _get_slots(max_processes):
+            spawned = _spawn(_child_spool_chunks, file_path, cpu_seconds, memory_mb, spool_path)
+            if spawned is not None:
+                proc, conn = spawned
+                try:
+                    message = _receive(proc, conn, timeout, file_path)
+                    if message[0] != "done":
+                        _raise_child_error(message)
+                finally:
+                    _stop(proc, conn)
+        if spawned is None:
+            yield from iter_row_chunks(file_path)
+            return
+        # Slot liberado: o consumidor avança no próprio ritmo
+        yield from _read_spool(spool_path)
+    finally:
+        try:
+            os.remove(spool_path)
+        except OSError:
+            pass
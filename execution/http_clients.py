@@ -0,0 +1,166 @@
+"""
+Registro de clientes HTTP de longa duração para LLM, embeddings, STT, TTS e Vision.
+Um httpx.Client com keep-alive (HTTP/2 quando o pacote h2 está instalado) por base URL e um
+cliente OpenAI por (base URL, chave, retries) por processo: as chamadas reaproveitam conexões
+já abertas em vez de pagar DNS + TCP + TLS a cada turno. Thread-safe; após fork (workers do
+servidor) o processo filho cria os seus próprios clientes. As versões assíncronas
+(async_http_client, async_openai_client) seguem a mesma regra, com um pool por event loop.
+
+Variáveis de ambiente:
+  HTTP_CLIENT_TIMEOUT_SECONDS (padrão 60), HTTP_CLIENT_CONNECT_TIMEOUT_SECONDS (padrão 5),
+  HTTP_POOL_MAX_CONNECTIONS (padrão 20), HTTP_POOL_MAX_KEEPALIVE (padrão 10),
+  HTTP_POOL_KEEPALIVE_SECONDS (padrão 60), HTTP_CLIENT_HTTP2 (padrão 1; usa HTTP/2 se h2 existir).
+"""
+
+import atexit
+import os
+import threading
+import weakref
+from typing import Optional
+
+OPENAI_DEFAULT_BASE_URL = "https://api.openai.com/v1"
+
+_lock = threading.Lock()
+_pid = os.getpid()
+_http_clients: dict[str, object] = {}
+_openai_clients: dict[tuple, object] = {}
+# Clientes assíncronos ficam presos ao event loop em que foram criados
+_async_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def _env_float(key: str, default: float) -> float:
+    try:
+        return max(0.0, float(os.environ.get(key, "").strip() or default))
+    except ValueError:
+        return default
+
+
+def _http2_enabled() -> bool:
+    if os.environ.get("HTTP_CLIENT_HTTP2", "1").strip().lower() in ("0", "false", "no"):
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _reset_after_fork() -> None:
+    """Conexões herdadas do processo pai não podem ser usadas no filho. Chamar com _lock adquirido."""
+    global _pid
+    if os.getpid() != _pid:
+        _http_clients.clear()
+        _openai_clients.clear()
+        _async_clients.clear()
+        _pid = os.getpid()
+
+
+def _client_options() -> dict:
+    import httpx
+    timeout = httpx.Timeout(
+        _env_float("HTTP_CLIENT_TIMEOUT_SECONDS", 60),
+        connect=_env_float("HTTP_CLIENT_CONNECT_TIMEOUT_SECONDS", 5),
+    )
+    limits = httpx.Limits(
+        max_connections=int(_env_float("HTTP_POOL_MAX_CONNECTIONS", 20)) or None,
+        max_keepalive_connections=int(_env_float("HTTP_POOL_MAX_KEEPALIVE", 10)),
+        keepalive_expiry=_env_float("HTTP_POOL_KEEPALIVE_SECONDS", 60),
+    )
+    return {"timeout": timeout, "limits": limits, "http2": _http2_enabled()}
+
+
+def _new_http_client():
+    import httpx
+    return httpx.Client(**_client_options())
+
+
+def http_client(base_url: str = "") -> "httpx.Client":
+    """Cliente httpx compartilhado para o host da base_url (timeout por requisição via timeout=)."""
+    key = base_url.rstrip("/")
+    with _lock:
+        _reset_after_fork()
+        client = _http_clients.get(key)
+        if client is None or client.is_closed:
+            client = _http_clients[key] = _new_http_client()
+        return client
+
+
+def openai_client(api_key: str, base_url: Optional[str] = None, max_retries: Optional[int] = None) -> "OpenAI":
+    """
+    Cliente OpenAI (ou compatível, ex.: OpenRouter) reaproveitado entre chamadas, sobre o httpx
+    compartilhado da base_url. Sem base_url usa OPENAI_BASE_URL ou a API da OpenAI.
+    max_retries=None mantém o padrão do SDK.
+    """
+    from openai import OpenAI
+
+    base_url = (base_url or os.environ.get("OPENAI_BASE_URL", "").strip() or OPENAI_DEFAULT_BASE_URL).rstrip("/")
+    key = (base_url, api_key, max_retries)
+    with _lock:
+        _reset_after_fork()
+        client = _openai_clients.get(key)
+    if client is not None:
+        return client
+    kwargs = {"api_key": api_key, "base_url": base_url, "http_client": http_client(base_url)}
+    if max_retries is not None:
+        kwargs["max_retries"] = max_retries
+    client = OpenAI(**kwargs)
+    with _lock:
+        return _openai_clients.setdefault(key, client)
+
+
+def _loop_clients() -> dict:
+    """Clientes assíncronos do event loop corrente. Chamar com _lock adquirido."""
+    import asyncio
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.get(loop)
+    if clients is None:
+        clients = _async_clients[loop] = {"http": {}, "openai": {}}
+    return clients
+
+
+def async_http_client(base_url: str = "") -> "httpx.AsyncClient":
+    """httpx.AsyncClient compartilhado para a base_url no event loop corrente."""
+    import httpx
+    key = base_url.rstrip("/")
+    with _lock:
+        _reset_after_fork()
+        pool = _loop_clients()["http"]
+        client = pool.get(key)
+        if client is None or client.is_closed:
+            client = pool[key] = httpx.AsyncClient(**_client_options())
+        return client
+
+
+def async_openai_client(api_key: str, base_url: Optional[str] = None, max_retries: Optional[int] = None) -> "AsyncOpenAI":
+    """Como openai_client, mas AsyncOpenAI sobre o async_http_client do event loop corrente."""
+    from openai import AsyncOpenAI
+
+    base_url = (base_url or os.environ.get("OPENAI_BASE_URL", "").strip() or OPENAI_DEFAULT_BASE_URL).rstrip("/")
+    key = (base_url, api_key, max_retries)
+    http = async_http_client(base_url)
+    with _lock:
+        pool = _loop_clients()["openai"]
+        client = pool.get(key)
+        if client is None:
+            kwargs = {"api_key": api_key, "base_url": base_url, "http_client": http}
+            if max_retries is not None:
+                kwargs["max_retries"] = max_retries
+            client = pool[key] = AsyncOpenAI(**kwargs)
+        return client
+
+
+def close_all() -> None:
+    """Fecha todos os clientes (shutdown do processo)."""
+    with _lock:
+        clients = list(_http_clients.values())
+        _http_clients.clear()
+        _openai_clients.clear()
+        _async_clients.clear()
+    for client in clients:
+        try:
+            client.close()
+        except Exception:
+            pass
+
+
+atexit.register(close_all)
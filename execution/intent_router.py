@@ -0,0 +1,118 @@
+"""
+Primeiro estágio do roteamento do supervisor, sem LLM: similaridade de embeddings entre a
+mensagem e a descrição de cada agente (nome, nicho e persona).
+- A descrição de cada agente é embedada uma vez por processo (chave: tenant, agente, modelo e
+  hash da descrição; mudar a persona gera um novo embedding). O embedding da mensagem vem de
+  knowledge_rag.embed_query, o mesmo que a busca RAG do turno usa.
+- margem = melhor alternativa - agente atual (cosseno). Abaixo de -INTENT_ROUTER_MARGIN (0.05) o
+  agente atual fica; acima de +INTENT_ROUTER_MARGIN a conversa vai para a alternativa. Entre os
+  dois (ambíguo), ou se o embedding falhar, decide o supervisor LLM.
+- INTENT_ROUTER=0 desliga (tudo vai para o LLM). Com NumPy o cosseno é vetorizado; sem NumPy,
+  Python puro.
+Contadores do processo em stats(): decisões locais (LLM evitado) e escaladas.
+"""
+
+import hashlib
+import logging
+import math
+import os
+import threading
+from typing import Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_vectors: dict[tuple[str, str, str, str], list[float]] = {}
+_stats = {"stay": 0, "switch": 0, "escalated": 0}
+
+
+def enabled() -> bool:
+    return os.environ.get("INTENT_ROUTER", "1").strip().lower() not in ("0", "false", "no")
+
+
+def _margin() -> float:
+    try:
+        return float(os.environ.get("INTENT_ROUTER_MARGIN", "").strip() or 0.05)
+    except ValueError:
+        return 0.05
+
+
+def _normalize(vector: list[float]) -> list[float]:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+def _cosines(query: list[float], vectors: list[list[float]]) -> list[float]:
+    """Cosseno da consulta com cada vetor (os vetores já estão normalizados)."""
+    q = _normalize(query)
+    if np is not None:
+        return (np.asarray(vectors, dtype=np.float32) @ np.asarray(q, dtype=np.float32)).tolist()
+    return [sum(a * b for a, b in zip(q, v)) for v in vectors]
+
+
+def agent_vectors(tenant_id: str, agents: list[dict]) -> list[list[float]]:
+    """Embedding normalizado da descrição de cada agente ({id, description}); só os novos vão à API."""
+    from .embedding_service import embedding_model
+    from .knowledge_rag import _embed
+    model = embedding_model()
+    keys = [
+        (str(tenant_id), a["id"], model, hashlib.sha256(a["description"].encode("utf-8")).hexdigest())
+        for a in agents
+    ]
+    with _lock:
+        missing = [i for i, key in enumerate(keys) if key not in _vectors]
+    if missing:
+        embedded = _embed([agents[i]["description"] for i in missing], tenant_id=tenant_id, max_retries=1)
+        with _lock:
+            for i, vector in zip(missing, embedded):
+                _vectors[keys[i]] = _normalize(vector)
+    with _lock:
+        return [_vectors[key] for key in keys]
+
+
+def decide(tenant_id: str, user_message: str, current: dict, candidates: list[dict]) -> Optional[dict]:
+    """
+    Decisão local entre o agente atual e os candidatos ({id, description}):
+    {"target_agent_id", "reason", "margin"} ou None quando o caso é ambíguo (vai para o LLM).
+    """
+    if not enabled() or not candidates or not user_message.strip():
+        return None
+    decision = None
+    margin = None
+    try:
+        from .knowledge_rag import embed_query
+        vectors = agent_vectors(tenant_id, [current, *candidates])
+        scores = _cosines(embed_query(user_message, tenant_id=tenant_id), vectors)
+        best = max(range(1, len(scores)), key=lambda i: scores[i])
+        margin = scores[best] - scores[0]
+        if margin < -_margin():
+            decision = {"target_agent_id": current["id"], "reason": "Message matches the current agent (embedding similarity)"}
+        elif margin > _margin():
+            decision = {"target_agent_id": candidates[best - 1]["id"], "reason": "Message matches another agent (embedding similarity)"}
+    except Exception as e:
+        logger.warning("intent_router_failed", extra={"tenant_id": tenant_id, "error": str(e)})
+    outcome = "escalated" if decision is None else ("stay" if decision["target_agent_id"] == current["id"] else "switch")
+    with _lock:
+        _stats[outcome] += 1
+    logger.info("intent_router", extra={
+        "tenant_id": tenant_id, "agent_id": current["id"], "outcome": outcome,
+        "margin": round(margin, 4) if margin is not None else None,
+    })
+    if decision:
+        decision["margin"] = round(margin, 4)
+    return decision
+
+
+def stats() -> dict:
+    """Contadores do processo: decisões locais (stay/switch), escaladas ao LLM e taxa de LLM evitado."""
+    with _lock:
+        s = dict(_stats)
+    total = s["stay"] + s["switch"] + s["escalated"]
+    s["llm_avoided"] = s["stay"] + s["switch"]
+    s["avoided_rate"] = round(s["llm_avoided"] / total, 4) if total else 0.0
+    return s
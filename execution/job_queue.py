@@ -0,0 +1,452 @@
+"""
+Fila durável de jobs de documentos em Postgres (tabela document_jobs, SELECT ... FOR UPDATE SKIP LOCKED).
+O platform_backend enfileira; o worker (run_document_worker.py) consome com concorrência configurável,
+retry com backoff e justiça entre tenants (o tenant com menos jobs em execução é atendido primeiro).
+Jobs sobrevivem a restart/redeploy: jobs 'running' sem heartbeat voltam para 'pending' (e o documento,
+de 'processing' para 'pending'). Enquanto o job roda, uma thread do worker renova locked_at (keep_alive).
+Arquivos enviados: com DOCUMENT_JOB_SHARED_UPLOADS=1 (API e worker montam o mesmo diretório de
+uploads) o job guarda só o caminho. Sem isso, vão junto do job como large objects do Postgres
+(document_job_files.content_oid), gravados e lidos em blocos de JOB_FILE_CHUNK_BYTES: nem a API nem o
+worker carregam o arquivo inteiro em memória. O worker os recria no disco antes de processar
+(restore_job_files); os large objects são apagados (lo_unlink) quando o job termina ou falha de vez.
+
+Variáveis de ambiente:
+  DOCUMENT_JOBS_ENABLED=1            platform_backend enfileira em vez de usar BackgroundTasks
+  DOCUMENT_JOB_MAX_ATTEMPTS          tentativas por job (padrão 3)
+  DOCUMENT_JOB_RETRY_BASE_SECONDS    base do backoff exponencial (padrão 30)
+  DOCUMENT_JOB_TENANT_MAX_RUNNING    jobs simultâneos por tenant (padrão 2)
+  DOCUMENT_JOB_STALE_SECONDS         sem heartbeat por este tempo = worker morreu (padrão 900)
+  DOCUMENT_JOB_HEARTBEAT_SECONDS     intervalo do heartbeat do job em execução (padrão 60)
+  DOCUMENT_JOB_SHARED_UPLOADS=1      uploads em armazenamento compartilhado: o arquivo não passa pelo banco
+"""
+
+import json
+import os
+import random
+import threading
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+# Bloco de leitura/escrita dos arquivos do job (large objects)
+JOB_FILE_CHUNK_BYTES = 1024 * 1024
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS document_jobs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    tenant_id UUID NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+    document_id UUID REFERENCES documents(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    payload JSONB NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'running', 'completed', 'failed')),
+    attempts INT NOT NULL DEFAULT 0,
+    max_attempts INT NOT NULL DEFAULT 3,
+    run_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    locked_at TIMESTAMPTZ,
+    locked_by TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    progress_message TEXT,
+    last_error TEXT,
+    result JSONB,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS idx_document_jobs_pending ON document_jobs (run_at) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_document_jobs_running ON document_jobs (tenant_id) WHERE status = 'running';
+CREATE INDEX IF NOT EXISTS idx_document_jobs_document ON document_jobs (document_id, created_at DESC);
+ALTER TABLE document_jobs ADD COLUMN IF NOT EXISTS document_ids UUID[] NOT NULL DEFAULT '{}';
+UPDATE document_jobs SET document_ids = ARRAY[document_id] WHERE document_id IS NOT NULL AND document_ids = '{}';
+CREATE INDEX IF NOT EXISTS idx_document_jobs_document_ids ON document_jobs USING GIN (document_ids);
+CREATE TABLE IF NOT EXISTS document_job_files (
+    job_id UUID NOT NULL REFERENCES document_jobs(id) ON DELETE CASCADE,
+    file_path TEXT NOT NULL,
+    content_oid OID NOT NULL,
+    PRIMARY KEY (job_id, file_path)
+)
+"""
+
+
+def _env_int(key: str, default: int) -> int:
+    try:
+        return max(0, int(os.environ.get(key, "").strip() or default))
+    except ValueError:
+        return default
+
+
+def shared_uploads() -> bool:
+    """True se API e worker enxergam o mesmo diretório de uploads (DOCUMENT_JOB_SHARED_UPLOADS=1)."""
+    return os.environ.get("DOCUMENT_JOB_SHARED_UPLOADS", "").strip().lower() in ("1", "true", "yes")
+
+
+def jobs_enabled() -> bool:
+    """True se o platform_backend deve usar a fila (DOCUMENT_JOBS_ENABLED=1)."""
+    return os.environ.get("DOCUMENT_JOBS_ENABLED", "").strip().lower() in ("1", "true", "yes")
+
+
+def _get_connection():
+    import psycopg2
+    from psycopg2.extras import RealDictCursor
+    url = (
+        os.environ.get("PLATFORM_DATABASE_URL", "").strip()
+        or os.environ.get("DATABASE_URL", "").strip()
+    )
+    if not url:
+        raise ValueError("DATABASE_URL ou PLATFORM_DATABASE_URL não configurado")
+    if "supabase.com" in url and "?" not in url:
+        url = url + "?sslmode=require"
+    return psycopg2.connect(url, cursor_factory=RealDictCursor)
+
+
+_schema_checked = False
+
+
+def ensure_jobs_table() -> None:
+    """Cria document_jobs se não existir (uma vez por processo)."""
+    global _schema_checked
+    if _schema_checked:
+        return
+    conn = _get_connection()
+    try:
+        with conn.cursor() as cur:
+            for stmt in SCHEMA_SQL.split(";"):
+                if stmt.strip():
+                    cur.execute(stmt)
+        conn.commit()
+        _schema_checked = True
+    finally:
+        conn.close()
+
+
+def payload_files(payload: dict) -> list[str]:
+    """Arquivos locais que o handler lê (file_path do job e de cada documento de um lote)."""
+    paths = [payload.get("file_path"), *(d.get("file_path") for d in payload.get("documents") or [])]
+    return list(dict.fromkeys(p for p in paths if p))
+
+
+def payload_documents(document_id: Optional[str], payload: dict) -> list[str]:
+    """Documentos do job: o document_id e cada documento de um lote (job "images")."""
+    ids = [document_id, *(d.get("doc_id") for d in payload.get("documents") or [])]
+    return list(dict.fromkeys(str(i) for i in ids if i))
+
+
+def _store_file(conn, path: str) -> int:
+    """Copia o arquivo para um large object, em blocos. Retorna o oid."""
+    lob = conn.lobject(0, "wb")
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(JOB_FILE_CHUNK_BYTES), b""):
+                lob.write(block)
+        return lob.oid
+    finally:
+        lob.close()
+
+
+def _delete_job_files(cur, job_id: str) -> None:
+    """Apaga os arquivos do job (large objects e linhas)."""
+    cur.execute("SELECT lo_unlink(content_oid) FROM document_job_files WHERE job_id = %s", (job_id,))
+    cur.execute("DELETE FROM document_job_files WHERE job_id = %s", (job_id,))
+
+
+def enqueue_job(tenant_id: str, document_id: Optional[str], kind: str, payload: dict, max_attempts: Optional[int] = None) -> str:
+    """
+    Enfileira um job e retorna seu id. Sem uploads compartilhados, os arquivos do payload vão junto
+    (large objects, em blocos).
+    """
+    ensure_jobs_table()
+    if max_attempts is None:
+        max_attempts = max(1, _env_int("DOCUMENT_JOB_MAX_ATTEMPTS", 3))
+    conn = _get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """INSERT INTO document_jobs (tenant_id, document_id, document_ids, kind, payload, max_attempts)
+                   VALUES (%s, %s, %s::uuid[], %s, %s, %s) RETURNING id""",
+                (tenant_id, document_id, payload_documents(document_id, payload), kind, json.dumps(payload), max_attempts),
+            )
+            job_id = str(cur.fetchone()["id"])
+            for path in [] if shared_uploads() else payload_files(payload):
+                cur.execute(
+                    "INSERT INTO document_job_files (job_id, file_path, content_oid) VALUES (%s, %s, %s)",
+                    (job_id, path, _store_file(conn, path)),
+                )
+        conn.commit()
+        return job_id
+    finally:
+        conn.close()
+
+
+def claim_job(worker_id: str) -> Optional[dict[str, Any]]:
+    """
+    Reserva o próximo job pronto (status pending, run_at vencido) com SKIP LOCKED.
+    Justiça entre tenants: prioriza tenants com menos jobs em execução e respeita
+    DOCUMENT_JOB_TENANT_MAX_RUNNING; dentro disso, o mais antigo primeiro.
+    """
+    tenant_max = max(1, _env_int("DOCUMENT_JOB_TENANT_MAX_RUNNING", 2))
+    conn = _get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                WITH running AS (
+                    SELECT tenant_id, COUNT(*) AS c FROM document_jobs
+                    WHERE status = 'running' GROUP BY tenant_id
+                )
+                SELECT j.id FROM document_jobs j
+                LEFT JOIN running r ON r.tenant_id = j.tenant_id
+                WHERE j.status = 'pending' AND j.run_at <= NOW() AND COALESCE(r.c, 0) < %s
+                ORDER BY COALESCE(r.c, 0), j.run_at
+                LIMIT 1
+                FOR UPDATE OF j SKIP LOCKED
+                """,
+                (tenant_max,),
+            )
+            row = cur.fetchone()
+            if not row:
+                conn.commit()
+                return None
+            cur.execute(
+                """UPDATE document_jobs
+                   SET status = 'running', attempts = attempts + 1, locked_at = NOW(), locked_by = %s,
+                       progress = 0, progress_message = NULL, updated_at = NOW()
+                   WHERE id = %s
+                   RETURNING id, tenant_id, document_id, kind, payload, attempts, max_attempts""",
+                (worker_id, row["id"]),
+            )
+            job = cur.fetchone()
+        conn.commit()
+    finally:
+        conn.close()
+    payload = job["payload"]
+    return {
+        "id": str(job["id"]),
+        "tenant_id": str(job["tenant_id"]),
+        "document_id": str(job["document_id"]) if job["document_id"] else None,
+        "kind": job["kind"],
+        "payload": payload if isinstance(payload, dict) else json.loads(payload or "{}"),
+        "attempts": job["attempts"],
+        "max_attempts": job["max_attempts"],
+    }
+
+
+def restore_job_files(job_id: str) -> int:
+    """
+    Recria no disco do worker os arquivos do job que não estão lá (lidos do large object em blocos).
+    Retorna quantos foram gravados.
+    """
+    written = 0
+    conn = _get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT file_path, content_oid FROM document_job_files WHERE job_id = %s", (job_id,))
+            rows = cur.fetchall()
+        for row in rows:
+            path = row["file_path"]
+            if os.path.isfile(path):
+                continue
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            tmp_path = f"{path}.part"
+            lob = conn.lobject(row["content_oid"], "rb")
+            try:
+                with open(tmp_path, "wb") as f:
+                    for block in iter(lambda: lob.read(JOB_FILE_CHUNK_BYTES), b""):
+                        f.write(block)
+            finally:
+                lob.close()
+            os.replace(tmp_path, path)
+            written += 1
+        conn.commit()
+    finally:
+        conn.close()
+    return written
+
+
+def heartbeat(job_id: str, worker_id: str) -> None:
+    """Renova locked_at do job enquanto este worker ainda é o dono."""
+    conn = _get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE document_jobs SET locked_at = NOW() WHERE id = %s AND status = 'running' AND locked_by = %s",
+                (job_id, worker_id),
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@contextmanager
+def keep_alive(job_id: str, worker_id: str, interval: Optional[float] = None) -> Iterator[None]:
+    """
+    Thread de heartbeat durante a execução do job (a cada DOCUMENT_JOB_HEARTBEAT_SECONDS), para que
+    uma etapa longa sem progresso (ex.: um PDF grande) não faça o job voltar para a fila.
+    """
+    if interval is None:
+        interval = max(1, _env_int("DOCUMENT_JOB_HEARTBEAT_SECONDS", 60))
+    stop = threading.Event()
+
+    def beat() -> None:
+        while not stop.wait(interval):
+            try:
+                heartbeat(job_id, worker_id)
+            except Exception:
+                pass
+
+    thread = threading.Thread(target=beat, name=f"job-heartbeat-{job_id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def update_progress(job_id: str, progress: float, message: str = "") -> None:
+    """Grava progresso do job (também serve de heartbeat para não ser considerado travado)."""
+    conn = _get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """UPDATE document_jobs SET progress = %s, progress_message = %s, locked_at = NOW(), updated_at = NOW()
+                   WHERE id = %s AND status = 'running'""",
+                (max(0.0, min(1.0, progress)), message or None, job_id),
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def complete_job(job_id: str, result: Optional[dict] = None) -> None:
+    conn = _get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """UPDATE document_jobs
+                   SET status = 'completed', progress = 1, result = %s, last_error = NULL,
+                       locked_at = NULL, locked_by = NULL, updated_at = NOW()
+                   WHERE id = %s""",
+                (json.dumps(result or {}, default=str), job_id),
+            )
+            _delete_job_files(cur, job_id)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def retry_delay_seconds(attempts: int) -> float:
+    """Backoff exponencial com jitter: base * 2^(tentativas-1) ± 20%, máximo 1h."""
+    base = _env_int("DOCUMENT_JOB_RETRY_BASE_SECONDS", 30)
+    delay = min(3600.0, base * (2 ** max(0, attempts - 1)))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def fail_job(job_id: str, attempts: int, max_attempts: int, error: str) -> bool:
+    """
+    Registra falha. Se ainda houver tentativas, reagenda com backoff (status pending, documentos
+    do job de volta a 'pending') e retorna True; senão marca como failed e retorna False.
+    """
+    will_retry = attempts < max_attempts
+    conn = _get_connection()
+    try:
+        with conn.cursor() as cur:
+            if will_retry:
+                cur.execute(
+                    """UPDATE document_jobs
+                       SET status = 'pending', run_at = NOW() + make_interval(secs => %s), last_error = %s,
+                           locked_at = NULL, locked_by = NULL, updated_at = NOW()
+                       WHERE id = %s""",
+                    (retry_delay_seconds(attempts), error[:2000], job_id),
+                )
+                cur.execute(
+                    """UPDATE documents SET status = 'pending'
+                       WHERE id IN (SELECT unnest(document_ids) FROM document_jobs WHERE id = %s) AND status = 'processing'""",
+                    (job_id,),
+                )
+            else:
+                cur.execute(
+                    """UPDATE document_jobs
+                       SET status = 'failed', last_error = %s, locked_at = NULL, locked_by = NULL, updated_at = NOW()
+                       WHERE id = %s""",
+                    (error[:2000], job_id),
+                )
+                _delete_job_files(cur, job_id)
+        conn.commit()
+    finally:
+        conn.close()
+    return will_retry
+
+
+def requeue_stale_jobs() -> int:
+    """
+    Devolve para 'pending' jobs 'running' sem heartbeat (worker morreu no meio). Os documentos do
+    job que ficaram em 'processing' voltam para 'pending' (ou 'failed', sem tentativas). Retorna
+    quantos jobs.
+    """
+    stale = max(60, _env_int("DOCUMENT_JOB_STALE_SECONDS", 900))
+    conn = _get_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                WITH requeued AS (
+                    UPDATE document_jobs
+                    SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END,
+                        last_error = COALESCE(last_error, 'worker interrompido'),
+                        locked_at = NULL, locked_by = NULL, updated_at = NOW()
+                    WHERE status = 'running' AND locked_at < NOW() - make_interval(secs => %s)
+                    RETURNING id, document_ids, status
+                ), documents_reset AS (
+                    UPDATE documents d
+                    SET status = CASE WHEN r.status = 'failed' THEN 'failed' ELSE 'pending' END
+                    FROM requeued r
+                    WHERE d.id = ANY(r.document_ids) AND d.status = 'processing'
+                ), files_dropped AS (
+                    DELETE FROM document_job_files f USING requeued r
+                    WHERE f.job_id = r.id AND r.status = 'failed'
+                    RETURNING f.content_oid
+                )
+                SELECT (SELECT COUNT(*) FROM requeued) AS count,
+                       (SELECT COUNT(lo_unlink(content_oid)) FROM files_dropped) AS files_dropped
+                """,
+                (stale,),
+            )
+            count = cur.fetchone()["count"]
+        conn.commit()
+        return count
+    finally:
+        conn.close()
+
+
+def get_latest_job(document_id: str) -> Optional[dict[str, Any]]:
+    """Último job do documento (para o endpoint de status) ou None. Vale para cada imagem de um lote."""
+    try:
+        conn = _get_connection()
+    except Exception:
+        return None
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """SELECT id, kind, status, attempts, max_attempts, progress, progress_message, last_error, result, run_at, updated_at
+                   FROM document_jobs WHERE document_ids @> ARRAY[%s]::uuid[] ORDER BY created_at DESC LIMIT 1""",
+                (document_id,),
+            )
+            row = cur.fetchone()
+    except Exception:
+        # Tabela ainda não criada (fila nunca usada)
+        return None
+    finally:
+        conn.close()
+    if not row:
+        return None
+    return {
+        "id": str(row["id"]),
+        "kind": row["kind"],
+        "status": row["status"],
+        "attempts": row["attempts"],
+        "max_attempts": row["max_attempts"],
+        "progress": float(row["progress"] or 0),
+        "progress_message": row["progress_message"],
+        "last_error": row["last_error"],
+        # Relatório do handler (chunks, embeddings reaproveitados, vision: chamadas evitadas...)
+        "result": row["result"],
+        "next_run_at": str(row["run_at"]) if row["status"] == "pending" else None,
+        "updated_at": str(row["updated_at"]) if row["updated_at"] else None,
+    }
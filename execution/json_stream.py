@@ -0,0 +1,116 @@
+"""
+Leitura incremental de um campo string de um JSON que ainda está sendo gerado pelo LLM.
+O modelo responde {"resposta_texto": "...", "enviar_audio": ..., ...} em pedaços (stream);
+StreamingFieldExtractor recebe os pedaços e devolve o texto do campo decodificado até o momento
+(escapes JSON incluídos, mesmo quando cortados entre dois pedaços). Os demais campos são lidos
+do JSON completo no final (extract_object).
+
+Para modelos sem saída estruturada (json_schema), extract_object acha o primeiro objeto JSON
+válido no texto livre e salvage_field recupera o texto do campo mesmo de um JSON truncado.
+"""
+
+import json
+import re
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class StreamingFieldExtractor:
+    """
+    feed(chunk) -> texto decodificado do campo até agora (str) ou None se ainda não começou.
+    done indica que a string do campo já foi fechada.
+    """
+
+    def __init__(self, field: str = "resposta_texto"):
+        self._key = re.compile(r'"' + re.escape(field) + r'"\s*:\s*"')
+        self._buffer = ""
+        self._pos = -1  # início do valor no buffer (-1 = chave ainda não vista)
+        self._parts: list[str] = []
+        self.done = False
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def feed(self, chunk: str) -> str | None:
+        self._buffer += chunk
+        if self._pos < 0:
+            m = self._key.search(self._buffer)
+            if not m:
+                return None
+            self._pos = m.end()
+        if not self.done:
+            self._consume()
+        return self.text
+
+    def _consume(self) -> None:
+        buf, i = self._buffer, self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if ch == '"':
+                self.done = True
+                i += 1
+                break
+            if ch != "\\":
+                j = i
+                while j < len(buf) and buf[j] not in '"\\':
+                    j += 1
+                self._parts.append(buf[i:j])
+                i = j
+                continue
+            # Escape: só consome quando completo (pode estar cortado no fim do pedaço)
+            if i + 1 >= len(buf):
+                break
+            code = buf[i + 1]
+            if code == "u":
+                if i + 6 > len(buf):
+                    break
+                value, size = self._unicode(buf, i)
+                if value is None:
+                    break
+                self._parts.append(value)
+                i += size
+                continue
+            self._parts.append(_ESCAPES.get(code, code))
+            i += 2
+        self._pos = i
+
+    @staticmethod
+    def _unicode(buf: str, i: int) -> tuple[str | None, int]:
+        """\\uXXXX, incluindo pares substitutos (\\ud83d\\ude00). (None, 0) = precisa de mais dados."""
+        high = int(buf[i + 2:i + 6], 16)
+        if 0xD800 <= high <= 0xDBFF:
+            if i + 12 > len(buf):
+                return None, 0
+            try:
+                return json.loads('"' + buf[i:i + 12] + '"'), 12
+            except ValueError:
+                return chr(high), 6
+        return chr(high), 6
+
+
+_DECODER = json.JSONDecoder()
+
+
+def extract_object(text: str) -> dict:
+    """
+    Primeiro objeto JSON válido no texto (com ```json, texto antes/depois ou chaves dentro de
+    strings). ValueError se não houver nenhum.
+    """
+    start = text.find("{")
+    while start != -1:
+        try:
+            value, _ = _DECODER.raw_decode(text, start)
+        except ValueError:
+            start = text.find("{", start + 1)
+            continue
+        if isinstance(value, dict):
+            return value
+        start = text.find("{", start + 1)
+    raise ValueError("Nenhum JSON encontrado na resposta do LLM")
+
+
+def salvage_field(text: str, field: str = "resposta_texto") -> str | None:
+    """Texto do campo lido incrementalmente (serve para JSON incompleto); None se o campo não aparece."""
+    extractor = StreamingFieldExtractor(field)
+    return extractor.feed(text)
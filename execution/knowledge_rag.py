@@ -6,6 +6,8 @@ Requer: OPENAI_API_KEY, tabela document_chunks com vector(1536).
 
 import json
 import os
+import threading
+from collections import OrderedDict
 from typing import List, Optional
 
 
@@ -24,47 +26,74 @@ def _get_connection():
     return psycopg2.connect(url, cursor_factory=RealDictCursor)
 
 
-def _embed(texts: List[str]) -> List[List[float]]:
-    """Gera embeddings via OpenAI (text-embedding-3-small, 1536 dims)."""
-    api_key = os.environ.get("OPENAI_API_KEY", "").strip()
-    if not api_key:
-        raise ValueError(
-            "OPENAI_API_KEY não configurado. Defina no .env para usar a base de conhecimento."
-        )
+def _embed(
+    texts: List[str],
+    tenant_id: Optional[str] = None,
+    stats: Optional[dict] = None,
+    max_retries: Optional[int] = None,
+) -> List[List[float]]:
+    """Gera embeddings via OpenAI (text-embedding-3-small, 1536 dims) pelo embedding_service (lotes, orçamento, retry)."""
+    from .embedding_service import embed_texts
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=api_key)
-        model = os.environ.get("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
-        out = client.embeddings.create(input=texts, model=model)
-        return [e.embedding for e in out.data]
+        return embed_texts(texts, tenant_id=tenant_id, stats=stats, max_retries=max_retries)
+    except ValueError:
+        raise
     except Exception as e:
         raise RuntimeError(f"Erro ao gerar embeddings: {e}") from e
 
 
+_QUERY_EMBEDDINGS_MAX = 256
+_query_embeddings: "OrderedDict[tuple[str, str], List[float]]" = OrderedDict()
+_query_embeddings_lock = threading.Lock()
+
+
+def embed_query(query: str, tenant_id: Optional[str] = None) -> List[float]:
+    """
+    Embedding de uma consulta, memorizado por (modelo, texto): a busca RAG e o cache de respostas
+    (response_cache) do mesmo turno pagam uma chamada só.
+    """
+    from .embedding_service import embedding_model
+    key = (embedding_model(), query.strip())
+    with _query_embeddings_lock:
+        if key in _query_embeddings:
+            _query_embeddings.move_to_end(key)
+            return _query_embeddings[key]
+    vector = _embed([key[1]], tenant_id=tenant_id, max_retries=1)[0]
+    with _query_embeddings_lock:
+        _query_embeddings[key] = vector
+        while len(_query_embeddings) > _QUERY_EMBEDDINGS_MAX:
+            _query_embeddings.popitem(last=False)
+    return vector
+
+
 def search_document_chunks(
     tenant_id: str,
     query: str,
     limit: int = 6,
     embedding_namespace: Optional[str] = None,
+    report: Optional[dict] = None,
 ) -> str:
     """
     Busca na base de conhecimento do tenant.
     Se embedding_namespace for informado, usa apenas documentos desse namespace (por agente).
-    Retorna um único texto com os trechos mais relevantes para o LLM.
+    Retorna um único texto com os trechos mais relevantes para o LLM. Quando a busca falha, o texto
+    é um aviso para o LLM e report["error"] recebe o motivo.
     """
     if not query or not query.strip():
         return ""
+    report = report if report is not None else {}
     api_key = os.environ.get("OPENAI_API_KEY", "").strip()
     if not api_key:
+        report["error"] = "OPENAI_API_KEY não definida"
         return (
             "CONTEXTO: A base de conhecimento está configurada mas OPENAI_API_KEY não foi definida. "
             "Não invente dados; diga que vai verificar."
         )
     try:
-        embeddings = _embed([query.strip()])
-        query_embedding = embeddings[0]
+        query_embedding = embed_query(query, tenant_id=tenant_id)
         vec_str = "[" + ",".join(str(x) for x in query_embedding) + "]"
     except Exception as e:
+        report["error"] = str(e)
         return f"CONTEXTO: Erro ao buscar na base de conhecimento ({e}). Não invente dados."
 
     rows = []
@@ -124,6 +153,7 @@ def search_document_chunks(
             except Exception:
                 pass
         if not rows:
+            report["error"] = str(e)
             return (
                 "CONTEXTO: Base de conhecimento indisponível no momento. "
                 "Não invente preços ou especificações."
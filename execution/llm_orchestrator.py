@@ -4,20 +4,34 @@ Carrega diretivas, monta prompt (system + user com estado, RAG e histórico), ch
 (API compatível com OpenAI), retorna resposta estruturada (texto, enviar_audio, próximo_estado, etc.).
 """
 
+import asyncio
 import json
+import logging
 import os
-import re
+import time
 from pathlib import Path
-from typing import Any
+from typing import Any, Awaitable, Callable
 
-from openai import OpenAI
+from openai import AsyncOpenAI, BadRequestError, OpenAI
 
+from .conversation_summary import fit_history, history_budget_tokens
+from .db_sessions import STATES
+from .http_clients import async_openai_client, openai_client
+from .json_stream import extract_object, salvage_field
+from .llm_usage import record_llm_usage, record_reply_parse
+from . import model_router
+from .prompt_templates import PromptTemplateCache, RenderedPrompt
 from .state_machine import get_state_display_name, apply_transition
 
 DIRECTIVES_DIR = Path(__file__).resolve().parent.parent / "directives"
 
 OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
 
+# Resposta quando nenhum modelo responde dentro do prazo (model_router.RouterDeadlineExceeded)
+FALLBACK_REPLY = "Desculpe, estou com uma instabilidade agora. Pode me mandar sua mensagem de novo em instantes?"
+
+logger = logging.getLogger(__name__)
+
 
 def _project_root() -> Path:
     return Path(__file__).resolve().parent.parent
@@ -27,27 +41,42 @@ def _get_client() -> OpenAI:
     key = os.environ.get("OPENROUTER_API_KEY", "").strip()
     if not key:
         raise ValueError("OPENROUTER_API_KEY não configurado no .env")
-    return OpenAI(
-        api_key=key,
-        base_url=OPENROUTER_BASE_URL,
-    )
+    return openai_client(key, base_url=OPENROUTER_BASE_URL)
+
+
+def _get_async_client() -> AsyncOpenAI:
+    key = os.environ.get("OPENROUTER_API_KEY", "").strip()
+    if not key:
+        raise ValueError("OPENROUTER_API_KEY não configurado no .env")
+    return async_openai_client(key, base_url=OPENROUTER_BASE_URL)
 
 
 def call_llm(messages: list[dict], model_override: str | None = None, temperature: float = 0.5, stream: bool = False) -> str:
-    """Helper genérico para chamar o LLM via OpenRouter."""
-    client = _get_client()
-    model = model_override or os.environ.get("OPENROUTER_MODEL", "openai/gpt-4o-mini")
-    
-    response = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        temperature=temperature,
-        stream=stream
-    )
-    
+    """
+    Helper genérico para chamar o LLM via OpenRouter. Sem stream passa pelo model_router
+    (modelo mais rápido entre OPENROUTER_MODEL e OPENROUTER_FALLBACK_MODELS, hedge e prazo).
+    """
     if stream:
-        return response # Retorna o generator
-    
+        model = model_override or model_router.default_model()
+        return _get_client().chat.completions.create(  # Retorna o generator
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            stream=True,
+        )
+    from .async_runtime import run_sync
+
+    client = _get_async_client()
+
+    async def create(model: str) -> tuple[Any, float]:
+        started = time.monotonic()
+        response = await client.chat.completions.create(model=model, messages=messages, temperature=temperature)
+        return response, (time.monotonic() - started) * 1000
+
+    model, (response, latency_ms) = run_sync(
+        model_router.complete(create, model_router.candidate_models(model_override=model_override))
+    )
+    record_llm_usage(response, model, latency_ms, purpose="call_llm")
     return response.choices[0].message.content or ""
 
 
@@ -60,190 +89,310 @@ _DIRECTIVES_WITH_FILTER_PRODUCT = frozenset({
 })
 
 
+# Ordem fixa de concatenação das diretivas
+_DIRECTIVE_ORDER = (
+    "sdr_personalidade.md",
+    "spin_selling.md",
+    "rag_regras.md",
+    "envio_imagens.md",
+    "fechamento.md",
+    "pos_venda.md",
+    "audio_regras.md",
+)
+
+# Templates do system prompt por (modo de persona, estado), invalidados por mtime de directives/
+_prompt_templates = PromptTemplateCache(DIRECTIVES_DIR)
+
+
+def _directive_names(skip_persona: bool = False, skip_spin_examples: bool = False, skip_product_directives: bool = False) -> list[str]:
+    names = []
+    for name in _DIRECTIVE_ORDER:
+        if skip_product_directives and name in _DIRECTIVES_WITH_FILTER_PRODUCT:
+            continue
+        if skip_persona and name == "sdr_personalidade.md":
+            continue
+        if skip_spin_examples and name == "spin_selling.md":
+            continue
+        names.append(name)
+    return names
+
+
 def load_directives(skip_persona: bool = False, skip_spin_examples: bool = False, skip_product_directives: bool = False) -> str:
     """Concatena o conteúdo de todos os .md em directives/ em ordem fixa.
     skip_persona: não carrega sdr_personalidade.md.
     skip_spin_examples: não carrega spin_selling.md.
     skip_product_directives: não carrega nenhum arquivo que menciona filtro/água (sdr, spin, envio_imagens, fechamento).
     """
-    order = [
-        "sdr_personalidade.md",
-        "spin_selling.md",
-        "rag_regras.md",
-        "envio_imagens.md",
-        "fechamento.md",
-        "pos_venda.md",
-        "audio_regras.md",
-    ]
     parts = []
-    for name in order:
-        if skip_product_directives and name in _DIRECTIVES_WITH_FILTER_PRODUCT:
-            continue
-        if skip_persona and name == "sdr_personalidade.md":
-            continue
-        if skip_spin_examples and name == "spin_selling.md":
-            continue
+    for name in _directive_names(skip_persona, skip_spin_examples, skip_product_directives):
         path = DIRECTIVES_DIR / name
         if path.exists():
             parts.append(path.read_text(encoding="utf-8"))
     return "\n\n---\n\n".join(parts)
 
 
-def build_system_prompt(
-    current_state: str,
-    agent_name: str | None = None,
-    agent_niche: str | None = None,
-    agent_prompt_custom: str | None = None,
-) -> str:
-    state_instruction = (
+# Regras de resposta: fixas, fazem parte do prefixo estático (cacheável pelo provedor)
+_RESPONSE_RULES = (
+    "IMPORTANTE: Interprete a mensagem atual e o histórico da conversa antes de responder. "
+    "Se o cliente repetir a mesma coisa (ex.: vários 'oi'), varie a resposta em vez de repetir igual. "
+    "Cada resposta deve ser específica para o que ele acabou de dizer.\n\n"
+    "UMA ENTRADA = UMA RESPOSTA: Se a mensagem do cliente tiver várias linhas ou várias frases juntas "
+    "(ex.: 'Oi' 'tudo bem?' 'quero mais informações' em sequência), trate como UMA só intenção e responda "
+    "UMA única vez, de forma natural. Não responda ponto a ponto para cada linha ou frase.\n\n"
+    "Responda em JSON no formato:\n"
+    '{"resposta_texto": "...", "enviar_audio": true/false, "proximo_estado": "...", '
+    '"enviar_imagens": true/false, "modelos": ["nome1", "nome2"] ou null}\n'
+    "Use apenas informações do CONTEXTO RAG abaixo. Se não estiver no contexto, diga que vai verificar. "
+    "resposta_texto: mensagem em texto para o cliente. proximo_estado: um dos estados SPIN. "
+    "enviar_imagens: true apenas quando for hora de mostrar 2-3 modelos (fase solucao/oferta). "
+    "modelos: lista com 2 ou 3 nomes de modelos da base para enviar imagens; se enviar_imagens false, use null."
+)
+
+_DEFAULT_PERSONA = "Você é um SDR de vendas de filtros de água. Siga rigorosamente as diretivas acima."
+
+
+def _render_static_prompt(mode: str, directives: dict[str, str]) -> str:
+    """Prefixo estático do system prompt: diretivas do modo ("default" ou "custom") + regras de resposta."""
+    custom = mode == "custom"
+    names = _directive_names(skip_persona=custom, skip_spin_examples=custom, skip_product_directives=custom)
+    body = "\n\n---\n\n".join(directives[name] for name in names if name in directives)
+    return body + "\n\n" + _RESPONSE_RULES
+
+
+def static_prompt_template(mode: str) -> RenderedPrompt:
+    """Prefixo estático pré-renderizado (texto + tokens) do modo de persona."""
+    return _prompt_templates.get(
+        mode,
+        list(_DIRECTIVE_ORDER),
+        lambda directives: _render_static_prompt(mode, directives),
+    )
+
+
+def prompt_template_stats() -> dict:
+    """Templates em cache com tamanho em tokens, hits e renderizações."""
+    return _prompt_templates.stats()
+
+
+def _state_instruction(current_state: str) -> str:
+    return (
         f"Estado atual da conversa: **{get_state_display_name(current_state)}** (valor interno: {current_state}). "
         "Siga as regras do SPIN: não pule etapas. Sua resposta (texto e tom) deve refletir SOMENTE este estado — "
         "não faça perguntas de descoberta se já estiver em oferta/fechamento; não pule para fechamento se ainda estiver em descoberta. "
         "proximo_estado: use o estado atual ou o PRÓXIMO na ordem (descoberta -> problema -> implicacao -> solucao -> oferta -> fechamento -> pos_venda). "
         "NUNCA retorne um estado anterior (ex.: se estiver em solucao, não retorne descoberta nem problema)."
     )
+
+
+def _custom_persona(agent_name: str | None, agent_niche: str | None, agent_prompt_custom: str | None) -> str:
+    persona = f"Você é {agent_name or 'o agente'}"
+    if agent_niche and agent_niche.strip():
+        persona += f", atuando como {agent_niche.strip()}"
+    persona += ". Apresente-se sempre com esse nome e nicho ao falar com o cliente. "
+    if agent_prompt_custom and agent_prompt_custom.strip():
+        persona += f"Instruções específicas: {agent_prompt_custom.strip()}. "
+    persona += (
+        "As diretivas acima são apenas para estilo de comunicação; "
+        "NÃO fale de filtros, água, torneira, galão ou qualquer produto que não seja do seu nicho. "
+        "Use o método SPIN na ordem: descoberta (perguntas sobre a situação do cliente no SEU nicho) -> problema (dores) -> implicação (riscos) -> solução/oferta -> fechamento. "
+        "Siga as diretivas acima."
+    )
+    return persona
+
+
+def build_system_parts(
+    current_state: str,
+    agent_name: str | None = None,
+    agent_niche: str | None = None,
+    agent_prompt_custom: str | None = None,
+    shared_memory: str = "",
+) -> tuple[RenderedPrompt, str]:
+    """
+    System prompt em duas partes, do mais estável para o mais variável:
+    (prefixo estático: diretivas + regras, idêntico byte a byte entre turnos do mesmo modo,
+     parte dinâmica: persona do agente -> estado -> memória compartilhada do lead).
+    Manter o prefixo estável é o que permite o cache de prefixo do provedor.
+    """
     has_custom_persona = bool(
         agent_name or agent_niche or (agent_prompt_custom and agent_prompt_custom.strip())
     )
-    directives = load_directives(
-        skip_persona=has_custom_persona,
-        skip_spin_examples=has_custom_persona,
-        skip_product_directives=has_custom_persona,
-    )
-
     if has_custom_persona:
-        persona = f"Você é {agent_name or 'o agente'}"
-        if agent_niche and agent_niche.strip():
-            persona += f", atuando como {agent_niche.strip()}"
-        persona += ". Apresente-se sempre com esse nome e nicho ao falar com o cliente. "
-        if agent_prompt_custom and agent_prompt_custom.strip():
-            persona += f"Instruções específicas: {agent_prompt_custom.strip()}. "
-        persona += (
-            "As diretivas abaixo são apenas para estilo de comunicação; "
-            "NÃO fale de filtros, água, torneira, galão ou qualquer produto que não seja do seu nicho. "
-            "Use o método SPIN na ordem: descoberta (perguntas sobre a situação do cliente no SEU nicho) -> problema (dores) -> implicação (riscos) -> solução/oferta -> fechamento. "
-            "Siga as diretivas abaixo.\n\n"
-        )
+        static = static_prompt_template("custom")
+        persona = _custom_persona(agent_name, agent_niche, agent_prompt_custom)
     else:
-        persona = (
-            "Você é um SDR de vendas de filtros de água. Siga rigorosamente as diretivas abaixo.\n\n"
-        )
-    return (
-        persona
-        + directives
-        + "\n\n"
-        + state_instruction
-        + "\n\nIMPORTANTE: Interprete a mensagem atual e o histórico da conversa antes de responder. "
-        "Se o cliente repetir a mesma coisa (ex.: vários 'oi'), varie a resposta em vez de repetir igual. "
-        "Cada resposta deve ser específica para o que ele acabou de dizer.\n\n"
-        "UMA ENTRADA = UMA RESPOSTA: Se a mensagem do cliente tiver várias linhas ou várias frases juntas "
-        "(ex.: 'Oi' 'tudo bem?' 'quero mais informações' em sequência), trate como UMA só intenção e responda "
-        "UMA única vez, de forma natural. Não responda ponto a ponto para cada linha ou frase.\n\n"
-        "Responda em JSON no formato:\n"
-        '{"resposta_texto": "...", "enviar_audio": true/false, "proximo_estado": "...", '
-        '"enviar_imagens": true/false, "modelos": ["nome1", "nome2"] ou null}\n'
-        "Use apenas informações do CONTEXTO RAG abaixo. Se não estiver no contexto, diga que vai verificar. "
-        "resposta_texto: mensagem em texto para o cliente. proximo_estado: um dos estados SPIN. "
-        "enviar_imagens: true apenas quando for hora de mostrar 2-3 modelos (fase solucao/oferta). "
-        "modelos: lista com 2 ou 3 nomes de modelos da base para enviar imagens; se enviar_imagens false, use null."
-    )
+        static = static_prompt_template("default")
+        persona = _DEFAULT_PERSONA
+    dynamic = [persona, _state_instruction(current_state)]
+    if shared_memory and shared_memory.strip():
+        dynamic.append(shared_memory.strip())
+    return static, "\n\n".join(dynamic)
+
+
+def build_system_prompt(
+    current_state: str,
+    agent_name: str | None = None,
+    agent_niche: str | None = None,
+    agent_prompt_custom: str | None = None,
+) -> str:
+    static, dynamic = build_system_parts(current_state, agent_name, agent_niche, agent_prompt_custom)
+    return static.text + "\n\n" + dynamic
+
+
+def _prompt_cache_control(model: str) -> bool:
+    """Marca de cache explícita (cache_control) só para modelos Anthropic; OpenAI/Gemini cacheiam prefixos sozinhos."""
+    enabled = os.environ.get("LLM_PROMPT_CACHE_CONTROL", "1").strip().lower() not in ("0", "false", "no")
+    return enabled and model.startswith("anthropic/")
+
+
+def _system_message(model: str, static: str, dynamic: str) -> dict:
+    if _prompt_cache_control(model):
+        return {
+            "role": "system",
+            "content": [
+                {"type": "text", "text": static, "cache_control": {"type": "ephemeral"}},
+                {"type": "text", "text": dynamic},
+            ],
+        }
+    return {"role": "system", "content": static + "\n\n" + dynamic}
 
 
 def build_user_message(
     user_message: str,
     rag_context: str,
     recent_log: list[dict],
+    summary: str = "",
 ) -> str:
-    """Monta a mensagem do usuário com contexto RAG e histórico resumido."""
+    """
+    Monta a mensagem do usuário com contexto RAG, resumo da conversa e histórico recente
+    (turnos ainda não resumidos, limitados a CONVERSATION_HISTORY_TOKENS; ver conversation_summary).
+    """
     parts = ["CONTEXTO DA BASE DE CONHECIMENTO (use apenas isso para preços, links, benefícios):\n", rag_context]
+    if summary:
+        parts.append(f"\n\nResumo da conversa até aqui (respostas e dados já informados pelo cliente):\n{summary}")
     if recent_log:
         parts.append("\n\nHistórico da conversa (use para interpretar repetições e contexto):")
-        for m in recent_log[-12:]:
-            role = "Cliente" if m["role"] == "user" else "Você"
-            content = (m["content"] or "").strip()
-            if content:
-                parts.append(f"\n{role}: {content[:300]}")
+        for line in fit_history(recent_log, history_budget_tokens()):
+            parts.append(f"\n{line}")
     parts.append(f"\n\nMensagem atual do cliente (interprete antes de responder): {user_message}")
     return "\n".join(parts)
 
 
-def _extract_json(text: str) -> dict:
-    """Extrai um bloco JSON da resposta (pode vir com markdown ou texto antes/depois)."""
-    text = text.strip()
-    # Tente bloco ```json ... ```
-    m = re.search(r"```(?:json)?\s*([\s\S]*?)\s*```", text)
-    if m:
-        return json.loads(m.group(1).strip())
-    # Tente primeiro { ... } na linha
-    start = text.find("{")
-    if start != -1:
-        depth = 0
-        for i in range(start, len(text)):
-            if text[i] == "{":
-                depth += 1
-            elif text[i] == "}":
-                depth -= 1
-                if depth == 0:
-                    return json.loads(text[start : i + 1])
-    raise ValueError("Nenhum JSON encontrado na resposta do LLM")
+# Saída estruturada (response_format json_schema): o provedor garante um JSON com estes campos
+REPLY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "resposta_texto": {"type": "string"},
+        "enviar_audio": {"type": "boolean"},
+        "proximo_estado": {"type": "string", "enum": list(STATES)},
+        "enviar_imagens": {"type": "boolean"},
+        "modelos": {"type": ["array", "null"], "items": {"type": "string"}},
+    },
+    "required": ["resposta_texto", "enviar_audio", "proximo_estado", "enviar_imagens", "modelos"],
+    "additionalProperties": False,
+}
 
+# Modelos que recusaram response_format json_schema neste processo (passam a usar extração do texto)
+_schema_unsupported: set[str] = set()
+_SCHEMA_ERROR_MARKERS = ("response_format", "json_schema", "structured output")
 
-def run(
-    user_id: str,
+
+def _is_schema_error(error: BadRequestError) -> bool:
+    """400 causado pelo response_format (e não por outro problema da requisição, ex.: contexto longo)."""
+    text = f"{error} {error.body or ''}".lower()
+    return any(marker in text for marker in _SCHEMA_ERROR_MARKERS)
+
+
+def _response_format(model: str) -> dict | None:
+    """
+    response_format json_schema para modelos com saída estruturada: prefixos em
+    LLM_JSON_SCHEMA_MODELS (padrão openai/,google/; "*" = todos). LLM_JSON_SCHEMA=0 desliga.
+    """
+    if os.environ.get("LLM_JSON_SCHEMA", "").strip().lower() in ("0", "false", "no") or model in _schema_unsupported:
+        return None
+    prefixes = [p.strip() for p in (os.environ.get("LLM_JSON_SCHEMA_MODELS", "").strip() or "openai/,google/").split(",") if p.strip()]
+    if "*" not in prefixes and not any(model.startswith(p) for p in prefixes):
+        return None
+    return {"type": "json_schema", "json_schema": {"name": "resposta_sdr", "strict": True, "schema": REPLY_SCHEMA}}
+
+
+async def _create_chat(client: AsyncOpenAI, model: str, messages: list[dict], **kwargs: Any) -> tuple[Any, bool]:
+    """
+    chat.completions.create com json_schema quando o modelo suporta. Se o provedor recusar o
+    response_format (400 que cita response_format/json_schema), o modelo é marcado e a chamada é
+    refeita sem ele; outros 400 sobem como erro do modelo.
+    Retorna (resposta ou stream, saída estruturada?).
+    """
+    response_format = _response_format(model)
+    if response_format is not None:
+        try:
+            return await client.chat.completions.create(
+                model=model, messages=messages, response_format=response_format, **kwargs,
+            ), True
+        except BadRequestError as e:
+            if not _is_schema_error(e):
+                raise
+            _schema_unsupported.add(model)
+            logger.warning("llm_json_schema_unsupported", extra={"model": model, "error": str(e)})
+    return await client.chat.completions.create(model=model, messages=messages, **kwargs), False
+
+
+def _chat_messages(
+    model: str,
     user_message: str,
     current_state: str,
     rag_context: str,
     recent_log: list[dict],
-    input_was_audio: bool = False,
-    agent_name: str | None = None,
-    agent_niche: str | None = None,
-    agent_prompt_custom: str | None = None,
-    tenant_id: str | None = None,
-    agent_id: str | None = None,
-) -> dict[str, Any]:
-    """
-    Executa uma rodada do orquestrador.
-    Retorna dict com: resposta_texto, enviar_audio, proximo_estado, enviar_imagens, modelos.
-    Se agent_name/niche/prompt_custom forem passados, o system prompt usa a persona desse agente.
-    """
-    system = build_system_prompt(
+    agent_name: str | None,
+    agent_niche: str | None,
+    agent_prompt_custom: str | None,
+    shared_memory_prompt: str,
+    summary: str = "",
+) -> tuple[list[dict], RenderedPrompt]:
+    """Mensagens da rodada e o prefixo estático (para prefix_tokens no llm_usage)."""
+    # Ordem estável para cache de prefixo: diretivas -> persona -> estado -> memória (system), RAG/histórico (user)
+    static, dynamic = build_system_parts(
         current_state,
         agent_name=agent_name,
         agent_niche=agent_niche,
         agent_prompt_custom=agent_prompt_custom,
+        shared_memory=shared_memory_prompt,
     )
-    
-    # --- AIOS SHARED MEMORY ---
-    shared_memory_prompt = ""
-    if tenant_id and agent_id:
-        try:
-            from .agent_memory import build_shared_memory_prompt
-            shared_memory_prompt = build_shared_memory_prompt(tenant_id, user_id, agent_id)
-        except Exception as e:
-            print(f"Error loading shared memory: {e}")
-            
-    if shared_memory_prompt:
-        system = shared_memory_prompt + "\n" + system
-
-    user_content = build_user_message(user_message, rag_context, recent_log)
-
-    client = _get_client()
-    model = os.environ.get("OPENROUTER_MODEL", "openai/gpt-4o-mini")
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": user_content},
-        ],
-        temperature=0.55,
-    )
-    raw = response.choices[0].message.content or ""
+    user_content = build_user_message(user_message, rag_context, recent_log, summary)
+    return [
+        _system_message(model, static.text, dynamic),
+        {"role": "user", "content": user_content},
+    ], static
+
 
+def _parse_reply(
+    raw: str,
+    current_state: str,
+    input_was_audio: bool,
+    usage: dict,
+    model: str = "",
+    structured: bool = False,
+) -> dict[str, Any]:
+    """
+    JSON da resposta do modelo normalizado (campos padrão, transição válida, usage).
+    Com saída estruturada o texto já é o JSON; sem ela, o primeiro objeto JSON do texto. Se nada
+    for lido, o resposta_texto é recuperado do JSON parcial (salvage_field) antes de cair no texto cru.
+    """
+    mode = "json_schema" if structured else "extract"
+    out = None
     try:
-        out = _extract_json(raw)
-    except (json.JSONDecodeError, ValueError):
+        out = json.loads(raw) if structured else extract_object(raw)
+    except ValueError:
+        if structured:  # ex.: o provedor devolveu texto em volta do JSON
+            try:
+                out = extract_object(raw)
+            except ValueError:
+                pass
+    if not isinstance(out, dict):
+        out = None
+    record_reply_parse(model, mode, out is not None, raw)
+    if out is None:
+        salvaged = salvage_field(raw) if raw else None
         out = {
-            "resposta_texto": raw[:2000] if raw else "Desculpe, tive um problema. Pode repetir?",
+            "resposta_texto": salvaged or (raw[:2000] if raw else "Desculpe, tive um problema. Pode repetir?"),
             "enviar_audio": False,
             "proximo_estado": current_state,
             "enviar_imagens": False,
@@ -260,4 +409,221 @@ def run(
     out["proximo_estado"] = apply_transition(current_state, raw_next)
     if out.get("modelos") is not None and not isinstance(out["modelos"], list):
         out["modelos"] = None
+    out["usage"] = usage
     return out
+
+
+def _shared_memory(tenant_id: str | None, user_id: str, agent_id: str | None) -> str:
+    # --- AIOS SHARED MEMORY ---
+    if not (tenant_id and agent_id):
+        return ""
+    try:
+        from .agent_memory import build_shared_memory_prompt
+        return build_shared_memory_prompt(tenant_id, user_id, agent_id)
+    except Exception as e:
+        print(f"Error loading shared memory: {e}")
+        return ""
+
+
+def _fallback_reply(current_state: str) -> dict[str, Any]:
+    """Resposta de contingência quando o prazo do model_router estoura (sem chamar o modelo de novo)."""
+    return {
+        "resposta_texto": FALLBACK_REPLY,
+        "enviar_audio": False,
+        "proximo_estado": current_state,
+        "enviar_imagens": False,
+        "modelos": None,
+        "usage": {},
+        "fallback": True,
+    }
+
+
+def run(
+    user_id: str,
+    user_message: str,
+    current_state: str,
+    rag_context: str,
+    recent_log: list[dict],
+    input_was_audio: bool = False,
+    agent_name: str | None = None,
+    agent_niche: str | None = None,
+    agent_prompt_custom: str | None = None,
+    tenant_id: str | None = None,
+    agent_id: str | None = None,
+    summary: str = "",
+) -> dict[str, Any]:
+    """
+    Executa uma rodada do orquestrador.
+    Retorna dict com: resposta_texto, enviar_audio, proximo_estado, enviar_imagens, modelos
+    e usage (tokens, cached_tokens e latência da chamada; ver llm_usage).
+    Se agent_name/niche/prompt_custom forem passados, o system prompt usa a persona desse agente.
+    Versão síncrona de run_async (executa no loop de fundo de async_runtime).
+    """
+    from .async_runtime import run_sync
+
+    return run_sync(run_async(
+        user_id, user_message, current_state, rag_context, recent_log,
+        input_was_audio=input_was_audio,
+        agent_name=agent_name,
+        agent_niche=agent_niche,
+        agent_prompt_custom=agent_prompt_custom,
+        tenant_id=tenant_id,
+        agent_id=agent_id,
+        summary=summary,
+    ))
+
+
+async def run_async(
+    user_id: str,
+    user_message: str,
+    current_state: str,
+    rag_context: str,
+    recent_log: list[dict],
+    input_was_audio: bool = False,
+    agent_name: str | None = None,
+    agent_niche: str | None = None,
+    agent_prompt_custom: str | None = None,
+    tenant_id: str | None = None,
+    agent_id: str | None = None,
+    summary: str = "",
+) -> dict[str, Any]:
+    """
+    Versão assíncrona de run: a chamada ao modelo é aguardada (AsyncOpenAI), sem ocupar thread.
+    O modelo é escolhido pelo model_router (allowlist do agente, latência, hedge); estourado o
+    prazo, devolve a resposta de contingência (com "fallback": True).
+    """
+    from .async_runtime import run_db
+
+    models = await run_db(model_router.agent_models, tenant_id, agent_id)
+    shared_memory_prompt = await run_db(_shared_memory, tenant_id, user_id, agent_id)
+    client = _get_async_client()
+
+    async def create(model: str) -> tuple[Any, RenderedPrompt, bool, float]:
+        messages, static = _chat_messages(
+            model, user_message, current_state, rag_context, recent_log,
+            agent_name, agent_niche, agent_prompt_custom, shared_memory_prompt, summary,
+        )
+        started = time.monotonic()
+        response, structured = await _create_chat(client, model, messages, temperature=0.55)
+        return response, static, structured, (time.monotonic() - started) * 1000
+
+    try:
+        model, (response, static, structured, latency_ms) = await model_router.complete(create, models)
+    except model_router.RouterDeadlineExceeded:
+        return _fallback_reply(current_state)
+    usage = record_llm_usage(
+        response,
+        model,
+        latency_ms,
+        purpose="chat",
+        tenant_id=tenant_id,
+        agent_id=agent_id,
+        prefix_tokens=static.tokens,
+    )
+    return _parse_reply(
+        response.choices[0].message.content or "", current_state, input_was_audio, usage,
+        model=model, structured=structured,
+    )
+
+
+async def run_stream_async(
+    user_id: str,
+    user_message: str,
+    current_state: str,
+    rag_context: str,
+    recent_log: list[dict],
+    on_partial: Callable[[str], Awaitable[None]],
+    input_was_audio: bool = False,
+    agent_name: str | None = None,
+    agent_niche: str | None = None,
+    agent_prompt_custom: str | None = None,
+    tenant_id: str | None = None,
+    agent_id: str | None = None,
+    summary: str = "",
+) -> dict[str, Any]:
+    """
+    Como run_async, mas com stream: a cada pedaço recebido chama on_partial(texto) com o
+    resposta_texto parcial já decodificado (ver json_stream). Os campos estruturados
+    (proximo_estado, enviar_imagens...) são lidos do JSON completo ao final.
+    O model_router escolhe o modelo pelo tempo até o primeiro pedaço (hedge no início do stream);
+    o prazo vale para o stream inteiro.
+    """
+    from .async_runtime import run_db
+    from .json_stream import StreamingFieldExtractor
+
+    models = await run_db(model_router.agent_models, tenant_id, agent_id)
+    shared_memory_prompt = await run_db(_shared_memory, tenant_id, user_id, agent_id)
+    client = _get_async_client()
+    started = time.monotonic()
+
+    async def open_stream(model: str) -> tuple[Any, Any, RenderedPrompt, bool, list]:
+        """Abre o stream e espera o primeiro pedaço (o que conta para o hedge)."""
+        messages, static = _chat_messages(
+            model, user_message, current_state, rag_context, recent_log,
+            agent_name, agent_niche, agent_prompt_custom, shared_memory_prompt, summary,
+        )
+        stream, structured = await _create_chat(
+            client, model, messages,
+            temperature=0.55,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        iterator = stream.__aiter__()
+        try:
+            first = [await iterator.__anext__()]
+        except StopAsyncIteration:
+            first = []
+        except BaseException:
+            await stream.close()  # perdeu o hedge: libera a conexão
+            raise
+        return stream, iterator, static, structured, first
+
+    extractor = StreamingFieldExtractor("resposta_texto")
+    raw_parts: list[str] = []
+    state: dict[str, Any] = {"last_chunk": None, "sent": ""}
+
+    async def feed(chunk: Any) -> None:
+        state["last_chunk"] = chunk
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if not delta:
+            return
+        raw_parts.append(delta)
+        partial = extractor.feed(delta)
+        if partial and partial != state["sent"]:
+            state["sent"] = partial
+            await on_partial(partial)
+
+    deadline = model_router.deadline_seconds()
+    stream = None
+    try:
+        model, (stream, iterator, static, structured, first) = await model_router.complete(
+            open_stream, models, kind="first_token", deadline=deadline,
+        )
+
+        async def consume() -> None:
+            for chunk in first:
+                await feed(chunk)
+            async for chunk in iterator:
+                await feed(chunk)
+
+        await asyncio.wait_for(consume(), timeout=max(0.0, deadline - (time.monotonic() - started)))
+    except (model_router.RouterDeadlineExceeded, asyncio.TimeoutError):
+        logger.warning("llm_stream_deadline", extra={"tenant_id": tenant_id, "agent_id": agent_id, "partial_chars": len(state["sent"])})
+        out = _fallback_reply(current_state)
+        if state["sent"]:
+            out["resposta_texto"] = state["sent"]  # o cliente já viu o texto parcial
+        return out
+    finally:
+        if stream is not None:
+            await stream.close()  # libera a conexão também em erro ou cancelamento no meio do stream
+    # Com include_usage o último pedaço traz usage (sem choices)
+    usage = record_llm_usage(
+        state["last_chunk"],
+        model,
+        (time.monotonic() - started) * 1000,
+        purpose="chat_stream",
+        tenant_id=tenant_id,
+        agent_id=agent_id,
+        prefix_tokens=static.tokens,
+    )
+    return _parse_reply("".join(raw_parts), current_state, input_was_audio, usage, model=model, structured=structured)
@@ -0,0 +1,129 @@
+"""
+Instrumentação das chamadas ao LLM: tokens de prompt/resposta, tokens servidos do cache de prefixo
+do provedor (usage.prompt_tokens_details.cached_tokens, ou cache_read_input_tokens na Anthropic)
+e latência. Cada chamada gera um log "llm_usage"; os agregados por modelo ficam em memória do
+processo (llm_usage_stats) para comparar latência de turnos com e sem cache. O consumo também é
+somado no escopo ativo (usage_scope) para contabilização por tenant/agente/turno.
+"""
+
+import logging
+import threading
+from typing import Any, Optional
+
+from .usage_scope import add_usage
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_stats: dict[str, dict] = {}
+_parse_stats: dict[str, dict] = {}
+
+
+def _field(obj: Any, name: str) -> Any:
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def usage_from_response(response: Any) -> dict:
+    """{prompt_tokens, completion_tokens, total_tokens, cached_tokens} a partir de response.usage."""
+    usage = _field(response, "usage")
+    prompt = int(_field(usage, "prompt_tokens") or 0)
+    completion = int(_field(usage, "completion_tokens") or 0)
+    details = _field(usage, "prompt_tokens_details")
+    cached = _field(details, "cached_tokens") or _field(usage, "cache_read_input_tokens") or 0
+    return {
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "total_tokens": int(_field(usage, "total_tokens") or prompt + completion),
+        "cached_tokens": int(cached),
+    }
+
+
+def record_llm_usage(
+    response: Any,
+    model: str,
+    latency_ms: float,
+    purpose: str = "chat",
+    tenant_id: Optional[str] = None,
+    agent_id: Optional[str] = None,
+    prefix_tokens: Optional[int] = None,
+) -> dict:
+    """
+    Registra uma chamada (log + agregados) e devolve o usage normalizado com latency_ms.
+    prefix_tokens: tamanho estimado da parte estática do prompt (o que poderia vir do cache).
+    """
+    usage = usage_from_response(response)
+    add_usage(purpose, model, **usage)
+    usage["latency_ms"] = round(latency_ms, 1)
+    with _lock:
+        s = _stats.setdefault(model, {
+            "requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0,
+            "cache_hit_requests": 0, "latency_ms_cached": 0.0, "latency_ms_uncached": 0.0,
+        })
+        s["requests"] += 1
+        s["prompt_tokens"] += usage["prompt_tokens"]
+        s["completion_tokens"] += usage["completion_tokens"]
+        s["cached_tokens"] += usage["cached_tokens"]
+        if usage["cached_tokens"]:
+            s["cache_hit_requests"] += 1
+            s["latency_ms_cached"] += latency_ms
+        else:
+            s["latency_ms_uncached"] += latency_ms
+    logger.info(
+        "llm_usage",
+        extra={
+            "purpose": purpose, "model": model, "tenant_id": tenant_id, "agent_id": agent_id,
+            "prefix_tokens": prefix_tokens, **usage,
+        },
+    )
+    return usage
+
+
+def llm_usage_stats() -> dict:
+    """
+    Agregados por modelo desde o início do processo: requests, tokens, cached_ratio
+    (tokens de prompt servidos do cache) e latência média com e sem cache.
+    """
+    out = {}
+    with _lock:
+        for model, s in _stats.items():
+            hits = s["cache_hit_requests"]
+            misses = s["requests"] - hits
+            out[model] = {
+                "requests": s["requests"],
+                "prompt_tokens": s["prompt_tokens"],
+                "completion_tokens": s["completion_tokens"],
+                "cached_tokens": s["cached_tokens"],
+                "cached_ratio": round(s["cached_tokens"] / s["prompt_tokens"], 3) if s["prompt_tokens"] else 0.0,
+                "cache_hit_requests": hits,
+                "avg_latency_ms_cached": round(s["latency_ms_cached"] / hits, 1) if hits else None,
+                "avg_latency_ms_uncached": round(s["latency_ms_uncached"] / misses, 1) if misses else None,
+            }
+    return out
+
+
+def record_reply_parse(model: str, mode: str, ok: bool, raw: str = "") -> None:
+    """
+    Resultado da leitura do JSON da resposta (mode: json_schema = saída estruturada do provedor,
+    extract = JSON procurado no texto livre). Falhas geram o log "llm_reply_parse_failed".
+    """
+    with _lock:
+        s = _parse_stats.setdefault(model, {"replies": 0, "failures": 0, "json_schema": 0, "extract": 0})
+        s["replies"] += 1
+        s[mode] = s.get(mode, 0) + 1
+        if not ok:
+            s["failures"] += 1
+    if not ok:
+        logger.warning("llm_reply_parse_failed", extra={"model": model, "mode": mode, "sample": raw[:200]})
+
+
+def reply_parse_stats() -> dict:
+    """Por modelo: respostas, falhas de leitura do JSON, failure_rate e quantas vieram por json_schema/extract."""
+    with _lock:
+        return {
+            model: {**s, "failure_rate": round(s["failures"] / s["replies"], 4) if s["replies"] else 0.0}
+            for model, s in _parse_stats.items()
+        }
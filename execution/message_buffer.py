@@ -1,12 +1,13 @@
 """
 Camada 3 - Execução: buffer de mensagens em Redis com TTL.
 Chave: buffer:{tenant_id}:{user_id}. Uso: add_message_to_buffer, get_combined_messages, clear_buffer.
-Processamento assíncrono via chamadas em asyncio.to_thread (não bloqueia a thread principal).
+Para código assíncrono há as variantes *_async (redis.asyncio, um cliente por event loop).
 """
 
 import json
 import logging
 import os
+import weakref
 from typing import Optional
 
 KEY_PREFIX = "buffer"
@@ -38,30 +39,64 @@ def _key(tenant_id: str, user_id: str) -> str:
 
 
 def _get_client():
-    """Cliente Redis (sync). Para uso assíncrono, chamar via asyncio.to_thread."""
+    """Cliente Redis (sync). Para código assíncrono, usar as funções *_async."""
     import redis
     return redis.from_url(_redis_url(), decode_responses=True)
 
 
+# redis.asyncio: conexões pertencem ao event loop em que foram abertas
+_async_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def _get_async_client():
+    """Cliente redis.asyncio do event loop corrente (reaproveitado entre chamadas)."""
+    import asyncio
+    import redis.asyncio as aioredis
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = aioredis.from_url(_redis_url(), decode_responses=True)
+    return client
+
+
+def _payload(message: str, timestamp: Optional[str]) -> str:
+    return json.dumps({"message": message, "timestamp": timestamp or ""}, ensure_ascii=False)
+
+
+def _combine(raw_list: list) -> str:
+    """Mensagens do buffer concatenadas em ordem cronológica."""
+    parts = []
+    for raw in raw_list:
+        try:
+            data = json.loads(raw)
+            parts.append((data.get("timestamp", ""), data.get("message", "")))
+        except (json.JSONDecodeError, TypeError):
+            parts.append(("", raw if isinstance(raw, str) else ""))
+    parts.sort(key=lambda x: x[0])
+    return " ".join(p.strip() for _, p in parts if p.strip()).strip()
+
+
+def _log_added(tenant_id: str, user_id: str, total: int) -> None:
+    if total == 1:
+        logger.info("buffer_created", extra={"tenant_id": tenant_id, "user_id": user_id})
+    else:
+        logger.info("buffer_extended", extra={"tenant_id": tenant_id, "user_id": user_id, "total": total})
+
+
 def add_message_to_buffer(tenant_id: str, user_id: str, message: str, timestamp: Optional[str] = None) -> tuple[bool, int]:
     """
     Adiciona uma mensagem ao buffer e atualiza o TTL.
     Retorna (buffer_created, total_messages). buffer_created=True se era o primeiro item.
     """
-    import redis
     try:
         client = _get_client()
         key = _key(tenant_id, user_id)
-        payload = json.dumps({"message": message, "timestamp": timestamp or ""}, ensure_ascii=False)
         pipe = client.pipeline()
-        pipe.rpush(key, payload)
+        pipe.rpush(key, _payload(message, timestamp))
         pipe.expire(key, _buffer_ttl_seconds())
         results = pipe.execute()
         total = results[0]
-        if total == 1:
-            logger.info("buffer_created", extra={"tenant_id": tenant_id, "user_id": user_id})
-        else:
-            logger.info("buffer_extended", extra={"tenant_id": tenant_id, "user_id": user_id, "total": total})
+        _log_added(tenant_id, user_id, total)
         return (total == 1, total)
     except Exception as e:
         logger.warning("buffer_add_failed", extra={"error": str(e), "tenant_id": tenant_id, "user_id": user_id})
@@ -73,18 +108,7 @@ def get_combined_messages(tenant_id: str, user_id: str) -> str:
     try:
         client = _get_client()
         key = _key(tenant_id, user_id)
-        raw_list = client.lrange(key, 0, -1)
-        if not raw_list:
-            return ""
-        parts = []
-        for raw in raw_list:
-            try:
-                data = json.loads(raw)
-                parts.append((data.get("timestamp", ""), data.get("message", "")))
-            except (json.JSONDecodeError, TypeError):
-                parts.append(("", raw if isinstance(raw, str) else ""))
-        parts.sort(key=lambda x: x[0])
-        return " ".join(p.strip() for _, p in parts if p.strip()).strip()
+        return _combine(client.lrange(key, 0, -1) or [])
     except Exception as e:
         logger.warning("buffer_get_failed", extra={"error": str(e), "tenant_id": tenant_id, "user_id": user_id})
         raise
@@ -102,6 +126,37 @@ def clear_buffer(tenant_id: str, user_id: str) -> None:
         raise
 
 
+async def add_message_to_buffer_async(tenant_id: str, user_id: str, message: str, timestamp: Optional[str] = None) -> tuple[bool, int]:
+    """Versão assíncrona de add_message_to_buffer."""
+    try:
+        key = _key(tenant_id, user_id)
+        async with _get_async_client().pipeline() as pipe:
+            pipe.rpush(key, _payload(message, timestamp))
+            pipe.expire(key, _buffer_ttl_seconds())
+            results = await pipe.execute()
+        total = results[0]
+        _log_added(tenant_id, user_id, total)
+        return (total == 1, total)
+    except Exception as e:
+        logger.warning("buffer_add_failed", extra={"error": str(e), "tenant_id": tenant_id, "user_id": user_id})
+        raise
+
+
+async def take_combined_messages_async(tenant_id: str, user_id: str) -> str:
+    """Lê e remove o buffer numa única transação (get_combined_messages + clear_buffer)."""
+    try:
+        key = _key(tenant_id, user_id)
+        async with _get_async_client().pipeline(transaction=True) as pipe:
+            pipe.lrange(key, 0, -1)
+            pipe.delete(key)
+            raw_list, _ = await pipe.execute()
+        logger.info("buffer_flushed", extra={"tenant_id": tenant_id, "user_id": user_id})
+        return _combine(raw_list or [])
+    except Exception as e:
+        logger.warning("buffer_get_failed", extra={"error": str(e), "tenant_id": tenant_id, "user_id": user_id})
+        raise
+
+
 def buffer_available() -> bool:
     """Retorna True se REDIS_URL está configurado (buffer disponível)."""
     return bool(os.environ.get("REDIS_URL", "").strip())
@@ -0,0 +1,216 @@
+"""
+Roteamento de modelos do LLM por latência e saúde, com requisição em hedge e prazo máximo.
+- Candidatos: agents.settings.models (allowlist do agente) ou OPENROUTER_MODEL seguido de
+  OPENROUTER_FALLBACK_MODELS (separados por vírgula).
+- Para cada modelo o processo guarda as últimas ROUTER_WINDOW chamadas (latência e erro):
+  p50/p95 e taxa de erro. Modelos com taxa de erro >= ROUTER_MAX_ERROR_RATE (com pelo menos
+  ROUTER_MIN_SAMPLES chamadas) vão para o fim; entre os saudáveis ganha o menor p95. Modelo
+  ainda sem amostras entra com p95 0 (é experimentado).
+- Hedge: se a primeira chamada não respondeu até ROUTER_HEDGE_MS (padrão: p95 do modelo, ou
+  ROUTER_HEDGE_DEFAULT_MS sem histórico; 0 desliga), dispara a mesma requisição no próximo
+  modelo e fica com a primeira resposta. Erro de um modelo passa direto para o próximo. A
+  chamada cancelada (perdeu o hedge ou o prazo) conta como falha do modelo.
+- Prazo: ROUTER_DEADLINE_SECONDS (25s) para o conjunto; estourado, levanta RouterDeadlineExceeded
+  (o orquestrador responde com uma mensagem de contingência).
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_MODEL = "openai/gpt-4o-mini"
+
+_lock = threading.Lock()
+_samples: dict[tuple[str, str], deque] = {}
+
+
+class RouterDeadlineExceeded(TimeoutError):
+    """Nenhum modelo respondeu dentro de ROUTER_DEADLINE_SECONDS."""
+
+
+def _env_int(key: str, default: int) -> int:
+    try:
+        return int(os.environ.get(key, "").strip() or default)
+    except ValueError:
+        return default
+
+
+def _env_float(key: str, default: float) -> float:
+    try:
+        return float(os.environ.get(key, "").strip() or default)
+    except ValueError:
+        return default
+
+
+def default_model() -> str:
+    return os.environ.get("OPENROUTER_MODEL", "").strip() or DEFAULT_MODEL
+
+
+def candidate_models(allowlist: Optional[list[str]] = None, model_override: Optional[str] = None) -> list[str]:
+    """Modelos candidatos, sem repetição, em ordem de preferência."""
+    if model_override:
+        models = [model_override]
+    elif allowlist:
+        models = [str(m).strip() for m in allowlist]
+    else:
+        fallbacks = os.environ.get("OPENROUTER_FALLBACK_MODELS", "").split(",")
+        models = [default_model(), *(m.strip() for m in fallbacks)]
+    return list(dict.fromkeys(m for m in models if m))
+
+
+def agent_models(tenant_id: Optional[str], agent_id: Optional[str]) -> list[str]:
+    """Allowlist do agente (agents.settings.models) ou os candidatos padrão."""
+    allowlist = None
+    if tenant_id and agent_id:
+        try:
+            from .tenant_config import get_agent_settings
+            allowlist = get_agent_settings(tenant_id, agent_id).get("models")
+        except Exception as e:
+            logger.warning("model_router_settings_failed", extra={"agent_id": agent_id, "error": str(e)})
+    return candidate_models(allowlist if isinstance(allowlist, list) else None)
+
+
+def observe(model: str, latency_ms: float, ok: bool, kind: str = "completion") -> None:
+    """Registra uma chamada (kind: completion = resposta inteira, first_token = início do stream)."""
+    with _lock:
+        window = _samples.setdefault((kind, model), deque(maxlen=max(1, _env_int("ROUTER_WINDOW", 50))))
+        window.append((latency_ms, ok))
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def stats(model: str, kind: str = "completion") -> dict:
+    """{samples, error_rate, p50_ms, p95_ms} da janela do modelo (latências só das chamadas com sucesso)."""
+    with _lock:
+        window = list(_samples.get((kind, model), ()))
+    ok = [ms for ms, success in window if success]
+    return {
+        "samples": len(window),
+        "error_rate": round(1 - len(ok) / len(window), 4) if window else 0.0,
+        "p50_ms": round(_percentile(ok, 0.5), 1) if ok else None,
+        "p95_ms": round(_percentile(ok, 0.95), 1) if ok else None,
+    }
+
+
+def router_stats() -> dict:
+    """Estatísticas de todos os modelos observados no processo, por tipo de chamada."""
+    with _lock:
+        keys = list(_samples)
+    return {f"{kind}:{model}": stats(model, kind) for kind, model in keys}
+
+
+def rank(models: list[str], kind: str = "completion") -> list[str]:
+    """Saudáveis primeiro, por p95 (sem histórico conta como 0); empate mantém a ordem da allowlist."""
+    min_samples = _env_int("ROUTER_MIN_SAMPLES", 5)
+    max_error_rate = _env_float("ROUTER_MAX_ERROR_RATE", 0.5)
+
+    def key(item: tuple[int, str]) -> tuple:
+        index, model = item
+        s = stats(model, kind)
+        unhealthy = s["samples"] >= min_samples and s["error_rate"] >= max_error_rate
+        return (unhealthy, s["p95_ms"] or 0.0, index)
+
+    return [m for _, m in sorted(enumerate(models), key=key)]
+
+
+def hedge_delay(model: str, kind: str = "completion") -> Optional[float]:
+    """Segundos até disparar o hedge (None = sem hedge)."""
+    raw = os.environ.get("ROUTER_HEDGE_MS", "").strip()
+    if raw:
+        try:
+            ms = float(raw)
+        except ValueError:
+            ms = 0.0
+        return ms / 1000 if ms > 0 else None
+    s = stats(model, kind)
+    if s["p95_ms"] is not None and s["samples"] >= _env_int("ROUTER_MIN_SAMPLES", 5):
+        return s["p95_ms"] / 1000
+    return _env_float("ROUTER_HEDGE_DEFAULT_MS", 6000) / 1000
+
+
+def deadline_seconds() -> float:
+    return _env_float("ROUTER_DEADLINE_SECONDS", 25.0)
+
+
+async def complete(
+    create: Callable[[str], Awaitable[T]],
+    models: list[str],
+    kind: str = "completion",
+    deadline: Optional[float] = None,
+) -> tuple[str, T]:
+    """
+    Executa create(modelo) no melhor modelo, com hedge e failover, e devolve (modelo, resultado).
+    A requisição perdedora é cancelada. Levanta RouterDeadlineExceeded no prazo ou o último erro
+    quando todos os modelos falharam.
+    """
+    loop = asyncio.get_running_loop()
+    order = rank(models, kind)
+    queue = list(order)
+    end = loop.time() + (deadline if deadline is not None else deadline_seconds())
+    pending: dict[asyncio.Task, str] = {}
+    last_error: Optional[BaseException] = None
+
+    async def timed(model: str) -> T:
+        started = loop.time()
+        try:
+            result = await create(model)
+        except asyncio.CancelledError:
+            # Perdeu o hedge ou o prazo: conta como falha (não como latência de sucesso); no prazo,
+            # a latência registrada é o prazo inteiro
+            observe(model, (min(loop.time(), end) - started) * 1000, False, kind)
+            raise
+        except Exception:
+            observe(model, (loop.time() - started) * 1000, False, kind)
+            raise
+        observe(model, (loop.time() - started) * 1000, True, kind)
+        return result
+
+    def launch() -> None:
+        model = queue.pop(0)
+        pending[loop.create_task(timed(model))] = model
+
+    launch()
+    delay = hedge_delay(order[0], kind)
+    hedge_at = loop.time() + delay if delay is not None else None
+    hedged = False
+    try:
+        while pending:
+            now = loop.time()
+            if now >= end:
+                break
+            wake = min(end, hedge_at) if (queue and hedge_at is not None and not hedged) else end
+            done, _ = await asyncio.wait(pending, timeout=max(0.0, wake - now), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                model = pending.pop(task)
+                if task.exception() is None:
+                    if model != order[0] or hedged or last_error is not None:
+                        logger.info("model_router", extra={"kind": kind, "model": model, "preferred": order[0],
+                                                           "hedged": hedged, "failover": last_error is not None})
+                    return model, task.result()
+                last_error = task.exception()
+                logger.warning("model_router_error", extra={"kind": kind, "model": model, "error": str(last_error)})
+            if not queue:
+                continue
+            if not pending:
+                launch()  # failover
+            elif not hedged and hedge_at is not None and loop.time() >= hedge_at:
+                hedged = True  # um hedge por chamada
+                launch()
+    finally:
+        for task in pending:
+            task.cancel()
+    if pending or loop.time() >= end:
+        logger.warning("model_router_deadline", extra={"kind": kind, "models": order})
+        raise RouterDeadlineExceeded(f"Nenhum modelo respondeu em {deadline_seconds() if deadline is None else deadline}s")
+    raise last_error  # type: ignore[misc]
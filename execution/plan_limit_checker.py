@@ -1,10 +1,41 @@
 """
 Verificação de limites por plano (free/pro/enterprise).
 Usado pelo platform_backend ao criar agente e pelo core antes de executar (opcional).
+
+Limite de mensagens sem COUNT(*) por turno:
+- Plano do tenant em cache por PLAN_CACHE_TTL_SECONDS (300s): no Redis (chave plan:{tenant_id},
+  compartilhada entre processos) ou, sem REDIS_URL, em memória do processo. invalidate_plan ao
+  mudar apaga as duas; sem Redis, os outros processos só veem o plano novo quando o TTL vence.
+- Mensagens do mês (linhas de tenant_conversation_log) num contador: chave
+  quota:messages:{tenant_id}:{AAAA-MM} do Redis (REDIS_URL) ou memória do processo. append_log soma
+  cada mensagem gravada com um INCRBY condicional atômico (script Lua: só soma se a chave existe;
+  chave ausente fica para a reconciliação, que grava o total do log).
+- Mês em UTC nos dois lados: a chave do contador e o COUNT da reconciliação usam os mesmos limites
+  [início do mês, início do mês seguinte) em UTC, não o fuso do banco.
+- Reconciliação: a cada QUOTA_RECONCILE_SECONDS (900s) por tenant e processo, o contador é
+  recalculado pelo log do mês (corrige perdas do Redis e mensagens de outros processos sem Redis)
+  e gravado em tenant_usage.conversation_messages.
 """
 
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
 from typing import Optional
 
+logger = logging.getLogger(__name__)
+
+QUOTA_KEY_PREFIX = "quota:messages"
+PLAN_KEY_PREFIX = "plan"
+# INCRBY só se a chave existe (senão o contador começaria do zero): um comando atômico no Redis
+_INCR_IF_EXISTS = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('INCRBY', KEYS[1], ARGV[1])
+end
+return nil
+"""
+
 # Limites por plano
 PLAN_LIMITS = {
     "free": {"agents": 1, "messages_per_month": 500},
@@ -13,8 +44,23 @@ PLAN_LIMITS = {
 }
 
 
-def _get_tenant_plan(tenant_id: str) -> str:
-    """Retorna o plano do tenant (free/pro/enterprise). Default free."""
+_lock = threading.Lock()
+_plans: dict[str, tuple[float, str]] = {}
+_counters: dict[tuple[str, str], int] = {}
+_reconciled: dict[tuple[str, str], float] = {}
+_redis = None
+_incr_script = None
+_usage_column_checked = False
+
+
+def _env_float(key: str, default: float) -> float:
+    try:
+        return float(os.environ.get(key, "").strip() or default)
+    except ValueError:
+        return default
+
+
+def _load_tenant_plan(tenant_id: str) -> str:
     from . import db_sessions as db
     if not db._use_postgres():
         return "free"
@@ -28,6 +74,184 @@ def _get_tenant_plan(tenant_id: str) -> str:
         conn.close()
 
 
+def _plan_key(tenant_id: str) -> str:
+    return f"{PLAN_KEY_PREFIX}:{tenant_id}"
+
+
+def _get_tenant_plan(tenant_id: str) -> str:
+    """
+    Retorna o plano do tenant (free/pro/enterprise). Default free. Em cache por PLAN_CACHE_TTL_SECONDS:
+    no Redis (invalidação vale para todos os processos) ou em memória do processo.
+    """
+    key = str(tenant_id)
+    ttl = _env_float("PLAN_CACHE_TTL_SECONDS", 300.0)
+    client = _redis_client()
+    if client is not None:
+        try:
+            plan = client.get(_plan_key(key))
+            if plan is None:
+                plan = _load_tenant_plan(key)
+                client.set(_plan_key(key), plan, ex=max(1, int(ttl)))
+            return plan
+        except Exception as e:
+            logger.warning("plan_cache_redis_failed", extra={"tenant_id": key, "error": str(e)})
+    now = time.monotonic()
+    with _lock:
+        entry = _plans.get(key)
+    if entry and now - entry[0] < ttl:
+        return entry[1]
+    plan = _load_tenant_plan(key)
+    with _lock:
+        _plans[key] = (now, plan)
+    return plan
+
+
+def invalidate_plan(tenant_id: Optional[str] = None) -> None:
+    """
+    Descarta o plano em cache do tenant (ou de todos). Chamado quando o plano muda. Com Redis a
+    invalidação do tenant vale para todos os processos; sem Redis, só para este.
+    """
+    client = _redis_client()
+    if client is not None and tenant_id is not None:
+        try:
+            client.delete(_plan_key(str(tenant_id)))
+        except Exception as e:
+            logger.warning("plan_cache_redis_failed", extra={"tenant_id": str(tenant_id), "error": str(e)})
+    with _lock:
+        if tenant_id is None:
+            _plans.clear()
+        else:
+            _plans.pop(str(tenant_id), None)
+
+
+def _current_month() -> str:
+    return datetime.utcnow().strftime("%Y-%m")
+
+
+def _month_bounds(month: str) -> tuple[datetime, datetime]:
+    """[início do mês, início do mês seguinte) em UTC para AAAA-MM (o mesmo mês da chave do contador)."""
+    start = datetime.strptime(month, "%Y-%m").replace(tzinfo=timezone.utc)
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start, end
+
+
+def _quota_key(tenant_id: str, month: str) -> str:
+    return f"{QUOTA_KEY_PREFIX}:{tenant_id}:{month}"
+
+
+def _redis_client():
+    """Cliente Redis (sync) do processo; None sem REDIS_URL."""
+    global _redis
+    url = os.environ.get("REDIS_URL", "").strip()
+    if not url:
+        return None
+    if _redis is None:
+        import redis
+        _redis = redis.from_url(url, decode_responses=True)
+    return _redis
+
+
+def _count_month_messages(tenant_id: str, month: str) -> int:
+    """Mensagens do mês (AAAA-MM, UTC) no log (o COUNT(*) que o contador evita a cada turno)."""
+    from . import db_sessions as db
+    start, end = _month_bounds(month)
+    conn = db._get_pg_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """SELECT COUNT(*) AS c FROM tenant_conversation_log
+                   WHERE tenant_id = %s AND timestamp >= %s AND timestamp < %s""",
+                (tenant_id, start, end),
+            )
+            row = cur.fetchone()
+        return row["c"] if row else 0
+    finally:
+        conn.close()
+
+
+def _save_reconciled(tenant_id: str, month: str, count: int) -> None:
+    """Grava o total reconciliado em tenant_usage.conversation_messages (linha do mês)."""
+    from .usage_tracker import _ensure_usage_record, _get_connection
+    global _usage_column_checked
+    conn = _get_connection()
+    try:
+        with conn.cursor() as cur:
+            if not _usage_column_checked:
+                cur.execute("ALTER TABLE tenant_usage ADD COLUMN IF NOT EXISTS conversation_messages INTEGER NOT NULL DEFAULT 0")
+                _usage_column_checked = True
+            _ensure_usage_record(tenant_id, cur)
+            cur.execute(
+                """UPDATE tenant_usage SET conversation_messages = %s, updated_at = NOW()
+                   WHERE tenant_id = %s AND year_month = %s""",
+                (count, tenant_id, month),
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def reconcile_message_count(tenant_id: str) -> int:
+    """Recalcula o contador do mês pelo log, grava em tenant_usage e devolve o total."""
+    tenant_id = str(tenant_id)
+    month = _current_month()
+    count = _count_month_messages(tenant_id, month)
+    client = _redis_client()
+    if client is not None:
+        try:
+            client.set(_quota_key(tenant_id, month), count, ex=40 * 86400)
+        except Exception as e:
+            logger.warning("quota_redis_failed", extra={"tenant_id": tenant_id, "error": str(e)})
+    with _lock:
+        _counters[(tenant_id, month)] = count
+        _reconciled[(tenant_id, month)] = time.monotonic()
+    try:
+        _save_reconciled(tenant_id, month, count)
+    except Exception as e:
+        logger.warning("quota_reconcile_save_failed", extra={"tenant_id": tenant_id, "error": str(e)})
+    logger.info("quota_reconciled", extra={"tenant_id": tenant_id, "year_month": month, "messages": count})
+    return count
+
+
+def record_messages(tenant_id: str, n: int = 1) -> None:
+    """Soma n mensagens gravadas no log ao contador do mês (chamado por db_sessions.append_log)."""
+    tenant_id = str(tenant_id)
+    month = _current_month()
+    client = _redis_client()
+    if client is not None:
+        global _incr_script
+        try:
+            if _incr_script is None:
+                _incr_script = client.register_script(_INCR_IF_EXISTS)
+            # Chave nova: fica para a reconciliação criar (com o total do log), senão começaria do zero
+            _incr_script(keys=[_quota_key(tenant_id, month)], args=[n])
+        except Exception as e:
+            logger.warning("quota_redis_failed", extra={"tenant_id": tenant_id, "error": str(e)})
+    with _lock:
+        if (tenant_id, month) in _counters:
+            _counters[(tenant_id, month)] += n
+
+
+def message_count(tenant_id: str) -> int:
+    """Mensagens do tenant no mês: contador (O(1)); reconcilia quando vencido ou ausente."""
+    tenant_id = str(tenant_id)
+    month = _current_month()
+    with _lock:
+        reconciled_at = _reconciled.get((tenant_id, month))
+        local = _counters.get((tenant_id, month))
+    if reconciled_at is None or time.monotonic() - reconciled_at >= _env_float("QUOTA_RECONCILE_SECONDS", 900.0):
+        return reconcile_message_count(tenant_id)
+    client = _redis_client()
+    if client is not None:
+        try:
+            raw = client.get(_quota_key(tenant_id, month))
+            if raw is not None:
+                return int(raw)
+            return reconcile_message_count(tenant_id)
+        except Exception as e:
+            logger.warning("quota_redis_failed", extra={"tenant_id": tenant_id, "error": str(e)})
+    return local or 0
+
+
 def check_agent_limit(tenant_id: str) -> bool:
     """
     Retorna True se o tenant pode criar mais um agente (dentro do limite do plano).
@@ -51,24 +275,19 @@ def check_agent_limit(tenant_id: str) -> bool:
 def check_message_limit(tenant_id: str, period: str = "month") -> bool:
     """
     Retorna True se o tenant pode enviar mais mensagens no período (dentro do limite do plano).
-    period: "month" (mensagens no mês atual).
+    period: "month" (mensagens no mês atual, pelo contador).
     """
     plan = _get_tenant_plan(tenant_id)
     limit = PLAN_LIMITS.get(plan, PLAN_LIMITS["free"])["messages_per_month"]
     if limit is None:
         return True
+    if period == "month":
+        return message_count(tenant_id) < limit
     from . import db_sessions as db
     conn = db._get_pg_connection()
     try:
         with conn.cursor() as cur:
-            if period == "month":
-                cur.execute(
-                    """SELECT COUNT(*) AS c FROM tenant_conversation_log
-                       WHERE tenant_id = %s AND timestamp >= date_trunc('month', CURRENT_DATE)""",
-                    (tenant_id,),
-                )
-            else:
-                cur.execute("SELECT COUNT(*) AS c FROM tenant_conversation_log WHERE tenant_id = %s", (tenant_id,))
+            cur.execute("SELECT COUNT(*) AS c FROM tenant_conversation_log WHERE tenant_id = %s", (tenant_id,))
             row = cur.fetchone()
         count = row["c"] if row else 0
         return count < limit
@@ -76,6 +295,20 @@ def check_message_limit(tenant_id: str, period: str = "month") -> bool:
         conn.close()
 
 
+def message_quota(tenant_id: str) -> dict:
+    """Cota de mensagens do mês para o dashboard: plano, limite (None = ilimitado), usadas e restantes."""
+    plan = _get_tenant_plan(tenant_id)
+    limit = PLAN_LIMITS.get(plan, PLAN_LIMITS["free"])["messages_per_month"]
+    used = message_count(tenant_id)
+    return {
+        "plan": plan,
+        "year_month": _current_month(),
+        "messages_limit": limit,
+        "messages_used": used,
+        "messages_remaining": None if limit is None else max(0, limit - used),
+    }
+
+
 def get_plan_limits(plan: str) -> dict:
     """Retorna os limites do plano (agents, messages_per_month)."""
     return dict(PLAN_LIMITS.get(plan, PLAN_LIMITS["free"]))
@@ -0,0 +1,108 @@
+"""
+Cache de templates de prompt montados a partir de arquivos de diretiva (directives/*.md).
+Cada template é renderizado uma vez por chave (ex.: modo de persona + estado SPIN) e reaproveitado
+em todos os turnos: sem leitura de disco nem concatenação no caminho quente. Os arquivos são
+verificados por mtime no máximo a cada PROMPT_TEMPLATE_CHECK_SECONDS (padrão 2s); se algum mudou,
+os templates são renderizados de novo no próximo uso.
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Hashable, Optional
+
+from .tokens import estimate_tokens
+
+
+@dataclass(frozen=True)
+class RenderedPrompt:
+    """Template pronto: texto e tamanho em tokens (ver tokens.estimate_tokens)."""
+    text: str
+    tokens: int
+
+
+def _check_interval() -> float:
+    try:
+        return max(0.0, float(os.environ.get("PROMPT_TEMPLATE_CHECK_SECONDS", "").strip() or 2))
+    except ValueError:
+        return 2.0
+
+
+class PromptTemplateCache:
+    """
+    Templates por chave, invalidados quando algum arquivo de diretiva muda (mtime) ou some/aparece.
+    render recebe {nome do arquivo: conteúdo} (só os existentes) e devolve o texto do template.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        self._templates: dict[Hashable, RenderedPrompt] = {}
+        self._files: dict[str, Optional[str]] = {}  # conteúdo lido (None = arquivo ausente)
+        self._mtimes: dict[str, Optional[float]] = {}
+        self._checked_at = 0.0
+        self._generation = 0  # incrementada a cada descarte: render antigo não volta ao cache
+        self.renders = 0
+        self.hits = 0
+
+    def _mtime(self, name: str) -> Optional[float]:
+        try:
+            return (self.directory / name).stat().st_mtime
+        except OSError:
+            return None
+
+    def _check(self, now: float) -> None:
+        """Descarta tudo se algum arquivo já lido mudou. Chamar com _lock adquirido."""
+        if now - self._checked_at < _check_interval():
+            return
+        self._checked_at = now
+        if any(self._mtime(name) != mtime for name, mtime in self._mtimes.items()):
+            self._clear()
+
+    def _clear(self) -> None:
+        """Chamar com _lock adquirido."""
+        self._templates.clear()
+        self._files.clear()
+        self._mtimes.clear()
+        self._generation += 1
+
+    def _read(self, name: str) -> Optional[str]:
+        if name not in self._files:
+            self._mtimes[name] = self._mtime(name)
+            path = self.directory / name
+            self._files[name] = path.read_text(encoding="utf-8") if path.exists() else None
+        return self._files[name]
+
+    def get(self, key: Hashable, files: list[str], render: Callable[[dict[str, str]], str]) -> RenderedPrompt:
+        with self._lock:
+            self._check(time.monotonic())
+            cached = self._templates.get(key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+            contents = {name: text for name in files if (text := self._read(name)) is not None}
+            generation = self._generation
+        # Renderização fora do lock (pode contar tokens); corrida só duplica trabalho. Se houve
+        # invalidação no meio, o texto foi montado com arquivos antigos: serve este uso e não fica no cache
+        text = render(contents)
+        rendered = RenderedPrompt(text=text, tokens=estimate_tokens(text))
+        with self._lock:
+            if generation == self._generation:
+                self._templates[key] = rendered
+            self.renders += 1
+        return rendered
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> dict:
+        """Templates em cache com o tamanho em tokens, e contadores de hit/render."""
+        with self._lock:
+            return {
+                "templates": {str(k): {"tokens": v.tokens, "chars": len(v.text)} for k, v in self._templates.items()},
+                "hits": self.hits,
+                "renders": self.renders,
+            }
@@ -0,0 +1,242 @@
+"""
+Cache semântico de respostas (opt-in por agente) na frente do LLM.
+Perguntas quase iguais (saudações, "quanto custa?") num mesmo agente, estado e contexto recuperado
+são respondidas com a resposta estruturada já gerada, sem chamar o modelo.
+
+- Ativação: agents.settings.response_cache = true ou {"enabled": true, "similarity": 0.95,
+  "ttl_hours": 24, "states": ["descoberta"]}. Padrões: RESPONSE_CACHE_SIMILARITY,
+  RESPONSE_CACHE_TTL_HOURS e RESPONSE_CACHE_STATES.
+- Chave: tenant + agente + estado + hash do contexto (RAG recuperado, histórico recente e persona
+  do agente) e embedding da mensagem (pgvector) com similaridade mínima. Documento, persona ou
+  conversa diferentes mudam o hash: a entrada antiga deixa de ser usada e expira pelo TTL. No
+  histórico o nome do lead vira {nome}, então a mesma conversa de leads diferentes cai na mesma chave.
+- Só conversas no começo (sem resumo, ver conversation_summary) usam o cache: depois disso a
+  resposta depende do histórico. Turno com a busca RAG falha (rag_error) não consulta nem grava.
+- O nome do lead (spin_answers.nome) é guardado como {nome} e preenchido na hora do hit.
+Contadores do processo em stats(); hits por entrada na tabela response_cache.
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+NAME_PLACEHOLDER = "{nome}"
+
+_schema_checked = False
+_lock = threading.Lock()
+_stats = {"lookups": 0, "hits": 0, "stores": 0}
+
+
+def _env_float(key: str, default: float) -> float:
+    try:
+        return float(os.environ.get(key, "").strip() or default)
+    except ValueError:
+        return default
+
+
+def _default_states() -> list[str]:
+    raw = os.environ.get("RESPONSE_CACHE_STATES", "").strip() or "descoberta"
+    return [s.strip() for s in raw.split(",") if s.strip()]
+
+
+def _connection():
+    from .document_ingest import _get_connection
+    conn = _get_connection()
+    global _schema_checked
+    if not _schema_checked:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    id BIGSERIAL PRIMARY KEY,
+                    tenant_id UUID NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+                    agent_id UUID NOT NULL REFERENCES agents(id) ON DELETE CASCADE,
+                    state TEXT NOT NULL,
+                    context_hash TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    embedding vector(1536) NOT NULL,
+                    response JSONB NOT NULL,
+                    hits INT NOT NULL DEFAULT 0,
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                    last_hit_at TIMESTAMPTZ
+                )
+                """
+            )
+            cur.execute(
+                "CREATE INDEX IF NOT EXISTS idx_response_cache_key ON response_cache (tenant_id, agent_id, state, context_hash)"
+            )
+        conn.commit()
+        _schema_checked = True
+    return conn
+
+
+def _parse_config(raw: Any) -> Optional[dict]:
+    """settings.response_cache normalizado; None quando desativado."""
+    if raw is True:
+        raw = {"enabled": True}
+    if not isinstance(raw, dict) or not raw.get("enabled"):
+        return None
+    return {
+        "similarity": float(raw.get("similarity") or _env_float("RESPONSE_CACHE_SIMILARITY", 0.95)),
+        "ttl_hours": float(raw.get("ttl_hours") or _env_float("RESPONSE_CACHE_TTL_HOURS", 24.0)),
+        "states": list(raw.get("states") or _default_states()),
+    }
+
+
+def cache_config(tenant_id: str, agent_id: str) -> Optional[dict]:
+    """Configuração do cache do agente (settings do roster em cache, ver tenant_config)."""
+    from .tenant_config import get_agent_settings
+    return _parse_config(get_agent_settings(tenant_id, agent_id).get("response_cache"))
+
+
+def context_hash(state: str, rag_context: str, *persona: Optional[str]) -> str:
+    """Hash do que, além da mensagem, determina a resposta: estado, contexto recuperado e persona."""
+    h = hashlib.sha256()
+    for part in (state, rag_context, *persona):
+        h.update((part or "").encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def history_key(recent_log: Optional[list[dict]], lead_name: Optional[str] = None) -> str:
+    """Hash do histórico recente (papel e texto de cada mensagem), com o nome do lead trocado por {nome}."""
+    h = hashlib.sha256()
+    name = (lead_name or "").strip()
+    for m in recent_log or []:
+        content = m.get("content") or ""
+        if name:
+            content = re.sub(re.escape(name), NAME_PLACEHOLDER, content)
+        h.update(f"{m.get('role') or ''}\x00{content}\x00".encode("utf-8"))
+    return h.hexdigest()
+
+
+def template_reply(out: dict, lead_name: Optional[str]) -> dict:
+    """Resposta a guardar: só os campos estruturados, com o nome do lead trocado por {nome}."""
+    reply = {k: copy.deepcopy(out.get(k)) for k in ("resposta_texto", "enviar_audio", "proximo_estado", "enviar_imagens", "modelos")}
+    if lead_name and lead_name.strip():
+        reply["resposta_texto"] = re.sub(re.escape(lead_name.strip()), NAME_PLACEHOLDER, reply["resposta_texto"] or "")
+    return reply
+
+
+def render_reply(reply: dict, lead_name: Optional[str]) -> dict:
+    """Preenche {nome}; sem nome conhecido, remove o vocativo ("Olá, {nome}!" -> "Olá!")."""
+    out = copy.deepcopy(reply)
+    text = out.get("resposta_texto") or ""
+    if lead_name and lead_name.strip():
+        text = text.replace(NAME_PLACEHOLDER, lead_name.strip())
+    else:
+        text = re.sub(r",?\s*\{nome\}", "", re.sub(r"\{nome\},\s*", "", text))
+    out["resposta_texto"] = text
+    return out
+
+
+def lookup(
+    tenant_id: str,
+    agent_id: str,
+    state: str,
+    ctx_hash: str,
+    query: str,
+    config: dict,
+    lead_name: Optional[str] = None,
+) -> Optional[dict]:
+    """Resposta em cache mais próxima da mensagem (dentro do TTL e da similaridade) ou None."""
+    from .knowledge_rag import embed_query
+    vec = "[" + ",".join(str(x) for x in embed_query(query, tenant_id=tenant_id)) + "]"
+    conn = _connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """SELECT id, response, 1 - (embedding <=> %s::vector) AS similarity FROM response_cache
+                   WHERE tenant_id = %s AND agent_id = %s AND state = %s AND context_hash = %s
+                     AND created_at > NOW() - make_interval(secs => %s)
+                   ORDER BY embedding <=> %s::vector
+                   LIMIT 1""",
+                (vec, tenant_id, agent_id, state, ctx_hash, config["ttl_hours"] * 3600, vec),
+            )
+            row = cur.fetchone()
+            hit = row is not None and float(row["similarity"]) >= config["similarity"]
+            if hit:
+                cur.execute("UPDATE response_cache SET hits = hits + 1, last_hit_at = NOW() WHERE id = %s", (row["id"],))
+        conn.commit()
+    finally:
+        conn.close()
+    with _lock:
+        _stats["lookups"] += 1
+        _stats["hits"] += int(hit)
+    logger.info("response_cache", extra={
+        "tenant_id": tenant_id, "agent_id": agent_id, "state": state, "hit": hit,
+        "similarity": round(float(row["similarity"]), 4) if row else None,
+    })
+    if not hit:
+        return None
+    response = row["response"] if isinstance(row["response"], dict) else json.loads(row["response"])
+    return render_reply(response, lead_name)
+
+
+def store(
+    tenant_id: str,
+    agent_id: str,
+    state: str,
+    ctx_hash: str,
+    query: str,
+    out: dict,
+    lead_name: Optional[str] = None,
+) -> None:
+    """Guarda a resposta do LLM (o embedding da mensagem já foi calculado no lookup)."""
+    if not (out.get("resposta_texto") or "").strip():
+        return
+    from .knowledge_rag import embed_query
+    vec = "[" + ",".join(str(x) for x in embed_query(query, tenant_id=tenant_id)) + "]"
+    conn = _connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """INSERT INTO response_cache (tenant_id, agent_id, state, context_hash, query, embedding, response)
+                   VALUES (%s, %s, %s, %s, %s, %s::vector, %s)""",
+                (tenant_id, agent_id, state, ctx_hash, query.strip(), vec,
+                 json.dumps(template_reply(out, lead_name), ensure_ascii=False)),
+            )
+        conn.commit()
+    finally:
+        conn.close()
+    with _lock:
+        _stats["stores"] += 1
+
+
+def cached_reply(
+    tenant_id: str,
+    agent_id: str,
+    state: str,
+    query: str,
+    rag_context: str,
+    persona: tuple,
+    lead_name: Optional[str] = None,
+    recent_log: Optional[list[dict]] = None,
+    rag_error: bool = False,
+) -> tuple[Optional[str], Optional[dict]]:
+    """
+    (hash do contexto, resposta em cache) do turno. Hash None: cache desativado ou turno não
+    elegível (estado fora da lista, busca RAG com erro); nada a guardar depois do LLM.
+    """
+    if rag_error:
+        return None, None
+    config = cache_config(tenant_id, agent_id)
+    if not config or state not in config["states"] or not query.strip():
+        return None, None
+    ctx_hash = context_hash(state, rag_context, history_key(recent_log, lead_name), *persona)
+    return ctx_hash, lookup(tenant_id, agent_id, state, ctx_hash, query, config, lead_name)
+
+
+def stats() -> dict:
+    """Contadores do processo: consultas, hits, respostas guardadas e taxa de acerto."""
+    with _lock:
+        s = dict(_stats)
+    s["hit_rate"] = round(s["hits"] / s["lookups"], 4) if s["lookups"] else 0.0
+    return s
@@ -0,0 +1,185 @@
+"""
+Roteamento fixo por conversa (tenant + lead): depois de uma decisão do supervisor, as mensagens
+seguintes vão para o mesmo agente sem reavaliar.
+- Estado: {"agent_id", "confidence", "routed_at"} na chave routing:{tenant_id}:{agente de entrada}:{lead}
+  do Redis (REDIS_URL) ou em memória do processo, por ROUTING_STICKY_TTL_SECONDS (6h) desde a
+  última mensagem. O handoff também vai para conversations.routed_agent_id (conversa do agente
+  de entrada): com o estado expirado ou em outro processo, a conversa continua no agente roteado.
+- Reavaliação: nunca antes de ROUTING_COOLDOWN_SECONDS (120s) depois de um handoff. Depois disso,
+  só quando a mensagem traz um sinal de troca de assunto (ROUTING_TOPIC_CHANGE_WORDS) ou quando a
+  confiança, que começa em 1 e é multiplicada por ROUTING_CONFIDENCE_DECAY (0.85) a cada mensagem
+  sem reavaliar, fica abaixo de ROUTING_MIN_CONFIDENCE (0.5).
+- Agente de entrada sem delegação nem equipe: nada é lido nem gravado (supervisor responde do
+  roster em memória).
+- decide_route só lê (roda sob timeout no turno); record_route grava a decisão que o turno de
+  fato usou (etapa sem timeout).
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from . import db_sessions as db
+from . import supervisor
+from .tenant_config import get_tenant_roster
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "routing"
+SUPERVISOR_LOG_MESSAGES = 3  # o supervisor usa as 3 últimas mensagens
+DEFAULT_TOPIC_CHANGE_WORDS = (
+    "outro assunto,mudar de assunto,outra coisa,outra dúvida,falar com,atendente,humano,"
+    "departamento,setor,financeiro,suporte"
+)
+
+_lock = threading.Lock()
+_local: dict[str, tuple[float, dict]] = {}
+_redis = None
+
+
+def _env_float(key: str, default: float) -> float:
+    try:
+        return float(os.environ.get(key, "").strip() or default)
+    except ValueError:
+        return default
+
+
+def _ttl_seconds() -> int:
+    return int(_env_float("ROUTING_STICKY_TTL_SECONDS", 6 * 3600))
+
+
+def _key(tenant_id: str, entry_agent_id: str, lead_id: str) -> str:
+    return f"{KEY_PREFIX}:{tenant_id}:{entry_agent_id}:{lead_id}"
+
+
+def _redis_client():
+    """Cliente Redis (sync) do processo; None sem REDIS_URL."""
+    global _redis
+    url = os.environ.get("REDIS_URL", "").strip()
+    if not url:
+        return None
+    if _redis is None:
+        import redis
+        _redis = redis.from_url(url, decode_responses=True)
+    return _redis
+
+
+def _read_cache(key: str) -> Optional[dict]:
+    client = _redis_client()
+    if client is not None:
+        try:
+            raw = client.get(key)
+            return json.loads(raw) if raw else None
+        except Exception as e:
+            logger.warning("routing_state_redis_failed", extra={"key": key, "error": str(e)})
+    with _lock:
+        entry = _local.get(key)
+    if entry and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+
+def _write_cache(key: str, state: dict) -> None:
+    client = _redis_client()
+    if client is not None:
+        try:
+            client.set(key, json.dumps(state), ex=_ttl_seconds())
+            return
+        except Exception as e:
+            logger.warning("routing_state_redis_failed", extra={"key": key, "error": str(e)})
+    with _lock:
+        now = time.monotonic()
+        for k in [k for k, (expires, _) in _local.items() if expires <= now]:
+            del _local[k]
+        _local[key] = (now + _ttl_seconds(), state)
+
+
+def load(tenant_id: str, entry_agent_id: str, lead_id: str) -> Optional[dict]:
+    """Estado da conversa (cache) ou o último handoff gravado em conversations."""
+    state = _read_cache(_key(tenant_id, entry_agent_id, lead_id))
+    if state is None:
+        try:
+            state = db.get_routing(lead_id, tenant_id=tenant_id, agent_id=entry_agent_id)
+        except Exception as e:
+            logger.warning("routing_state_db_failed", extra={"tenant_id": tenant_id, "error": str(e)})
+    return state
+
+
+def clear(tenant_id: str, entry_agent_id: str, lead_id: str) -> None:
+    """Descarta o estado de roteamento da conversa (reset_session); o handoff gravado é limpo pelo reset."""
+    key = _key(tenant_id, entry_agent_id, lead_id)
+    client = _redis_client()
+    if client is not None:
+        try:
+            client.delete(key)
+        except Exception as e:
+            logger.warning("routing_state_redis_failed", extra={"key": key, "error": str(e)})
+    with _lock:
+        _local.pop(key, None)
+
+
+def topic_changed(message: str) -> bool:
+    """Sinal de troca de assunto na mensagem (palavras de ROUTING_TOPIC_CHANGE_WORDS)."""
+    raw = os.environ.get("ROUTING_TOPIC_CHANGE_WORDS", "").strip() or DEFAULT_TOPIC_CHANGE_WORDS
+    text = message.lower()
+    return any(word.strip() and word.strip().lower() in text for word in raw.split(","))
+
+
+def decide_route(
+    tenant_id: str,
+    entry_agent_id: str,
+    lead_id: str,
+    user_message: str,
+) -> dict:
+    """
+    Decisão do turno, sem gravar nada: {"target_agent_id", "reason", "handoff", "state"}.
+    handoff=True só quando o agente mudou neste turno (para gravar a memória compartilhada uma vez);
+    "state" é o estado a gravar por record_route (None quando o agente de entrada não roteia). O
+    histórico que o supervisor recebe (do agente atual) só é lido quando há reavaliação.
+    """
+    if not supervisor.can_route(tenant_id, entry_agent_id):
+        decision = supervisor.route_conversation(tenant_id, user_message, [], current_agent_id=entry_agent_id)
+        return {**decision, "handoff": False, "state": None}
+
+    now = time.time()
+    state = load(tenant_id, entry_agent_id, lead_id)
+    if state and not (get_tenant_roster(tenant_id).get(state["agent_id"]) or {}).get("active"):
+        state = None  # agente roteado pausado ou excluído
+    if state:
+        in_cooldown = now - state["routed_at"] < _env_float("ROUTING_COOLDOWN_SECONDS", 120.0)
+        confident = state["confidence"] >= _env_float("ROUTING_MIN_CONFIDENCE", 0.5)
+        if in_cooldown or (confident and not topic_changed(user_message)):
+            if not in_cooldown:
+                state = {**state, "confidence": state["confidence"] * _env_float("ROUTING_CONFIDENCE_DECAY", 0.85)}
+            logger.info("routing_sticky", extra={
+                "tenant_id": tenant_id, "lead_id": lead_id, "agent_id": state["agent_id"],
+                "cooldown": in_cooldown, "confidence": round(state["confidence"], 3),
+            })
+            return {"target_agent_id": state["agent_id"], "reason": "Sticky routing", "handoff": False, "state": state}
+
+    current = state["agent_id"] if state else entry_agent_id
+    recent_log = db.get_recent_log(lead_id, limit=SUPERVISOR_LOG_MESSAGES, tenant_id=tenant_id, agent_id=current)
+    decision = supervisor.route_conversation(
+        tenant_id, user_message, recent_log, current_agent_id=current, entry_agent_id=entry_agent_id,
+    )
+    target = decision.get("target_agent_id") or current
+    handoff = target != current
+    state = {"agent_id": target, "confidence": 1.0, "routed_at": now if handoff else (state or {}).get("routed_at", 0.0)}
+    return {**decision, "target_agent_id": target, "handoff": handoff, "state": state}
+
+
+def record_route(tenant_id: str, entry_agent_id: str, lead_id: str, decision: dict) -> None:
+    """Grava o estado da decisão (cache) e, no handoff, conversations.routed_agent_id."""
+    state = decision.get("state")
+    if not state:
+        return
+    _write_cache(_key(tenant_id, entry_agent_id, lead_id), state)
+    if decision.get("handoff"):
+        try:
+            db.save_routing(lead_id, state["agent_id"], state["confidence"], tenant_id=tenant_id, agent_id=entry_agent_id)
+        except Exception as e:
+            logger.warning("routing_state_db_failed", extra={"tenant_id": tenant_id, "error": str(e)})
+
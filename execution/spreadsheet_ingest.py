@@ -0,0 +1,172 @@
+"""
+Ingestão de planilhas em streaming (.xlsx, .xls, .csv).
+Lê linha a linha (openpyxl read_only, xlrd on_demand, csv.reader) e agrupa as linhas em chunks
+que repetem o cabeçalho da aba, para que cada trecho seja entendido sozinho na busca
+("Quarto | Diária | Temporada" + as linhas). A memória fica constante mesmo em tabelas de
+centenas de milhares de linhas: nada além do chunk atual é mantido.
+
+Cada chunk é {"content": texto, "metadata": {"sheet": aba, "row_start": n, "row_end": m}}
+(linhas numeradas a partir de 1, como no Excel).
+
+Variável de ambiente: SPREADSHEET_CHUNK_CHARS (tamanho alvo do chunk, padrão 1200).
+"""
+
+import csv
+import os
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+SPREADSHEET_EXTENSIONS = frozenset({".xlsx", ".xls", ".csv"})
+DEFAULT_CHUNK_CHARS = 1200
+
+# (aba, número da linha, células)
+Row = Tuple[Optional[str], int, List[str]]
+
+
+def is_spreadsheet(file_path: str) -> bool:
+    return Path(file_path).suffix.lower() in SPREADSHEET_EXTENSIONS
+
+
+def _cell_text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _trim(cells: List[str]) -> List[str]:
+    """Remove células vazias do fim da linha."""
+    end = len(cells)
+    while end and not cells[end - 1]:
+        end -= 1
+    return cells[:end]
+
+
+def _iter_xlsx(path: Path) -> Iterator[Row]:
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise RuntimeError("Para Excel .xlsx instale: pip install openpyxl") from None
+    wb = load_workbook(str(path), read_only=True, data_only=True)
+    try:
+        for sheet in wb.worksheets:
+            for n, row in enumerate(sheet.iter_rows(values_only=True), start=1):
+                yield sheet.title, n, [_cell_text(c) for c in row]
+    finally:
+        wb.close()
+
+
+def _iter_xls(path: Path) -> Iterator[Row]:
+    try:
+        import xlrd
+    except ImportError:
+        raise RuntimeError("Para Excel .xls instale: pip install xlrd") from None
+    wb = xlrd.open_workbook(str(path), on_demand=True)
+    try:
+        for name in wb.sheet_names():
+            sheet = wb.sheet_by_name(name)
+            for n in range(sheet.nrows):
+                yield name, n + 1, [_cell_text(v) for v in sheet.row_values(n)]
+            wb.unload_sheet(name)
+    finally:
+        wb.release_resources()
+
+
+def _iter_csv(path: Path) -> Iterator[Row]:
+    with open(path, "r", encoding="utf-8-sig", errors="replace", newline="") as f:
+        sample = f.read(64 * 1024)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+        except csv.Error:
+            dialect = csv.excel
+        for n, row in enumerate(csv.reader(f, dialect), start=1):
+            yield None, n, [c.strip() for c in row]
+
+
+def iter_rows(file_path: str) -> Iterator[Row]:
+    """Linhas da planilha, uma a uma: (aba ou None no CSV, número da linha, células)."""
+    path = Path(file_path)
+    if not path.exists():
+        raise FileNotFoundError(f"Arquivo não encontrado: {file_path}")
+    suf = path.suffix.lower()
+    if suf == ".xlsx":
+        return _iter_xlsx(path)
+    if suf == ".xls":
+        return _iter_xls(path)
+    if suf == ".csv":
+        return _iter_csv(path)
+    raise ValueError(f"Formato de planilha não suportado: {suf}. Use .xlsx, .xls ou .csv.")
+
+
+def _chunk_size() -> int:
+    try:
+        return max(200, int(os.environ.get("SPREADSHEET_CHUNK_CHARS", "").strip() or DEFAULT_CHUNK_CHARS))
+    except ValueError:
+        return DEFAULT_CHUNK_CHARS
+
+
+def iter_row_chunks(file_path: str, max_chars: Optional[int] = None) -> Iterator[dict]:
+    """
+    Chunks da planilha em streaming. O primeiro registro não vazio de cada aba é o cabeçalho
+    e é repetido no início de todos os chunks daquela aba.
+    """
+    max_chars = max_chars or _chunk_size()
+    sheet: Optional[str] = None
+    header: Optional[str] = None
+    header_row = 0
+    prefix = ""
+    lines: List[str] = []
+    size = 0
+    row_start = row_end = 0
+    emitted = False  # a aba atual já gerou algum chunk
+    started = False
+
+    def flush(end_of_sheet: bool = False) -> Optional[dict]:
+        if lines:
+            return {
+                "content": prefix + "\n".join(lines),
+                "metadata": {"sheet": sheet, "row_start": row_start, "row_end": row_end},
+            }
+        if end_of_sheet and header is not None and not emitted:
+            # Aba com uma linha só: o "cabeçalho" é o próprio conteúdo
+            content = (f"Planilha: {sheet}\n" if sheet else "") + header
+            return {"content": content, "metadata": {"sheet": sheet, "row_start": header_row, "row_end": header_row}}
+        return None
+
+    for row_sheet, n, cells in iter_rows(file_path):
+        if not started or row_sheet != sheet:
+            if started:
+                chunk = flush(end_of_sheet=True)
+                if chunk:
+                    yield chunk
+            sheet, header, prefix, lines, size, emitted = row_sheet, None, "", [], 0, False
+            started = True
+        cells = _trim(cells)
+        if not any(cells):
+            continue
+        line = " | ".join(cells)
+        if header is None:
+            header, header_row = line, n
+            prefix = (f"Planilha: {sheet}\n" if sheet else "") + f"Colunas: {header}\n"
+            continue
+        if lines and len(prefix) + size + len(line) + 1 > max_chars:
+            yield flush()
+            emitted = True
+            lines, size = [], 0
+        if not lines:
+            row_start = n
+        lines.append(line)
+        size += len(line) + 1
+        row_end = n
+
+    if started:
+        chunk = flush(end_of_sheet=True)
+        if chunk:
+            yield chunk
+
+
+def extract_text(file_path: str) -> str:
+    """Texto completo da planilha (cabeçalho + linhas), para quem precisa de uma string só."""
+    return "\n\n".join(c["content"] for c in iter_row_chunks(file_path))
@@ -0,0 +1,75 @@
+"""
+Entrega progressiva de respostas em stream para canais que editam mensagens (Telegram).
+A primeira parte vira uma mensagem (send); as seguintes editam essa mensagem (edit), no máximo
+uma vez a cada TELEGRAM_STREAM_EDIT_SECONDS (padrão 1,0s) e só quando o texto cresceu pelo
+menos TELEGRAM_STREAM_MIN_CHARS caracteres (padrão 20), para respeitar o limite de edições da
+API. finish() garante que a mensagem termine com o texto final.
+"""
+
+import asyncio
+import inspect
+import os
+import time
+from typing import Any, Callable, Optional
+
+
+def _env_float(key: str, default: float) -> float:
+    try:
+        return max(0.0, float(os.environ.get(key, "").strip() or default))
+    except ValueError:
+        return default
+
+
+def streaming_enabled() -> bool:
+    """LLM_STREAM_REPLIES=0 desliga a entrega progressiva (resposta só no final, como antes)."""
+    return os.environ.get("LLM_STREAM_REPLIES", "1").strip().lower() not in ("0", "false", "no")
+
+
+async def _call(fn: Callable, *args: Any) -> Any:
+    """Aceita callbacks síncronos (rodam em thread, ex.: httpx síncrono) ou assíncronos."""
+    if inspect.iscoroutinefunction(fn):
+        return await fn(*args)
+    return await asyncio.to_thread(fn, *args)
+
+
+class ThrottledEditor:
+    """
+    send(text) -> identificador da mensagem (None se falhou); edit(identificador, text) -> None.
+    update(texto parcial) é o on_partial do orquestrador.
+    """
+
+    def __init__(self, send: Callable, edit: Callable):
+        self._send = send
+        self._edit = edit
+        self._interval = _env_float("TELEGRAM_STREAM_EDIT_SECONDS", 1.0)
+        self._min_chars = int(_env_float("TELEGRAM_STREAM_MIN_CHARS", 20))
+        self._lock = asyncio.Lock()
+        self.message: Optional[Any] = None
+        self.shown = ""
+        self._last = 0.0
+
+    async def update(self, text: str) -> None:
+        text = text.strip()
+        if not text or self._lock.locked():
+            return  # envio anterior ainda em andamento: pula este parcial
+        async with self._lock:
+            now = time.monotonic()
+            if self.message is None:
+                self.message = await _call(self._send, text)
+            elif now - self._last < self._interval or len(text) - len(self.shown) < self._min_chars:
+                return
+            else:
+                await _call(self._edit, self.message, text)
+            self.shown = text
+            self._last = now
+
+    async def finish(self, text: str) -> bool:
+        """Texto final na mensagem. False se nada foi enviado (o chamador envia normalmente)."""
+        text = text.strip()
+        async with self._lock:
+            if self.message is None:
+                return False
+            if text and text != self.shown:
+                await _call(self._edit, self.message, text)
+                self.shown = text
+            return True
@@ -8,8 +8,12 @@ from pathlib import Path
 
 from openai import OpenAI
 
+from .http_clients import openai_client
+from .usage_scope import add_usage
+
 # Limite de tamanho para a API (25 MB para Whisper)
 MAX_FILE_SIZE_MB = 25
+STT_MODEL = "whisper-1"
 
 
 def _project_root() -> Path:
@@ -20,7 +24,7 @@ def _get_client() -> OpenAI:
     key = os.environ.get("OPENAI_API_KEY", "").strip()
     if not key:
         raise ValueError("OPENAI_API_KEY não configurado.")
-    return OpenAI(api_key=key)
+    return openai_client(key)
 
 
 def transcribe(audio_path: str | Path, language: str | None = "pt") -> str:
@@ -38,14 +42,16 @@ def transcribe(audio_path: str | Path, language: str | None = "pt") -> str:
 
     client = _get_client()
     with open(path, "rb") as f:
+        # verbose_json traz a duração do áudio (base de cobrança do Whisper)
         transcript = client.audio.transcriptions.create(
-            model="whisper-1",
+            model=STT_MODEL,
             file=f,
             language=language,
-            response_format="text",
+            response_format="verbose_json",
         )
     if isinstance(transcript, str):
         return transcript.strip()
+    add_usage("stt", STT_MODEL, audio_seconds=float(getattr(transcript, "duration", 0) or 0))
     return (getattr(transcript, "text", None) or "").strip()
 
 
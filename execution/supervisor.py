@@ -6,7 +6,10 @@ com base no perfil (niche/description) de cada agente disponível no Tenant.
 
 import json
 import os
-from execution.db_sessions import _use_postgres, _get_pg_connection
+import time
+from execution.llm_usage import record_llm_usage
+from execution.intent_router import decide
+from execution.tenant_config import get_tenant_roster
 
 # Fallback models in order of preference for pure routing logic (requires fast inference + tool calling)
 SUPERVISOR_MODELS = [
@@ -15,122 +18,111 @@ SUPERVISOR_MODELS = [
     "google/gemini-flash-1.5"
 ]
 
+def _get_roster(tenant_id: str) -> dict[str, dict]:
+    """Agentes do tenant em cache (tenant_config.get_tenant_roster); vazio sem Postgres ou em erro."""
+    try:
+        return get_tenant_roster(tenant_id)
+    except Exception as e:
+        print(f"Error fetching tenant roster for supervisor: {e}")
+        return {}
+
+
+def _describe(r: dict) -> str:
+    desc = f"Name: {r['name']} - Niche: {r['niche']}"
+    if r['prompt_custom']:
+        desc += f" - Behavior: {r['prompt_custom'][:100]}..."
+    return desc
+
+
 def _get_tenant_agents(tenant_id: str, allowed_ids: list[str] | None = None, team_id: str | None = None) -> list[dict]:
     """Retorna a lista de agentes ativos disponíveis no tenant.
     Se allowed_ids for fornecido, filtra apenas esses agentes (para can_delegate_to).
     Se team_id for fornecido, filtra apenas agentes daquela equipe.
     """
-    if not _use_postgres():
-        return []
-    
-    conn = _get_pg_connection()
     agents = []
-    try:
-        with conn.cursor() as cur:
-            query = "SELECT id, name, niche, prompt_custom, settings FROM agents WHERE tenant_id = %s AND active = true"
-            params = [tenant_id]
-            if team_id:
-                query += " AND team_id = %s"
-                params.append(team_id)
-                
-            cur.execute(query, tuple(params))
-            rows = cur.fetchall()
-            for r in rows:
-                agent_id = str(r["id"])
-                # Filter by allowed_ids if provided
-                if allowed_ids is not None and agent_id not in allowed_ids:
-                    continue
-                desc = f"Name: {r['name']} - Niche: {r['niche']}"
-                if r['prompt_custom']:
-                    desc += f" - Behavior: {r['prompt_custom'][:100]}..."
-                agents.append({
-                    "id": agent_id,
-                    "name": r["name"],
-                    "description": desc
-                })
-        return agents
-    except Exception as e:
-        print(f"Error fetching tenant agents for supervisor: {e}")
-        return []
-    finally:
-        conn.close()
+    for agent_id, r in _get_roster(tenant_id).items():
+        if not r["active"]:
+            continue
+        if team_id and r["team_id"] != str(team_id):
+            continue
+        # Filter by allowed_ids if provided
+        if allowed_ids is not None and agent_id not in allowed_ids:
+            continue
+        agents.append({
+            "id": agent_id,
+            "name": r["name"],
+            "description": _describe(r)
+        })
+    return agents
 
 
 def _get_agent_settings(tenant_id: str, agent_id: str) -> dict:
-    """Busca settings do agente atual para ler can_delegate_to."""
-    if not _use_postgres():
-        return {}
-    conn = _get_pg_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute(
-                "SELECT settings FROM agents WHERE id = %s AND tenant_id = %s",
-                (agent_id, tenant_id)
-            )
-            row = cur.fetchone()
-            if row and row["settings"]:
-                settings = row["settings"]
-                if isinstance(settings, str):
-                    settings = json.loads(settings)
-                return settings if isinstance(settings, dict) else {}
-        return {}
-    except Exception as e:
-        print(f"Error fetching agent settings: {e}")
-        return {}
-    finally:
-        conn.close()
+    """Settings do agente atual (do roster em cache) para ler can_delegate_to."""
+    return (_get_roster(tenant_id).get(str(agent_id)) or {}).get("settings") or {}
 
 
 def _get_agent_team_id(tenant_id: str, agent_id: str) -> str | None:
-    """Busca o team_id do agente atual."""
-    if not _use_postgres():
-        return None
-    conn = _get_pg_connection()
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT team_id FROM agents WHERE id = %s AND tenant_id = %s", (agent_id, tenant_id))
-            row = cur.fetchone()
-            if row and row["team_id"]:
-                return str(row["team_id"])
-        return None
-    except Exception:
-        return None
-    finally:
-        conn.close()
-
-
-def route_conversation(tenant_id: str, user_message: str, recent_log: list[dict], current_agent_id: str | None = None) -> dict:
+    """team_id do agente atual (do roster em cache)."""
+    return (_get_roster(tenant_id).get(str(agent_id)) or {}).get("team_id")
+
+
+def _delegation_scope(tenant_id: str, agent_id: str) -> tuple[list[str] | None, str | None]:
+    """(can_delegate_to, team_id) do agente; (None, None) quando ele não delega nem está em equipe."""
+    can_delegate_to = _get_agent_settings(tenant_id, agent_id).get("can_delegate_to")
+    if isinstance(can_delegate_to, list) and len(can_delegate_to) > 0:
+        return [str(aid) for aid in can_delegate_to], None
+    # Fallback para roteamento de equipe inteira
+    return None, _get_agent_team_id(tenant_id, agent_id)
+
+
+def can_route(tenant_id: str, agent_id: str) -> bool:
+    """True se o agente delega (can_delegate_to) ou está numa equipe (do roster em cache, sem banco)."""
+    return any(_delegation_scope(tenant_id, agent_id))
+
+
+def route_conversation(
+    tenant_id: str,
+    user_message: str,
+    recent_log: list[dict],
+    current_agent_id: str | None = None,
+    entry_agent_id: str | None = None,
+) -> dict:
     """
     Roteador do AIOS: Analisa a conversa e retorna o id do agente que deve responder.
-    Respeita can_delegate_to nos settings do agente atual.
+    Respeita can_delegate_to nos settings do agente de entrada (entry_agent_id, o agente do canal;
+    padrão: o atual). Depois de um handoff, o agente de entrada também é candidato.
     Retorna {"target_agent_id": UUID, "reason": str}
     """
     allowed_ids: list[str] | None = None
     team_id: str | None = None
-    if current_agent_id and tenant_id:
-        settings = _get_agent_settings(tenant_id, current_agent_id)
-        can_delegate_to = settings.get("can_delegate_to")
-        if isinstance(can_delegate_to, list) and len(can_delegate_to) > 0:
-            allowed_ids = [str(aid) for aid in can_delegate_to]
-        else:
-            # Fallback para roteamento de equipe inteira
-            team_id = _get_agent_team_id(tenant_id, current_agent_id)
-            if not team_id:
-                # Sem configuração de delegação ativa e fora de equipe -> não roteia
-                return {"target_agent_id": current_agent_id, "reason": "No delegation or team configured for this agent"}
+    scope_agent_id = entry_agent_id or current_agent_id
+    if scope_agent_id and tenant_id:
+        allowed_ids, team_id = _delegation_scope(tenant_id, scope_agent_id)
+        if allowed_ids is None and not team_id:
+            # Sem configuração de delegação ativa e fora de equipe -> não roteia
+            return {"target_agent_id": current_agent_id, "reason": "No delegation or team configured for this agent"}
 
     agents = _get_tenant_agents(tenant_id, allowed_ids=allowed_ids, team_id=team_id)
+    if entry_agent_id and entry_agent_id != current_agent_id and not any(a["id"] == entry_agent_id for a in agents):
+        agents += [a for a in _get_tenant_agents(tenant_id, allowed_ids=[entry_agent_id])]
 
     # Se só houver 1 agente ou nenhum (além do atual), não há o que rotear
     callable_agents = [a for a in agents if a["id"] != current_agent_id]
     if not callable_agents:
         return {"target_agent_id": current_agent_id or (agents[0]["id"] if agents else None), "reason": "No callable agents available"}
 
+    # Primeiro estágio local (embeddings): só casos ambíguos seguem para o LLM
+    current = _get_roster(tenant_id).get(str(current_agent_id)) if current_agent_id else None
+    if current:
+        local = decide(tenant_id, user_message, {"id": current["id"], "description": _describe(current)}, callable_agents)
+        if local:
+            return local
+
     api_key = os.environ.get("OPENROUTER_API_KEY", "").strip()
     if not api_key:
          return {"target_agent_id": current_agent_id, "reason": "Missing OpenRouter API Key"}
 
-    import httpx
+    from .http_clients import http_client
     url = "https://openrouter.ai/api/v1/chat/completions"
     headers = {
         "Authorization": f"Bearer {api_key}",
@@ -161,31 +153,37 @@ def route_conversation(tenant_id: str, user_message: str, recent_log: list[dict]
     messages.append({"role": "user", "content": f"New Message: {user_message}\n\nSelect the best AGENT_ID for this message as JSON."})
 
     try:
-        with httpx.Client(timeout=10.0) as client:
-            r = client.post(
-                url,
-                json={
-                    "model": SUPERVISOR_MODELS[0],
-                    "models": SUPERVISOR_MODELS, # Allows fallback
-                    "route": "fallback",
-                    "messages": messages,
-                    "response_format": {"type": "json_object"}
-                },
-                headers=headers
-            )
-            r.raise_for_status()
-            data = r.json()
-            response_text = data["choices"][0]["message"]["content"]
-            parsed = json.loads(response_text)
-            
-            target_agent_id = parsed.get("target_agent_id")
-            # Verify if the returned ID actually exists
-            if target_agent_id and any(a["id"] == target_agent_id for a in agents):
-                 return {
-                     "target_agent_id": target_agent_id,
-                     "reason": parsed.get("reason", "Supervisor decision")
-                 }
-                 
+        # Cliente compartilhado (keep-alive) para o OpenRouter; timeout curto só nesta chamada
+        started = time.monotonic()
+        r = http_client("https://openrouter.ai/api/v1").post(
+            url,
+            json={
+                "model": SUPERVISOR_MODELS[0],
+                "models": SUPERVISOR_MODELS, # Allows fallback
+                "route": "fallback",
+                "messages": messages,
+                "response_format": {"type": "json_object"}
+            },
+            headers=headers,
+            timeout=10.0,
+        )
+        r.raise_for_status()
+        data = r.json()
+        record_llm_usage(
+            data, data.get("model") or SUPERVISOR_MODELS[0], (time.monotonic() - started) * 1000,
+            purpose="supervisor", tenant_id=tenant_id, agent_id=current_agent_id,
+        )
+        response_text = data["choices"][0]["message"]["content"]
+        parsed = json.loads(response_text)
+        
+        target_agent_id = parsed.get("target_agent_id")
+        # Verify if the returned ID actually exists
+        if target_agent_id and any(a["id"] == target_agent_id for a in agents):
+             return {
+                 "target_agent_id": target_agent_id,
+                 "reason": parsed.get("reason", "Supervisor decision")
+             }
+             
     except Exception as e:
         print(f"Supervisor routing error: {e}")
         
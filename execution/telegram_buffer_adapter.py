@@ -78,13 +78,7 @@ async def handle_buffered_message(
 
     # Adicionar ao buffer (Redis) em thread para não bloquear
     try:
-        created, total = await asyncio.to_thread(
-            buf.add_message_to_buffer,
-            tenant_id,
-            user_id,
-            message,
-            None,
-        )
+        created, total = await buf.add_message_to_buffer_async(tenant_id, user_id, message)
     except Exception as e:
         logger.warning("buffer_unavailable_fallback", extra={"error": str(e)})
         await run_agent(update, context, message, False)
@@ -112,8 +106,7 @@ async def handle_buffered_message(
                 pass
             logger.info("buffer_timeout_triggered", extra={"tenant_id": tenant_id, "user_id": user_id})
             try:
-                combined = await asyncio.to_thread(buf.get_combined_messages, tenant_id, user_id)
-                await asyncio.to_thread(buf.clear_buffer, tenant_id, user_id)
+                combined = await buf.take_combined_messages_async(tenant_id, user_id)
             except Exception as e:
                 logger.warning("buffer_flush_failed", extra={"error": str(e)})
                 combined = message
@@ -21,13 +21,16 @@ from .db_sessions import (
     append_log,
     get_or_create_session,
     get_recent_log,
+    get_summary,
     init_db,
     reset_session,
     update_classification,
     update_state,
 )
 from .drive_rag import get_filter_images_from_drive, search as drive_search
-from .llm_orchestrator import run as llm_run
+from .async_runtime import run_db
+from .conversation_summary import after_turn, recent_log_limit, unsummarized
+from .llm_orchestrator import run_async as llm_run_async
 from .message_buffer import buffer_available as message_buffer_available
 from .state_machine import apply_transition
 from .stt import transcribe as stt_transcribe
@@ -124,8 +127,8 @@ async def _run_agent_core(
     user_id = str(update.effective_user.id)
 
     # Sessão e estado
-    init_db()
-    session = get_or_create_session(user_id)
+    await run_db(init_db)
+    session = await run_db(get_or_create_session, user_id)
     current_state = session["current_state"]
 
     # 3) RAG (opcional: se Drive não configurado, usar contexto vazio e instrução clara)
@@ -138,7 +141,7 @@ async def _run_agent_core(
         )
     else:
         try:
-            rag_context = drive_search(user_text, state=current_state)
+            rag_context = await run_db(drive_search, user_text, state=current_state)
         except Exception as e:
             rag_context = (
                 "CONTEXTO: A base de conhecimento não está disponível no momento. "
@@ -146,19 +149,23 @@ async def _run_agent_core(
                 f"(Erro: {e})"
             )
 
-    # 4) Histórico
-    recent_log = get_recent_log(user_id, limit=20)
+    # 4) Histórico (resumo + turnos ainda não resumidos)
+    recent_log, summary = await asyncio.gather(
+        run_db(get_recent_log, user_id, limit=recent_log_limit()),
+        run_db(get_summary, user_id),
+    )
 
     # 5) LLM
     await update.message.chat.send_action("typing")
     try:
-        out = llm_run(
+        out = await llm_run_async(
             user_id=user_id,
             user_message=user_text,
             current_state=current_state,
             rag_context=rag_context,
-            recent_log=recent_log,
+            recent_log=unsummarized(recent_log, summary),
             input_was_audio=is_audio,
+            summary=summary["summary"],
         )
     except Exception as e:
         await update.message.reply_text(f"Desculpe, deu um erro aqui. Pode tentar de novo? ({e})")
@@ -173,11 +180,16 @@ async def _run_agent_core(
     # 6) Transição de estado (só se válida)
     new_state = apply_transition(current_state, proximo_estado)
     if new_state != current_state:
-        update_state(user_id, new_state)
+        await run_db(update_state, user_id, new_state)
 
     # 7) Log
-    append_log(user_id, "user", user_text, "audio" if is_audio else "text")
-    append_log(user_id, "assistant", resposta_texto, "text")
+    await run_db(append_log, user_id, "user", user_text, "audio" if is_audio else "text")
+    await run_db(append_log, user_id, "assistant", resposta_texto, "text")
+    try:
+        await after_turn(user_id)
+    except Exception as e:
+        # Resumo da conversa é acessório: falha aqui não pode impedir a resposta
+        logger.warning("after_turn falhou (resumo da conversa): %s", e)
 
     # 8) Atraso antes de responder (parecer mais natural)
     delay = _response_delay_seconds()
@@ -252,7 +264,7 @@ async def _run_agent_core(
 
     # Classificação de lead (heurística)
     if new_state == "fechamento":
-        update_classification(user_id, "quente")
+        await run_db(update_classification, user_id, "quente")
 
 
 async def _handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -3,6 +3,10 @@ Configuração multi-tenant: busca tenant e agente ativo no Postgres.
 Usado pelo core/agent_runner. Só funciona quando DATABASE_URL está configurado (Postgres).
 """
 
+import json
+import os
+import threading
+import time
 from typing import Any, Optional
 
 from . import db_sessions as db
@@ -85,3 +89,97 @@ def get_agent_by_id(agent_id: str) -> Optional[dict[str, Any]]:
         }
     finally:
         conn.close()
+
+
+_rosters: dict[str, tuple[float, dict[str, dict[str, Any]]]] = {}
+_rosters_lock = threading.Lock()
+# Geração por tenant (e global): sobe a cada invalidação. Carga iniciada antes de uma invalidação
+# não entra no cache (leu o banco antes da mudança).
+_roster_generations: dict[str, int] = {}
+_roster_generation_all = 0
+
+
+def _roster_generation(key: str) -> tuple[int, int]:
+    return _roster_generation_all, _roster_generations.get(key, 0)
+
+
+def _roster_ttl_seconds() -> float:
+    try:
+        return float(os.environ.get("ROUTING_METADATA_TTL_SECONDS", "").strip() or 300)
+    except ValueError:
+        return 300.0
+
+
+def _load_roster(tenant_id: str) -> dict[str, dict[str, Any]]:
+    conn = db._get_pg_connection()
+    try:
+        with conn.cursor() as cur:
+            try:
+                cur.execute(
+                    "SELECT id, name, niche, prompt_custom, settings, team_id, active FROM agents WHERE tenant_id = %s",
+                    (tenant_id,),
+                )
+            except Exception:
+                # Schema sem agents.team_id (migration_agents_team_and_settings.sql não aplicada)
+                conn.rollback()
+                cur.execute(
+                    "SELECT id, name, niche, prompt_custom, settings, NULL AS team_id, active FROM agents WHERE tenant_id = %s",
+                    (tenant_id,),
+                )
+            rows = cur.fetchall()
+    finally:
+        conn.close()
+    roster = {}
+    for r in rows:
+        settings = r.get("settings") or {}
+        if isinstance(settings, str):
+            settings = json.loads(settings)
+        roster[str(r["id"])] = {
+            "id": str(r["id"]),
+            "name": r["name"],
+            "niche": r["niche"],
+            "prompt_custom": r["prompt_custom"],
+            "settings": settings if isinstance(settings, dict) else {},
+            "team_id": str(r["team_id"]) if r.get("team_id") else None,
+            "active": bool(r["active"]),
+        }
+    return roster
+
+
+def get_tenant_roster(tenant_id: str) -> dict[str, dict[str, Any]]:
+    """
+    Agentes do tenant (ativos ou não) com nicho, persona, settings (can_delegate_to, models,
+    response_cache...) e team_id, por id. Fica em memória do processo por
+    ROUTING_METADATA_TTL_SECONDS (300s) ou até invalidate_tenant_roster (routers de agentes e
+    equipes): o supervisor e as leituras de settings por turno não vão ao banco.
+    """
+    key = str(tenant_id)
+    now = time.monotonic()
+    with _rosters_lock:
+        entry = _rosters.get(key)
+        if entry and now - entry[0] < _roster_ttl_seconds():
+            return entry[1]
+        generation = _roster_generation(key)
+    roster = _load_roster(key) if db._use_postgres() else {}
+    with _rosters_lock:
+        if _roster_generation(key) == generation:
+            _rosters[key] = (now, roster)
+    return roster
+
+
+def invalidate_tenant_roster(tenant_id: Optional[str] = None) -> None:
+    """Descarta o roster em cache do tenant (ou de todos). Chamado quando agentes/equipes mudam."""
+    global _roster_generation_all
+    with _rosters_lock:
+        if tenant_id is None:
+            _roster_generation_all += 1
+            _rosters.clear()
+        else:
+            key = str(tenant_id)
+            _roster_generations[key] = _roster_generations.get(key, 0) + 1
+            _rosters.pop(key, None)
+
+
+def get_agent_settings(tenant_id: str, agent_id: str) -> dict[str, Any]:
+    """agents.settings do agente (ex.: response_cache, models), do roster em cache do tenant."""
+    return (get_tenant_roster(tenant_id).get(str(agent_id)) or {}).get("settings") or {}
@@ -0,0 +1,32 @@
+"""
+Contagem aproximada de tokens.
+Usa tiktoken (cl100k_base) quando instalado; senão heurística de ~4 caracteres por token.
+Usado para dividir lotes de embeddings e estimar tamanho de prompts.
+"""
+
+from functools import lru_cache
+
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=1)
+def _get_encoder():
+    """Encoder do tiktoken ou None se a lib não estiver disponível."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """Número (aproximado) de tokens de um texto. Texto vazio = 0."""
+    if not text:
+        return 0
+    enc = _get_encoder()
+    if enc is not None:
+        try:
+            return len(enc.encode(text, disallowed_special=()))
+        except Exception:
+            pass
+    return len(text) // CHARS_PER_TOKEN + 1
@@ -8,6 +8,9 @@ from pathlib import Path
 
 from openai import OpenAI
 
+from .http_clients import openai_client
+from .usage_scope import add_usage
+
 # Máximo de caracteres para manter áudio em ~20–30 s (aprox. 1 palavra = 2 chars em PT)
 MAX_CHARS_FOR_AUDIO = 400
 
@@ -20,7 +23,7 @@ def _get_client() -> OpenAI:
     key = os.environ.get("OPENAI_API_KEY", "").strip()
     if not key:
         raise ValueError("OPENAI_API_KEY não configurado.")
-    return OpenAI(api_key=key)
+    return openai_client(key)
 
 
 def _truncate_for_audio(text: str, max_chars: int = MAX_CHARS_FOR_AUDIO) -> str:
@@ -66,6 +69,8 @@ def synthesize(
         input=text,
     )
     response.stream_to_file(str(path))
+    # TTS é cobrado por caractere
+    add_usage("tts", model, characters=len(text))
     return str(path)
 
 
@@ -0,0 +1,111 @@
+"""
+Execução das etapas de um turno do agente como grafo de dependências.
+Cada etapa (TurnStep) declara de quais outras depende; etapas independentes rodam em paralelo.
+Cada etapa tem timeout próprio e um fallback (valor usado em caso de timeout ou erro); etapas
+sem fallback propagam a exceção. O relatório traz a duração de cada etapa e o tempo do caminho
+crítico (a cadeia de dependências mais lenta), que é o que de fato atrasa o primeiro token.
+O timeout só abandona a espera: o que a etapa já mandou para uma thread (run_db) continua rodando.
+Por isso etapas com timeout devem só ler ou ser idempotentes; gravações vão em etapas sem timeout.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+_NO_FALLBACK = object()
+
+
+@dataclass
+class TurnStep:
+    """
+    name: identificador (chave em results).
+    run: corrotina que recebe o dict de resultados das dependências já concluídas.
+    deps: nomes das etapas que precisam terminar antes.
+    timeout: segundos (None = sem limite).
+    fallback: valor em caso de timeout/erro; callable recebe a exceção. Ausente = propaga.
+    """
+    name: str
+    run: Callable[[dict], Awaitable[Any]]
+    deps: tuple[str, ...] = ()
+    timeout: Optional[float] = None
+    fallback: Any = _NO_FALLBACK
+
+
+def step_timeout(name: str, default: float) -> float:
+    """Timeout da etapa: TURN_STEP_TIMEOUT_<NOME> (segundos) ou o padrão."""
+    raw = os.environ.get(f"TURN_STEP_TIMEOUT_{name.upper()}", "").strip()
+    try:
+        return max(0.1, float(raw)) if raw else default
+    except ValueError:
+        return default
+
+
+async def run_turn_graph(steps: list[TurnStep]) -> tuple[dict[str, Any], dict]:
+    """
+    Executa as etapas respeitando dependências. Retorna (results, report) com
+    report = {"steps": {nome: {"ms", "status", "start_ms"}}, "critical_path_ms", "critical_path", "total_ms"}.
+    status: "ok", "timeout" ou "fallback" (erro com fallback).
+    """
+    by_name = {s.name: s for s in steps}
+    for s in steps:
+        missing = [d for d in s.deps if d not in by_name]
+        if missing:
+            raise ValueError(f"Etapa {s.name} depende de etapas inexistentes: {missing}")
+
+    started = time.monotonic()
+    results: dict[str, Any] = {}
+    timings: dict[str, dict] = {}
+    tasks: dict[str, asyncio.Task] = {}
+
+    async def execute(step: TurnStep) -> Any:
+        if step.deps:
+            await asyncio.gather(*(tasks[d] for d in step.deps))
+        t0 = time.monotonic()
+        status = "ok"
+        try:
+            value = await asyncio.wait_for(step.run(results), step.timeout)
+        except Exception as e:
+            if step.fallback is _NO_FALLBACK:
+                raise
+            status = "timeout" if isinstance(e, asyncio.TimeoutError) else "fallback"
+            logger.warning("turn_step_fallback", extra={"step": step.name, "status": status, "error": str(e)})
+            value = step.fallback(e) if callable(step.fallback) else step.fallback
+        timings[step.name] = {
+            "start_ms": round((t0 - started) * 1000, 1),
+            "ms": round((time.monotonic() - t0) * 1000, 1),
+            "status": status,
+        }
+        results[step.name] = value
+        return value
+
+    for s in steps:
+        tasks[s.name] = asyncio.ensure_future(execute(s))
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        for t in tasks.values():
+            t.cancel()
+        raise
+
+    # Caminho crítico: maior soma de durações ao longo das dependências
+    finish: dict[str, tuple[float, list[str]]] = {}
+
+    def path(name: str) -> tuple[float, list[str]]:
+        if name not in finish:
+            best = max((path(d) for d in by_name[name].deps), default=(0.0, []))
+            finish[name] = (best[0] + timings[name]["ms"], best[1] + [name])
+        return finish[name]
+
+    critical_ms, critical = max((path(n) for n in by_name), default=(0.0, []))
+    report = {
+        "steps": timings,
+        "critical_path_ms": round(critical_ms, 1),
+        "critical_path": critical,
+        "total_ms": round((time.monotonic() - started) * 1000, 1),
+    }
+    return results, report
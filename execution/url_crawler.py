@@ -0,0 +1,245 @@
+"""
+Crawler de URLs para a base de conhecimento.
+Descobre páginas pelo sitemap (sitemap.xml ou linhas "Sitemap:" do robots.txt) ou seguindo links
+do mesmo domínio em largura até uma profundidade/limite de páginas. Busca com pool assíncrono
+limitado (httpx), respeita o robots.txt e faz requisições condicionais (If-None-Match /
+If-Modified-Since) para páginas já conhecidas: 304 ou conteúdo com o mesmo hash = "unchanged".
+
+Cada página do resultado é um dict:
+  url, depth, status ("new" | "changed" | "unchanged" | "error"), http_status,
+  etag, last_modified, content_hash, text (só em new/changed), error
+"""
+
+import asyncio
+import hashlib
+import xml.etree.ElementTree as ET
+from typing import Optional
+from urllib.parse import urldefrag, urljoin, urlparse
+from urllib.robotparser import RobotFileParser
+
+USER_AGENT = "Mozilla/5.0 (compatible; B&B-RAG-Bot/1.0)"
+DEFAULT_MAX_PAGES = 20
+DEFAULT_MAX_DEPTH = 1
+DEFAULT_CONCURRENCY = 5
+TEXT_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+
+# Extensões que nunca são páginas de conteúdo
+_SKIP_EXTENSIONS = (
+    ".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".ico", ".css", ".js", ".zip",
+    ".mp4", ".mp3", ".woff", ".woff2", ".ttf", ".pdf", ".xml",
+)
+
+
+def normalize_url(url: str) -> str:
+    """URL sem fragmento e com host minúsculo (chave das páginas)."""
+    url, _ = urldefrag(url.strip())
+    parsed = urlparse(url)
+    path = parsed.path or "/"
+    normalized = parsed._replace(scheme=parsed.scheme.lower(), netloc=parsed.netloc.lower(), path=path)
+    return normalized.geturl()
+
+
+def _same_site(url: str, host: str) -> bool:
+    netloc = urlparse(url).netloc.lower()
+    return netloc == host or netloc == f"www.{host}" or f"www.{netloc}" == host
+
+
+def _content_hash(text: str) -> str:
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def _extract_links(html: str, base_url: str) -> list[str]:
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    links = []
+    for a in soup.find_all("a", href=True):
+        href = a["href"].strip()
+        if href.startswith(("mailto:", "tel:", "javascript:")):
+            continue
+        links.append(normalize_url(urljoin(base_url, href)))
+    return links
+
+
+def _page_text(body: str, content_type: str) -> str:
+    if "html" in content_type:
+        from .document_ingest_extended import _extract_text_from_html_string
+        return _extract_text_from_html_string(body)
+    return body.strip()
+
+
+async def _fetch_robots(client, origin: str) -> tuple[RobotFileParser, list[str]]:
+    """robots.txt do site (ausente = tudo permitido) e os sitemaps declarados nele."""
+    parser = RobotFileParser()
+    try:
+        resp = await client.get(f"{origin}/robots.txt")
+        lines = resp.text.splitlines() if resp.status_code == 200 else []
+    except Exception:
+        lines = []
+    parser.parse(lines)
+    sitemaps = [line.split(":", 1)[1].strip() for line in lines if line.lower().startswith("sitemap:")]
+    return parser, sitemaps
+
+
+async def _sitemap_urls(client, sitemap_url: str, host: str, limit: int, nested: int = 1) -> list[str]:
+    """URLs de um sitemap (ou índice de sitemaps, um nível) do mesmo domínio."""
+    try:
+        resp = await client.get(sitemap_url)
+        if resp.status_code != 200:
+            return []
+        root = ET.fromstring(resp.content)
+    except Exception:
+        return []
+    ns = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+    urls: list[str] = []
+    if root.tag.endswith("sitemapindex"):
+        if nested <= 0:
+            return []
+        for loc in root.iter(f"{ns}loc"):
+            urls.extend(await _sitemap_urls(client, loc.text.strip(), host, limit - len(urls), nested - 1))
+            if len(urls) >= limit:
+                break
+        return urls[:limit]
+    for loc in root.iter(f"{ns}loc"):
+        url = normalize_url(loc.text or "")
+        if url and _same_site(url, host) and url not in urls:
+            urls.append(url)
+            if len(urls) >= limit:
+                break
+    return urls
+
+
+async def _fetch_page(client, url: str, depth: int, known: dict, allowed_types: tuple) -> tuple[dict, str]:
+    """Busca uma página (condicional se conhecida). Retorna (página, html para extrair links)."""
+    prev = known.get(url) or {}
+    headers = {}
+    if prev.get("etag"):
+        headers["If-None-Match"] = prev["etag"]
+    if prev.get("last_modified"):
+        headers["If-Modified-Since"] = prev["last_modified"]
+    page = {
+        "url": url, "depth": depth, "status": "error", "http_status": None,
+        "etag": prev.get("etag"), "last_modified": prev.get("last_modified"),
+        "content_hash": prev.get("content_hash"), "text": None, "error": None,
+    }
+    try:
+        resp = await client.get(url, headers=headers)
+    except Exception as e:
+        page["error"] = f"{type(e).__name__}: {e}"
+        return page, ""
+    page["http_status"] = resp.status_code
+    if resp.status_code == 304:
+        page["status"] = "unchanged"
+        return page, ""
+    if resp.status_code != 200:
+        page["error"] = f"HTTP {resp.status_code}"
+        return page, ""
+    content_type = resp.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in allowed_types:
+        page["error"] = f"Content-Type não suportado: {content_type or 'desconhecido'}"
+        return page, ""
+    body = resp.text
+    text = _page_text(body, content_type)
+    content_hash = _content_hash(text)
+    page.update({
+        "etag": resp.headers.get("etag"),
+        "last_modified": resp.headers.get("last-modified"),
+        "content_hash": content_hash,
+    })
+    if prev and prev.get("content_hash") == content_hash:
+        page["status"] = "unchanged"
+    else:
+        page["status"] = "changed" if prev else "new"
+        page["text"] = text
+    return page, body if "html" in content_type else ""
+
+
+async def crawl(
+    start_url: str,
+    max_pages: int = DEFAULT_MAX_PAGES,
+    max_depth: int = DEFAULT_MAX_DEPTH,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    use_sitemap: bool = True,
+    known: Optional[dict] = None,
+    timeout: float = 30.0,
+) -> dict:
+    """
+    Percorre o site a partir de start_url. known = {url: {etag, last_modified, content_hash}}
+    das páginas já ingeridas (refresh): elas são revalidadas e sempre entram na lista a visitar.
+    Retorna {"pages": [...], "blocked": [urls bloqueadas pelo robots.txt], "sitemap": bool}.
+    """
+    import httpx
+
+    known = {normalize_url(u): v for u, v in (known or {}).items()}
+    start_url = normalize_url(start_url)
+    parsed = urlparse(start_url)
+    host = parsed.netloc.lower()
+    origin = f"{parsed.scheme}://{parsed.netloc}"
+    max_pages = max(1, max_pages)
+    concurrency = max(1, concurrency)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(
+        headers={"User-Agent": USER_AGENT},
+        timeout=timeout,
+        limits=limits,
+        follow_redirects=True,
+    ) as client:
+        robots, robots_sitemaps = await _fetch_robots(client, origin)
+
+        def allowed(url: str) -> bool:
+            return robots.can_fetch(USER_AGENT, url)
+
+        sitemap_used = False
+        seeds: list[str] = [start_url]
+        if use_sitemap and max_pages > 1:
+            sitemap_candidates = [start_url] if parsed.path.endswith(".xml") else (robots_sitemaps or [f"{origin}/sitemap.xml"])
+            for sm in sitemap_candidates:
+                urls = await _sitemap_urls(client, sm, host, max_pages)
+                if urls:
+                    seeds = urls if parsed.path.endswith(".xml") else [start_url] + [u for u in urls if u != start_url]
+                    sitemap_used = True
+                    break
+        # Refresh: páginas já conhecidas sempre são revalidadas
+        seeds += [u for u in known if u not in seeds]
+
+        seen: set[str] = set()
+        blocked: list[str] = []
+        pages: list[dict] = []
+        semaphore = asyncio.Semaphore(concurrency)
+        allowed_types = TEXT_CONTENT_TYPES
+
+        async def visit(url: str, depth: int):
+            async with semaphore:
+                return await _fetch_page(client, url, depth, known, allowed_types)
+
+        frontier = [(u, 0) for u in seeds]
+        while frontier and len(pages) < max_pages:
+            batch = []
+            for url, depth in frontier:
+                if url in seen or (url != start_url and url.lower().endswith(_SKIP_EXTENSIONS)):
+                    continue
+                seen.add(url)
+                if not allowed(url):
+                    blocked.append(url)
+                    continue
+                batch.append((url, depth))
+                if len(pages) + len(batch) >= max_pages:
+                    break
+            frontier = []
+            if not batch:
+                break
+            results = await asyncio.gather(*(visit(u, d) for u, d in batch))
+            for page, html in results:
+                pages.append(page)
+                # Sitemap já dá a lista de páginas; sem ele, segue links até max_depth
+                if html and not sitemap_used and page["depth"] < max_depth:
+                    for link in _extract_links(html, page["url"]):
+                        if _same_site(link, host) and link not in seen:
+                            frontier.append((link, page["depth"] + 1))
+
+    return {"pages": pages, "blocked": blocked, "sitemap": sitemap_used}
+
+
+def crawl_sync(start_url: str, **kwargs) -> dict:
+    """crawl() para código síncrono (worker da fila / BackgroundTasks)."""
+    return asyncio.run(crawl(start_url, **kwargs))
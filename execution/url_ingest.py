@@ -0,0 +1,217 @@
+"""
+Ingestão de sites (crawler) na base de conhecimento, com revalidação condicional.
+Um documento = um site: cada página vira chunks com metadata {"url": ...} e o estado HTTP de cada
+página (ETag, Last-Modified, hash do texto) fica em document_pages. No refresh só as páginas que
+mudaram são baixadas e re-ingeridas; as inalteradas (304 ou mesmo hash) mantêm seus chunks e
+embeddings, e a troca é atômica (document_ingest.replace_chunks).
+"""
+
+import json
+from typing import Callable, Optional
+
+from .document_ingest import _get_connection, replace_chunks
+from .url_crawler import DEFAULT_MAX_DEPTH, DEFAULT_MAX_PAGES, crawl_sync
+
+# Páginas que sumiram do site: os chunks delas saem do documento
+GONE_STATUS = (404, 410)
+
+_pages_schema_checked = False
+
+
+def _ensure_pages_table(conn) -> None:
+    """Cria document_pages e documents.crawl_options se não existirem (uma vez por processo)."""
+    global _pages_schema_checked
+    if _pages_schema_checked:
+        return
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS document_pages (
+                id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                tenant_id UUID NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+                document_id UUID NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+                url TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                http_status INT,
+                last_error TEXT,
+                fetched_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                UNIQUE (document_id, url)
+            )
+            """
+        )
+        cur.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS crawl_options JSONB")
+    conn.commit()
+    _pages_schema_checked = True
+
+
+def _known_pages(cur, document_id: str) -> dict:
+    cur.execute(
+        "SELECT url, etag, last_modified, content_hash FROM document_pages WHERE document_id = %s",
+        (document_id,),
+    )
+    return {r["url"]: dict(r) for r in cur.fetchall()}
+
+
+def _stored_chunks(cur, document_id: str, urls: list[str]) -> dict[str, list[dict]]:
+    """Chunks já gravados das páginas inalteradas: {url: [{"content", "metadata"}]} na ordem original."""
+    if not urls:
+        return {}
+    cur.execute(
+        """SELECT content, metadata FROM document_chunks
+           WHERE document_id = %s AND metadata->>'url' = ANY(%s)
+           ORDER BY chunk_index""",
+        (document_id, urls),
+    )
+    by_url: dict[str, list[dict]] = {}
+    for r in cur.fetchall():
+        metadata = r["metadata"] if isinstance(r["metadata"], dict) else json.loads(r["metadata"] or "{}")
+        by_url.setdefault(metadata.get("url"), []).append({"content": r["content"], "metadata": metadata})
+    return by_url
+
+
+def crawl_document(
+    doc_id: str,
+    tenant_id: str,
+    url: Optional[str] = None,
+    max_pages: Optional[int] = None,
+    max_depth: Optional[int] = None,
+    use_sitemap: Optional[bool] = None,
+    refresh: bool = False,
+    progress: Optional[Callable[[float, str], None]] = None,
+) -> dict:
+    """
+    Faz o crawl (ou refresh) do site do documento e atualiza chunks e document_pages.
+    Opções ausentes vêm de documents.crawl_options (gravadas no primeiro crawl).
+    Retorna relatório: pages, new, changed, unchanged, removed, errors, blocked + o de replace_chunks.
+    """
+    from .chunker import chunk_document
+
+    progress = progress or (lambda fraction, message: None)
+    conn = _get_connection()
+    try:
+        _ensure_pages_table(conn)
+        with conn.cursor() as cur:
+            cur.execute("SELECT source_url, crawl_options FROM documents WHERE id = %s AND tenant_id = %s", (doc_id, tenant_id))
+            doc = cur.fetchone()
+            if not doc:
+                raise ValueError(f"Documento {doc_id} não encontrado")
+            saved = doc["crawl_options"] or {}
+            if isinstance(saved, str):
+                saved = json.loads(saved)
+            known = _known_pages(cur, doc_id)
+            if not refresh:
+                cur.execute("UPDATE documents SET status = 'processing' WHERE id = %s", (doc_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+    options = {
+        "url": url or saved.get("url") or doc["source_url"],
+        "max_pages": max_pages or saved.get("max_pages") or DEFAULT_MAX_PAGES,
+        "max_depth": max_depth if max_depth is not None else saved.get("max_depth", DEFAULT_MAX_DEPTH),
+        "use_sitemap": use_sitemap if use_sitemap is not None else saved.get("use_sitemap", True),
+    }
+    if not options["url"]:
+        raise ValueError("Documento sem URL de origem")
+
+    progress(0.1, "buscando páginas")
+    result = crawl_sync(
+        options["url"],
+        max_pages=options["max_pages"],
+        max_depth=options["max_depth"],
+        use_sitemap=options["use_sitemap"],
+        known=known,
+    )
+    pages = result["pages"]
+    counts = {s: sum(1 for p in pages if p["status"] == s) for s in ("new", "changed", "unchanged", "error")}
+    gone = {p["url"] for p in pages if p["http_status"] in GONE_STATUS}
+    if not counts["new"] and not counts["changed"] and not counts["unchanged"] and not known:
+        errors = "; ".join(f"{p['url']}: {p['error']}" for p in pages[:3])
+        raise RuntimeError(f"Nenhuma página pôde ser lida ({errors or 'bloqueada pelo robots.txt'})")
+
+    report = {
+        "pages": len(pages),
+        **counts,
+        "removed": len(gone & set(known)),
+        "blocked": len(result["blocked"]),
+        "sitemap": result["sitemap"],
+    }
+    if known and not counts["new"] and not counts["changed"] and not report["removed"]:
+        # Nada mudou: só atualiza validadores/horário das páginas
+        _save_pages(tenant_id, doc_id, pages, gone)
+        progress(1.0, "nenhuma página mudou")
+        return report
+
+    progress(0.4, f"{counts['new'] + counts['changed']} páginas novas/alteradas")
+    fetched = {p["url"]: p for p in pages}
+    # Ordem: páginas conhecidas (ordem anterior) e depois as novas, na ordem do crawl
+    order = [u for u in known if u not in gone] + [p["url"] for p in pages if p["url"] not in known and p["status"] == "new"]
+    conn = _get_connection()
+    try:
+        with conn.cursor() as cur:
+            stored = _stored_chunks(cur, doc_id, [u for u in order if not (fetched.get(u) or {}).get("text")])
+        conn.commit()
+    finally:
+        conn.close()
+    chunks: list[dict] = []
+    for page_url in order:
+        page = fetched.get(page_url)
+        if page and page.get("text"):
+            chunks.extend(
+                {"content": c["content"], "metadata": {**c["metadata"], "url": page_url}}
+                for c in chunk_document(page["text"])
+            )
+        else:
+            chunks.extend(stored.get(page_url, []))
+
+    text_bytes = sum(len(c["content"].encode("utf-8")) for c in chunks)
+    report.update(
+        replace_chunks(
+            tenant_id,
+            doc_id,
+            chunks,
+            document_updates={
+                "source_url": options["url"],
+                "file_size_mb": text_bytes / (1024 * 1024),
+                "crawl_options": json.dumps(options),
+            },
+        )
+    )
+    _save_pages(tenant_id, doc_id, pages, gone)
+    progress(1.0, "concluído")
+    return report
+
+
+def _save_pages(tenant_id: str, doc_id: str, pages: list[dict], gone: set) -> None:
+    """Grava ETag/Last-Modified/hash das páginas visitadas e remove as que sumiram."""
+    conn = _get_connection()
+    try:
+        with conn.cursor() as cur:
+            for p in pages:
+                if p["url"] in gone:
+                    continue
+                if p["status"] == "error":
+                    cur.execute(
+                        """UPDATE document_pages SET http_status = %s, last_error = %s, fetched_at = NOW()
+                           WHERE document_id = %s AND url = %s""",
+                        (p["http_status"], p["error"], doc_id, p["url"]),
+                    )
+                    continue
+                cur.execute(
+                    """
+                    INSERT INTO document_pages (tenant_id, document_id, url, etag, last_modified, content_hash, http_status, last_error, fetched_at)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, NULL, NOW())
+                    ON CONFLICT (document_id, url) DO UPDATE SET
+                        etag = EXCLUDED.etag, last_modified = EXCLUDED.last_modified,
+                        content_hash = EXCLUDED.content_hash, http_status = EXCLUDED.http_status,
+                        last_error = NULL, fetched_at = NOW()
+                    """,
+                    (tenant_id, doc_id, p["url"], p["etag"], p["last_modified"], p["content_hash"], p["http_status"]),
+                )
+            if gone:
+                cur.execute("DELETE FROM document_pages WHERE document_id = %s AND url = ANY(%s)", (doc_id, list(gone)))
+        conn.commit()
+    finally:
+        conn.close()
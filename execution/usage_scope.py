@@ -0,0 +1,75 @@
+"""
+Contabilização de consumo por escopo (turno do agente ou job de documento).
+Cada chamada a provedor (LLM, supervisor, embeddings, Vision, STT, TTS) registra o que a API
+informou em add_usage; se houver um escopo ativo (contextvars), o consumo é somado nele por
+finalidade. No fim do turno/job o escopo é gravado de uma vez em tenant_usage/tenant_usage_log
+(usage_tracker.track_message_sync / track_tokens_sync), com tenant, agente e lead.
+
+Unidades: prompt_tokens, completion_tokens, cached_tokens, total_tokens (LLM e embeddings),
+characters (TTS), audio_seconds (STT) e calls.
+"""
+
+import contextvars
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+UNITS = ("prompt_tokens", "completion_tokens", "cached_tokens", "total_tokens", "characters", "audio_seconds")
+
+_current: contextvars.ContextVar[Optional["UsageScope"]] = contextvars.ContextVar("usage_scope", default=None)
+
+
+class UsageScope:
+    """Consumo acumulado de um turno/job, por finalidade (chat, supervisor, embedding...)."""
+
+    def __init__(self, kind: str, tenant_id: Optional[str], agent_id: Optional[str] = None, lead_id: Optional[str] = None):
+        self.kind = kind
+        self.tenant_id = tenant_id
+        self.agent_id = agent_id
+        self.lead_id = lead_id
+        self._lock = threading.Lock()  # chamadas podem vir de várias threads (run_db, pools)
+        self._by_purpose: dict[str, dict] = {}
+
+    def add(self, purpose: str, model: Optional[str], usage: dict) -> None:
+        with self._lock:
+            p = self._by_purpose.setdefault(purpose, {"calls": 0, "models": []})
+            p["calls"] += 1
+            if model and model not in p["models"]:
+                p["models"].append(model)
+            for unit in UNITS:
+                if usage.get(unit):
+                    p[unit] = round(p.get(unit, 0) + usage[unit], 3)
+
+    @property
+    def total_tokens(self) -> int:
+        with self._lock:
+            return int(sum(p.get("total_tokens", 0) for p in self._by_purpose.values()))
+
+    def by_purpose(self) -> dict:
+        with self._lock:
+            return {k: {**v, "models": list(v["models"])} for k, v in self._by_purpose.items()}
+
+    def metadata(self) -> dict:
+        """Metadata gravado em tenant_usage_log (base do detalhamento por agente/finalidade)."""
+        return {"kind": self.kind, "agent_id": self.agent_id, "lead_id": self.lead_id, "by_purpose": self.by_purpose()}
+
+
+@contextmanager
+def usage_scope(kind: str, tenant_id: Optional[str], agent_id: Optional[str] = None, lead_id: Optional[str] = None) -> Iterator[UsageScope]:
+    scope = UsageScope(kind, tenant_id, agent_id=agent_id, lead_id=lead_id)
+    token = _current.set(scope)
+    try:
+        yield scope
+    finally:
+        _current.reset(token)
+
+
+def current_scope() -> Optional[UsageScope]:
+    return _current.get()
+
+
+def add_usage(purpose: str, model: Optional[str], **usage: float) -> None:
+    """Soma o consumo no escopo ativo (sem escopo: nada a fazer; o log do provedor continua)."""
+    scope = _current.get()
+    if scope is not None:
+        scope.add(purpose, model, usage)
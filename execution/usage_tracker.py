@@ -2,9 +2,13 @@
 Módulo core de rastreamento de uso (Usage Tracker).
 Extrai a lógica do roteador para ser usada diretamente pela execução (agent_facade, workers).
 """
+import json
 import os
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Optional
+from typing import Iterator, Optional
+
+from .usage_scope import UsageScope, usage_scope
 
 
 # Plan limits configuration based on Euro pricing
@@ -103,8 +107,11 @@ def _ensure_usage_record(tenant_id: str, cursor) -> dict:
     }
 
 
-def track_message_sync(tenant_id: str, tokens_used: int = 0) -> bool:
-    """Registra o uso de uma mensagem e os tokens gerados/gastos durante ela."""
+def track_message_sync(tenant_id: str, tokens_used: int = 0, metadata: Optional[dict] = None) -> bool:
+    """
+    Registra o uso de uma mensagem e os tokens gerados/gastos durante ela.
+    metadata: detalhamento gravado no log (ver UsageScope.metadata: agente, lead, tokens por finalidade).
+    """
     if not tenant_id:
         return False
     
@@ -127,9 +134,9 @@ def track_message_sync(tenant_id: str, tokens_used: int = 0) -> bool:
             
             # Opcionalmente registrar tokens independentes de onde a msg veio. Log de message_sent.
             cur.execute(
-                """INSERT INTO tenant_usage_log (tenant_id, event_type, tokens)
-                   VALUES (%s, 'message_sent', %s)""",
-                (tenant_id, tokens_used)
+                """INSERT INTO tenant_usage_log (tenant_id, event_type, tokens, metadata)
+                   VALUES (%s, 'message_sent', %s, %s)""",
+                (tenant_id, tokens_used, json.dumps(metadata or {}))
             )
         conn.commit()
         return True
@@ -141,6 +148,69 @@ def track_message_sync(tenant_id: str, tokens_used: int = 0) -> bool:
         conn.close()
 
 
+def track_tokens_sync(tenant_id: str, tokens: int, event_type: str = "token_used", metadata: Optional[dict] = None) -> bool:
+    """Soma tokens fora de um turno (ex.: embeddings de documentos, áudio) em tenant_usage e no log."""
+    if not tenant_id:
+        return False
+    month = _get_current_month()
+    conn = _get_connection()
+    try:
+        with conn.cursor() as cur:
+            _ensure_usage_record(tenant_id, cur)
+            cur.execute(
+                """UPDATE tenant_usage SET tokens_used = tokens_used + %s, updated_at = NOW()
+                   WHERE tenant_id = %s AND year_month = %s""",
+                (tokens, tenant_id, month)
+            )
+            cur.execute(
+                """INSERT INTO tenant_usage_log (tenant_id, event_type, tokens, metadata)
+                   VALUES (%s, %s, %s, %s)""",
+                (tenant_id, event_type, tokens, json.dumps(metadata or {}))
+            )
+        conn.commit()
+        return True
+    except Exception as e:
+        print(f"Error tracking tokens: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+@contextmanager
+def tracked_usage(event_type: str, tenant_id: Optional[str], agent_id: Optional[str] = None, lead_id: Optional[str] = None) -> Iterator[UsageScope]:
+    """
+    Escopo de consumo gravado ao sair (mesmo com erro: a chamada ao provedor já foi paga).
+    Usado em jobs de documento e no áudio dos canais; o turno do agente grava via track_message_sync.
+    """
+    with usage_scope(event_type, tenant_id, agent_id=agent_id, lead_id=lead_id) as scope:
+        try:
+            yield scope
+        finally:
+            if tenant_id and scope.by_purpose():
+                track_tokens_sync(tenant_id, scope.total_tokens, event_type, scope.metadata())
+
+
+def check_token_budget(tenant_id: str) -> bool:
+    """True se o tenant ainda tem tokens no mês (tokens_limit 0 = ilimitado)."""
+    month = _get_current_month()
+    conn = _get_connection()
+    try:
+        with conn.cursor() as cur:
+            usage = _ensure_usage_record(tenant_id, cur)
+            if not usage["tokens_limit"]:
+                conn.commit()
+                return True
+            cur.execute(
+                "SELECT tokens_used FROM tenant_usage WHERE tenant_id = %s AND year_month = %s",
+                (tenant_id, month)
+            )
+            row = cur.fetchone()
+        conn.commit()
+        return (row["tokens_used"] if row else 0) < usage["tokens_limit"]
+    finally:
+        conn.close()
+
+
 def track_storage_sync(tenant_id: str, bytes_delta: int, event_type: str = "document_uploaded") -> dict:
     """Registra uso de storage (adicionar ou remover bytes) para uso do Worker ou Roteador."""
     if not tenant_id:
@@ -191,3 +261,27 @@ def track_storage_sync(tenant_id: str, bytes_delta: int, event_type: str = "docu
         return {"ok": False, "error": str(e)}
     finally:
         conn.close()
+
+
+def get_storage_remaining_bytes(tenant_id: str) -> Optional[int]:
+    """
+    Bytes que o tenant ainda pode enviar dentro do limite de storage do plano.
+    Uso = soma de documents.file_size_mb (arquivos em disco). None = plano sem limite.
+    """
+    conn = _get_connection()
+    try:
+        with conn.cursor() as cur:
+            usage = _ensure_usage_record(tenant_id, cur)
+            limit_mb = float(usage["storage_limit_mb"] or 0)
+            if limit_mb <= 0:
+                conn.commit()
+                return None
+            cur.execute(
+                "SELECT COALESCE(SUM(file_size_mb), 0) AS used_mb FROM documents WHERE tenant_id = %s",
+                (tenant_id,),
+            )
+            used_mb = float(cur.fetchone()["used_mb"] or 0)
+        conn.commit()
+        return max(0, int((limit_mb - used_mb) * 1024 * 1024))
+    finally:
+        conn.close()
@@ -0,0 +1,290 @@
+"""
+Descrição de imagens para a base de conhecimento via OpenAI Vision, com cache e modo em lote.
+- Cache por tenant + hash da imagem + modelo (tabela vision_cache): re-upload ou a mesma imagem
+  em outro agente não paga a chamada de novo.
+- Imagens grandes são reduzidas (lado maior até VISION_MAX_SIDE, JPEG) antes do base64 quando o
+  Pillow está instalado; sem Pillow a imagem vai como está.
+- Várias imagens são descritas em paralelo (VISION_CONCURRENCY) dentro de um orçamento de
+  requisições por minuto (VISION_RPM, 0 = sem limite).
+O relatório traz chamadas feitas, chamadas evitadas pelo cache e o tempo economizado.
+"""
+
+import base64
+import contextvars
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+from .embedding_service import _MinuteBudget
+from .llm_usage import record_llm_usage
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = frozenset({".png", ".jpg", ".jpeg", ".webp"})
+DEFAULT_MODEL = "gpt-4o-mini"
+PROMPT = (
+    "Descreva o conteúdo desta imagem ou documento de forma textual e detalhada, incluindo texto visível, "
+    "números, tabelas e informações relevantes, para uso em busca semântica em uma base de conhecimento. "
+    "Responda apenas com o texto da descrição, sem introduções."
+)
+_MIMES = {".png": "image/png", ".webp": "image/webp"}
+
+
+def _env_int(key: str, default: int) -> int:
+    try:
+        return max(0, int(os.environ.get(key, "").strip() or default))
+    except ValueError:
+        return default
+
+
+def vision_model() -> str:
+    return os.environ.get("OPENAI_VISION_MODEL", "").strip() or DEFAULT_MODEL
+
+
+def is_image(file_path: str) -> bool:
+    return Path(file_path).suffix.lower() in IMAGE_EXTENSIONS
+
+
+def image_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def prepare_image(data: bytes, suffix: str) -> tuple[bytes, str]:
+    """
+    Reduz a imagem para no máximo VISION_MAX_SIDE px no lado maior (JPEG qualidade 85).
+    Sem Pillow, ou se a imagem já é pequena, devolve os bytes originais. Retorna (bytes, mime).
+    """
+    mime = _MIMES.get(suffix.lower(), "image/jpeg")
+    max_side = _env_int("VISION_MAX_SIDE", 1536)
+    if not max_side:
+        return data, mime
+    try:
+        from PIL import Image
+    except ImportError:
+        return data, mime
+    try:
+        img = Image.open(io.BytesIO(data))
+        if max(img.size) <= max_side:
+            return data, mime
+        img.thumbnail((max_side, max_side))
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        out = io.BytesIO()
+        img.save(out, format="JPEG", quality=85, optimize=True)
+        return out.getvalue(), "image/jpeg"
+    except Exception as e:
+        logger.warning("vision_downscale_failed", extra={"error": str(e)})
+        return data, mime
+
+
+# --- Cache (Postgres) ---
+
+_cache_schema_checked = False
+
+
+def _cache_connection():
+    from .document_ingest import _get_connection
+    conn = _get_connection()
+    global _cache_schema_checked
+    if not _cache_schema_checked:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS vision_cache (
+                    tenant_id UUID NOT NULL REFERENCES tenants(id) ON DELETE CASCADE,
+                    image_hash TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    description TEXT NOT NULL,
+                    elapsed_ms INT NOT NULL DEFAULT 0,
+                    hits INT NOT NULL DEFAULT 0,
+                    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                    last_hit_at TIMESTAMPTZ,
+                    PRIMARY KEY (tenant_id, image_hash, model)
+                )
+                """
+            )
+        conn.commit()
+        _cache_schema_checked = True
+    return conn
+
+
+def _cache_lookup(tenant_id: str, model: str, hashes: List[str]) -> dict[str, dict]:
+    """{hash: {"description", "elapsed_ms"}} das imagens já descritas; marca o hit."""
+    if not hashes:
+        return {}
+    conn = _cache_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                """UPDATE vision_cache SET hits = hits + 1, last_hit_at = NOW()
+                   WHERE tenant_id = %s AND model = %s AND image_hash = ANY(%s)
+                   RETURNING image_hash, description, elapsed_ms""",
+                (tenant_id, model, hashes),
+            )
+            rows = cur.fetchall()
+        conn.commit()
+        return {r["image_hash"]: {"description": r["description"], "elapsed_ms": r["elapsed_ms"]} for r in rows}
+    finally:
+        conn.close()
+
+
+def _cache_store(tenant_id: str, model: str, entries: List[tuple[str, str, int]]) -> None:
+    """Grava (hash, descrição, ms) no cache."""
+    if not entries:
+        return
+    conn = _cache_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.executemany(
+                """INSERT INTO vision_cache (tenant_id, image_hash, model, description, elapsed_ms)
+                   VALUES (%s, %s, %s, %s, %s)
+                   ON CONFLICT (tenant_id, image_hash, model) DO UPDATE
+                   SET description = EXCLUDED.description, elapsed_ms = EXCLUDED.elapsed_ms""",
+                [(tenant_id, h, model, d, ms) for h, d, ms in entries],
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# --- Chamada ao modelo ---
+
+def _get_client():
+    api_key = os.environ.get("OPENAI_API_KEY", "").strip()
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY é necessário para processar imagens.")
+    from .http_clients import openai_client
+    return openai_client(api_key)
+
+
+_budget_lock = threading.Lock()
+_budget: Optional[_MinuteBudget] = None
+
+
+def _wait_budget() -> None:
+    """Bloqueia até caber mais uma chamada no orçamento VISION_RPM (compartilhado no processo)."""
+    global _budget
+    rpm = _env_int("VISION_RPM", 500)
+    if not rpm:
+        return
+    while True:
+        with _budget_lock:
+            if _budget is None:
+                _budget = _MinuteBudget(rpm, 0)
+            _budget.rpm = rpm
+            now = time.monotonic()
+            wait = _budget.wait_time(0, now)
+            if wait <= 0:
+                _budget.consume(0, now)
+                return
+        time.sleep(wait)
+
+
+def _describe(client, model: str, data: bytes, suffix: str) -> tuple[str, int]:
+    """Uma chamada ao Vision. Retorna (descrição, ms)."""
+    payload, mime = prepare_image(data, suffix)
+    b64 = base64.standard_b64encode(payload).decode("ascii")
+    _wait_budget()
+    started = time.monotonic()
+    resp = client.chat.completions.create(
+        model=model,
+        messages=[
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": PROMPT},
+                    {"type": "image_url", "image_url": {"url": f"data:{mime};base64,{b64}"}},
+                ],
+            }
+        ],
+        max_tokens=1024,
+    )
+    elapsed_ms = int((time.monotonic() - started) * 1000)
+    record_llm_usage(resp, model, elapsed_ms, purpose="vision")
+    return (resp.choices[0].message.content or "").strip(), elapsed_ms
+
+
+def describe_images(file_paths: List[str], tenant_id: Optional[str] = None, report: Optional[dict] = None) -> List[str]:
+    """
+    Descreve as imagens (mesma ordem). Com tenant_id usa o cache vision_cache; imagens repetidas
+    no lote são descritas uma vez só. report (opcional) recebe: images, vision_calls,
+    vision_calls_avoided, time_saved_seconds, elapsed_seconds.
+    """
+    if report is None:
+        report = {}
+    started = time.monotonic()
+    model = vision_model()
+    blobs = []
+    for fp in file_paths:
+        path = Path(fp)
+        if not path.exists():
+            raise FileNotFoundError(f"Arquivo não encontrado: {fp}")
+        blobs.append((path.read_bytes(), path.suffix.lower()))
+    hashes = [image_hash(data) for data, _ in blobs]
+
+    cached: dict[str, dict] = {}
+    if tenant_id:
+        try:
+            cached = _cache_lookup(tenant_id, model, list(set(hashes)))
+        except Exception as e:
+            logger.warning("vision_cache_unavailable", extra={"error": str(e)})
+            tenant_id = None  # sem cache: não tenta gravar
+
+    # Uma chamada por hash ausente (imagens duplicadas no lote contam como evitadas)
+    pending: dict[str, int] = {}
+    for i, h in enumerate(hashes):
+        if h not in cached and h not in pending:
+            pending[h] = i
+    results: dict[str, tuple[str, int]] = {}
+    if pending:
+        client = _get_client()
+        concurrency = max(1, min(_env_int("VISION_CONCURRENCY", 3), len(pending)))
+
+        def run(item: tuple[str, int]) -> tuple[str, tuple[str, int]]:
+            h, i = item
+            return h, _describe(client, model, *blobs[i])
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="vision") as executor:
+            # Um contexto por tarefa: o consumo vai para o usage_scope de quem chamou
+            futures = [executor.submit(contextvars.copy_context().run, run, item) for item in pending.items()]
+            for future in futures:
+                h, result = future.result()
+                results[h] = result
+        if tenant_id:
+            try:
+                _cache_store(tenant_id, model, [(h, d, ms) for h, (d, ms) in results.items()])
+            except Exception as e:
+                logger.warning("vision_cache_store_failed", extra={"error": str(e)})
+
+    descriptions = []
+    saved_ms = 0
+    for i, h in enumerate(hashes):
+        if h in cached:
+            descriptions.append(cached[h]["description"])
+            saved_ms += cached[h]["elapsed_ms"]
+        else:
+            description, ms = results[h]
+            descriptions.append(description)
+            if pending[h] != i:
+                saved_ms += ms  # duplicata dentro do lote
+    report.update({
+        "images": len(file_paths),
+        "vision_calls": len(results),
+        "vision_calls_avoided": len(file_paths) - len(results),
+        "time_saved_seconds": round(saved_ms / 1000, 2),
+        "elapsed_seconds": round(time.monotonic() - started, 2),
+    })
+    if file_paths:
+        logger.info("vision_extraction", extra={"tenant_id": tenant_id, **report})
+    return descriptions
+
+
+def describe_image(file_path: str, tenant_id: Optional[str] = None, report: Optional[dict] = None) -> str:
+    """Descrição de uma imagem (ver describe_images)."""
+    return describe_images([file_path], tenant_id=tenant_id, report=report)[0]
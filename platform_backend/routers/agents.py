@@ -28,6 +28,15 @@ def _check_agent_limit(tenant_id: str) -> bool:
     except Exception:
         return True  # sem checker: permite criar (fallback para deploy sem execution/)
 
+
+def _invalidate_roster(tenant_id: str) -> None:
+    """Descarta o roster em cache do tenant (supervisor/settings) após mudar agentes."""
+    try:
+        from execution.tenant_config import invalidate_tenant_roster
+        invalidate_tenant_roster(tenant_id)
+    except Exception:
+        pass  # sem execution/: nada em cache neste processo
+
 router = APIRouter(prefix="/agents", tags=["agents"])
 
 
@@ -188,6 +197,7 @@ def create_agent(body: AgentCreate, user: dict = Depends(get_current_user)):
                 row = cur.fetchone()
         else:
             raise
+    _invalidate_roster(tenant_id)
     return _row_to_agent(row)
 
 
@@ -248,6 +258,7 @@ def update_agent(agent_id: UUID, body: AgentUpdate, user: dict = Depends(get_cur
                 row = cur.fetchone()
         else:
             raise
+    _invalidate_roster(tenant_id)
     return _row_to_agent(row)
 
 
@@ -259,6 +270,7 @@ def delete_agent(agent_id: UUID, user: dict = Depends(get_current_user)):
         cur.execute("DELETE FROM agents WHERE id = %s AND tenant_id = %s", (str(agent_id), tenant_id))
         if cur.rowcount == 0:
             raise HTTPException(status_code=404, detail="Agente não encontrado")
+    _invalidate_roster(tenant_id)
     return {"ok": True}
 
 
@@ -275,6 +287,7 @@ def pause_agent(agent_id: UUID, user: dict = Depends(get_current_user)):
         row = cur.fetchone()
     if not row:
         raise HTTPException(status_code=404, detail="Agente não encontrado")
+    _invalidate_roster(tenant_id)
     return {"ok": True, "status": "paused"}
 
 
@@ -291,12 +304,12 @@ def resume_agent(agent_id: UUID, user: dict = Depends(get_current_user)):
         row = cur.fetchone()
     if not row:
         raise HTTPException(status_code=404, detail="Agente não encontrado")
+    _invalidate_roster(tenant_id)
     return {"ok": True, "status": "active"}
 
 
-@router.post("/{agent_id}/chat")
-def agent_chat(agent_id: UUID, body: ChatRequest, user: dict = Depends(get_current_user)):
-    """Envia uma mensagem ao agente e retorna a resposta (chat de teste no dashboard)."""
+def _chat_facade_kwargs(agent_id: UUID, body: ChatRequest, user: dict) -> dict:
+    """Valida mensagem e agente do chat de teste; devolve os argumentos da fachada."""
     _ensure_agents_table_columns()
     tenant_id = _ensure_tenant(user)
     msg = (body.message or "").strip()
@@ -310,25 +323,43 @@ def agent_chat(agent_id: UUID, body: ChatRequest, user: dict = Depends(get_curre
         row = cur.fetchone()
     if not row:
         raise HTTPException(status_code=404, detail="Agente não encontrado")
-    embedding_namespace = row.get("embedding_namespace")
+    import sys
+    import os
+    root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    if root not in sys.path:
+        sys.path.insert(0, root)
+    return dict(
+        lead_id="dashboard-test",
+        user_text=msg,
+        tenant_id=tenant_id,
+        agent_id=str(row["id"]),
+        embedding_namespace_override=row.get("embedding_namespace"),
+        agent_name_override=row.get("name"),
+        agent_niche_override=row.get("niche"),
+        agent_prompt_custom_override=row.get("prompt_custom"),
+    )
+
+
+@router.post("/{agent_id}/chat")
+def agent_chat(agent_id: UUID, body: ChatRequest, user: dict = Depends(get_current_user)):
+    """Envia uma mensagem ao agente e retorna a resposta (chat de teste no dashboard)."""
+    kwargs = _chat_facade_kwargs(agent_id, body, user)
     try:
-        import sys
-        import os
-        root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-        if root not in sys.path:
-            sys.path.insert(0, root)
         from execution.agent_facade import run_agent_facade
-        out = run_agent_facade(
-            lead_id="dashboard-test",
-            user_text=msg,
-            tenant_id=tenant_id,
-            agent_id=str(row["id"]),
-            embedding_namespace_override=embedding_namespace,
-            agent_name_override=row.get("name"),
-            agent_niche_override=row.get("niche"),
-            agent_prompt_custom_override=row.get("prompt_custom"),
-        )
+        out = run_agent_facade(**kwargs)
         reply = (out.get("resposta_texto") or "").strip()
         return {"reply": reply}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/{agent_id}/chat/stream")
+def agent_chat_stream(agent_id: UUID, body: ChatRequest, user: dict = Depends(get_current_user)):
+    """Chat de teste em Server-Sent Events: "partial" {"text"} durante a geração, "done" {"reply"} no final."""
+    kwargs = _chat_facade_kwargs(agent_id, body, user)
+    from execution.agent_facade import run_agent_facade_async
+    from ..sse import agent_sse_response
+    return agent_sse_response(
+        lambda on_partial: run_agent_facade_async(on_partial=on_partial, **kwargs),
+        lambda out: {"reply": (out.get("resposta_texto") or "").strip()},
+    )
@@ -15,6 +15,15 @@ router = APIRouter(prefix="/billing", tags=["billing"])
 settings = get_settings()
 stripe.api_key = settings.stripe_secret_key
 
+
+def _invalidate_plan(tenant_id: str) -> None:
+    """Descarta o plano em cache do tenant (limite de mensagens em execution/plan_limit_checker)."""
+    try:
+        from execution.plan_limit_checker import invalidate_plan
+        invalidate_plan(str(tenant_id))
+    except Exception:
+        pass  # sem execution/: nada em cache neste processo
+
 class CheckoutRequest(BaseModel):
     plan: str  # 'starter', 'growth', 'business', 'enterprise'
     success_url: str
@@ -112,6 +121,7 @@ async def stripe_webhook(request: Request, stripe_signature: str = Header(None))
                     "UPDATE tenants SET plan = %s, stripe_subscription_id = %s, updated_at = NOW() WHERE id = %s",
                     (plan, subscription_id, tenant_id)
                 )
+            _invalidate_plan(tenant_id)
 
     elif event['type'] in ['customer.subscription.updated', 'customer.subscription.deleted']:
         subscription = event['data']['object']
@@ -122,8 +132,11 @@ async def stripe_webhook(request: Request, stripe_signature: str = Header(None))
         if event['type'] == 'customer.subscription.deleted' or status in ['unpaid', 'canceled']:
             with get_cursor() as cur:
                 cur.execute(
-                    "UPDATE tenants SET plan = 'free', stripe_subscription_id = NULL, updated_at = NOW() WHERE stripe_customer_id = %s",
+                    "UPDATE tenants SET plan = 'free', stripe_subscription_id = NULL, updated_at = NOW() WHERE stripe_customer_id = %s RETURNING id",
                     (customer_id,)
                 )
+                rows = cur.fetchall()
+            for r in rows:
+                _invalidate_plan(r["id"])
 
     return {"status": "success"}
@@ -1,12 +1,14 @@
 """
 Upload e listagem de documentos por tenant (base de conhecimento).
-Suporta: PDF, Excel (.xlsx, .xls), Word (.docx), CSV, Markdown, HTML, URLs.
+Suporta: PDF, Excel (.xlsx, .xls), Word (.docx), CSV, Markdown, HTML, imagens (.png, .jpg, .jpeg, .webp), URLs.
 """
+import hashlib
 import os
 import uuid
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, BackgroundTasks, Request
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 
 from ..dependencies import get_current_user
 from ..config import get_settings
@@ -30,6 +32,19 @@ class DocumentResponse(BaseModel):
 class URLDocumentRequest(BaseModel):
     url: str
     embedding_namespace: Optional[str] = None
+    # crawl=True: segue sitemap/links do mesmo domínio (um documento para o site inteiro)
+    crawl: bool = False
+    max_pages: int = 20
+    max_depth: int = 1
+    use_sitemap: bool = True
+
+
+MAX_CRAWL_PAGES = 200
+
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp"}
+ALLOWED_EXTENSIONS = {".txt", ".pdf", ".xlsx", ".xls", ".docx", ".csv", ".md", ".html"} | IMAGE_EXTENSIONS
+MAX_IMAGE_BATCH = 50
 
 
 def _ensure_tenant(user: dict):
@@ -39,6 +54,135 @@ def _ensure_tenant(user: dict):
     return str(tenant_id)
 
 
+def _validate_extension(filename: Optional[str]) -> str:
+    ext = os.path.splitext(filename or "file")[1].lower()
+    if ext not in ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Formato não suportado. Use: {', '.join(ALLOWED_EXTENSIONS)}"
+        )
+    return ext
+
+
+# Uploads são copiados para o disco em blocos (memória constante por upload)
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+STORAGE_LIMIT_DETAIL = "Limite de storage do plano atingido"
+
+
+_sha_column_checked = False
+
+
+def _ensure_documents_sha_column():
+    """Garante a coluna documents.file_sha256 (deduplicação de uploads idênticos), uma vez por processo."""
+    global _sha_column_checked
+    if _sha_column_checked:
+        return
+    with get_cursor() as cur:
+        cur.execute("""
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name = 'documents' AND column_name = 'file_sha256') THEN
+                    ALTER TABLE documents ADD COLUMN file_sha256 TEXT;
+                    CREATE INDEX IF NOT EXISTS idx_documents_tenant_sha256 ON documents (tenant_id, file_sha256);
+                END IF;
+            END
+            $$;
+        """)
+    _sha_column_checked = True
+
+
+def _storage_remaining_bytes(tenant_id: str) -> Optional[int]:
+    """Bytes disponíveis no plano do tenant (None = sem limite ou checker indisponível)."""
+    try:
+        import sys
+        root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+        if root not in sys.path:
+            sys.path.insert(0, root)
+        from execution.usage_tracker import get_storage_remaining_bytes
+        return get_storage_remaining_bytes(tenant_id)
+    except Exception:
+        return None  # sem checker: permite o upload
+
+
+def _check_declared_size(request: Optional[Request], max_bytes: Optional[int]):
+    """Recusa antes de ler o corpo quando o Content-Length já passa do limite."""
+    if request is None or max_bytes is None:
+        return
+    try:
+        declared = int(request.headers.get("content-length") or 0)
+    except ValueError:
+        return
+    # Content-Length inclui o envelope multipart; folga de 64 KB
+    if declared > max_bytes + 64 * 1024:
+        raise HTTPException(status_code=413, detail=STORAGE_LIMIT_DETAIL)
+
+
+async def _save_upload(file: UploadFile, ext: str, max_bytes: Optional[int] = None) -> tuple[str, int, str]:
+    """
+    Copia o upload para o upload_dir em blocos, calculando tamanho e SHA-256 no caminho.
+    Se passar de max_bytes, interrompe, apaga o parcial e responde 413.
+    Retorna (file_path, tamanho em bytes, sha256 hex).
+    """
+    settings = get_settings()
+    os.makedirs(settings.upload_dir, exist_ok=True)
+    file_path = os.path.join(settings.upload_dir, f"{uuid.uuid4()}{ext}")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(file_path, "wb") as f:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes is not None and size > max_bytes:
+                    raise HTTPException(status_code=413, detail=STORAGE_LIMIT_DETAIL)
+                digest.update(chunk)
+                await run_in_threadpool(f.write, chunk)
+    except BaseException:
+        _remove_file(file_path)
+        raise
+    return file_path, size, digest.hexdigest()
+
+
+def _remove_file(file_path: Optional[str]):
+    if file_path and os.path.isfile(file_path):
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+
+
+def _find_duplicate(tenant_id: str, namespace: str, sha256: str) -> Optional[dict]:
+    """
+    Documento do tenant com o mesmo conteúdo (não falho) no mesmo namespace, se existir; o mais recente.
+    Em outro namespace (outro agente) o arquivo é ingerido de novo: a busca filtra por namespace.
+    """
+    with get_cursor() as cur:
+        cur.execute(
+            """SELECT * FROM documents
+               WHERE tenant_id = %s AND embedding_namespace = %s AND file_sha256 = %s
+                 AND COALESCE(status, 'pending') <> 'failed'
+               ORDER BY created_at DESC LIMIT 1""",
+            (tenant_id, namespace, sha256),
+        )
+        return cur.fetchone()
+
+
+def _document_response(r: dict) -> "DocumentResponse":
+    return DocumentResponse(
+        id=str(r["id"]),
+        tenant_id=str(r["tenant_id"]),
+        file_path=r.get("file_path") or "",
+        file_name=(r.get("file_name") or (r.get("file_path") and os.path.basename(r["file_path"])) or "unknown"),
+        file_size_mb=float(r.get("file_size_mb") or 0),
+        file_type=(r.get("file_type") or "unknown"),
+        embedding_namespace=r.get("embedding_namespace") or "",
+        source_url=r.get("source_url"),
+        status=(r.get("status") or "pending"),
+    )
+
+
 @router.get("", response_model=list[DocumentResponse])
 def list_documents(user: dict = Depends(get_current_user)):
     try:
@@ -49,20 +193,7 @@ def list_documents(user: dict = Depends(get_current_user)):
                 (tenant_id,),
             )
             rows = cur.fetchall()
-        return [
-            DocumentResponse(
-                id=str(r["id"]),
-                tenant_id=str(r["tenant_id"]),
-                file_path=r.get("file_path") or "",
-                file_name=(r.get("file_name") or (r.get("file_path") and os.path.basename(r["file_path"])) or "unknown"),
-                file_size_mb=float(r.get("file_size_mb") or 0),
-                file_type=(r.get("file_type") or "unknown"),
-                embedding_namespace=r.get("embedding_namespace") or "",
-                source_url=r.get("source_url"),
-                status=(r.get("status") or "pending"),
-            )
-            for r in rows
-        ]
+        return [_document_response(r) for r in rows]
     except HTTPException:
         raise
     except Exception as e:
@@ -72,13 +203,14 @@ def list_documents(user: dict = Depends(get_current_user)):
 @router.post("/upload", response_model=DocumentResponse)
 async def upload_document(
     background_tasks: BackgroundTasks,
+    request: Request,
     file: UploadFile = File(...),
     embedding_namespace: Optional[str] = None,
     user: dict = Depends(get_current_user),
 ):
     """
     Upload de documento para a base de conhecimento.
-    Suporta: .txt, .pdf, .xlsx, .xls, .docx, .csv, .md, .html
+    Suporta: .txt, .pdf, .xlsx, .xls, .docx, .csv, .md, .html, .png, .jpg, .jpeg, .webp
     """
     # #region agent log
     _log_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "debug-21fe81.log")
@@ -93,7 +225,7 @@ async def upload_document(
             pass
     # #endregion
     try:
-        return await _upload_document_impl(file, embedding_namespace, user, _debug_log, background_tasks)
+        return await _upload_document_impl(file, embedding_namespace, user, _debug_log, background_tasks, request)
     except HTTPException:
         raise
     except Exception as e:
@@ -101,7 +233,7 @@ async def upload_document(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-async def _upload_document_impl(file, embedding_namespace, user, _debug_log, background_tasks: BackgroundTasks):
+async def _upload_document_impl(file, embedding_namespace, user, _debug_log, background_tasks: BackgroundTasks, request: Optional[Request] = None):
     tenant_id = _ensure_tenant(user)
     # #region agent log
     _debug_log("upload_document entry", {"tenant_id": tenant_id, "filename": file.filename}, "A")
@@ -109,38 +241,34 @@ async def _upload_document_impl(file, embedding_namespace, user, _debug_log, bac
     settings = get_settings()
     
     # Valida extensão
-    allowed_extensions = {".txt", ".pdf", ".xlsx", ".xls", ".docx", ".csv", ".md", ".html"}
-    ext = os.path.splitext(file.filename or "file")[1].lower()
-    
-    if ext not in allowed_extensions:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Formato não suportado. Use: {', '.join(allowed_extensions)}"
-        )
+    ext = _validate_extension(file.filename)
     
     row = None
     doc_id = None
     try:
-        os.makedirs(settings.upload_dir, exist_ok=True)
-        safe_name = f"{uuid.uuid4()}{ext}"
-        file_path = os.path.join(settings.upload_dir, safe_name)
         # #region agent log
-        _debug_log("before file save", {"upload_dir": settings.upload_dir, "file_path": file_path}, "B")
+        _debug_log("before file save", {"upload_dir": settings.upload_dir}, "B")
         # #endregion
-        content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(content)
-        file_size_mb = len(content) / (1024 * 1024)
+        max_bytes = _storage_remaining_bytes(tenant_id)
+        _check_declared_size(request, max_bytes)
+        file_path, size_bytes, sha256 = await _save_upload(file, ext, max_bytes)
+        file_size_mb = size_bytes / (1024 * 1024)
         namespace = embedding_namespace or f"tenant_{tenant_id}"
+        _ensure_documents_sha_column()
+        # Mesmo arquivo já enviado: devolve o documento existente sem reprocessar
+        duplicate = _find_duplicate(tenant_id, namespace, sha256)
+        if duplicate:
+            _remove_file(file_path)
+            return _document_response(duplicate)
         # #region agent log
         _debug_log("before INSERT", {"doc_id": doc_id}, "A")
         # #endregion
         with get_cursor() as cur:
             cur.execute(
-                """INSERT INTO documents (tenant_id, file_path, embedding_namespace, file_name, file_size_mb, file_type, status)
-                   VALUES (%s, %s, %s, %s, %s, %s, 'pending') 
+                """INSERT INTO documents (tenant_id, file_path, embedding_namespace, file_name, file_size_mb, file_type, status, file_sha256)
+                   VALUES (%s, %s, %s, %s, %s, %s, 'pending', %s) 
                    RETURNING id, tenant_id, file_path, embedding_namespace, file_name, file_type""",
-                (tenant_id, file_path, namespace, file.filename, file_size_mb, ext[1:]),
+                (tenant_id, file_path, namespace, file.filename, file_size_mb, ext[1:], sha256),
             )
             row = cur.fetchone()
             doc_id = str(row["id"])
@@ -150,16 +278,16 @@ async def _upload_document_impl(file, embedding_namespace, user, _debug_log, bac
         # #endregion
         raise
 
-    # Launch background processing
+    # Agenda o processamento (fila ou background)
     if doc_id:
-        background_tasks.add_task(
-            process_document_task,
-            doc_id=doc_id,
+        _schedule_job(
+            background_tasks,
+            "process",
+            doc_id,
+            tenant_id,
             file_path=file_path,
-            tenant_id=tenant_id,
-            embedding_namespace=namespace,
-            file_name=file.filename,
-            file_type=ext[1:]
+            file_name=file.filename or "file",
+            file_type=ext[1:],
         )
 
     return DocumentResponse(
@@ -175,6 +303,85 @@ async def _upload_document_impl(file, embedding_namespace, user, _debug_log, bac
     )
 
 
+def _discard_batch(tenant_id: str, batch: list[dict]) -> None:
+    """Apaga os documentos já criados de um lote de imagens que falhou, e os arquivos deles."""
+    if batch:
+        try:
+            with get_cursor() as cur:
+                cur.execute(
+                    "DELETE FROM documents WHERE tenant_id = %s AND id = ANY(%s::uuid[])",
+                    (tenant_id, [d["doc_id"] for d in batch]),
+                )
+        except Exception as e:
+            print(f"Error discarding image batch: {e}")
+            return
+    for d in batch:
+        _remove_file(d["file_path"])
+
+
+@router.post("/upload-images", response_model=list[DocumentResponse])
+async def upload_images(
+    background_tasks: BackgroundTasks,
+    request: Request,
+    files: list[UploadFile] = File(...),
+    embedding_namespace: Optional[str] = None,
+    user: dict = Depends(get_current_user),
+):
+    """
+    Upload de várias imagens de uma vez (um documento por imagem). As descrições são geradas
+    num único job "images": cache por hash e chamadas ao Vision em paralelo sob orçamento.
+    Imagens já enviadas antes (mesmo SHA-256) voltam como o documento existente.
+    """
+    tenant_id = _ensure_tenant(user)
+    if not files:
+        raise HTTPException(status_code=400, detail="Envie ao menos uma imagem")
+    if len(files) > MAX_IMAGE_BATCH:
+        raise HTTPException(status_code=400, detail=f"Máximo de {MAX_IMAGE_BATCH} imagens por envio")
+    for f in files:
+        if _validate_extension(f.filename) not in IMAGE_EXTENSIONS:
+            raise HTTPException(status_code=400, detail=f"Não é imagem: {f.filename}. Use: {', '.join(sorted(IMAGE_EXTENSIONS))}")
+
+    max_bytes = _storage_remaining_bytes(tenant_id)
+    _check_declared_size(request, max_bytes)
+    _ensure_documents_sha_column()
+    namespace = embedding_namespace or f"tenant_{tenant_id}"
+    responses: list[DocumentResponse] = []
+    batch: list[dict] = []
+    file_path = None  # arquivo da imagem atual, ainda sem documento
+    try:
+        for f in files:
+            ext = os.path.splitext(f.filename or "")[1].lower()
+            file_path, size_bytes, sha256 = await _save_upload(f, ext, max_bytes)
+            if max_bytes is not None:
+                max_bytes -= size_bytes
+            duplicate = _find_duplicate(tenant_id, namespace, sha256)
+            if duplicate:
+                _remove_file(file_path)
+                file_path = None
+                responses.append(_document_response(duplicate))
+                continue
+            with get_cursor() as cur:
+                cur.execute(
+                    """INSERT INTO documents (tenant_id, file_path, embedding_namespace, file_name, file_size_mb, file_type, status, file_sha256)
+                       VALUES (%s, %s, %s, %s, %s, %s, 'pending', %s)
+                       RETURNING *""",
+                    (tenant_id, file_path, namespace, f.filename or "image", size_bytes / (1024 * 1024), ext[1:], sha256),
+                )
+                row = cur.fetchone()
+            responses.append(_document_response(row))
+            batch.append({"doc_id": str(row["id"]), "file_path": file_path, "file_name": f.filename or "image", "file_type": ext[1:]})
+            file_path = None
+    except BaseException:
+        # Falha no meio do lote (413, banco): o envio inteiro falha, sem documentos 'pending' sem job
+        _remove_file(file_path)
+        _discard_batch(tenant_id, batch)
+        raise
+
+    if batch:
+        _schedule_job(background_tasks, "images", batch[0]["doc_id"], tenant_id, documents=batch)
+    return responses
+
+
 @router.post("/url", response_model=DocumentResponse)
 async def upload_from_url(
     background_tasks: BackgroundTasks,
@@ -190,6 +397,9 @@ async def upload_from_url(
     
     tenant_id = _ensure_tenant(user)
     settings = get_settings()
+
+    if request.crawl:
+        return _create_crawl_document(background_tasks, request, tenant_id)
     
     # Baixa conteúdo da URL
     try:
@@ -233,16 +443,16 @@ async def upload_from_url(
         row = cur.fetchone()
         doc_id = str(row["id"])
 
-    # Launch background processing
+    # Agenda o processamento (fila ou background)
     if doc_id:
-        background_tasks.add_task(
-            process_document_task,
-            doc_id=doc_id,
+        _schedule_job(
+            background_tasks,
+            "process",
+            doc_id,
+            tenant_id,
             file_path=file_path,
-            tenant_id=tenant_id,
-            embedding_namespace=namespace,
             file_name=row.get("file_name") or request.url.split("/")[-1] or "webpage",
-            file_type=ext[1:]
+            file_type=ext[1:],
         )
 
     return DocumentResponse(
@@ -258,6 +468,59 @@ async def upload_from_url(
     )
 
 
+def _create_crawl_document(background_tasks: BackgroundTasks, request: URLDocumentRequest, tenant_id: str) -> DocumentResponse:
+    """Cria o documento do site e agenda o crawl (execution/url_ingest.py)."""
+    from urllib.parse import urlparse
+
+    parsed = urlparse(request.url)
+    if parsed.scheme not in ("http", "https") or not parsed.netloc:
+        raise HTTPException(status_code=400, detail="URL inválida")
+    namespace = request.embedding_namespace or f"tenant_{tenant_id}"
+    with get_cursor() as cur:
+        cur.execute(
+            """INSERT INTO documents (tenant_id, file_path, embedding_namespace, file_name, file_size_mb, file_type, source_url, status)
+               VALUES (%s, '', %s, %s, 0, 'url', %s, 'pending')
+               RETURNING *""",
+            (tenant_id, namespace, parsed.netloc, request.url),
+        )
+        row = cur.fetchone()
+    _schedule_job(
+        background_tasks,
+        "crawl",
+        str(row["id"]),
+        tenant_id,
+        url=request.url,
+        max_pages=max(1, min(request.max_pages, MAX_CRAWL_PAGES)),
+        max_depth=max(0, request.max_depth),
+        use_sitemap=request.use_sitemap,
+    )
+    return _document_response(row)
+
+
+@router.post("/{document_id}/refresh", response_model=DocumentResponse)
+def refresh_document(document_id: str, background_tasks: BackgroundTasks, user: dict = Depends(get_current_user)):
+    """
+    Revalida as páginas de um documento criado por URL. Requisições condicionais (ETag/Last-Modified):
+    só as páginas que mudaram são baixadas e re-ingeridas; a versão atual continua na busca até a troca.
+    """
+    tenant_id = _ensure_tenant(user)
+    with get_cursor() as cur:
+        cur.execute("SELECT * FROM documents WHERE id = %s AND tenant_id = %s", (document_id, tenant_id))
+        row = cur.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Documento não encontrado")
+    if not row.get("source_url"):
+        raise HTTPException(status_code=400, detail="Documento não foi criado a partir de uma URL")
+    if row.get("file_type") not in ("url", "html", "txt"):
+        raise HTTPException(status_code=400, detail="Refresh disponível apenas para páginas web")
+    payload = {"refresh": True}
+    if not row.get("crawl_options"):
+        # Documento de página única (importado antes do crawler): revalida só a própria URL
+        payload.update(url=row["source_url"], max_pages=1, max_depth=0, use_sitemap=False)
+    _schedule_job(background_tasks, "crawl", document_id, tenant_id, **payload)
+    return _document_response(row)
+
+
 @router.delete("/{document_id}")
 def delete_document(document_id: str, user: dict = Depends(get_current_user)):
     """Deleta um documento e seus chunks."""
@@ -297,23 +560,85 @@ def delete_document(document_id: str, user: dict = Depends(get_current_user)):
     return {"ok": True}
 
 
+@router.post("/{document_id}/replace", response_model=DocumentResponse)
+async def replace_document(
+    document_id: str,
+    background_tasks: BackgroundTasks,
+    request: Request,
+    file: UploadFile = File(...),
+    user: dict = Depends(get_current_user),
+):
+    """
+    Substitui o arquivo de um documento existente (nova versão).
+    Só os trechos novos/alterados geram embedding; a troca é atômica e a busca continua
+    usando a versão anterior até a nova estar completa.
+    """
+    tenant_id = _ensure_tenant(user)
+    ext = _validate_extension(file.filename)
+    with get_cursor() as cur:
+        cur.execute("SELECT * FROM documents WHERE id = %s AND tenant_id = %s", (document_id, tenant_id))
+        row = cur.fetchone()
+    if not row:
+        raise HTTPException(status_code=404, detail="Documento não encontrado")
+
+    # O arquivo antigo só sai do disco após a troca: a nova versão pode ocupar até o restante do plano
+    max_bytes = _storage_remaining_bytes(tenant_id)
+    _check_declared_size(request, max_bytes)
+    file_path, _, sha256 = await _save_upload(file, ext, max_bytes)
+    _ensure_documents_sha_column()
+    if row.get("file_sha256") == sha256:
+        # Conteúdo idêntico à versão atual: nada a fazer
+        _remove_file(file_path)
+        return _document_response(row)
+    _schedule_job(
+        background_tasks,
+        "replace",
+        document_id,
+        tenant_id,
+        file_path=file_path,
+        file_name=file.filename or row.get("file_name") or "file",
+        file_type=ext[1:],
+    )
+    return DocumentResponse(
+        id=document_id,
+        tenant_id=tenant_id,
+        file_path=row.get("file_path") or "",
+        file_name=row.get("file_name") or "unknown",
+        file_size_mb=float(row.get("file_size_mb") or 0),
+        file_type=row.get("file_type") or "unknown",
+        embedding_namespace=row.get("embedding_namespace") or "",
+        source_url=row.get("source_url"),
+        status=row.get("status") or "pending",
+    )
+
+
 @router.get("/{document_id}/status")
 def get_document_status(document_id: str, user: dict = Depends(get_current_user)):
     """Retorna o status do processamento de um documento."""
     tenant_id = _ensure_tenant(user)
     with get_cursor() as cur:
         cur.execute(
-            "SELECT id, status, file_name, file_type FROM documents WHERE id = %s AND tenant_id = %s",
+            "SELECT * FROM documents WHERE id = %s AND tenant_id = %s",
             (document_id, tenant_id),
         )
         row = cur.fetchone()
     if not row:
         raise HTTPException(status_code=404, detail="Documento não encontrado")
+    _execution_modules()
+    from execution.job_queue import get_latest_job
+
+    job = get_latest_job(document_id)
     return {
         "id": str(row["id"]),
         "status": row["status"],
         "file_name": row["file_name"],
         "file_type": row["file_type"],
+        "chunks_count": row.get("chunks_count") or 0,
+        "embeddings_reused": row.get("embeddings_reused") or 0,
+        "version": row.get("version") or 1,
+        # Job da fila (None quando processado via BackgroundTasks)
+        "job": job,
+        "progress": job["progress"] if job else (1.0 if row["status"] == "completed" else None),
     }
 
 
@@ -342,64 +667,40 @@ def rename_document(document_id: str, request: DocumentRenameRequest, user: dict
 
 # --- BACKGROUND WORKER ---
 
-def process_document_task(doc_id: str, file_path: str, tenant_id: str, embedding_namespace: str, file_name: str, file_type: str):
-    """Worker de segundo plano para processar documentos (extração + embedding)."""
+def _execution_modules():
+    """Garante a raiz do projeto no sys.path para importar execution.*."""
     import sys
     from pathlib import Path
-    
-    # Atualiza status inicial
-    try:
-        with get_cursor() as cur:
-            cur.execute(
-                "UPDATE documents SET status = 'processing', file_name = %s, file_type = %s, file_size_mb = %s WHERE id = %s",
-                (file_name, file_type, os.path.getsize(file_path) / (1024 * 1024), doc_id)
-            )
-    except Exception:
-        pass
+    root = Path(__file__).resolve().parents[2]
+    if str(root) not in sys.path:
+        sys.path.insert(0, str(root))
 
-    try:
-        root = Path(__file__).resolve().parents[2]
-        if str(root) not in sys.path:
-            sys.path.insert(0, str(root))
-        
-        from execution.document_ingest_extended import _extract_text_from_file, _chunk_text
-        from execution.knowledge_rag import _embed
-        from execution.document_ingest import _get_connection
 
-        # Extração
-        text = _extract_text_from_file(file_path)
-        chunks = _chunk_text(text)
-        
-        if not chunks:
-            with get_cursor() as cur:
-                cur.execute("UPDATE documents SET status = 'completed' WHERE id = %s", (doc_id,))
-            return
+def _schedule_job(background_tasks: BackgroundTasks, kind: str, doc_id: str, tenant_id: str, **payload):
+    """
+    Agenda o processamento: fila durável (DOCUMENT_JOBS_ENABLED=1, consumida por run_document_worker.py)
+    ou, sem fila / se o enfileiramento falhar, BackgroundTasks no próprio processo web.
+    payload: argumentos do handler (ver execution/document_pipeline.JOB_HANDLERS).
+    """
+    _execution_modules()
+    from execution import job_queue
 
-        # Embeddings
-        embeddings = _embed(chunks)
-        
-        # Salvamento
-        conn = _get_connection()
+    if job_queue.jobs_enabled():
         try:
-            with conn.cursor() as cur:
-                for i, (content_chunk, emb) in enumerate(zip(chunks, embeddings)):
-                    vec_str = "[" + ",".join(str(x) for x in emb) + "]"
-                    cur.execute(
-                        """INSERT INTO document_chunks (tenant_id, document_id, chunk_index, content, embedding)
-                           VALUES (%s, %s, %s, %s, %s::vector)""",
-                        (tenant_id, doc_id, i, content_chunk, vec_str),
-                    )
-            conn.commit()
-            
-            with get_cursor() as cur:
-                cur.execute("UPDATE documents SET status = 'completed' WHERE id = %s", (doc_id,))
-        finally:
-            conn.close()
+            job_queue.enqueue_job(tenant_id, doc_id, kind, payload)
+            return
+        except Exception as e:
+            print(f"Error enqueueing document job {doc_id}: {e}")
+    background_tasks.add_task(run_document_task, kind, doc_id, tenant_id, payload)
+
 
+def run_document_task(kind: str, doc_id: str, tenant_id: str, payload: dict):
+    """Executa o job no processo web (sem fila): processar, substituir ou fazer crawl do documento."""
+    _execution_modules()
+    from execution.document_pipeline import handle_final_failure, run_handler
+
+    try:
+        run_handler(kind, doc_id, tenant_id, payload)
     except Exception as e:
-        print(f"Error processing document {doc_id}: {e}")
-        try:
-            with get_cursor() as cur:
-                cur.execute("UPDATE documents SET status = 'failed' WHERE id = %s", (doc_id,))
-        except Exception:
-            pass
+        print(f"Error running document job {kind} {doc_id}: {e}")
+        handle_final_failure(kind, doc_id, payload)
@@ -11,6 +11,15 @@ from ..db import get_cursor
 router = APIRouter(prefix="/teams", tags=["teams"])
 
 
+def _invalidate_roster(tenant_id: str) -> None:
+    """Descarta o roster em cache do tenant (equipes usadas pelo supervisor)."""
+    try:
+        from execution.tenant_config import invalidate_tenant_roster
+        invalidate_tenant_roster(str(tenant_id))
+    except Exception:
+        pass  # sem execution/: nada em cache neste processo
+
+
 def _ensure_teams_table():
     with get_cursor() as cur:
         # Create the agent_teams table
@@ -190,6 +199,7 @@ def update_team(team_id: str, body: TeamUpdate, user: dict = Depends(get_current
         if not row:
             raise HTTPException(status_code=404, detail="Team not found")
             
+    _invalidate_roster(tenant_id)
     return get_team(team_id, user=user)
 
 
@@ -208,4 +218,5 @@ def delete_team(team_id: str, user: dict = Depends(get_current_user)):
         if not row:
             raise HTTPException(status_code=404, detail="Team not found")
             
+    _invalidate_roster(tenant_id)
     return {"ok": True}
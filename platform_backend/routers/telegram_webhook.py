@@ -1,6 +1,8 @@
 """
 Webhook público: Telegram envia POST aqui; processamos com o token do tenant e respondemos.
 """
+import asyncio
+
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import JSONResponse
 
@@ -65,7 +67,9 @@ def _process_telegram_update(tenant_id: str, update: dict) -> None:
                             p.write_bytes(r2.content)
                             try:
                                 from execution.stt import transcribe as stt_transcribe
-                                user_text = stt_transcribe(p)
+                                from execution.usage_tracker import tracked_usage
+                                with tracked_usage("audio", tenant_id, agent_id=cfg.get("agent_id"), lead_id=user_id):
+                                    user_text = stt_transcribe(p)
                             except Exception:
                                 user_text = ""
                             try:
@@ -95,6 +99,14 @@ def _process_telegram_update(tenant_id: str, update: dict) -> None:
             pass
 
     response = None
+    # Resposta em stream: primeira parte vira mensagem, o resto edita a mesma mensagem (editMessageText)
+    editor = None
+    from execution.stream_delivery import ThrottledEditor, streaming_enabled
+    if streaming_enabled():
+        editor = ThrottledEditor(
+            send=lambda text: _send_telegram_text_id(token, chat_id, text),
+            edit=lambda message_id, text: _edit_telegram_text(token, chat_id, message_id, text),
+        )
     try:
         from core.agent_runner import run_agent
         agent_id = cfg.get("agent_id")
@@ -103,6 +115,7 @@ def _process_telegram_update(tenant_id: str, update: dict) -> None:
             channel="telegram",
             incoming_message=user_text,
             metadata={"lead_id": user_id, "is_audio": is_audio, "agent_id": agent_id},
+            on_partial=editor.update if editor else None,
         )
     except Exception as e:
         import traceback
@@ -122,9 +135,13 @@ def _process_telegram_update(tenant_id: str, update: dict) -> None:
         return
 
     resposta_texto = (response.get("resposta_texto") or "").strip() if response else ""
-    if resposta_texto:
+    streamed = False
+    if editor and resposta_texto:
+        from execution.async_runtime import run_sync
+        streamed = run_sync(editor.finish(resposta_texto))
+    if resposta_texto and not streamed:
         _send_telegram_text(token, chat_id, resposta_texto)
-    elif response is not None:
+    elif not resposta_texto and response is not None:
         _send_telegram_text(token, chat_id, "Recebi sua mensagem. Se o agente não respondeu, o administrador pode precisar configurar OPENROUTER_API_KEY no servidor.")
 
     # Opcional: imagens e áudio (resposta TTS) — envio simples
@@ -149,7 +166,9 @@ def _process_telegram_update(tenant_id: str, update: dict) -> None:
     if (response or {}).get("enviar_audio") and resposta_texto and is_audio:
         try:
             from execution.tts import synthesize as tts_synthesize
-            audio_path = tts_synthesize(resposta_texto)
+            from execution.usage_tracker import tracked_usage
+            with tracked_usage("audio", tenant_id, agent_id=cfg.get("agent_id"), lead_id=user_id):
+                audio_path = tts_synthesize(resposta_texto)
             _send_telegram_voice(token, chat_id, audio_path)
         except Exception:
             pass
@@ -168,6 +187,34 @@ def _send_telegram_text(token: str, chat_id: int, text: str) -> bool:
         return False
 
 
+def _send_telegram_text_id(token: str, chat_id: int, text: str) -> int | None:
+    """sendMessage retornando o message_id (para editar depois), ou None."""
+    import httpx
+    try:
+        r = httpx.post(
+            f"https://api.telegram.org/bot{token}/sendMessage",
+            json={"chat_id": chat_id, "text": text},
+            timeout=15.0,
+        )
+        data = r.json()
+        return (data.get("result") or {}).get("message_id") if data.get("ok") else None
+    except Exception:
+        return None
+
+
+def _edit_telegram_text(token: str, chat_id: int, message_id: int, text: str) -> bool:
+    import httpx
+    try:
+        r = httpx.post(
+            f"https://api.telegram.org/bot{token}/editMessageText",
+            json={"chat_id": chat_id, "message_id": message_id, "text": text},
+            timeout=15.0,
+        )
+        return r.json().get("ok", False)
+    except Exception:
+        return False
+
+
 def _send_telegram_photo(token: str, chat_id: int, photo_url: str, caption: str = "") -> bool:
     import httpx
     try:
@@ -211,7 +258,8 @@ async def telegram_webhook_receive(tenant_id: str, request: Request):
     except Exception:
         raise HTTPException(status_code=400, detail="Body inválido")
     try:
-        _process_telegram_update(tenant_id, body)
+        # Processamento síncrono (agente + envio) fora do event loop
+        await asyncio.to_thread(_process_telegram_update, tenant_id, body)
     except Exception as e:
         print(f"Error processing telegram webhook for tenant {tenant_id}: {e}")
         pass  # Telegram já recebe 200; falhas não devem derrubar o webhook
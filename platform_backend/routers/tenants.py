@@ -10,6 +10,15 @@ from ..db import get_cursor
 router = APIRouter(prefix="/tenants", tags=["tenants"])
 
 
+def _invalidate_plan(tenant_id: str) -> None:
+    """Descarta o plano em cache do tenant (limite de mensagens em execution/plan_limit_checker)."""
+    try:
+        from execution.plan_limit_checker import invalidate_plan
+        invalidate_plan(str(tenant_id))
+    except Exception:
+        pass  # sem execution/: nada em cache neste processo
+
+
 class TenantResponse(BaseModel):
     id: str
     company_name: str
@@ -82,4 +91,5 @@ def update_tenant_plan(body: TenantPlanUpdate, user: dict = Depends(get_current_
     if not row:
         raise HTTPException(status_code=404, detail="Tenant não encontrado")
     
+    _invalidate_plan(tenant_id)
     return {"ok": True, "plan": body.plan}
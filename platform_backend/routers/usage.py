@@ -2,7 +2,7 @@
 Roteador de Usage Tracking: tokens, mensagens, storage.
 Gerencia o tracking de uso por tenant e verifica limites de plano.
 """
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional
 from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException
@@ -58,6 +58,16 @@ def _get_current_month() -> str:
     return datetime.utcnow().strftime("%Y-%m")
 
 
+def _month_bounds(year_month: str) -> tuple[datetime, datetime]:
+    """[início, início do mês seguinte) em UTC, para filtrar created_at pelo índice (tenant_id, created_at)."""
+    try:
+        start = datetime.strptime(year_month, "%Y-%m").replace(tzinfo=timezone.utc)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="year_month deve estar no formato AAAA-MM")
+    end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start, end
+
+
 def _ensure_usage_record(tenant_id: str, cursor) -> dict:
     """Garante que existe registro de uso para o mês atual."""
     month = _get_current_month()
@@ -283,6 +293,51 @@ def get_usage_logs(
     ]
 
 
+@router.get("/tokens")
+def get_token_breakdown(
+    year_month: Optional[str] = None,
+    user: CurrentUser = None,
+    tenant_id: CurrentTenant = None,
+):
+    """
+    Consumo do mês por agente e finalidade (chat, supervisor, embedding, vision, stt, tts),
+    a partir do detalhamento gravado em tenant_usage_log.metadata.by_purpose.
+    """
+    month = year_month or _get_current_month()
+    start, end = _month_bounds(month)
+    with get_cursor() as cur:
+        cur.execute(
+            """SELECT COALESCE(l.metadata->>'agent_id', '') AS agent_id,
+                      p.key AS purpose,
+                      SUM(COALESCE((p.value->>'calls')::numeric, 0)) AS calls,
+                      SUM(COALESCE((p.value->>'prompt_tokens')::numeric, 0)) AS prompt_tokens,
+                      SUM(COALESCE((p.value->>'completion_tokens')::numeric, 0)) AS completion_tokens,
+                      SUM(COALESCE((p.value->>'cached_tokens')::numeric, 0)) AS cached_tokens,
+                      SUM(COALESCE((p.value->>'total_tokens')::numeric, 0)) AS total_tokens,
+                      SUM(COALESCE((p.value->>'characters')::numeric, 0)) AS characters,
+                      SUM(COALESCE((p.value->>'audio_seconds')::numeric, 0)) AS audio_seconds
+               FROM tenant_usage_log l,
+                    jsonb_each(COALESCE(l.metadata->'by_purpose', '{}'::jsonb)) p
+               WHERE l.tenant_id = %s AND l.created_at >= %s AND l.created_at < %s
+               GROUP BY 1, 2
+               ORDER BY 1, 2""",
+            (tenant_id, start, end)
+        )
+        rows = cur.fetchall()
+
+    agents: dict[str, dict] = {}
+    totals: dict[str, float] = {}
+    for r in rows:
+        values = {k: float(r[k]) for k in ("calls", "prompt_tokens", "completion_tokens", "cached_tokens",
+                                            "total_tokens", "characters", "audio_seconds")}
+        agent = agents.setdefault(r["agent_id"] or "sem_agente", {"total_tokens": 0.0, "by_purpose": {}})
+        agent["by_purpose"][r["purpose"]] = values
+        agent["total_tokens"] += values["total_tokens"]
+        for k, v in values.items():
+            totals[k] = totals.get(k, 0.0) + v
+    return {"year_month": month, "totals": totals, "agents": agents}
+
+
 @router.get("/limits")
 def get_plan_limits(
     plan: str = "free",
@@ -293,3 +348,21 @@ def get_plan_limits(
         "plan": plan,
         **limits,
     }
+
+
+@router.get("/quota")
+def get_message_quota(
+    user: CurrentUser = None,
+    tenant_id: CurrentTenant = None,
+):
+    """
+    Cota de mensagens do mês (a mesma que bloqueia o agente): plano, limite, usadas e restantes.
+    Lida do contador de execution/plan_limit_checker, sem COUNT(*) no log.
+    """
+    import os
+    import sys
+    root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    if root not in sys.path:
+        sys.path.insert(0, root)
+    from execution.plan_limit_checker import message_quota
+    return message_quota(tenant_id)
@@ -339,8 +339,8 @@ async def webhook_receive(request: Request):
                 text_body = (msg.get("text") or {}).get("body") or ""
                 if not from_wa or not text_body.strip():
                     continue
-                from adapters.whatsapp_adapter import get_agent_response
-                response = get_agent_response(tenant_id, str(from_wa), text_body.strip(), is_audio=False, agent_id=agent_id)
+                from adapters.whatsapp_adapter import get_agent_response_async
+                response = await get_agent_response_async(tenant_id, str(from_wa), text_body.strip(), is_audio=False, agent_id=agent_id)
                 reply_text = (response.get("resposta_texto") or "").strip()
                 if reply_text:
                     success = await _send_whatsapp_text(phone_number_id, access_token, str(from_wa), reply_text)
@@ -441,8 +441,8 @@ async def evolution_webhook(request: Request):
         tenant_id, config = _get_tenant_and_evolution_by_instance(instance_name)
         if not tenant_id or not config:
             continue
-        from adapters.whatsapp_adapter import get_agent_response
-        response = get_agent_response(tenant_id, remote_jid, text or "", is_audio=False, agent_id=config.get("agent_id"))
+        from adapters.whatsapp_adapter import get_agent_response_async
+        response = await get_agent_response_async(tenant_id, remote_jid, text or "", is_audio=False, agent_id=config.get("agent_id"))
         reply_text = (response.get("resposta_texto") or "").strip()
         if reply_text:
             success = await _send_evolution_text(
@@ -15,9 +15,8 @@ class WidgetChatRequest(BaseModel):
     session_id: str | None = None  # Optional: client can maintain session
 
 
-@router.post("/chat")
-def widget_chat(body: WidgetChatRequest):
-    """Endpoint público para o widget de chat embeddable em websites."""
+def _load_widget_agent(body: WidgetChatRequest) -> tuple[str, dict]:
+    """Valida a mensagem e o agente (ativo e do tenant). Retorna (mensagem, linha do agente)."""
     msg = (body.message or "").strip()
     if not msg:
         raise HTTPException(status_code=400, detail="Mensagem vazia")
@@ -38,32 +37,57 @@ def widget_chat(body: WidgetChatRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro de banco: {e}")
 
+    import sys
+    import os
+    root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    if root not in sys.path:
+        sys.path.insert(0, root)
+    return msg, row
+
+
+def _facade_kwargs(body: WidgetChatRequest, msg: str, row: dict) -> dict:
     # Use session_id from body or create a widget-specific lead_id
-    lead_id = f"widget-{body.session_id or 'anonymous'}"
+    return dict(
+        lead_id=f"widget-{body.session_id or 'anonymous'}",
+        user_text=msg,
+        tenant_id=body.tenant_id,
+        agent_id=str(row["id"]),
+        embedding_namespace_override=row.get("embedding_namespace"),
+        agent_name_override=row.get("name"),
+        agent_niche_override=row.get("niche"),
+        agent_prompt_custom_override=row.get("prompt_custom"),
+    )
+
 
+@router.post("/chat")
+def widget_chat(body: WidgetChatRequest):
+    """Endpoint público para o widget de chat embeddable em websites."""
+    msg, row = _load_widget_agent(body)
     try:
-        import sys
-        import os
-        root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-        if root not in sys.path:
-            sys.path.insert(0, root)
         from execution.agent_facade import run_agent_facade
-        out = run_agent_facade(
-            lead_id=lead_id,
-            user_text=msg,
-            tenant_id=body.tenant_id,
-            agent_id=str(row["id"]),
-            embedding_namespace_override=row.get("embedding_namespace"),
-            agent_name_override=row.get("name"),
-            agent_niche_override=row.get("niche"),
-            agent_prompt_custom_override=row.get("prompt_custom"),
-        )
+        out = run_agent_facade(**_facade_kwargs(body, msg, row))
         reply = (out.get("resposta_texto") or "").strip()
         return {"reply": reply, "estado": out.get("proximo_estado")}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/chat/stream")
+def widget_chat_stream(body: WidgetChatRequest):
+    """
+    Como /chat, em Server-Sent Events: eventos "partial" {"text"} enquanto o modelo gera e
+    "done" {"reply", "estado"} no final (ou "error" {"detail"}).
+    """
+    msg, row = _load_widget_agent(body)
+    from execution.agent_facade import run_agent_facade_async
+    from ..sse import agent_sse_response
+    kwargs = _facade_kwargs(body, msg, row)
+    return agent_sse_response(
+        lambda on_partial: run_agent_facade_async(on_partial=on_partial, **kwargs),
+        lambda out: {"reply": (out.get("resposta_texto") or "").strip(), "estado": out.get("proximo_estado")},
+    )
+
+
 @router.get("/config/{agent_id}")
 def widget_config(agent_id: str, tenant_id: str):
     """Retorna configurações públicas do agente para inicializar o widget."""
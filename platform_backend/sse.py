@@ -0,0 +1,53 @@
+"""
+Server-Sent Events para respostas do agente em stream (widget e chat de teste do dashboard).
+Eventos: "partial" {"text": resposta até agora}, depois "done" (payload final) ou "error" {"detail"}.
+"""
+import asyncio
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+from fastapi.responses import StreamingResponse
+
+
+def _event(name: str, data: dict) -> str:
+    return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _agent_events(
+    run: Callable[[Callable[[str], Awaitable[None]]], Awaitable[dict]],
+    done: Callable[[dict], dict],
+) -> AsyncIterator[str]:
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def on_partial(text: str) -> None:
+        await queue.put(("partial", {"text": text}))
+
+    async def worker() -> None:
+        try:
+            out = await run(on_partial)
+            await queue.put(("done", done(out)))
+        except Exception as e:
+            await queue.put(("error", {"detail": str(e)}))
+
+    task = asyncio.create_task(worker())
+    try:
+        while True:
+            name, data = await queue.get()
+            yield _event(name, data)
+            if name != "partial":
+                break
+    finally:
+        if not task.done():
+            task.cancel()  # cliente desconectou
+
+
+def agent_sse_response(
+    run: Callable[[Callable[[str], Awaitable[None]]], Awaitable[dict]],
+    done: Callable[[dict], Any],
+) -> StreamingResponse:
+    """run(on_partial) executa o agente (ex.: run_agent_facade_async); done(out) monta o evento final."""
+    return StreamingResponse(
+        _agent_events(run, done),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Worker da fila de documentos (extração + embeddings fora do processo web).
+Consome a tabela document_jobs (ver execution/job_queue.py) com N threads; jobs interrompidos
+por restart/redeploy voltam para a fila automaticamente.
+Uso: python run_document_worker.py
+Variáveis: DOCUMENT_WORKER_CONCURRENCY (padrão 2), DOCUMENT_WORKER_POLL_SECONDS (padrão 2).
+No platform_backend defina DOCUMENT_JOBS_ENABLED=1 para enfileirar em vez de usar BackgroundTasks.
+"""
+
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from dotenv import load_dotenv
+load_dotenv(ROOT / ".env")
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+    stream=sys.stdout,
+)
+logger = logging.getLogger("document_worker")
+
+from execution import job_queue
+from execution.document_pipeline import run_job
+
+STALE_CHECK_SECONDS = 60
+_stop = threading.Event()
+
+
+def _env_number(key: str, default: float) -> float:
+    try:
+        return max(0.0, float(os.environ.get(key, "").strip() or default))
+    except ValueError:
+        return default
+
+
+def _worker_loop(worker_id: str, poll_seconds: float) -> None:
+    while not _stop.is_set():
+        try:
+            job = job_queue.claim_job(worker_id)
+        except Exception:
+            logger.exception("Erro ao buscar job; tentando de novo em %ss", poll_seconds)
+            _stop.wait(poll_seconds)
+            continue
+        if job is None:
+            _stop.wait(poll_seconds)
+            continue
+        logger.info("Job %s (%s) do tenant %s — tentativa %s/%s", job["id"], job["kind"], job["tenant_id"], job["attempts"], job["max_attempts"])
+        with job_queue.keep_alive(job["id"], worker_id):
+            run_job(job)
+
+
+def main():
+    concurrency = max(1, int(_env_number("DOCUMENT_WORKER_CONCURRENCY", 2)))
+    poll_seconds = max(0.2, _env_number("DOCUMENT_WORKER_POLL_SECONDS", 2))
+    job_queue.ensure_jobs_table()
+
+    def _shutdown(signum, frame):
+        logger.info("Sinal %s recebido; terminando jobs em andamento...", signum)
+        _stop.set()
+
+    signal.signal(signal.SIGTERM, _shutdown)
+    signal.signal(signal.SIGINT, _shutdown)
+
+    host = f"{socket.gethostname()}:{os.getpid()}"
+    threads = [
+        threading.Thread(target=_worker_loop, args=(f"{host}:{i}", poll_seconds), name=f"doc-worker-{i}", daemon=True)
+        for i in range(concurrency)
+    ]
+    for t in threads:
+        t.start()
+    logger.info("Worker de documentos iniciado (%s threads).", concurrency)
+
+    while not _stop.is_set():
+        try:
+            requeued = job_queue.requeue_stale_jobs()
+            if requeued:
+                logger.warning("%s job(s) travado(s) devolvido(s) à fila.", requeued)
+        except Exception:
+            logger.exception("Erro ao verificar jobs travados")
+        _stop.wait(STALE_CHECK_SECONDS)
+
+    for t in threads:
+        t.join()
+    logger.info("Worker de documentos encerrado.")
+
+
+if __name__ == "__main__":
+    main()
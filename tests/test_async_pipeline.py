@@ -0,0 +1,73 @@
+"""
+Cenário de teste: servidor local compatível com chat/completions que demora 0,3s por resposta.
+Vinte rodadas simultâneas de llm_orchestrator.run_async num só event loop devem terminar em
+pouco mais que uma chamada (nenhuma thread presa esperando o modelo); a API síncrona continua
+funcionando como invólucro (run_sync).
+"""
+
+import asyncio
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Raiz do projeto
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+REPLY = {"resposta_texto": "Olá! Como posso ajudar?", "enviar_audio": False, "proximo_estado": "descoberta"}
+
+
+class _SlowChatHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("content-length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(0.3)
+        raw = json.dumps({
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body.get("model"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": json.dumps(REPLY)}}],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110},
+        }).encode()
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_concurrent_turns_share_one_loop(monkeypatch):
+    from execution import llm_orchestrator
+    from execution.async_runtime import run_sync
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SlowChatHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(llm_orchestrator, "OPENROUTER_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/v1")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "sk-test")
+    monkeypatch.setenv("OPENROUTER_MODEL", "test/async-model")
+
+    async def turn(i: int) -> dict:
+        return await llm_orchestrator.run_async(f"lead-{i}", "Oi", "descoberta", "CONTEXTO: vazio", [])
+
+    async def many() -> list[dict]:
+        return await asyncio.gather(*(turn(i) for i in range(20)))
+
+    try:
+        started = time.monotonic()
+        results = run_sync(many())
+        elapsed = time.monotonic() - started
+        assert [r["resposta_texto"] for r in results] == [REPLY["resposta_texto"]] * 20
+        assert results[0]["usage"]["total_tokens"] == 110
+        assert elapsed < 3.0  # sequencial seriam 6s
+    finally:
+        server.shutdown()
@@ -0,0 +1,89 @@
+"""
+Cenário de teste: conversa longa no SQLite com resumo a cada 2 turnos e 1 turno mantido por extenso.
+O modelo de resumo (servidor local compatível com chat/completions) recebe só os turnos que saíram
+da janela; o prompt seguinte leva o resumo + turnos não resumidos, dentro do orçamento de tokens.
+"""
+
+import asyncio
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Raiz do projeto
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+SUMMARY = "Cliente Ana, casal, quer suíte com vista para o mar em dezembro; orçamento de R$ 400 por noite."
+
+
+class _SummaryHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests: list[dict] = []
+
+    def do_POST(self):
+        length = int(self.headers.get("content-length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        _SummaryHandler.requests.append(body)
+        raw = json.dumps({
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body.get("model"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": SUMMARY}}],
+            "usage": {"prompt_tokens": 200, "completion_tokens": 30, "total_tokens": 230},
+        }).encode()
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_rolling_summary_bounds_history(monkeypatch, tmp_path):
+    from execution import conversation_summary, db_sessions, llm_orchestrator
+    from execution.async_runtime import run_sync
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SummaryHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(llm_orchestrator, "OPENROUTER_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/v1")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "sk-test")
+    monkeypatch.setenv("CONVERSATION_SUMMARY_MODEL", "test/cheap")
+    monkeypatch.setenv("CONVERSATION_SUMMARY_EVERY_TURNS", "2")
+    monkeypatch.setenv("CONVERSATION_SUMMARY_KEEP_TURNS", "1")
+    monkeypatch.setenv("CONVERSATION_HISTORY_TOKENS", "200")
+    monkeypatch.setenv("DATABASE_PATH", str(tmp_path / "sdr.db"))
+    for name in ("DATABASE_URL", "SUPABASE_URL"):
+        monkeypatch.delenv(name, raising=False)
+
+    async def conversation() -> None:
+        db_sessions.init_db()
+        db_sessions.get_or_create_session("lead-1")
+        for turn in range(1, 4):
+            db_sessions.append_log("lead-1", "user", f"mensagem {turn} " + "detalhe " * 40)
+            db_sessions.append_log("lead-1", "assistant", f"resposta {turn}")
+            await conversation_summary.after_turn("lead-1")
+            await asyncio.gather(*conversation_summary._tasks)
+
+    try:
+        run_sync(conversation())
+    finally:
+        server.shutdown()
+
+    # Resumo no 2º turno (incorpora só o 1º); o 3º turno fica pendente
+    assert len(_SummaryHandler.requests) == 1
+    sent = _SummaryHandler.requests[0]["messages"][1]["content"]
+    assert "mensagem 1" in sent and "mensagem 2" not in sent
+    summary = db_sessions.get_summary("lead-1")
+    assert summary == {"summary": SUMMARY, "summary_turns": 1}
+
+    log = db_sessions.get_recent_log("lead-1", limit=conversation_summary.recent_log_limit())
+    history = conversation_summary.unsummarized(log, summary)
+    assert [m["content"] for m in history][-1] == "resposta 3" and len(history) == 4
+    message = llm_orchestrator.build_user_message("E o café?", "CONTEXTO: vazio", history, summary["summary"])
+    assert SUMMARY in message and "mensagem 1" not in message and "resposta 3" in message
+    assert len(message) < 2000
@@ -0,0 +1,54 @@
+"""
+Cenário de teste: init_db com Postgres simulado (conexão que registra os comandos). Os ALTER TABLE
+de colunas novas rodam só na primeira chamada do processo; as seguintes (uma por turno) não
+pegam lock exclusivo nas tabelas.
+"""
+
+import sys
+from pathlib import Path
+
+# Raiz do projeto
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+class _Conn:
+    def __init__(self, executed: list):
+        self.executed = executed
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, sql, params=None):
+        self.executed.append(sql)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def test_added_columns_altered_once_per_process(monkeypatch):
+    from execution import db_sessions
+    executed: list[str] = []
+    monkeypatch.setattr(db_sessions, "_use_postgres", lambda: True)
+    monkeypatch.setattr(db_sessions, "_get_pg_connection", lambda: _Conn(executed))
+    monkeypatch.setattr(db_sessions, "_pg_columns_checked", False)
+
+    for _ in range(3):
+        db_sessions.init_db()
+
+    alters = [sql for sql in executed if "ADD COLUMN IF NOT EXISTS summary" in sql or "ADD COLUMN IF NOT EXISTS rout" in sql]
+    assert alters == db_sessions._PG_ADDED_COLUMNS
+    assert any("summary_turns" in sql for sql in alters) and any("routed_agent_id" in sql for sql in alters)
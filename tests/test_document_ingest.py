@@ -0,0 +1,192 @@
+"""
+Cenário de teste: substituição incremental de documento com Postgres simulado. replace_chunks faz
+diff e embeddings sem transação aberta e só trava o documento (FOR UPDATE) para a troca, depois de
+conferir que versão e chunks não mudaram; se mudaram, refaz o diff sem gerar de novo os embeddings.
+O relatório conta mantidos, novos e removidos. Chunks vindos de um gerador (planilha) são
+consumidos em janelas, com os embeddings de cada janela gerados antes de ler a seguinte.
+store_chunks gera um embedding por hash novo (repetidos no documento e já gravados no tenant são
+reaproveitados); a garantia das colunas de hash usa conexão própria e, se falhar, não desfaz a
+transação de quem chamou.
+"""
+
+import sys
+from pathlib import Path
+
+# Raiz do projeto
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+MODEL = "text-embedding-3-small"
+
+
+class _Conn:
+    """Conexão simulada: registra comandos e commits; as consultas respondem com as linhas da tabela simulada."""
+
+    def __init__(self, events: list, tables: dict):
+        self.events = events
+        self.tables = tables
+        self._last = ""
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, sql, params=None):
+        self._last = " ".join(sql.split())
+        self.events.append((self._last, params))
+
+    def executemany(self, sql, rows):
+        for params in rows:
+            self.execute(sql, params)
+
+    def fetchone(self):
+        rows = self.fetchall()
+        return rows[0] if rows else None
+
+    def fetchall(self):
+        if self._last.startswith("SELECT version FROM documents"):
+            version = self.tables["version"]
+            return [{"version": version() if callable(version) else version}]
+        if self._last.startswith("SELECT id, content_hash"):
+            return self.tables["chunks"]
+        if "DISTINCT ON (content_hash)" in self._last:
+            return self.tables.get("reusable", [])
+        return []
+
+    def commit(self):
+        self.events.append(("COMMIT", None))
+
+    def rollback(self):
+        self.events.append(("ROLLBACK", None))
+
+    def close(self):
+        pass
+
+
+def _ingest(monkeypatch, tables: dict):
+    from execution import document_ingest, embedding_service, knowledge_rag
+    events: list = []
+    embedded: list = []
+    monkeypatch.setattr(document_ingest, "_get_connection", lambda: _Conn(events, tables))
+    monkeypatch.setattr(document_ingest, "_chunk_schema_checked", True)
+    monkeypatch.setattr(embedding_service, "embedding_model", lambda: MODEL)
+
+    def fake_embed(texts, tenant_id=None, stats=None, **kwargs):
+        events.append(("EMBED", list(texts)))
+        embedded.extend(texts)
+        return [[0.1, 0.2] for _ in texts]
+
+    monkeypatch.setattr(knowledge_rag, "_embed", fake_embed)
+    return document_ingest, events, embedded
+
+
+def _tables() -> dict:
+    from execution.document_ingest import chunk_content_hash
+    return {
+        "version": 3,
+        "chunks": [
+            {"id": "c-a", "content": "Check-in às 14h", "content_hash": chunk_content_hash("Check-in às 14h", MODEL)},
+            {"id": "c-b", "content": "Café das 7h às 10h", "content_hash": None},
+        ],
+    }
+
+
+def test_replace_chunks_embeds_before_locking(monkeypatch):
+    document_ingest, events, embedded = _ingest(monkeypatch, _tables())
+
+    report = document_ingest.replace_chunks("t1", "doc-1", ["Check-in às 14h", "Piscina aquecida"])
+
+    sqls = [sql for sql, _ in events]
+    embed = sqls.index("EMBED")
+    lock = next(i for i, sql in enumerate(sqls) if "FOR UPDATE" in sql)
+    # Embeddings sem transação de escrita aberta; o lock só cobre conferência + troca, num commit
+    assert embed < lock
+    assert not any(sql.split()[0] in ("INSERT", "UPDATE", "DELETE") for sql in sqls[:lock])
+    assert sqls[lock + 1].startswith("SELECT id, content_hash FROM document_chunks")
+    assert sqls[lock:].count("COMMIT") == 1 and sqls[-1] == "COMMIT"
+    assert embedded == ["Piscina aquecida"]
+    assert report["kept"] == 1 and report["added"] == 1 and report["removed"] == 1 and report["version"] == 4
+    assert ("DELETE FROM document_chunks WHERE id = ANY(%s::uuid[])", (["c-b"],)) in events
+
+
+def test_replace_chunks_retries_when_document_changes_before_lock(monkeypatch):
+    tables = _tables()
+    reads = iter([3, 4, 4, 4])  # snapshot, lock (mudou), snapshot, lock
+    tables["version"] = lambda: next(reads)
+    document_ingest, events, embedded = _ingest(monkeypatch, tables)
+
+    report = document_ingest.replace_chunks("t1", "doc-1", ["Check-in às 14h", "Piscina aquecida"])
+
+    sqls = [sql for sql, _ in events]
+    assert sum("FOR UPDATE" in sql for sql in sqls) == 2 and "ROLLBACK" in sqls
+    # Primeira troca abortada antes de escrever; embeddings gerados uma vez só
+    first_lock = next(i for i, sql in enumerate(sqls) if "FOR UPDATE" in sql)
+    assert sqls[first_lock + 2] == "ROLLBACK"
+    assert embedded == ["Piscina aquecida"] and report["version"] == 5
+
+
+def test_replace_chunks_streams_generator_in_windows(monkeypatch):
+    document_ingest, events, embedded = _ingest(monkeypatch, _tables())
+    monkeypatch.setattr(document_ingest, "STORE_WINDOW", 2)
+
+    def rows():
+        for text in ["Check-in às 14h", "Piscina aquecida", "Estacionamento grátis", "Pet friendly"]:
+            events.append(("YIELD", text))
+            yield {"content": text, "metadata": {"sheet": "Regras"}}
+
+    report = document_ingest.replace_chunks("t1", "doc-1", rows())
+
+    flow = [(sql, params) for sql, params in events if sql in ("YIELD", "EMBED")]
+    # Cada janela é embedada antes de a próxima ser lida; o chunk mantido não gera embedding
+    assert flow == [
+        ("YIELD", "Check-in às 14h"), ("YIELD", "Piscina aquecida"), ("EMBED", ["Piscina aquecida"]),
+        ("YIELD", "Estacionamento grátis"), ("YIELD", "Pet friendly"), ("EMBED", ["Estacionamento grátis", "Pet friendly"]),
+    ]
+    assert report["chunks"] == 4 and report["kept"] == 1 and report["added"] == 3 and report["removed"] == 1
+    inserts = [params for sql, params in events if sql.startswith("INSERT INTO document_chunks")]
+    assert [(p[2], p[3]) for p in inserts] == [(1, "Piscina aquecida"), (2, "Estacionamento grátis"), (3, "Pet friendly")]
+
+
+def test_store_chunks_embeds_each_new_hash_once(monkeypatch):
+    from execution.document_ingest import chunk_content_hash
+    tables = {"reusable": [{"content_hash": chunk_content_hash("Café das 7h às 10h", MODEL), "embedding": "[0.5,0.5]"}]}
+    document_ingest, events, embedded = _ingest(monkeypatch, tables)
+
+    report = document_ingest.store_chunks("t1", "doc-1", ["Piscina aquecida", "Café das 7h às 10h", "Piscina  aquecida"])
+
+    # Texto repetido (mesmo hash após normalizar espaços) gera um embedding só; o do tenant é reaproveitado
+    assert embedded == ["Piscina aquecida"]
+    assert report["chunks"] == 3 and report["embedded"] == 1 and report["reused"] == 2
+    inserts = [params for sql, params in events if sql.startswith("INSERT INTO document_chunks")]
+    assert [p[4] for p in inserts] == ["[0.1,0.2]", "[0.5,0.5]", "[0.1,0.2]"]
+    assert inserts[0][5] == inserts[2][5]
+
+
+class _FailingDDL(_Conn):
+    """Conexão em que o ALTER TABLE falha (ex.: usuário sem permissão de DDL)."""
+
+    def execute(self, sql, params=None):
+        if sql.startswith("ALTER TABLE"):
+            raise RuntimeError("permission denied")
+        super().execute(sql, params)
+
+
+def test_schema_check_does_not_touch_callers_transaction(monkeypatch):
+    document_ingest, events, embedded = _ingest(monkeypatch, {})
+    ddl_events: list = []
+    monkeypatch.setattr(document_ingest, "_get_connection", lambda: _FailingDDL(ddl_events, {}))
+    monkeypatch.setattr(document_ingest, "_chunk_schema_checked", False)
+    caller = _Conn(events, {})
+
+    document_ingest.store_chunks("t1", "doc-1", ["Piscina aquecida"], conn=caller)
+
+    assert ("ROLLBACK", None) in ddl_events
+    # Transação de quem chamou intacta: sem rollback nem commit, com o chunk inserido
+    assert not any(sql in ("ROLLBACK", "COMMIT") for sql, _ in events)
+    assert any(sql.startswith("INSERT INTO document_chunks") for sql, _ in events)
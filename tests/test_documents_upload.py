@@ -0,0 +1,127 @@
+"""
+Cenário de teste: upload de documento (POST /documents/upload) com banco simulado. O mesmo arquivo
+enviado duas vezes volta como o documento já existente (sem novo processamento); a coluna
+file_sha256 é garantida uma vez por processo, não a cada upload; o duplicado mais recente é
+escolhido por created_at; o mesmo arquivo para outro namespace (outro agente) vira documento novo. Num lote de imagens que estoura o limite de armazenamento no meio, as
+imagens já gravadas são apagadas (documento e arquivo) em vez de ficarem 'pending' sem job.
+"""
+
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+# Raiz do projeto
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+TENANT = "11111111-1111-1111-1111-111111111111"
+
+
+class _Cursor:
+    """Cursor simulado sobre uma lista de documentos."""
+
+    def __init__(self, executed: list, documents: list):
+        self.executed = executed
+        self.documents = documents
+        self._result = None
+
+    def execute(self, sql, params=None):
+        sql = " ".join(sql.split())
+        self.executed.append(sql)
+        if sql.startswith("SELECT * FROM documents WHERE tenant_id = %s AND embedding_namespace = %s AND file_sha256 = %s"):
+            tenant_id, namespace, sha256 = params
+            matches = [d for d in self.documents if d["tenant_id"] == tenant_id
+                       and d["embedding_namespace"] == namespace and d["file_sha256"] == sha256]
+            self._result = matches[-1] if matches else None
+        elif sql.startswith("INSERT INTO documents"):
+            tenant_id, file_path, namespace, file_name, size_mb, file_type, sha256 = params
+            row = {"id": f"doc-{len(self.documents) + 1}", "tenant_id": tenant_id, "file_path": file_path,
+                   "embedding_namespace": namespace, "file_name": file_name, "file_type": file_type,
+                   "file_size_mb": size_mb, "status": "pending", "file_sha256": sha256}
+            self.documents.append(row)
+            self._result = row
+        elif sql.startswith("DELETE FROM documents WHERE tenant_id = %s AND id = ANY(%s::uuid[])"):
+            tenant_id, ids = params
+            self.documents[:] = [d for d in self.documents if not (d["tenant_id"] == tenant_id and d["id"] in ids)]
+
+    def fetchone(self):
+        return self._result
+
+
+def test_duplicate_upload_returns_existing_document(monkeypatch, tmp_path):
+    import asyncio
+    import io
+    from fastapi import BackgroundTasks, UploadFile
+    from platform_backend.config import get_settings
+    from platform_backend.routers import documents
+
+    executed: list = []
+    stored: list = []
+    scheduled: list = []
+
+    @contextmanager
+    def fake_cursor():
+        yield _Cursor(executed, stored)
+
+    monkeypatch.setenv("PLATFORM_UPLOAD_DIR", str(tmp_path))
+    get_settings.cache_clear()
+    monkeypatch.setattr(documents, "get_cursor", fake_cursor)
+    monkeypatch.setattr(documents, "_sha_column_checked", False)
+    monkeypatch.setattr(documents, "_storage_remaining_bytes", lambda tenant_id: None)
+    monkeypatch.setattr(documents, "_schedule_job", lambda tasks, kind, doc_id, tenant_id, **payload: scheduled.append(doc_id))
+
+    def upload(namespace=None):
+        file = UploadFile(io.BytesIO(b"quarto;diaria\nsuite;500\n"), filename="tarifas.csv")
+        return asyncio.run(documents._upload_document_impl(
+            file, namespace, {"tenant_id": TENANT}, lambda *args: None, BackgroundTasks(),
+        ))
+
+    try:
+        first, second = upload(), upload()
+        other_agent = upload("agent_tours")
+    finally:
+        get_settings.cache_clear()
+
+    assert second.id == first.id
+    assert other_agent.id != first.id and other_agent.embedding_namespace == "agent_tours"
+    assert scheduled == [first.id, other_agent.id]
+    # Cópia duplicada apagada do disco
+    assert len(list(tmp_path.iterdir())) == 2
+    assert sum("ALTER TABLE documents ADD COLUMN file_sha256" in sql for sql in executed) == 1
+    assert all("ORDER BY created_at DESC" in sql for sql in executed if "file_sha256 = %s" in sql)
+
+
+def test_image_batch_failing_midway_leaves_nothing_pending(monkeypatch, tmp_path):
+    import asyncio
+    import io
+    import pytest
+    from fastapi import BackgroundTasks, HTTPException, UploadFile
+    from platform_backend.config import get_settings
+    from platform_backend.routers import documents
+
+    stored: list = []
+    scheduled: list = []
+
+    @contextmanager
+    def fake_cursor():
+        yield _Cursor([], stored)
+
+    monkeypatch.setenv("PLATFORM_UPLOAD_DIR", str(tmp_path))
+    get_settings.cache_clear()
+    monkeypatch.setattr(documents, "get_cursor", fake_cursor)
+    monkeypatch.setattr(documents, "_sha_column_checked", True)
+    # Cabe a primeira imagem, a segunda estoura o limite (413)
+    monkeypatch.setattr(documents, "_storage_remaining_bytes", lambda tenant_id: 12)
+    monkeypatch.setattr(documents, "_schedule_job", lambda *a, **k: scheduled.append(a))
+
+    files = [UploadFile(io.BytesIO(b"png-1"), filename="a.png"), UploadFile(io.BytesIO(b"png-2-grande"), filename="b.png")]
+    try:
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(documents.upload_images(BackgroundTasks(), None, files, None, {"tenant_id": TENANT}))
+    finally:
+        get_settings.cache_clear()
+
+    assert exc.value.status_code == 413
+    assert stored == [] and scheduled == []
+    assert list(tmp_path.iterdir()) == []
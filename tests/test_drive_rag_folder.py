@@ -0,0 +1,43 @@
+"""
+Cenário de teste: dois tenants com pastas do Drive diferentes buscando ao mesmo tempo (threads, como
+no pool do run_db), com drive_rag simulado. Cada busca recebe a pasta do próprio tenant como
+argumento e DRIVE_FOLDER_ID do processo não é alterado.
+"""
+
+import sys
+import threading
+import time
+import types
+from pathlib import Path
+
+# Raiz do projeto
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def test_concurrent_folder_searches_do_not_share_state(monkeypatch):
+    from execution import agent_facade
+    env_seen: list = []
+
+    def search(query, state=None, folder_id=None):
+        env_seen.append(agent_facade.os.environ.get("DRIVE_FOLDER_ID"))
+        time.sleep(0.05)  # as duas buscas se sobrepõem
+        return f"CONTEXTO da pasta {folder_id}"
+
+    monkeypatch.setitem(sys.modules, "execution.drive_rag", types.SimpleNamespace(search=search))
+    monkeypatch.setenv("DRIVE_FOLDER_ID", "pasta-padrao")
+    results: dict = {}
+
+    def turn(folder_id):
+        results[folder_id] = agent_facade._rag_for_folder(folder_id, "preço da diária", "descoberta", {})
+
+    threads = [threading.Thread(target=turn, args=(f,)) for f in ("pasta-hotel", "pasta-passeios")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == {"pasta-hotel": "CONTEXTO da pasta pasta-hotel", "pasta-passeios": "CONTEXTO da pasta pasta-passeios"}
+    assert env_seen == ["pasta-padrao", "pasta-padrao"]
+    assert agent_facade.os.environ["DRIVE_FOLDER_ID"] == "pasta-padrao"
@@ -0,0 +1,97 @@
+"""
+Cenário de teste: servidor local compatível com a API de embeddings da OpenAI.
+A primeira requisição recebe 429; o serviço deve refazer a chamada, manter a ordem das entradas
+e reportar a vazão.
+"""
+
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Raiz do projeto
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+class _StubEmbeddingHandler(BaseHTTPRequestHandler):
+    calls = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        length = int(self.headers.get("content-length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        with self.lock:
+            type(self).calls += 1
+            first = type(self).calls == 1
+        if first:
+            self._send(429, {"error": {"message": "rate limited", "type": "rate_limit"}})
+            return
+        inputs = body.get("input") or []
+        data = [
+            {"object": "embedding", "index": i, "embedding": [float(len(text)), float(i)]}
+            for i, text in enumerate(inputs)
+        ]
+        self._send(200, {
+            "object": "list",
+            "data": list(reversed(data)),  # fora de ordem de propósito
+            "model": body.get("model"),
+            "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)},
+        })
+
+    def _send(self, status: int, payload: dict):
+        raw = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_split_batches_respects_token_limit():
+    """Lotes não passam do limite de tokens e preservam a ordem."""
+    from execution.embedding_service import split_batches
+    texts = ["a" * 400] * 10  # ~100 tokens cada
+    batches = split_batches(texts, max_tokens=250)
+    assert [i for b in batches for i in b] == list(range(10))
+    assert all(len(b) <= 2 for b in batches)
+    assert split_batches(["x" * 4000], max_tokens=10) == [[0]]
+
+
+def test_embed_texts_retries_and_keeps_order():
+    """429 na primeira chamada -> retry; embeddings voltam na ordem das entradas."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubEmbeddingHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    env = {
+        "OPENAI_API_KEY": "test",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{server.server_address[1]}/v1",
+        "EMBEDDING_RETRY_BASE_SECONDS": "0.01",
+        "EMBEDDING_BATCH_MAX_TOKENS": "30",
+        "EMBEDDING_CONCURRENCY": "3",
+    }
+    old = {k: os.environ.get(k) for k in env}
+    os.environ.update(env)
+    try:
+        from execution.embedding_service import embed_texts
+        texts = [f"chunk número {i} " * (i + 1) for i in range(12)]
+        stats: dict = {}
+        vectors = embed_texts(texts, tenant_id="tenant-test", stats=stats)
+        assert [v[0] for v in vectors] == [float(len(t)) for t in texts]
+        assert stats["chunks"] == 12
+        assert stats["batches"] > 1
+        assert stats["retries"] >= 1
+        assert stats["chunks_per_second"] > 0
+    finally:
+        server.shutdown()
+        for k, v in old.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
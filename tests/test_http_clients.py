@@ -0,0 +1,46 @@
+"""
+Cenário de teste: servidor local com keep-alive (HTTP/1.1). Chamadas seguidas pelo cliente
+compartilhado devem reaproveitar a mesma conexão TCP, e o cliente OpenAI é o mesmo objeto
+para a mesma base URL e chave.
+"""
+
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Raiz do projeto
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    ports: set = set()
+
+    def do_GET(self):
+        type(self).ports.add(self.client_address[1])
+        self.send_response(200)
+        self.send_header("content-length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+def test_shared_client_reuses_connection():
+    from execution.http_clients import http_client, openai_client
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        for _ in range(5):
+            assert http_client(base).get(f"{base}/ping").text == "ok"
+        assert len(_KeepAliveHandler.ports) == 1
+        assert http_client(base) is http_client(base + "/")
+        assert openai_client("sk-test", base_url=base) is openai_client("sk-test", base_url=base)
+        assert openai_client("sk-test", base_url=base)._client is http_client(base)
+    finally:
+        server.shutdown()
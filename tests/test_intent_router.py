@@ -0,0 +1,63 @@
+"""
+Cenário de teste: equipe com dois agentes (hospedagem e passeios) e embeddings determinísticos
+por palavra-chave. Mensagem claramente do agente atual fica nele e a do outro nicho muda de agente,
+ambas sem chamar o supervisor LLM; só a ambígua escala. As descrições são embedadas uma vez.
+"""
+
+import sys
+from collections import OrderedDict
+from pathlib import Path
+
+# Raiz do projeto
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+TENANT = "tenant-1"
+AXES = ("quarto", "passeio")
+
+
+def _vector(text: str) -> list[float]:
+    text = text.lower()
+    return [float(text.count(word)) + 0.1 for word in AXES]
+
+
+def _agent(agent_id: str, niche: str) -> dict:
+    return {"id": agent_id, "name": agent_id, "niche": niche, "prompt_custom": "",
+            "settings": {}, "team_id": "team-1", "active": True}
+
+
+def test_local_routing_skips_supervisor_llm(monkeypatch):
+    from execution import intent_router, knowledge_rag, supervisor, tenant_config
+    embedded = []
+
+    def fake_embed(texts, tenant_id=None, stats=None, max_retries=None):
+        embedded.extend(texts)
+        return [_vector(t) for t in texts]
+
+    roster = {"hotel": _agent("hotel", "quarto e diárias"), "tours": _agent("tours", "passeio de barco")}
+    monkeypatch.setattr(tenant_config, "_load_roster", lambda tenant_id: roster)
+    monkeypatch.setattr(tenant_config.db, "_use_postgres", lambda: True)
+    monkeypatch.setattr(tenant_config, "_rosters", {})
+    monkeypatch.setattr(knowledge_rag, "_embed", fake_embed)
+    monkeypatch.setattr(knowledge_rag, "_query_embeddings", OrderedDict())
+    monkeypatch.setattr(intent_router, "_vectors", {})
+    monkeypatch.setattr(intent_router, "_stats", {"stay": 0, "switch": 0, "escalated": 0})
+    monkeypatch.delenv("OPENROUTER_API_KEY", raising=False)
+
+    out = supervisor.route_conversation(TENANT, "O quarto tem varanda?", [], current_agent_id="hotel")
+    assert out["target_agent_id"] == "hotel" and "embedding" in out["reason"]
+    out = supervisor.route_conversation(TENANT, "Quero um passeio amanhã", [], current_agent_id="hotel")
+    assert out["target_agent_id"] == "tours" and out["margin"] > 0
+    # Ambígua: segue para o LLM (aqui sem chave, volta ao atual)
+    out = supervisor.route_conversation(TENANT, "Quarto com passeio incluso?", [], current_agent_id="hotel")
+    assert out["reason"] == "Missing OpenRouter API Key"
+
+    # Descrições embedadas uma vez (2 agentes) + 3 mensagens
+    assert len(embedded) == 5
+    stats = intent_router.stats()
+    assert stats["llm_avoided"] == 2 and stats["escalated"] == 1
+
+    monkeypatch.setenv("INTENT_ROUTER", "0")
+    out = supervisor.route_conversation(TENANT, "O quarto tem varanda?", [], current_agent_id="hotel")
+    assert out["reason"] == "Missing OpenRouter API Key"
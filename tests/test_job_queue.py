@@ -0,0 +1,212 @@
+"""
+Cenário de teste: fila de documentos com Postgres simulado (conexão que registra os comandos e
+devolve respostas prontas). claim_job reserva e normaliza o job; fail_job reagenda com o documento
+de volta a 'pending' ou marca como failed; requeue_stale_jobs devolve jobs sem heartbeat e o
+documento; keep_alive renova o heartbeat durante o job; o arquivo enviado viaja no banco como large
+object, gravado e lido em blocos, e o worker o recria no próprio disco (com uploads compartilhados, só
+o caminho vai no job); um lote de imagens fica ligado a todos os seus documentos.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+# Raiz do projeto
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+class _LObject:
+    """Large object simulado: registra o tamanho de cada write/read."""
+
+    def __init__(self, store: dict, oid: int, io: list):
+        self.store = store
+        self.oid = oid
+        self.io = io
+        self._pos = 0
+
+    def write(self, data: bytes) -> int:
+        self.io.append(("write", len(data)))
+        self.store[self.oid] += data
+        return len(data)
+
+    def read(self, size: int) -> bytes:
+        data = bytes(self.store[self.oid][self._pos:self._pos + size])
+        self._pos += len(data)
+        self.io.append(("read", len(data)))
+        return data
+
+    def close(self):
+        pass
+
+
+class _Conn:
+    """Conexão simulada: execute registra (sql, params); fetchone/fetchall devolvem as respostas em ordem."""
+
+    def __init__(self, executed: list, responses: list, lobs: dict = None, io: list = None):
+        self.executed = executed
+        self.responses = responses
+        self.lobs = lobs if lobs is not None else {}
+        self.io = io if io is not None else []
+        self.rowcount = 1
+
+    def lobject(self, oid=0, mode="rb"):
+        if not oid:
+            oid = len(self.lobs) + 1
+            self.lobs[oid] = bytearray()
+        return _LObject(self.lobs, oid, self.io)
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, sql, params=None):
+        self.executed.append((" ".join(sql.split()), params))
+
+    def fetchone(self):
+        return self.responses.pop(0)
+
+    def fetchall(self):
+        return self.responses.pop(0)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _queue(monkeypatch, responses=None, lobs=None, io=None):
+    from execution import job_queue
+    executed: list = []
+    responses = responses if responses is not None else []
+    lobs = lobs if lobs is not None else {}
+    monkeypatch.setattr(job_queue, "_get_connection", lambda: _Conn(executed, responses, lobs, io))
+    monkeypatch.setattr(job_queue, "_schema_checked", True)
+    return job_queue, executed
+
+
+def test_claim_job(monkeypatch):
+    job_queue, executed = _queue(monkeypatch, [
+        {"id": "job-1"},
+        {"id": "job-1", "tenant_id": "t1", "document_id": "doc-1", "kind": "process",
+         "payload": '{"file_path": "/up/a.pdf"}', "attempts": 1, "max_attempts": 3},
+        None,
+    ])
+    job = job_queue.claim_job("worker-a")
+    assert job == {"id": "job-1", "tenant_id": "t1", "document_id": "doc-1", "kind": "process",
+                   "payload": {"file_path": "/up/a.pdf"}, "attempts": 1, "max_attempts": 3}
+    assert "FOR UPDATE OF j SKIP LOCKED" in executed[0][0]
+    assert "locked_by = %s" in executed[1][0] and executed[1][1] == ("worker-a", "job-1")
+
+    # Fila vazia
+    assert job_queue.claim_job("worker-a") is None
+
+
+def test_fail_job_retries_then_fails(monkeypatch):
+    job_queue, executed = _queue(monkeypatch)
+    monkeypatch.setenv("DOCUMENT_JOB_RETRY_BASE_SECONDS", "30")
+
+    assert job_queue.fail_job("job-1", 1, 3, "ValueError: boom") is True
+    retry, document = executed
+    assert "SET status = 'pending'" in retry[0] and 24 <= retry[1][0] <= 36
+    assert document[0].startswith("UPDATE documents SET status = 'pending'") and document[1] == ("job-1",)
+
+    executed.clear()
+    assert job_queue.fail_job("job-1", 3, 3, "ValueError: boom") is False
+    assert "SET status = 'failed'" in executed[0][0]
+    assert executed[1] == ("SELECT lo_unlink(content_oid) FROM document_job_files WHERE job_id = %s", ("job-1",))
+    assert executed[2] == ("DELETE FROM document_job_files WHERE job_id = %s", ("job-1",))
+    assert not any("UPDATE documents" in sql for sql, _ in executed)
+
+
+def test_requeue_stale_jobs_resets_documents(monkeypatch):
+    job_queue, executed = _queue(monkeypatch, [{"count": 2}])
+    monkeypatch.setenv("DOCUMENT_JOB_STALE_SECONDS", "900")
+    assert job_queue.requeue_stale_jobs() == 2
+    [(sql, params)] = executed
+    assert params == (900,)
+    assert "UPDATE documents d SET status = CASE WHEN r.status = 'failed' THEN 'failed' ELSE 'pending' END" in sql
+    assert "d.status = 'processing'" in sql
+    assert "d.id = ANY(r.document_ids)" in sql
+    assert "COUNT(lo_unlink(content_oid)) FROM files_dropped" in sql
+
+
+def test_keep_alive_heartbeats_while_running(monkeypatch):
+    job_queue, executed = _queue(monkeypatch)
+    with job_queue.keep_alive("job-1", "worker-a", interval=0.05):
+        time.sleep(0.28)
+    beats = [params for sql, params in executed if "SET locked_at = NOW()" in sql]
+    assert len(beats) >= 3 and set(beats) == {("job-1", "worker-a")}
+    count = len(executed)
+    time.sleep(0.1)
+    assert len(executed) == count  # parou junto com o job
+
+
+def test_uploaded_file_travels_with_job(monkeypatch, tmp_path):
+    from execution import job_queue as jq
+    monkeypatch.setattr(jq, "JOB_FILE_CHUNK_BYTES", 4)
+    monkeypatch.delenv("DOCUMENT_JOB_SHARED_UPLOADS", raising=False)
+    api_file = tmp_path / "api" / "a.csv"
+    api_file.parent.mkdir()
+    api_file.write_bytes(b"quarto;diaria\nsuite;500\n")
+    lobs: dict = {}
+    io: list = []
+    job_queue, executed = _queue(monkeypatch, [{"id": "job-1"}], lobs, io)
+    job_queue.enqueue_job("t1", "doc-1", "process", {"file_path": str(api_file)})
+    [(sql, (job_id, path, oid))] = [e for e in executed if "document_job_files" in e[0]]
+    assert job_id == "job-1" and path == str(api_file) and bytes(lobs[oid]) == api_file.read_bytes()
+    # Gravado em blocos, nunca o arquivo inteiro de uma vez
+    assert io and max(n for _, n in io) <= 4
+
+    # No worker o arquivo não existe: é recriado a partir do large object, também em blocos
+    io.clear()
+    worker_file = tmp_path / "worker" / "uploads" / "a.csv"
+    job_queue, _ = _queue(monkeypatch, [[{"file_path": str(worker_file), "content_oid": oid}]], lobs, io)
+    assert job_queue.restore_job_files("job-1") == 1
+    assert worker_file.read_bytes() == api_file.read_bytes()
+    assert [op for op, _ in io] == ["read"] * len(io) and max(n for _, n in io) <= 4
+
+
+def test_shared_uploads_keep_only_the_path(monkeypatch, tmp_path):
+    monkeypatch.setenv("DOCUMENT_JOB_SHARED_UPLOADS", "1")
+    api_file = tmp_path / "a.csv"
+    api_file.write_bytes(b"quarto;diaria\n")
+    lobs: dict = {}
+    job_queue, executed = _queue(monkeypatch, [{"id": "job-1"}], lobs)
+    job_queue.enqueue_job("t1", "doc-1", "process", {"file_path": str(api_file)})
+    assert not lobs and not any("document_job_files" in sql for sql, _ in executed)
+    assert '"file_path"' in executed[0][1][4]
+
+
+def test_image_batch_job_covers_every_document(monkeypatch, tmp_path):
+    images = []
+    for name in ("a.png", "b.png"):
+        path = tmp_path / name
+        path.write_bytes(b"png")
+        images.append({"doc_id": f"doc-{name[0]}", "file_path": str(path), "file_name": name, "file_type": "png"})
+    job_queue, executed = _queue(monkeypatch, [{"id": "job-1"}])
+    job_queue.enqueue_job("t1", "doc-a", "images", {"documents": images})
+    insert_sql, params = executed[0]
+    assert "document_ids" in insert_sql and params[2] == ["doc-a", "doc-b"]
+    assert len([e for e in executed if "document_job_files" in e[0]]) == 2
+
+    # Retry devolve a 'pending' todos os documentos do job, não só o primeiro
+    executed.clear()
+    job_queue.fail_job("job-1", 1, 3, "ValueError: boom")
+    assert "SELECT unnest(document_ids) FROM document_jobs WHERE id = %s" in executed[1][0]
+
+    # Status de qualquer imagem do lote encontra o job
+    job_queue, executed = _queue(monkeypatch, [{
+        "id": "job-1", "kind": "images", "status": "running", "attempts": 1, "max_attempts": 3, "progress": 0.5,
+        "progress_message": "1/2 imagens gravadas", "last_error": None, "result": None, "run_at": None, "updated_at": None,
+    }])
+    job = job_queue.get_latest_job("doc-b")
+    assert job["id"] == "job-1" and job["kind"] == "images"
+    assert "document_ids @> ARRAY[%s]::uuid[]" in executed[0][0] and executed[0][1] == ("doc-b",)
@@ -0,0 +1,59 @@
+"""
+Cenário de teste: o JSON da resposta chega em pedaços de 1 a 7 caracteres, cortando escapes
+(\\n, \\", \\u00e7) no meio. O texto parcial de resposta_texto só cresce e termina igual ao
+campo do JSON completo; as edições no Telegram são limitadas pelo intervalo mínimo.
+"""
+
+import asyncio
+import json
+import sys
+from pathlib import Path
+
+# Raiz do projeto
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def test_partial_text_survives_split_escapes():
+    from execution.json_stream import StreamingFieldExtractor
+    reply = {
+        "resposta_texto": 'Olá! A diária é "R$ 350"\nCafé incluso \U0001F600 e recepção 24h.',
+        "enviar_audio": False,
+        "proximo_estado": "oferta",
+    }
+    raw = "```json\n" + json.dumps(reply) + "\n```"
+    extractor = StreamingFieldExtractor("resposta_texto")
+    partials = []
+    i, size = 0, 1
+    while i < len(raw):
+        out = extractor.feed(raw[i:i + size])
+        if out:
+            partials.append(out)
+        i += size
+        size = size % 7 + 1
+    assert extractor.done
+    assert partials[-1] == reply["resposta_texto"]
+    assert all(b.startswith(a) for a, b in zip(partials, partials[1:]))
+
+
+def test_editor_throttles_edits(monkeypatch):
+    monkeypatch.setenv("TELEGRAM_STREAM_EDIT_SECONDS", "60")
+    from execution.stream_delivery import ThrottledEditor
+    calls = []
+
+    async def send(text):
+        calls.append(("send", text))
+        return 42
+
+    def edit(message_id, text):  # síncrono, como o httpx do webhook
+        calls.append(("edit", message_id, text))
+
+    async def scenario():
+        editor = ThrottledEditor(send, edit)
+        for n in range(1, 200, 10):
+            await editor.update("x" * n)
+        return await editor.finish("x" * 250)
+
+    assert asyncio.run(scenario()) is True
+    assert calls == [("send", "x"), ("edit", 42, "x" * 250)]
@@ -0,0 +1,118 @@
+"""
+Cenário de teste: servidor local compatível com chat/completions em que cada modelo tem um atraso
+(test/slow 2s, test/fast 50ms) e test/broken responde 400. O hedge responde pelo modelo rápido sem
+esperar o lento, erro passa para o próximo modelo, o ranking aprende o mais rápido e, com todos
+lentos, o prazo devolve a resposta de contingência.
+"""
+
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Raiz do projeto
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+DELAYS = {"test/slow": 2.0, "test/fast": 0.05}
+
+
+class _DelayedChatHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("content-length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        model = body.get("model")
+        if model == "test/broken":
+            raw, status = json.dumps({"error": {"message": "modelo indisponível"}}).encode(), 400
+        else:
+            time.sleep(DELAYS.get(model, 0))
+            reply = {"resposta_texto": f"Resposta de {model}", "enviar_audio": False, "proximo_estado": "descoberta"}
+            raw, status = json.dumps({
+                "id": "chatcmpl-test",
+                "object": "chat.completion",
+                "created": 0,
+                "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": json.dumps(reply)}}],
+                "usage": {"prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110},
+            }).encode(), 200
+        try:
+            self.send_response(status)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+        except OSError:
+            pass  # cliente cancelou (perdeu o hedge)
+
+    def log_message(self, *args):
+        pass
+
+
+def _turn(monkeypatch, models: str) -> tuple[dict, float]:
+    from execution import llm_orchestrator
+    from execution.async_runtime import run_sync
+    first, *rest = models.split(",")
+    monkeypatch.setenv("OPENROUTER_MODEL", first)
+    monkeypatch.setenv("OPENROUTER_FALLBACK_MODELS", ",".join(rest))
+    started = time.monotonic()
+    out = run_sync(llm_orchestrator.run_async("lead-1", "Oi", "descoberta", "CONTEXTO: vazio", []))
+    return out, time.monotonic() - started
+
+
+def test_hedge_failover_ranking_and_deadline(monkeypatch):
+    from execution import llm_orchestrator, model_router
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _DelayedChatHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(llm_orchestrator, "OPENROUTER_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/v1")
+    monkeypatch.setattr(model_router, "_samples", {})
+    monkeypatch.setenv("OPENROUTER_API_KEY", "sk-test")
+    monkeypatch.setenv("ROUTER_HEDGE_MS", "200")
+    monkeypatch.setenv("ROUTER_MIN_SAMPLES", "1")
+    try:
+        # Hedge: o lento não respondeu em 200ms, o rápido responde
+        out, elapsed = _turn(monkeypatch, "test/slow,test/fast")
+        assert out["resposta_texto"] == "Resposta de test/fast" and elapsed < 1.5
+
+        # Failover: erro no primeiro modelo vai direto para o próximo
+        out, _ = _turn(monkeypatch, "test/broken,test/fast")
+        assert out["resposta_texto"] == "Resposta de test/fast"
+        assert model_router.stats("test/broken")["error_rate"] == 1.0
+
+        # Ranking: com histórico, o rápido vai primeiro (sem hedge, sem esperar o lento)
+        assert model_router.rank(["test/slow", "test/broken", "test/fast"]) == ["test/fast", "test/slow", "test/broken"]
+        monkeypatch.setenv("ROUTER_HEDGE_MS", "0")
+        out, elapsed = _turn(monkeypatch, "test/slow,test/fast")
+        assert out["resposta_texto"] == "Resposta de test/fast" and elapsed < 1.0
+
+        # Prazo: todos lentos -> resposta de contingência no prazo
+        monkeypatch.setenv("ROUTER_DEADLINE_SECONDS", "0.5")
+        out, elapsed = _turn(monkeypatch, "test/slow")
+        assert out.get("fallback") and out["resposta_texto"] == llm_orchestrator.FALLBACK_REPLY
+        assert elapsed < 1.5
+    finally:
+        server.shutdown()
+
+
+def test_cancelled_calls_count_as_failures(monkeypatch):
+    import asyncio
+    import pytest
+    from execution import model_router
+    from execution.async_runtime import run_sync
+    monkeypatch.setattr(model_router, "_samples", {})
+    monkeypatch.setenv("ROUTER_HEDGE_MS", "0")
+
+    async def hang(model):
+        await asyncio.sleep(5)
+
+    with pytest.raises(model_router.RouterDeadlineExceeded):
+        run_sync(model_router.complete(hang, ["test/hang"], deadline=0.3))
+    [(latency_ms, ok)] = model_router._samples[("completion", "test/hang")]
+    # Cancelado no prazo: falha, com o prazo inteiro como latência
+    assert not ok and 290 <= latency_ms <= 310
+    assert model_router.stats("test/hang")["p95_ms"] is None
@@ -0,0 +1,112 @@
+"""
+Cenário de teste: tenant no plano free (500 mensagens/mês) com 498 mensagens no log, sem Redis
+(contador em memória). O limite é checado pelo contador sem novo COUNT(*) a cada turno e o plano
+é lido uma vez; invalidar o plano ou vencer a reconciliação volta ao banco. O COUNT usa os limites
+UTC do mês da chave; com Redis, o incremento é um script atômico e o plano fica em cache
+compartilhado, apagado por invalidate_plan.
+"""
+
+import sys
+from pathlib import Path
+
+# Raiz do projeto
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+TENANT = "tenant-1"
+
+
+def test_counter_based_message_limit(monkeypatch):
+    from execution import plan_limit_checker as plc
+    plans, counts, saved = ["free"], [], []
+
+    def count(tenant_id, month):
+        counts.append((tenant_id, month))
+        return 498
+
+    monkeypatch.setattr(plc, "_load_tenant_plan", lambda tenant_id: plans.pop(0))
+    monkeypatch.setattr(plc, "_count_month_messages", count)
+    monkeypatch.setattr(plc, "_save_reconciled", lambda tenant_id, month, n: saved.append(n))
+    for name in ("_plans", "_counters", "_reconciled"):
+        monkeypatch.setattr(plc, name, {})
+    monkeypatch.delenv("REDIS_URL", raising=False)
+
+    assert plc.check_message_limit(TENANT)
+    plc.record_messages(TENANT)  # mensagem do cliente
+    assert plc.check_message_limit(TENANT)
+    plc.record_messages(TENANT)  # resposta
+    assert not plc.check_message_limit(TENANT)
+    assert plc.message_quota(TENANT)["messages_remaining"] == 0
+    assert len(counts) == 1 and saved == [498]
+
+    # Upgrade: plano relido após invalidar
+    plans.append("enterprise")
+    plc.invalidate_plan(TENANT)
+    assert plc.check_message_limit(TENANT)
+    assert plc.message_quota(TENANT)["messages_limit"] is None
+
+    # Reconciliação vencida recalcula pelo log
+    monkeypatch.setenv("QUOTA_RECONCILE_SECONDS", "0")
+    assert plc.message_count(TENANT) == 498
+    assert len(counts) == 2 and saved == [498, 498]
+
+
+def test_month_bounds_are_utc():
+    from datetime import datetime, timezone
+    from execution import plan_limit_checker as plc
+    assert plc._month_bounds("2026-12") == (
+        datetime(2026, 12, 1, tzinfo=timezone.utc), datetime(2027, 1, 1, tzinfo=timezone.utc),
+    )
+
+
+class _Redis:
+    """Redis simulado: get/set/delete e scripts registrados (o script de incremento condicional)."""
+
+    def __init__(self):
+        self.data = {}
+        self.scripts = []
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+    def register_script(self, source):
+        self.scripts.append(source)
+
+        def run(keys, args):
+            # Mesma semântica do Lua: soma só se a chave existe, num único comando
+            if keys[0] in self.data:
+                self.data[keys[0]] = int(self.data[keys[0]]) + int(args[0])
+                return self.data[keys[0]]
+            return None
+
+        return run
+
+
+def test_redis_counter_and_shared_plan(monkeypatch):
+    from execution import plan_limit_checker as plc
+    client, plans = _Redis(), ["free", "pro"]
+    monkeypatch.setattr(plc, "_redis_client", lambda: client)
+    monkeypatch.setattr(plc, "_incr_script", None)
+    monkeypatch.setattr(plc, "_load_tenant_plan", lambda tenant_id: plans.pop(0))
+    monkeypatch.setattr(plc, "_plans", {})
+    key = plc._quota_key(TENANT, plc._current_month())
+
+    plc.record_messages(TENANT)  # chave ausente: fica para a reconciliação
+    assert key not in client.data
+    client.data[key] = "10"
+    plc.record_messages(TENANT, 2)
+    assert client.data[key] == 12
+    assert len(client.scripts) == 1 and "INCRBY" in client.scripts[0]
+
+    # Plano no Redis: relido só depois de invalidate_plan (vale para todos os processos)
+    assert plc._get_tenant_plan(TENANT) == "free"
+    assert plc._get_tenant_plan(TENANT) == "free"
+    plc.invalidate_plan(TENANT)
+    assert plc._get_tenant_plan(TENANT) == "pro"
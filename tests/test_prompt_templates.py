@@ -0,0 +1,75 @@
+"""
+Cenário de teste: diretivas em diretório temporário. O template é renderizado uma vez por chave
+e reaproveitado; quando um arquivo muda (mtime), o próximo uso renderiza de novo. Um render que
+termina depois de uma invalidação não volta ao cache.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+# Raiz do projeto
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def test_template_cached_until_directive_changes(tmp_path, monkeypatch):
+    from execution.prompt_templates import PromptTemplateCache
+    monkeypatch.setenv("PROMPT_TEMPLATE_CHECK_SECONDS", "0")
+    (tmp_path / "a.md").write_text("regra A", encoding="utf-8")
+    cache = PromptTemplateCache(tmp_path)
+    calls = []
+
+    def render(files):
+        calls.append(files)
+        return " | ".join(files[name] for name in sorted(files))
+
+    first = cache.get(("default", "descoberta"), ["a.md", "b.md"], render)
+    again = cache.get(("default", "descoberta"), ["a.md", "b.md"], render)
+    assert first.text == "regra A" and first.tokens > 0
+    assert again is first and len(calls) == 1
+
+    (tmp_path / "a.md").write_text("regra A revisada", encoding="utf-8")
+    os.utime(tmp_path / "a.md", (1, 1))
+    (tmp_path / "b.md").write_text("regra B", encoding="utf-8")
+    updated = cache.get(("default", "descoberta"), ["a.md", "b.md"], render)
+    assert updated.text == "regra A revisada | regra B"
+    assert cache.stats()["renders"] == 2
+
+
+def test_static_prefix_is_identical_across_states_and_agents():
+    """O prefixo estático não muda com estado, agente ou memória; só a parte dinâmica muda."""
+    from execution.llm_orchestrator import build_system_parts
+    a_static, a_dynamic = build_system_parts("descoberta", agent_name="Ana", agent_niche="pousada")
+    b_static, b_dynamic = build_system_parts("oferta", agent_name="Bia", agent_niche="hotel", shared_memory="Lead já pediu preço.")
+    assert a_static.text == b_static.text and a_static.tokens > 0
+    assert a_dynamic != b_dynamic
+    assert b_dynamic.index("Bia") < b_dynamic.index("oferta") < b_dynamic.index("Lead já pediu preço.")
+
+
+def test_usage_records_cached_tokens():
+    """cached_tokens vem de usage.prompt_tokens_details (OpenAI/OpenRouter)."""
+    from execution.llm_usage import llm_usage_stats, record_llm_usage
+    response = {"usage": {"prompt_tokens": 2000, "completion_tokens": 50, "total_tokens": 2050,
+                          "prompt_tokens_details": {"cached_tokens": 1792}}}
+    usage = record_llm_usage(response, "test/model-cache", 420.0)
+    assert usage["cached_tokens"] == 1792 and usage["total_tokens"] == 2050
+    assert llm_usage_stats()["test/model-cache"]["cached_ratio"] == 0.896
+
+
+def test_render_racing_invalidate_is_not_cached(tmp_path):
+    from execution.prompt_templates import PromptTemplateCache
+    (tmp_path / "a.md").write_text("regra A", encoding="utf-8")
+    cache = PromptTemplateCache(tmp_path)
+
+    def render_during_edit(files):
+        # Diretiva editada e cache invalidado enquanto o template antigo é montado
+        (tmp_path / "a.md").write_text("regra B", encoding="utf-8")
+        cache.invalidate()
+        return files["a.md"]
+
+    stale = cache.get("k", ["a.md"], render_during_edit)
+    assert stale.text == "regra A"
+    assert cache.stats()["templates"] == {}
+    assert cache.get("k", ["a.md"], lambda files: files["a.md"]).text == "regra B"
@@ -0,0 +1,120 @@
+"""
+Cenário de teste: resposta do LLM com o nome do lead ("Olá, Ana!") guardada no cache semântico.
+No hit para outro lead o nome é trocado; sem nome conhecido o vocativo some. Configuração do
+agente e hash do contexto (persona/RAG/histórico alterados invalidam a entrada). Com Postgres
+simulado: store guarda o molde, lookup devolve só acima da similaridade, e um turno com a busca
+RAG falha (rag_error) nem consulta o cache.
+"""
+
+import sys
+from pathlib import Path
+
+# Raiz do projeto
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def test_reply_templating_and_context_key(monkeypatch):
+    monkeypatch.delenv("RESPONSE_CACHE_STATES", raising=False)
+    from execution.response_cache import _parse_config, context_hash, render_reply, template_reply
+    out = {"resposta_texto": "Olá, Ana! A diária é R$ 350. Ana, quantas pessoas?", "enviar_audio": False,
+           "proximo_estado": "descoberta", "enviar_imagens": False, "modelos": None, "usage": {"total_tokens": 900}}
+    stored = template_reply(out, "Ana")
+    assert "usage" not in stored and "Ana" not in stored["resposta_texto"]
+    assert render_reply(stored, "Bruno")["resposta_texto"] == "Olá, Bruno! A diária é R$ 350. Bruno, quantas pessoas?"
+    assert render_reply(stored, None)["resposta_texto"] == "Olá! A diária é R$ 350. quantas pessoas?"
+
+    assert _parse_config(None) is None and _parse_config({"enabled": False}) is None
+    assert _parse_config(True)["states"] == ["descoberta"]
+    assert _parse_config({"enabled": True, "similarity": 0.9})["similarity"] == 0.9
+
+    base = context_hash("descoberta", "CONTEXTO (base de conhecimento): diária R$ 350", "Pousada", "hotelaria", None)
+    assert base == context_hash("descoberta", "CONTEXTO (base de conhecimento): diária R$ 350", "Pousada", "hotelaria", None)
+    assert base != context_hash("descoberta", "CONTEXTO (base de conhecimento): diária R$ 380", "Pousada", "hotelaria", None)
+    assert base != context_hash("descoberta", "CONTEXTO (base de conhecimento): diária R$ 350", "Pousada", "hotelaria", "Seja formal")
+
+
+class _Conn:
+    """Conexão simulada: registra comandos; a busca por similaridade devolve a linha configurada."""
+
+    def __init__(self, executed: list, row):
+        self.executed = executed
+        self.row = row
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, sql, params=None):
+        self.executed.append((" ".join(sql.split()), params))
+
+    def fetchone(self):
+        return self.row
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _cache(monkeypatch, row=None):
+    from execution import knowledge_rag, response_cache
+    executed: list = []
+    monkeypatch.setattr(response_cache, "_connection", lambda: _Conn(executed, row))
+    monkeypatch.setattr(response_cache, "_stats", {"lookups": 0, "hits": 0, "stores": 0})
+    monkeypatch.setattr(knowledge_rag, "embed_query", lambda text, tenant_id=None: [0.5, 0.5])
+    return response_cache, executed
+
+
+def test_store_and_lookup(monkeypatch):
+    config = {"similarity": 0.95, "ttl_hours": 24.0, "states": ["descoberta"]}
+    out = {"resposta_texto": "Olá, Ana! A diária é R$ 350.", "enviar_audio": False, "proximo_estado": "descoberta",
+           "enviar_imagens": False, "modelos": None}
+
+    response_cache, executed = _cache(monkeypatch)
+    response_cache.store("t1", "a1", "descoberta", "ctx", "quanto custa a diária?", out, "Ana")
+    response_cache.store("t1", "a1", "descoberta", "ctx", "oi", {"resposta_texto": "  "}, "Ana")
+    [(sql, params)] = executed
+    assert sql.startswith("INSERT INTO response_cache") and params[:5] == ("t1", "a1", "descoberta", "ctx", "quanto custa a diária?")
+    assert '"Olá, {nome}! A diária é R$ 350."' in params[6]
+
+    stored = response_cache.template_reply(out, "Ana")
+    response_cache, executed = _cache(monkeypatch, {"id": 9, "response": stored, "similarity": 0.97})
+    hit = response_cache.lookup("t1", "a1", "descoberta", "ctx", "qual o valor da diária?", config, "Bruno")
+    assert hit["resposta_texto"] == "Olá, Bruno! A diária é R$ 350."
+    assert executed[-1] == ("UPDATE response_cache SET hits = hits + 1, last_hit_at = NOW() WHERE id = %s", (9,))
+
+    response_cache, executed = _cache(monkeypatch, {"id": 9, "response": stored, "similarity": 0.9})
+    assert response_cache.lookup("t1", "a1", "descoberta", "ctx", "tem piscina?", config, "Bruno") is None
+    assert len(executed) == 1 and response_cache.stats() == {"lookups": 1, "hits": 0, "stores": 0, "hit_rate": 0.0}
+
+
+def test_cached_reply_keys_on_history_and_skips_rag_errors(monkeypatch):
+    response_cache, executed = _cache(monkeypatch)
+    monkeypatch.setattr(response_cache, "cache_config", lambda tenant_id, agent_id: {
+        "similarity": 0.95, "ttl_hours": 24.0, "states": ["descoberta"]})
+    persona = ("Pousada", "hotelaria", None)
+    rag = "CONTEXTO (base de conhecimento): Erro comum: reservar sem sinal. Diária R$ 350."
+
+    # RAG falho: sem consulta e sem hash (nada é guardado depois do LLM)
+    assert response_cache.cached_reply("t1", "a1", "descoberta", "quanto custa?", rag, persona, rag_error=True) == (None, None)
+    assert executed == []
+
+    # "Erro" no texto de um documento não desliga o cache
+    first, _ = response_cache.cached_reply("t1", "a1", "descoberta", "quanto custa?", rag, persona)
+    assert first and len(executed) == 1
+
+    ana = [{"role": "user", "content": "oi"}, {"role": "assistant", "content": "Olá, Ana! Para quantas pessoas?"}]
+    bruno = [{"role": "user", "content": "oi"}, {"role": "assistant", "content": "Olá, Bruno! Para quantas pessoas?"}]
+    after_ana, _ = response_cache.cached_reply("t1", "a1", "descoberta", "quanto custa?", rag, persona, "Ana", recent_log=ana)
+    after_bruno, _ = response_cache.cached_reply("t1", "a1", "descoberta", "quanto custa?", rag, persona, "Bruno", recent_log=bruno)
+    other, _ = response_cache.cached_reply("t1", "a1", "descoberta", "quanto custa?", rag, persona, "Ana",
+                                           recent_log=[{"role": "user", "content": "quero cancelar"}])
+    assert after_ana == after_bruno and len({first, after_ana, other}) == 3
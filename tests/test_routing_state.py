@@ -0,0 +1,163 @@
+"""
+Cenário de teste: conversa de um lead num agente de entrada com equipe, sem Redis e sem Postgres
+(estado em memória), com o supervisor contado. Depois do handoff a conversa fica no agente
+roteado durante o cooldown e enquanto a confiança decai; troca de assunto ou confiança baixa
+reavaliam, e o agente roteado continua como atual na reavaliação. Na fachada, os turnos depois
+do handoff leem e gravam sessão, histórico e resumo na conversa do agente roteado; roteamento que
+estoura o timeout não grava handoff nem memória compartilhada quando a decisão chega depois.
+"""
+
+import sys
+from pathlib import Path
+
+# Raiz do projeto
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+TENANT = "tenant-1"
+
+
+def _agent(agent_id: str) -> dict:
+    return {"id": agent_id, "name": agent_id, "niche": agent_id, "prompt_custom": "",
+            "settings": {}, "team_id": "team-1", "active": True}
+
+
+def test_sticky_routing_cooldown_and_decay(monkeypatch):
+    from execution import routing_state, supervisor, tenant_config
+    calls = []
+
+    def route(tenant_id, user_message, recent_log, current_agent_id=None, entry_agent_id=None):
+        calls.append((current_agent_id, entry_agent_id))
+        return {"target_agent_id": "tours", "reason": "User asks about tours"}
+
+    monkeypatch.setattr(tenant_config, "_load_roster", lambda tenant_id: {a: _agent(a) for a in ("hotel", "tours")})
+    monkeypatch.setattr(tenant_config.db, "_use_postgres", lambda: True)
+    monkeypatch.setattr(tenant_config, "_rosters", {})
+    monkeypatch.setattr(supervisor, "route_conversation", route)
+    monkeypatch.setattr(routing_state, "_local", {})
+    monkeypatch.setattr(routing_state.db, "get_routing", lambda *a, **k: None)
+    monkeypatch.setattr(routing_state.db, "get_recent_log", lambda *a, **k: [])
+    monkeypatch.setattr(routing_state.db, "save_routing", lambda *a, **k: calls.append("saved"))
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    monkeypatch.setenv("ROUTING_CONFIDENCE_DECAY", "0.5")
+    monkeypatch.setenv("ROUTING_MIN_CONFIDENCE", "0.3")
+
+    def turn(message: str) -> dict:
+        decision = routing_state.decide_route(TENANT, "hotel", "lead-1", message)
+        routing_state.record_route(TENANT, "hotel", "lead-1", decision)
+        return decision
+
+    out = turn("Quero um passeio de barco")
+    assert out["target_agent_id"] == "tours" and out["handoff"]
+    assert calls == [("hotel", "hotel"), "saved"]
+
+    # Cooldown: nem a troca de assunto reavalia
+    out = turn("Na verdade quero falar com outro setor")
+    assert out["target_agent_id"] == "tours" and not out["handoff"] and len(calls) == 2
+
+    # Fora do cooldown: confiança 1 -> 0.5 -> 0.25 (< 0.3) e então reavalia
+    monkeypatch.setenv("ROUTING_COOLDOWN_SECONDS", "0")
+    assert turn("Que horas sai?")["reason"] == "Sticky routing"
+    assert turn("Tem colete?")["reason"] == "Sticky routing"
+    assert len(calls) == 2
+    out = turn("Quanto custa?")
+    assert calls[-1] == ("tours", "hotel") and not out["handoff"] and len(calls) == 3
+
+    # Sinal de troca de assunto reavalia com confiança alta
+    turn("Tenho outra dúvida sobre o quarto")
+    assert len(calls) == 4
+
+
+def _stub_facade(monkeypatch, sessions: dict, logs: dict, reads: list) -> None:
+    """Fachada sem banco/LLM: sessão e histórico por agente em memória; o LLM responde "agente: n mensagens"."""
+    from execution import agent_facade, llm_orchestrator, response_cache
+
+    def session(lead_id, tenant_id=None, agent_id=None):
+        reads.append(("session", agent_id))
+        return {"current_state": sessions.setdefault(agent_id, "descoberta"), "spin_answers": {}}
+
+    def recent_log(lead_id, limit=12, tenant_id=None, agent_id=None):
+        reads.append(("log", agent_id))
+        return list(logs.get(agent_id, []))
+
+    def update_state(lead_id, state, tenant_id=None, agent_id=None):
+        sessions[agent_id] = state
+
+    def append_log(lead_id, role, content, content_type="text", tenant_id=None, agent_id=None):
+        logs.setdefault(agent_id, []).append({"role": role, "content": content})
+
+    async def llm(**kwargs):
+        nxt = {"descoberta": "problema", "problema": "implicacao"}[kwargs["current_state"]]
+        return {"resposta_texto": f"{kwargs['agent_id']}: {len(kwargs['recent_log'])}", "proximo_estado": nxt}
+
+    async def no_after_turn(*a, **k):
+        return None
+
+    noop = lambda *a, **k: None
+    for name, value in {
+        "init_db": noop, "get_or_create_session": session, "get_recent_log": recent_log,
+        "get_summary": lambda *a, **k: {"summary": "", "summary_turns": 0},
+        "update_state": update_state, "append_log": append_log, "update_classification": noop,
+        "after_turn": no_after_turn,
+    }.items():
+        monkeypatch.setattr(agent_facade, name, value)
+    monkeypatch.setattr(agent_facade.plan_limit_checker, "check_message_limit", lambda tenant_id: True)
+    monkeypatch.setattr("execution.usage_tracker.check_token_budget", lambda tenant_id: True)
+    monkeypatch.setattr("execution.usage_tracker.track_message_sync", lambda *a, **k: True)
+    monkeypatch.setattr("execution.knowledge_rag.search_document_chunks", lambda *a, **k: "CONTEXTO: ok")
+    monkeypatch.setattr(response_cache, "cached_reply", lambda *a, **k: (None, None))
+    monkeypatch.setattr(llm_orchestrator, "run_async", llm)
+    monkeypatch.setenv("DRIVE_RAG_DISABLED", "1")
+
+
+def test_turns_after_handoff_use_routed_conversation(monkeypatch):
+    from execution import agent_facade, routing_state
+    from execution.async_runtime import run_sync
+    sessions: dict[str, str] = {}
+    logs: dict[str, list] = {}
+    reads: list[tuple[str, str]] = []
+    decisions = iter([
+        {"target_agent_id": "tours", "reason": "User asks about tours", "handoff": True},
+        {"target_agent_id": "tours", "reason": "Sticky routing", "handoff": False},
+    ])
+    _stub_facade(monkeypatch, sessions, logs, reads)
+    monkeypatch.setattr(routing_state, "decide_route", lambda *a, **k: next(decisions))
+    monkeypatch.setattr(routing_state, "record_route", lambda *a, **k: None)
+    monkeypatch.setattr("execution.agent_memory.save_shared_memory", lambda *a, **k: None)
+
+    kwargs = dict(tenant_id=TENANT, agent_id="hotel", agent_name_override="Hotel")
+    first = run_sync(agent_facade.run_agent_facade_async("lead-1", "Quero um passeio", **kwargs))
+    second = run_sync(agent_facade.run_agent_facade_async("lead-1", "Que horas sai?", **kwargs))
+
+    # Nada lido da conversa do agente de entrada; o 2º turno vê o estado e o histórico do 1º
+    assert {agent for _, agent in reads} == {"tours"}
+    assert first["resposta_texto"] == "tours: 0" and second["resposta_texto"] == "tours: 2"
+    assert sessions == {"tours": "implicacao"} and len(logs["tours"]) == 4
+
+
+def test_routing_timeout_writes_nothing(monkeypatch):
+    import time
+    from execution import agent_facade, routing_state
+    from execution.async_runtime import run_sync
+    sessions: dict[str, str] = {}
+    logs: dict[str, list] = {}
+    writes: list = []
+    _stub_facade(monkeypatch, sessions, logs, [])
+
+    def slow_decision(*a, **k):
+        time.sleep(0.5)
+        return {"target_agent_id": "tours", "reason": "User asks about tours", "handoff": True,
+                "state": {"agent_id": "tours", "confidence": 1.0, "routed_at": time.time()}}
+
+    monkeypatch.setattr(routing_state, "decide_route", slow_decision)
+    monkeypatch.setattr(routing_state, "record_route", lambda *a, **k: writes.append("route"))
+    monkeypatch.setattr("execution.agent_memory.save_shared_memory", lambda *a, **k: writes.append("memory"))
+    monkeypatch.setenv("TURN_STEP_TIMEOUT_ROUTING", "0.1")
+
+    out = run_sync(agent_facade.run_agent_facade_async("lead-1", "Quero um passeio", tenant_id=TENANT,
+                                                       agent_id="hotel", agent_name_override="Hotel"))
+    # O turno segue no agente de entrada; a decisão que chegou tarde não grava handoff nem memória
+    time.sleep(0.6)
+    assert out["resposta_texto"] == "hotel: 0" and sessions == {"hotel": "problema"}
+    assert writes == []
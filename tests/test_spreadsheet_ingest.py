@@ -0,0 +1,102 @@
+"""
+Cenário de teste: tabela de preços em CSV (delimitador ;) com cabeçalho e linhas que não cabem num
+chunk só. Cada chunk repete o cabeçalho, as linhas não se repetem nem se perdem entre chunks e a
+numeração (row_start/row_end) emenda de um chunk para o outro. O CSV é lido no próprio processo,
+sem processo filho; o Excel é extraído pelo filho para um arquivo temporário e o slot de extração
+fica livre antes de o consumidor ler o primeiro chunk.
+"""
+
+import sys
+from pathlib import Path
+
+# Raiz do projeto
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def _write_csv(tmp_path: Path, rows: int) -> Path:
+    path = tmp_path / "tarifas.csv"
+    lines = ["Quarto;Diária;Temporada"] + [f"Suíte {i};{400 + i};alta" for i in range(1, rows + 1)]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return path
+
+
+def test_chunk_boundaries_repeat_header_and_cover_every_row(tmp_path):
+    from execution.spreadsheet_ingest import iter_row_chunks
+    path = _write_csv(tmp_path, 40)
+
+    chunks = list(iter_row_chunks(str(path), max_chars=200))
+
+    assert len(chunks) > 1
+    header = "Colunas: Quarto | Diária | Temporada\n"
+    assert all(c["content"].startswith(header) and len(c["content"]) <= 200 for c in chunks)
+    rows = [line for c in chunks for line in c["content"][len(header):].split("\n")]
+    assert rows == [f"Suíte {i} | {400 + i} | alta" for i in range(1, 41)]
+    # Linhas numeradas como no Excel (cabeçalho = 1), sem buraco nem sobreposição entre chunks
+    assert chunks[0]["metadata"]["row_start"] == 2 and chunks[-1]["metadata"]["row_end"] == 41
+    for prev, nxt in zip(chunks, chunks[1:]):
+        assert nxt["metadata"]["row_start"] == prev["metadata"]["row_end"] + 1
+
+
+def test_single_row_sheet_is_kept(tmp_path):
+    from execution.spreadsheet_ingest import iter_row_chunks
+    path = tmp_path / "aviso.csv"
+    path.write_text("Check-in às 14h\n", encoding="utf-8")
+    assert list(iter_row_chunks(str(path))) == [
+        {"content": "Check-in às 14h", "metadata": {"sheet": None, "row_start": 1, "row_end": 1}},
+    ]
+
+
+def test_csv_streams_in_process(monkeypatch, tmp_path):
+    from execution import extraction_pool
+
+    def no_spawn(*args, **kwargs):
+        raise AssertionError("CSV não deve abrir processo filho")
+
+    monkeypatch.setattr(extraction_pool, "_spawn", no_spawn)
+    monkeypatch.setenv("EXTRACTION_MAX_PROCESSES", "2")
+    path = _write_csv(tmp_path, 3)
+    chunks = list(extraction_pool.iter_spreadsheet_chunks(str(path)))
+    assert len(chunks) == 1 and chunks[0]["metadata"] == {"sheet": None, "row_start": 2, "row_end": 4}
+
+
+class _DoneProcess:
+    """Processo filho que já terminou (o alvo rodou inline no teste)."""
+
+    exitcode = 0
+
+    def is_alive(self):
+        return False
+
+    def terminate(self):
+        pass
+
+    def join(self, timeout=None):
+        pass
+
+
+def test_excel_slot_released_before_consumer_reads(monkeypatch, tmp_path):
+    import multiprocessing
+    from execution import extraction_pool, spreadsheet_ingest
+
+    def spawn_inline(target, file_path, cpu_seconds, memory_mb, *extra):
+        parent, child = multiprocessing.Pipe(duplex=False)
+        target(file_path, child, 0, 0, *extra)
+        return _DoneProcess(), parent
+
+    rows = [{"content": f"Colunas: Quarto\nSuíte {i}", "metadata": {"sheet": "Preços", "row_start": i, "row_end": i}}
+            for i in range(2, 7)]
+    monkeypatch.setattr(spreadsheet_ingest, "iter_row_chunks", lambda file_path: iter(rows))
+    monkeypatch.setattr(extraction_pool, "_spawn", spawn_inline)
+    monkeypatch.setenv("EXTRACTION_MAX_PROCESSES", "1")
+    workbook = tmp_path / "tarifas.xlsx"
+    workbook.write_bytes(b"xlsx")
+
+    chunks = extraction_pool.iter_spreadsheet_chunks(str(workbook))
+    first = next(chunks)
+    # Consumidor ainda no primeiro chunk e o único slot já está livre para outra extração
+    slots = extraction_pool._get_slots(1)
+    assert slots.acquire(blocking=False)
+    slots.release()
+    assert [first, *chunks] == rows
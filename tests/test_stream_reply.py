@@ -0,0 +1,119 @@
+"""
+Cenário de teste: servidor local compatível com chat/completions em stream (SSE). "openai/stream"
+manda o JSON da resposta em pedaços e o usage no fim; on_partial recebe o resposta_texto crescendo
+e os campos estruturados saem do JSON completo. "openai/slow" para no meio e estoura o prazo: a
+resposta de contingência mantém o texto parcial que o cliente já viu. Nos dois casos o stream é
+fechado.
+"""
+
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Raiz do projeto
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+REPLY = {"resposta_texto": "A diária da suíte é R$ 350, com café.", "enviar_audio": False,
+         "proximo_estado": "problema", "enviar_imagens": True, "modelos": None}
+
+
+def _event(model: str, payload: dict) -> bytes:
+    chunk = {"id": "chatcmpl-test", "object": "chat.completion.chunk", "created": 0, "model": model, **payload}
+    return b"data: " + json.dumps(chunk).encode() + b"\n\n"
+
+
+class _StreamHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        length = int(self.headers.get("content-length") or 0)
+        model = json.loads(self.rfile.read(length) or b"{}").get("model")
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("connection", "close")
+        self.end_headers()
+        raw = json.dumps(REPLY, ensure_ascii=False)
+        pieces = [raw[i:i + 12] for i in range(0, len(raw), 12)]
+        if model == "openai/slow":
+            pieces = pieces[:4]
+        for piece in pieces:
+            self.wfile.write(_event(model, {"choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}))
+            self.wfile.flush()
+        if model == "openai/slow":
+            time.sleep(2)  # o resto nunca chega dentro do prazo
+            return
+        usage = {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120}
+        self.wfile.write(_event(model, {"choices": [], "usage": usage}))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve(monkeypatch):
+    from openai import AsyncStream
+    from execution import llm_orchestrator
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StreamHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(llm_orchestrator, "OPENROUTER_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/v1")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "sk-test")
+    monkeypatch.setenv("OPENROUTER_FALLBACK_MODELS", "")
+    monkeypatch.setenv("LLM_JSON_SCHEMA_MODELS", "openai/")
+    closed: list = []
+    original_close = AsyncStream.close
+
+    async def close(self):
+        closed.append(self)
+        await original_close(self)
+
+    monkeypatch.setattr(AsyncStream, "close", close)
+    return server, closed
+
+
+def _run(model: str, monkeypatch) -> tuple[dict, list]:
+    from execution import llm_orchestrator
+    from execution.async_runtime import run_sync
+    monkeypatch.setenv("OPENROUTER_MODEL", model)
+    partials: list = []
+
+    async def on_partial(text: str) -> None:
+        partials.append(text)
+
+    out = run_sync(llm_orchestrator.run_stream_async("lead-1", "Quanto custa?", "descoberta", "CONTEXTO: vazio", [], on_partial))
+    return out, partials
+
+
+def test_stream_delivers_partials_and_reads_structured_fields(monkeypatch):
+    server, closed = _serve(monkeypatch)
+    try:
+        out, partials = _run("openai/stream", monkeypatch)
+    finally:
+        server.shutdown()
+
+    # Texto parcial sempre crescendo, terminando no resposta_texto inteiro
+    assert len(partials) > 1 and partials[-1] == REPLY["resposta_texto"]
+    assert all(REPLY["resposta_texto"].startswith(p) for p in partials)
+    assert all(len(a) < len(b) for a, b in zip(partials, partials[1:]))
+    assert out["resposta_texto"] == REPLY["resposta_texto"]
+    assert out["proximo_estado"] == "problema" and out["enviar_imagens"] is True and not out.get("fallback")
+    assert len(closed) == 1
+
+
+def test_stream_deadline_keeps_partial_text(monkeypatch):
+    server, closed = _serve(monkeypatch)
+    monkeypatch.setenv("ROUTER_DEADLINE_SECONDS", "0.5")
+    try:
+        out, partials = _run("openai/slow", monkeypatch)
+    finally:
+        server.shutdown()
+
+    assert partials and out["fallback"] is True
+    # O cliente já viu o parcial: a contingência mantém esse texto em vez da mensagem padrão
+    assert out["resposta_texto"] == partials[-1] and REPLY["resposta_texto"].startswith(partials[-1])
+    assert out["proximo_estado"] == "descoberta"
+    assert len(closed) == 1
@@ -0,0 +1,90 @@
+"""
+Cenário de teste: servidor local compatível com chat/completions. "openai/test" recebe
+response_format json_schema e responde só o JSON; "legacy/test" recusa response_format (400) e
+responde texto com ```json e chaves dentro das strings. O orquestrador lê os dois, marca o modelo
+sem suporte e conta as leituras por modelo; um 400 por outro motivo não marca o modelo; JSON truncado ainda rende o resposta_texto.
+"""
+
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+from openai import BadRequestError
+
+# Raiz do projeto
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+REPLY = {"resposta_texto": "Temos o plano {Premium} por R$ 99.", "enviar_audio": False,
+         "proximo_estado": "problema", "enviar_imagens": False, "modelos": None}
+
+
+class _SchemaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    formats: list = []
+
+    def do_POST(self):
+        length = int(self.headers.get("content-length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        model, response_format = body.get("model"), body.get("response_format")
+        _SchemaHandler.formats.append((model, (response_format or {}).get("type")))
+        if model == "legacy/test" and response_format:
+            raw, status = json.dumps({"error": {"message": "response_format not supported"}}).encode(), 400
+        elif model == "openai/too-long":
+            raw, status = json.dumps({"error": {"message": "maximum context length exceeded"}}).encode(), 400
+        else:
+            content = json.dumps(REPLY) if response_format else "Claro! {ok}\n```json\n" + json.dumps(REPLY) + "\n```"
+            raw, status = json.dumps({
+                "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110},
+            }).encode(), 200
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_schema_output_fallback_and_parse_metrics(monkeypatch):
+    from execution import llm_orchestrator
+    from execution.async_runtime import run_sync
+    from execution.llm_usage import reply_parse_stats
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SchemaHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(llm_orchestrator, "OPENROUTER_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/v1")
+    monkeypatch.setenv("OPENROUTER_API_KEY", "sk-test")
+    monkeypatch.setenv("OPENROUTER_FALLBACK_MODELS", "")
+    monkeypatch.setenv("LLM_JSON_SCHEMA_MODELS", "openai/,legacy/")
+    try:
+        for model in ("openai/test", "legacy/test", "legacy/test"):
+            monkeypatch.setenv("OPENROUTER_MODEL", model)
+            out = run_sync(llm_orchestrator.run_async("lead-1", "Oi", "descoberta", "CONTEXTO: vazio", []))
+            assert out["resposta_texto"] == REPLY["resposta_texto"] and out["proximo_estado"] == "problema"
+
+        # Outro 400 (contexto longo) não marca o modelo como sem json_schema
+        monkeypatch.setenv("OPENROUTER_MODEL", "openai/too-long")
+        with pytest.raises(BadRequestError):
+            run_sync(llm_orchestrator.run_async("lead-1", "Oi", "descoberta", "CONTEXTO: vazio", []))
+        assert "openai/too-long" not in llm_orchestrator._schema_unsupported
+    finally:
+        server.shutdown()
+
+    # O legado recusou uma vez e depois vai direto sem response_format
+    assert _SchemaHandler.formats == [("openai/test", "json_schema"), ("legacy/test", "json_schema"),
+                                      ("legacy/test", None), ("legacy/test", None), ("openai/too-long", "json_schema")]
+    stats = reply_parse_stats()
+    assert stats["openai/test"]["json_schema"] == 1 and stats["legacy/test"]["extract"] == 2
+    assert stats["legacy/test"]["failures"] == 0
+
+    truncated = '{"resposta_texto": "Olá! A diária \\u00e9 R$ 350 e", "enviar_au'
+    out = llm_orchestrator._parse_reply(truncated, "descoberta", False, {}, model="test/truncated")
+    assert out["resposta_texto"] == "Olá! A diária é R$ 350 e"
+    assert reply_parse_stats()["test/truncated"]["failures"] == 1
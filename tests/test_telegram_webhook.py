@@ -0,0 +1,45 @@
+"""
+Cenário de teste: webhook do Telegram com resposta em stream. O agente (stub) manda parciais pelo
+on_partial: a primeira vira mensagem, o final edita a mesma mensagem e nenhuma outra mensagem
+(nem o aviso de "agente não respondeu") é enviada. Resposta vazia ainda recebe o aviso.
+"""
+
+import sys
+from pathlib import Path
+
+# Raiz do projeto
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+FINAL = "Temos suítes com vista para o mar a partir de R$ 350 a diária."
+
+
+def _run(monkeypatch, reply: str) -> tuple[list, list]:
+    import core.agent_runner
+    from execution.async_runtime import run_sync
+    from platform_backend.routers import telegram_webhook
+    sent, edits = [], []
+
+    def run_agent(tenant_id, channel, incoming_message, metadata=None, on_partial=None):
+        if reply and on_partial is not None:
+            run_sync(on_partial(reply[:20]))
+        return {"resposta_texto": reply}
+
+    monkeypatch.setattr(telegram_webhook, "_get_telegram_config", lambda tenant_id: {"bot_token": "t", "agent_id": "a"})
+    monkeypatch.setattr(telegram_webhook, "_send_telegram_text", lambda token, chat_id, text: sent.append(text) or True)
+    monkeypatch.setattr(telegram_webhook, "_send_telegram_text_id", lambda token, chat_id, text: sent.append(text) or 7)
+    monkeypatch.setattr(telegram_webhook, "_edit_telegram_text", lambda token, chat_id, message_id, text: edits.append((message_id, text)))
+    monkeypatch.setattr(core.agent_runner, "run_agent", run_agent)
+    monkeypatch.setenv("LLM_STREAM_REPLIES", "1")
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    telegram_webhook._process_telegram_update("tenant-1", {"message": {"chat": {"id": 1}, "from": {"id": 2}, "text": "Oi"}})
+    return sent, edits
+
+
+def test_streamed_reply_has_no_fallback_message(monkeypatch):
+    sent, edits = _run(monkeypatch, FINAL)
+    assert sent == [FINAL[:20]] and edits == [(7, FINAL)]
+
+    sent, edits = _run(monkeypatch, "")
+    assert len(sent) == 1 and sent[0].startswith("Recebi sua mensagem") and not edits
@@ -0,0 +1,90 @@
+"""
+Cenário de teste: roster do tenant com carga contada (sem Postgres). O supervisor resolve
+can_delegate_to, equipe e candidatos do roster em cache: agente sem delegação nem equipe volta sem
+nova carga; invalidar o tenant (mudança em agentes/equipes) recarrega na próxima rota. Uma carga
+que leu o banco antes de uma invalidação concorrente não volta ao cache.
+"""
+
+import sys
+from pathlib import Path
+
+# Raiz do projeto
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+TENANT = "tenant-1"
+
+
+def _agent(agent_id: str, team_id=None, active=True, settings=None) -> dict:
+    return {"id": agent_id, "name": f"Agente {agent_id}", "niche": "vendas", "prompt_custom": "",
+            "settings": settings or {}, "team_id": team_id, "active": active}
+
+
+def test_roster_cache_and_invalidation(monkeypatch):
+    from execution import supervisor, tenant_config
+    roster = {
+        "solo": _agent("solo"),
+        "lead": _agent("lead", team_id="team-1"),
+        "helper": _agent("helper", team_id="team-1"),
+        "paused": _agent("paused", team_id="team-1", active=False),
+    }
+    loads = []
+
+    def load(tenant_id):
+        loads.append(tenant_id)
+        return {k: dict(v) for k, v in roster.items()}
+
+    monkeypatch.setattr(tenant_config, "_load_roster", load)
+    monkeypatch.setattr(tenant_config.db, "_use_postgres", lambda: True)
+    monkeypatch.setattr(tenant_config, "_rosters", {})
+    monkeypatch.delenv("OPENROUTER_API_KEY", raising=False)
+
+    # Primeira rota carrega; as seguintes (sem delegação) não voltam ao banco
+    for _ in range(3):
+        out = supervisor.route_conversation(TENANT, "Oi", [], current_agent_id="solo")
+        assert out["target_agent_id"] == "solo" and "No delegation" in out["reason"]
+    assert loads == [TENANT]
+
+    # Equipe: candidatos ativos da mesma equipe, do mesmo roster
+    assert [a["id"] for a in supervisor._get_tenant_agents(TENANT, team_id="team-1")] == ["lead", "helper"]
+    assert tenant_config.get_agent_settings(TENANT, "lead") == {}
+    assert loads == [TENANT]
+
+    # Agente passa a delegar: só vale depois da invalidação
+    roster["solo"]["settings"] = {"can_delegate_to": ["helper"]}
+    assert supervisor._get_agent_settings(TENANT, "solo") == {}
+    tenant_config.invalidate_tenant_roster(TENANT)
+    assert supervisor._get_agent_settings(TENANT, "solo") == {"can_delegate_to": ["helper"]}
+    assert loads == [TENANT, TENANT]
+
+    # TTL vencido recarrega
+    monkeypatch.setenv("ROUTING_METADATA_TTL_SECONDS", "0")
+    tenant_config.get_tenant_roster(TENANT)
+    assert len(loads) == 3
+
+
+def test_load_started_before_invalidation_is_not_cached(monkeypatch):
+    from execution import tenant_config
+    versions = iter(["antigo", "novo"])
+    loads = []
+
+    def load(tenant_id):
+        name = next(versions)
+        loads.append(name)
+        if name == "antigo":
+            # O agente muda enquanto esta carga ainda está lendo o banco
+            tenant_config.invalidate_tenant_roster(TENANT)
+        return {"solo": _agent("solo", settings={"versao": name})}
+
+    monkeypatch.setattr(tenant_config, "_load_roster", load)
+    monkeypatch.setattr(tenant_config.db, "_use_postgres", lambda: True)
+    monkeypatch.setattr(tenant_config, "_rosters", {})
+    monkeypatch.setattr(tenant_config, "_roster_generations", {})
+    monkeypatch.delenv("ROUTING_METADATA_TTL_SECONDS", raising=False)
+
+    assert tenant_config.get_agent_settings(TENANT, "solo") == {"versao": "antigo"}
+    # A carga antiga foi descartada: a próxima leitura vai ao banco e fica com a versão nova
+    assert tenant_config.get_agent_settings(TENANT, "solo") == {"versao": "novo"}
+    assert tenant_config.get_agent_settings(TENANT, "solo") == {"versao": "novo"}
+    assert loads == ["antigo", "novo"]
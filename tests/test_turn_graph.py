@@ -0,0 +1,52 @@
+"""
+Cenário de teste: etapas de um turno com atrasos simulados. Etapas independentes rodam em
+paralelo (tempo total ~ caminho crítico, não a soma), etapa lenta cai no fallback pelo timeout
+e o relatório aponta a cadeia de dependências mais lenta.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Raiz do projeto
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def _sleeping(seconds: float, value):
+    async def run(results: dict):
+        await asyncio.sleep(seconds)
+        return value(results) if callable(value) else value
+    return run
+
+
+def test_independent_steps_run_concurrently_with_fallback():
+    from execution.turn_graph import TurnStep, run_turn_graph
+    steps = [
+        TurnStep("session", _sleeping(0.1, {"current_state": "descoberta"})),
+        TurnStep("rag", _sleeping(0.3, "CONTEXTO")),
+        TurnStep("recent_log", _sleeping(0.1, [])),
+        TurnStep("routing", _sleeping(0.1, lambda r: f"agente-{len(r['recent_log'])}"), deps=("recent_log",)),
+        TurnStep("agent", _sleeping(5.0, {"name": "lento"}), deps=("routing",), timeout=0.2, fallback=None),
+        TurnStep("plan", _sleeping(0.05, True)),
+    ]
+    results, report = asyncio.run(run_turn_graph(steps))
+    assert results["routing"] == "agente-0" and results["agent"] is None
+    assert report["steps"]["agent"]["status"] == "timeout"
+    assert report["critical_path"] == ["recent_log", "routing", "agent"]
+    assert report["total_ms"] < 700  # sequencial: ~0.85s sem contar o timeout
+
+
+def test_step_without_fallback_propagates():
+    from execution.turn_graph import TurnStep, run_turn_graph
+
+    async def boom(results: dict):
+        raise RuntimeError("sessão indisponível")
+
+    try:
+        asyncio.run(run_turn_graph([TurnStep("session", boom), TurnStep("rag", _sleeping(0.5, "x"))]))
+    except RuntimeError as e:
+        assert "sessão" in str(e)
+    else:
+        raise AssertionError("esperava RuntimeError")
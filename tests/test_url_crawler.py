@@ -0,0 +1,124 @@
+"""
+Cenário de teste: site local (http.server) com robots.txt, links entre páginas, sitemap opcional
+e suporte a ETag. O crawler deve respeitar robots/profundidade e, no refresh, só devolver texto
+das páginas que mudaram.
+"""
+
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Raiz do projeto
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+PAGES = {
+    "/": '<html><body><h1>Pousada</h1><a href="/quartos">Quartos</a> <a href="/privado/admin">Admin</a>'
+         '<a href="https://outro-site.com/">Fora</a></body></html>',
+    "/quartos": '<html><body><p>Suíte com vista para o mar.</p><a href="/quartos/luxo">Luxo</a></body></html>',
+    "/quartos/luxo": "<html><body><p>Suíte luxo com banheira.</p></body></html>",
+    "/privado/admin": "<html><body>segredo</body></html>",
+}
+
+
+class _SiteHandler(BaseHTTPRequestHandler):
+    pages = dict(PAGES)
+    sitemap = False
+    requests: list = []
+
+    def do_GET(self):
+        type(self).requests.append(self.path)
+        host = f"http://{self.headers['Host']}"
+        if self.path == "/robots.txt":
+            body = "User-agent: *\nDisallow: /privado/\n"
+            if self.sitemap:
+                body += f"Sitemap: {host}/sitemap.xml\n"
+            return self._send(200, body, "text/plain")
+        if self.path == "/sitemap.xml":
+            if not self.sitemap:
+                return self._send(404, "not found", "text/plain")
+            locs = "".join(f"<url><loc>{host}{p}</loc></url>" for p in ("/", "/quartos/luxo"))
+            xml = f'<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{locs}</urlset>'
+            return self._send(200, xml, "application/xml")
+        html = self.pages.get(self.path)
+        if html is None:
+            return self._send(404, "not found", "text/plain")
+        etag = f'"{abs(hash(html))}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self._send(200, html, "text/html; charset=utf-8", etag)
+
+    def _send(self, status, body, content_type, etag=None):
+        raw = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("content-type", content_type)
+        self.send_header("content-length", str(len(raw)))
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve():
+    _SiteHandler.pages = dict(PAGES)
+    _SiteHandler.sitemap = False
+    _SiteHandler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SiteHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_crawl_follows_links_within_depth_and_robots():
+    """Segue links do mesmo domínio até max_depth, sem páginas bloqueadas pelo robots.txt."""
+    from execution.url_crawler import crawl_sync
+    server, base = _serve()
+    try:
+        result = crawl_sync(base + "/", max_pages=10, max_depth=1)
+    finally:
+        server.shutdown()
+    urls = {p["url"] for p in result["pages"]}
+    assert urls == {base + "/", base + "/quartos"}
+    assert base + "/privado/admin" in result["blocked"]
+    assert all(p["status"] == "new" and p["etag"] for p in result["pages"])
+    assert not result["sitemap"]
+
+
+def test_crawl_uses_sitemap_from_robots():
+    """Com sitemap declarado no robots.txt, as páginas vêm dele (sem seguir links)."""
+    from execution.url_crawler import crawl_sync
+    server, base = _serve()
+    _SiteHandler.sitemap = True
+    try:
+        result = crawl_sync(base + "/", max_pages=10, max_depth=3)
+    finally:
+        server.shutdown()
+    assert result["sitemap"]
+    assert {p["url"] for p in result["pages"]} == {base + "/", base + "/quartos/luxo"}
+
+
+def test_refresh_only_returns_changed_pages():
+    """Refresh com ETag: página igual responde 304 (unchanged); página alterada volta com texto."""
+    from execution.url_crawler import crawl_sync
+    server, base = _serve()
+    try:
+        first = crawl_sync(base + "/", max_pages=10, max_depth=2)
+        known = {p["url"]: p for p in first["pages"]}
+        _SiteHandler.pages["/quartos/luxo"] = "<html><body><p>Suíte luxo reformada.</p></body></html>"
+        second = crawl_sync(base + "/", max_pages=10, max_depth=2, known=known)
+    finally:
+        server.shutdown()
+    by_url = {p["url"]: p for p in second["pages"]}
+    assert by_url[base + "/"]["status"] == "unchanged"
+    assert by_url[base + "/"]["http_status"] == 304
+    assert by_url[base + "/quartos"]["status"] == "unchanged"
+    assert by_url[base + "/quartos/luxo"]["status"] == "changed"
+    assert "reformada" in by_url[base + "/quartos/luxo"]["text"]
+    assert by_url[base + "/"]["text"] is None
@@ -0,0 +1,25 @@
+"""
+Cenário de teste: detalhamento de tokens do mês (GET /usage/tokens). O mês vira um intervalo
+[início, início do mês seguinte) em UTC, inclusive na virada do ano, e formato inválido responde 400.
+"""
+
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+# Raiz do projeto
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def test_month_bounds():
+    from fastapi import HTTPException
+    from platform_backend.routers.usage import _month_bounds
+    assert _month_bounds("2026-02") == (datetime(2026, 2, 1, tzinfo=timezone.utc), datetime(2026, 3, 1, tzinfo=timezone.utc))
+    assert _month_bounds("2026-12") == (datetime(2026, 12, 1, tzinfo=timezone.utc), datetime(2027, 1, 1, tzinfo=timezone.utc))
+    with pytest.raises(HTTPException) as e:
+        _month_bounds("02/2026")
+    assert e.value.status_code == 400
@@ -0,0 +1,41 @@
+"""
+Cenário de teste: um turno com chamada ao LLM (em thread via run_db), supervisor e embeddings.
+O usage_scope do turno soma os tokens informados pelas APIs por finalidade; fora do escopo
+nada é acumulado.
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+# Raiz do projeto
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def _response(prompt: int, completion: int, cached: int = 0) -> dict:
+    return {"usage": {"prompt_tokens": prompt, "completion_tokens": completion,
+                      "total_tokens": prompt + completion, "prompt_tokens_details": {"cached_tokens": cached}}}
+
+
+def test_turn_scope_collects_usage_across_threads():
+    from execution.async_runtime import run_db
+    from execution.llm_usage import record_llm_usage
+    from execution.usage_scope import add_usage, current_scope, usage_scope
+
+    async def turn():
+        with usage_scope("turn", "tenant-1", agent_id="agente-1", lead_id="lead-1") as usage:
+            await run_db(record_llm_usage, _response(300, 20), "test/supervisor", 80.0, purpose="supervisor")
+            await run_db(add_usage, "embedding", "text-embedding-3-small", prompt_tokens=12, total_tokens=12)
+            record_llm_usage(_response(1500, 90, cached=1024), "test/chat", 900.0, purpose="chat")
+            record_llm_usage(_response(1400, 60), "test/chat", 850.0, purpose="chat")
+            return usage
+
+    usage = asyncio.run(turn())
+    assert usage.total_tokens == 320 + 12 + 1590 + 1460
+    by_purpose = usage.metadata()["by_purpose"]
+    assert by_purpose["chat"]["calls"] == 2 and by_purpose["chat"]["cached_tokens"] == 1024
+    assert by_purpose["supervisor"]["prompt_tokens"] == 300
+    assert usage.metadata()["agent_id"] == "agente-1"
+    assert current_scope() is None